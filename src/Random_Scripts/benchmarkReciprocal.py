@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the reciprocal pairing in Survey.computeReciprocal(). The time
+per quadrupole should stay roughly constant (linear scaling) up to 1e6
+quadrupoles.
+"""
+import os, sys, time
+sys.path.append(os.path.relpath('..'))
+import numpy as np
+import pandas as pd
+from resipy.Survey import Survey
+
+def randomSurvey(ndata, nelec=1024, seed=0):
+    """Build a survey with `ndata` quadrupoles, half of them being the
+    reciprocal of the other half.
+    """
+    rng = np.random.RandomState(seed)
+    nhalf = ndata//2
+    a = rng.randint(1, nelec-3, nhalf)
+    sp = rng.randint(1, 4, nhalf)
+    n = rng.randint(1, 8, nhalf)
+    array = np.c_[a, a+sp, a+sp*(n+1), a+sp*(n+2)]
+    array = (array - 1) % nelec + 1
+    array = np.r_[array, array[:,[2,3,0,1]]]
+    resist = np.r_[np.ones(nhalf), 1.02*np.ones(nhalf)]*np.tile(rng.lognormal(size=nhalf), 2)
+    df = pd.DataFrame(array, columns=['a','b','m','n'])
+    df['resist'] = resist
+    df['ip'] = 0
+    s = Survey.__new__(Survey) # bypass the parser
+    s._initAttributes('benchmark')
+    s.df = df
+    s.kFactor = 1
+    s.ndata = len(df)
+    return s
+
+#%% timing
+for ndata in [10**3, 10**4, 10**5, 10**6]:
+    s = randomSurvey(ndata)
+    t0 = time.time()
+    s.computeReciprocal()
+    dt = time.time() - t0
+    print('{:8d} quadrupoles: {:.3f} s ({:.2f} us/quadrupole)'.format(
+        ndata, dt, dt/ndata*1e6))
@@ -9,25 +9,50 @@ import numpy as np
 import pandas as pd
 
 #%%
+Mcols = ['M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M7', 'M8', 'M9', 'M10', 'M11',
+         'M12', 'M13', 'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M20']
+
 def positive_test (Dcurve,DecayTime): 
     """Calculating TDIP chargeability decay curve trend: 
         positive (increasing over time) trends are bad data
+        
+    The slopes of all decay curves (one per row of `Dcurve`) are computed at
+    once with the closed form of the least square linear fit.
     """
-    DC_slope = np.zeros(np.shape(Dcurve)[0])
-    for i in range(np.shape(Dcurve)[0]):     
-        DecayCoefs = np.linalg.lstsq(np.vstack([DecayTime, np.ones(len(DecayTime))]).T,Dcurve.iloc[i,:])[0]
-        DC_slope[i]=DecayCoefs[0]
+    y = np.asarray(Dcurve, dtype=float)
+    t = np.asarray(DecayTime, dtype=float)
+    tc = t - np.mean(t)
+    DC_slope = (y - np.mean(y, axis=1)[:,None]).dot(tc)/np.sum(tc**2)
     return DC_slope
 
 def linear_coefs (x,y): #linear fit parameteres for decay curve
-    data = np.concatenate((np.log(x)[:,None],np.log(y)[:,None]),axis=1)
-    if np.log(y).sum() !=0:
-        data_no_nan = data[~np.isnan(data).any(axis=1)]
-        coefs = np.linalg.lstsq(np.vstack([data_no_nan[:,0], np.ones(len(data_no_nan[:,0]))]).T,data_no_nan[:,1])[0]
-        return coefs
-    else:
-        coefs = np.array([0,0])
-        return
+    """Fit log(y) = b*log(x) + c for each row of `y` (missing values are
+    ignored). Returns an array with one (b, c) row per decay curve, NaN if the
+    log of the curve sums to 0.
+    """
+    y = np.atleast_2d(np.asarray(y, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lx = np.log(np.asarray(x, dtype=float))[None,:]*np.ones(y.shape)
+        ly = np.log(y)
+    ok = ~(np.isnan(lx) | np.isnan(ly))
+    lx = np.where(ok, lx, 0)
+    ly = np.where(ok, ly, 0)
+    n = np.sum(ok, axis=1)
+    sx = np.sum(lx, axis=1)
+    sy = np.sum(ly, axis=1)
+    sxx = np.sum(lx**2, axis=1)
+    sxy = np.sum(lx*ly, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = (n*sxy - sx*sy)/(n*sxx - sx**2)
+        c = (sy - b*sx)/n
+        # with a single point, lstsq returns the minimum norm solution
+        b1 = sxy/(sxx + 1)
+        c1 = sy/(sxx + 1)
+    coefs = np.c_[np.where(n == 1, b1, b), np.where(n == 1, c1, c)]
+    coefs[n == 0,:] = 0
+    with np.errstate(invalid='ignore'):
+        coefs[~(np.log(y).sum(axis=1) != 0),:] = np.nan
+    return coefs
 
 def DCA(data_in, dump=print): 
     """Decay Curve Analysis (Only for Syscal files):
@@ -42,65 +67,47 @@ def DCA(data_in, dump=print):
     Geophysics, 83(2), 1–48. https://doi.org/10.1190/geo2016-0714.1)
     """
     data = data_in.copy()
-    decayN = data[['M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M7', 'M8', 'M9',
-                'M10', 'M11', 'M12', 'M13', 'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M20']]
-    DecayTime_int = data['TM1'][0]
+    decayN = data[Mcols].values
+    DecayTime_int = data['TM1'].values[0]
     DecayTime = np.arange(int(DecayTime_int),np.shape(decayN)[1]*(int(DecayTime_int)+1),int(DecayTime_int))
-    data['DC_slope'] = positive_test(decayN.copy(),DecayTime) #decay curve trend - positive trends are bad data
+    data['DC_slope'] = positive_test(decayN,DecayTime) #decay curve trend - positive trends are bad data
     
     if data['ip'].mean() == 0: 
         print('\nNo reciprocal IP data available (fast reciprocal measurement)')
-        filtered_R_IP = data.query('(DC_slope<0)').rename(columns = {'a':'An', 'b':'Bn'})
-    else:
-        filtered_R_IP = data.query('(DC_slope<0)').rename(columns = {'a':'An', 'b':'Bn'})
-        
-    DC_fit_linear = np.zeros([len(filtered_R_IP['ip']),2])
-    for i in range(len(filtered_R_IP['ip'])): #calculating decay curve fit parameteres - m=at^b (m: chargeability, t: time, a and b: fitting parameters)
-        DC_fit_linear[i,:] = linear_coefs(DecayTime,filtered_R_IP[['M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M7', 'M8', 'M9',
-                    'M10', 'M11', 'M12', 'M13', 'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M20']].iloc[i,:])            
-    filtered_R_IP['DC_fit_a'],filtered_R_IP['DC_fit_b']=np.exp(DC_fit_linear[:,1]),DC_fit_linear[:,0]
-    filtered_R_IP = filtered_R_IP.dropna(subset=['DC_fit_a','DC_fit_b']).query('(DC_fit_a>0) & (DC_fit_b<0) | (DC_fit_a<0) & (DC_fit_b>0)') #filtering meaningless decay curves 
-    filtered_R_IP = filtered_R_IP.dropna(subset=['DC_fit_a','DC_fit_b']) #for test, remove it
-    fit_DC = pd.DataFrame(filtered_R_IP['DC_fit_a'][:,None]*DecayTime**filtered_R_IP['DC_fit_b'][:,None]).rename(columns = {0:'Fit_DC_1', 1:'Fit_DC_2', 2:'Fit_DC_3', 3:'Fit_DC_4',4:'Fit_DC_5', 5:'Fit_DC_6', 6:'Fit_DC_7', 7:'Fit_DC_8',
-                        8:'Fit_DC_9', 9:'Fit_DC_10',10:'Fit_DC_11',11:'Fit_DC_12',12:'Fit_DC_13',13:'Fit_DC_14',14:'Fit_DC_15',15:'Fit_DC_16',
-                        16:'Fit_DC_17',17:'Fit_DC_18',18:'Fit_DC_19',19:'Fit_DC_20'}) #building fitted decay curve       
-    filtered_R_IP = pd.concat([filtered_R_IP.reset_index(drop=True),fit_DC.reset_index(drop=True)], axis=1) #conatenating fitted decay curve dataframe with measured decaycurve        
-    filtered_R_IP['DC_rmsd'] = ((((fit_DC.values-filtered_R_IP[['M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M7', 'M8', 'M9',
-                'M10', 'M11', 'M12', 'M13', 'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M20']].values)**2).sum(axis=1))/np.shape(fit_DC)[1])**0.5 #calculating decay curve RMSD with fitted curve
-    ####  Bulding master decay curves for each IP window
-    filtered_R_IP['weight'] = 1/filtered_R_IP['DC_rmsd']
-    temp_DC_master = pd.concat([filtered_R_IP[['An','Bn']],(pd.DataFrame(fit_DC.values*filtered_R_IP['weight'][:,None]))],axis=1)
-    master_DC = pd.DataFrame((temp_DC_master.groupby(['An','Bn']).sum()).values/(filtered_R_IP.groupby(['An','Bn'])['weight']).sum()[:,None])
-    groups_temp = filtered_R_IP.groupby(['An','Bn'],sort=True)
-    groups_keys = []
-    for key in groups_temp.groups.keys():
-        groups_keys.append(key)
-    groups_keys = pd.DataFrame(np.reshape(groups_keys, (len(groups_keys),2))).rename(columns = {0:'An', 1:'Bn'})
-    groups_keys = pd.concat([groups_keys,pd.DataFrame(np.arange(0,len(groups_keys)))], axis=1).rename(columns = {0:'i'})
-    groups_keys_sorted = groups_keys.sort_values(['An','Bn']).reset_index(drop=True)
-    master_DC_indexed = pd.concat([master_DC,groups_keys_sorted['i']], axis=1).sort_values(['i']).reset_index(drop=True)
-    shift = np.linspace(-10, 10, 20)
-    appended_groups = []
-    groups_list = [groups_temp.get_group(x) for x in groups_temp.groups]  
-    for i in range(len(filtered_R_IP.groupby(['An','Bn']))):
-        group = groups_list[i]
-        temp_K=np.zeros([len(group)])
-        for j in range(len(group)):
-            errors = np.array([np.mean((master_DC_indexed.iloc[i,:-1][:,None] - group[['M1', 'M2', 'M3', 'M4', 'M5', 'M6', 'M7', 'M8', 'M9',
-                                        'M10', 'M11', 'M12', 'M13', 'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M20']].iloc[j,:][:,None] + m)) for m in shift])
-            temp_K[j] = np.polyfit(shift, errors, 2)[2]
-        group['K'] = temp_K
-        appended_groups.append(group)
-        percent_progress = i*100/len(filtered_R_IP.groupby(['An','Bn']))
-        dump(percent_progress)
-        print('%s%s -Done' % (int(percent_progress),'%'), end='\r')
+    filtered_R_IP = data[data['DC_slope'].values < 0].rename(columns = {'a':'An', 'b':'Bn'})
+    dump(25)
+    
+    #calculating decay curve fit parameteres - m=at^b (m: chargeability, t: time, a and b: fitting parameters)
+    DC_fit_linear = linear_coefs(DecayTime, filtered_R_IP[Mcols].values)
+    DC_fit_a, DC_fit_b = np.exp(DC_fit_linear[:,1]), DC_fit_linear[:,0]
+    ikeep = ~(np.isnan(DC_fit_a) | np.isnan(DC_fit_b)) & (((DC_fit_a > 0) & (DC_fit_b < 0)) | ((DC_fit_a < 0) & (DC_fit_b > 0))) #filtering meaningless decay curves 
+    filtered_R_IP = filtered_R_IP[ikeep].reset_index(drop=True)
+    if filtered_R_IP.shape[0] == 0:
+        print('DCA: no valid decay curve found.')
+        return filtered_R_IP.drop(['DC_slope'], axis=1).rename(columns = {'An':'a','Bn':'b'})
+    DC_fit_a, DC_fit_b = DC_fit_a[ikeep], DC_fit_b[ikeep]
+    fit_DC = DC_fit_a[:,None]*DecayTime**DC_fit_b[:,None] #building fitted decay curve
+    M = filtered_R_IP[Mcols].values
+    DC_rmsd = np.sqrt(np.sum((fit_DC - M)**2, axis=1)/fit_DC.shape[1]) #calculating decay curve RMSD with fitted curve
+    dump(50)
+    
+    ####  Bulding master decay curves for each (A,B) current injection: weighted mean of the fitted curves
+    weight = 1/DC_rmsd
+    AB = filtered_R_IP[['An','Bn']].values
+    _, igroup = np.unique(AB, axis=0, return_inverse=True) # sorted as groupby
+    igroup = igroup.flatten()
+    isort = np.argsort(igroup, kind='mergesort') # measurements grouped, original order within groups
+    istart = np.r_[0, np.where(np.diff(igroup[isort]) != 0)[0] + 1]
+    master_DC = np.add.reduceat(fit_DC[isort,:]*weight[isort,None], istart, axis=0) \
+        /np.add.reduceat(weight[isort], istart)[:,None]
+    dump(75)
+    
+    # misfit with the master curve: the constant of the parabola fitted to the
+    # mean misfit for shifts of the curve, i.e. the mean misfit itself
+    K = np.mean(master_DC[igroup,:] - M, axis=1)
+    appended_groups = filtered_R_IP.iloc[isort]
+    K = K[isort]
+    K_std = np.std(K)
+    final_data_dropped = appended_groups[np.abs(K) < (2*K_std)].drop(['DC_slope'], axis=1).rename(columns = {'An':'a','Bn':'b'})
     print('100% -Done - finished!')
-    appended_groups = pd.concat(appended_groups)
-    K_std = np.std(appended_groups['K'])
-    final_data = appended_groups.loc[np.abs(appended_groups['K'])<(2*K_std)]
-    final_data_dropped = final_data.drop(['DC_slope', 'DC_fit_a', 'DC_fit_b', 'Fit_DC_1', 
-                                   'Fit_DC_2', 'Fit_DC_3', 'Fit_DC_4', 'Fit_DC_5', 'Fit_DC_6', 'Fit_DC_7',
-                                   'Fit_DC_8', 'Fit_DC_9', 'Fit_DC_10', 'Fit_DC_11', 'Fit_DC_12',
-                                   'Fit_DC_13', 'Fit_DC_14', 'Fit_DC_15', 'Fit_DC_16', 'Fit_DC_17',
-                                   'Fit_DC_18', 'Fit_DC_19', 'Fit_DC_20', 'DC_rmsd', 'weight', 'K'], axis = 1).rename(columns = {'An':'a','Bn':'b'})
-    return (final_data_dropped)
\ No newline at end of file
+    return (final_data_dropped)
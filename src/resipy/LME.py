@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Linear mixed effect (LME) error model with the electrodes as grouping
+variables (Tso et al. 2017, doi:10.1016/j.jappgeo.2017.09.009):
+
+    Err ~ avgR + (1|a) + (1|b) + (1|m) + (1|n)
+
+The model is fitted by maximum likelihood (same as `lmer(..., REML=F)` in R)
+by minimizing the profiled deviance of Bates et al. (2015) with a bounded
+quasi-Newton method and the analytical gradient. The random effect design
+matrix and its cross-product are kept sparse and a sparse LU factorization of
+`Λ ZᵀZ Λ + I` (number of levels square) is computed at each iteration. As
+electrodes are mostly combined with their neighbours, this matrix stays sparse
+for long profiles (dense Cholesky is used when more than 10% of it is filled,
+e.g. for small surveys or random quadrupoles).
+"""
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.linalg import cho_factor, cho_solve, lapack
+from scipy.optimize import minimize
+
+
+def _groupIndex(array, levels):
+    """Return the column of the random effect design matrix of each
+    measurement and each grouping variable (-1 if the level is unknown).
+    """
+    icol = -np.ones(array.shape, dtype=int)
+    offset = 0
+    for k, lev in enumerate(levels):
+        ie = np.searchsorted(lev, array[:,k])
+        ie[ie == len(lev)] = len(lev) - 1
+        ifound = lev[ie] == array[:,k]
+        icol[ifound, k] = ie[ifound] + offset
+        offset += len(lev)
+    return icol
+
+
+def _factorize(A):
+    """Factorize the symmetric positive definite matrix `A` (sparse).
+
+    Returns
+    -------
+    logdet : float
+        Logarithm of the determinant of `A`.
+    solve : function
+        Solve `A x = rhs` (`rhs` is a dense 1D or 2D array).
+    diagInv : function
+        Return the diagonal of the inverse of `A`.
+    """
+    if A.nnz > 0.1*A.shape[0]**2: # nearly dense, fill-in would make LU slower
+        c = cho_factor(A.toarray(), lower=True)
+        def diagInv():
+            return np.diag(lapack.dpotri(c[0], lower=1)[0])
+        return 2*np.sum(np.log(np.diag(c[0]))), lambda rhs: cho_solve(c, rhs), diagInv
+    lu = splu(A.tocsc(), permc_spec='MMD_AT_PLUS_A', options={'SymmetricMode':True})
+    def diagInv():
+        return np.diag(lu.solve(np.eye(A.shape[0])))
+    return np.sum(np.log(np.abs(lu.U.diagonal()))), lu.solve, diagInv
+
+
+def _deviance(phi, nlevels, ZtZ, ZtX, Zty, XtX, Xty, Z, X, y, grad=False, full=False):
+    """Profiled ML deviance for the relative variances `phi` (>= 0, square of
+    the relative standard deviations) of the random effects, and its gradient
+    if `grad`.
+    """
+    n = len(y)
+    lam = np.repeat(np.sqrt(phi), nlevels)
+    Lam = sparse.diags(lam)
+    A = Lam.dot(ZtZ).dot(Lam) + sparse.identity(len(lam))
+    logdet, solve, diagInv = _factorize(A)
+    LZtX = lam[:,None]*ZtX
+    LZty = lam*Zty
+    P = solve(np.c_[LZtX, LZty]) # A^-1 [Λ Zt X, Λ Zt y]
+    PX, Py = P[:,:-1], P[:,-1]
+    beta = np.linalg.solve(XtX - LZtX.T.dot(PX), Xty - LZtX.T.dot(Py))
+    u = Py - PX.dot(beta) # spherical random effects
+    b = lam*u # random effects
+    fitted = X.dot(beta) + Z.dot(b)
+    res = y - fitted
+    r2 = np.sum(res**2) + np.sum(u**2) # penalized residual sum of squares
+    dev = logdet + n*(1 + np.log(2*np.pi*r2/n))
+    if full:
+        return dev, beta, b, fitted, r2/n
+    if grad:
+        # log|A| = log|I + G Φ| (G = Zt Z) so d(log|A|)/dphi_k is the sum
+        # over the levels of k of diag((I + G Φ)^-1 G) = diag(G - G Λ A^-1 Λ G)
+        # = (1 - diag(A^-1))/phi_k, and d(r2)/dphi_k = -|Z_k' res|^2 (beta
+        # and u are optimal)
+        dinv = diagInv()
+        dr2 = -Z.T.dot(res)**2
+        ioffset = np.r_[0, np.cumsum(nlevels)]
+        g = np.zeros(len(phi))
+        for k, (i0, i1) in enumerate(zip(ioffset[:-1], ioffset[1:])):
+            if phi[k] > 1e-6:
+                ddet = np.sum(1 - dinv[i0:i1])/phi[k]
+            else: # no cancellation close to the bound
+                LG = Lam.dot(ZtZ[:,i0:i1]).toarray()
+                ddet = np.sum(ZtZ.diagonal()[i0:i1] - np.sum(LG*solve(LG), axis=0))
+            g[k] = ddet + n/r2*np.sum(dr2[i0:i1])
+        return dev, g
+    return dev
+
+
+def fitLME(array, x, y):
+    """Fit the LME error model.
+
+    Parameters
+    ----------
+    array : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n), used as grouping variables.
+    x : numpy.ndarray
+        Mean reciprocal resistance (fixed effect).
+    y : numpy.ndarray
+        Observed reciprocal error.
+
+    Returns
+    -------
+    model : dict
+        Dictionnary with the fixed effects `beta` (intercept, slope), the
+        random effects `b` of each level of each grouping variable, the
+        `levels`, the relative standard deviations `theta`, the residual
+        variance `sigma2`, the `deviance` and the `fitted` values.
+    """
+    array = np.asarray(array, dtype=int)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    levels = [np.unique(array[:,k]) for k in range(array.shape[1])]
+    nlevels = np.array([len(lev) for lev in levels])
+    icol = _groupIndex(array, levels)
+    Z = sparse.csr_matrix((np.ones(icol.size), icol.flatten(),
+                           np.arange(0, icol.size + 1, icol.shape[1])),
+                          shape=(n, np.sum(nlevels)))
+    X = np.c_[np.ones(n), x]
+
+    # cross-products are computed once
+    ZtZ = Z.T.dot(Z).tocsr()
+    ZtX = np.asarray(Z.T.dot(X))
+    Zty = np.asarray(Z.T.dot(y))
+    XtX = X.T.dot(X)
+    Xty = X.T.dot(y)
+    args = (nlevels, ZtZ, ZtX, Zty, XtX, Xty, Z, X, y)
+
+    # bounded quasi-Newton with the analytical gradient, on the variances as
+    # the deviance is flat in theta at theta = 0
+    res = minimize(_deviance, np.ones(len(nlevels)), args=args + (True,), jac=True,
+                   method='L-BFGS-B', bounds=[(0, None)]*len(nlevels))
+    theta = np.sqrt(res.x)
+    dev, beta, b, fitted, sigma2 = _deviance(res.x, *args, full=True)
+    ioffset = np.r_[0, np.cumsum(nlevels)]
+    model = {'beta': beta,
+             'b': [b[ioffset[k]:ioffset[k+1]] for k in range(len(nlevels))],
+             'levels': levels,
+             'theta': theta,
+             'sigma2': sigma2,
+             'deviance': dev,
+             'fitted': fitted}
+    return model
+
+
+def predictLME(model, array, x):
+    """Predict the error from a fitted LME model. Levels not seen during the
+    fit have a random effect of 0 (same as `allow.new.levels=T` in R).
+
+    Parameters
+    ----------
+    model : dict
+        Model returned by `fitLME()`.
+    array : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n).
+    x : numpy.ndarray
+        Mean reciprocal resistance.
+
+    Returns
+    -------
+    pred : numpy.ndarray
+        Predicted error.
+    """
+    array = np.asarray(array, dtype=int)
+    icol = _groupIndex(array, model['levels'])
+    b = np.r_[np.hstack(model['b']), 0] # last one for unknown levels
+    pred = model['beta'][0] + model['beta'][1]*np.asarray(x, dtype=float)
+    pred += np.sum(b[icol], axis=1) # icol == -1 picks the 0
+    return pred
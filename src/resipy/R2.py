@@ -9,6 +9,7 @@ ResIPy_version = '2.0.2' # ResIPy version (semantic versionning in use)
 import os, sys, shutil, platform, warnings, time # python standard libs
 from subprocess import PIPE, call, Popen
 import subprocess
+from multiprocessing import Pool
 import numpy as np # import default 3rd party libaries (can be downloaded from conda repositry, incl with winpython)
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -21,14 +22,18 @@ OS = platform.system()
 sys.path.append(os.path.relpath('..'))
 
 #import ResIPy resipy packages
-from resipy.Survey import Survey
+from resipy.Survey import Survey, quadKey, findQuadKey, matchQuadKeys, fitErrorSurveys
+from resipy.SurveyStack import SurveyStack
+import resipy.geomFactor as geomFactor
+import resipy.surveyCache as surveyCache
 from resipy.r2in import write2in
 import resipy.meshTools as mt
-from resipy.meshTools import cropSurface
+from resipy.meshTools import cropSurface, readMeshDat, writeMeshDat
 import resipy.isinpolygon as iip
 from resipy.template import parallelScript, startAnmt, endAnmt
 from resipy.protocol import (dpdp1, dpdp2, wenner_alpha, wenner_beta, wenner,
-                          wenner_gamma, schlum1, schlum2, multigrad)
+                          wenner_gamma, schlum1, schlum2, multigrad, reciprocal,
+                          countInjections, optimizeSequence)
 from resipy.SelectPoints import SelectPoints
 from resipy.saveData import (write2Res2DInv, write2csv)
 
@@ -79,41 +84,57 @@ wineCheck()
 
 #%% useful functions
 
-# small useful function for reading and writing mesh.dat
-def readMeshDat(fname):
-    """Read mesh.dat or mesh3d.dat and returns elements and nodes.
+# parse survey files in parallel
+def _parseSurvey(args):
+    """Create a Survey from a (fname, ftype, spacing, parser) tuple. Defined
+    at module level so it can be sent to a process pool.
     """
-    with open(fname, 'r') as f:
-        x = f.readline().split()
-    numel = int(x[0])
-    elems = np.genfromtxt(fname, skip_header=1, max_rows=numel)
-    if fname[-6:] == '3d.dat': # it's a 3D mesh
-        skip_footer = 1
-    else:
-        skip_footer = 0
-    nodes = np.genfromtxt(fname, skip_header=numel+1, skip_footer=skip_footer)
-    return elems, nodes
+    fname, ftype, spacing, parser = args
+    return Survey(fname, ftype=ftype, spacing=spacing, parser=parser)
 
 
-def writeMeshDat(fname, elems, nodes, extraHeader='', footer='1'):
-    """Write mesh.dat/mesh3d.dat provided elements and nodes at least.
+def _initWorker(cacheDir, cacheMaxSize):
+    """Set the survey cache of a pool process as in the main process
+    (processes started with 'spawn' do not inherit `surveyCache.setCache()`).
     """
-    numel = len(elems)
-    nnodes = len(nodes)
-    threed = nodes.shape[1] == 4 # it's a 3D mesh
-    if threed is True:
-        extraHeader = '\t1\t0\t4'
-    with open(fname, 'w') as f:
-        f.write('{:.0f} {:.0f}{}\n'.format(numel, nnodes, extraHeader))
-    with open(fname, 'ab') as f:
-        np.savetxt(f, elems, fmt='%.0f')
-        if threed is True:
-            np.savetxt(f, nodes, fmt='%.0f %f %f %f')
-        else:
-            np.savetxt(f, nodes, fmt='%.0f %f %f')
-    if threed is True: # for 3D only
-        with open(fname, 'a') as f:
-            f.write(footer)
+    surveyCache.cacheDir = cacheDir
+    surveyCache.cacheMaxSize = cacheMaxSize
+
+
+def parseSurveys(fnames, ftype='Syscal', spacing=None, parser=None, workers=None):
+    """Parse and preprocess (default filtering and reciprocal computation)
+    several survey files, optionally in a pool of processes.
+    
+    Parameters
+    ----------
+    fnames : list of str
+        List of files to be parsed.
+    ftype : str, optional
+        Type of file to be parsed.
+    spacing : float, optional
+        Electrode spacing to be passed to the parser function.
+    parser : function, optional
+        A parser function to be passed to `Survey` constructor. If `workers`
+        is specified, it must be defined at the top level of a module so it
+        can be pickled.
+    workers : int, optional
+        Number of processes to use. If `None` (default) or 1, the files are
+        parsed in the main process.
+    
+    Yields
+    ------
+    survey : Survey
+        Survey objects in the same order as `fnames`.
+    """
+    args = [(f, ftype, spacing, parser) for f in fnames]
+    if workers is None or workers <= 1 or len(fnames) < 2:
+        for arg in args:
+            yield _parseSurvey(arg)
+    else:
+        with Pool(min(workers, len(fnames)), initializer=_initWorker,
+                  initargs=(surveyCache.cacheDir, surveyCache.cacheMaxSize)) as pool:
+            for survey in pool.imap(_parseSurvey, args):
+                yield survey
 
 
 # distance matrix function for 2D (numpy based from https://stackoverflow.com/questions/22720864/efficiently-calculating-a-euclidean-distance-matrix-using-numpy)
@@ -131,15 +152,7 @@ def pseudo(array, resist, spacing, label='', ax=None, contour=False, log=True,
     resist = resist
 
     if geom: # compute and applied geometric factor
-        apos = elecpos[array[:,0]-1]
-        bpos = elecpos[array[:,1]-1]
-        mpos = elecpos[array[:,2]-1]
-        npos = elecpos[array[:,3]-1]
-        AM = np.abs(apos-mpos)
-        BM = np.abs(bpos-mpos)
-        AN = np.abs(apos-npos)
-        BN = np.abs(bpos-npos)
-        K = 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN)) # geometric factor
+        K = geomFactor.computeK(elecpos, array)
         resist = resist*K
 
 #    array = np.sort(array, axis=1)
@@ -230,6 +243,7 @@ class R2(object): # R2 master class instanciated by the GUI
         self.iBorehole = val
         for s in self.surveys:
             s.iBorehole = val
+            s.iburied = self.iburied
 
 
 
@@ -380,7 +394,20 @@ class R2(object): # R2 master class instanciated by the GUI
         parser : function, optional
             A parser function to be passed to `Survey` constructor.
         """
-        self.surveys.append(Survey(fname, ftype, spacing=spacing, parser=parser))
+        self._addSurvey(Survey(fname, ftype, spacing=spacing, parser=parser), info=info)
+
+
+    def _addSurvey(self, survey, info={}):
+        """Add an already created survey to `R2.surveys`.
+        
+        Parameters
+        ----------
+        survey : Survey
+            Survey object.
+        info : dict, optional
+            Dictionnary of info about the survey.
+        """
+        self.surveys.append(survey)
         self.surveysInfo.append(info)
         self.setBorehole(self.iBorehole)
 
@@ -400,7 +427,7 @@ class R2(object): # R2 master class instanciated by the GUI
 
 
     def createBatchSurvey(self, dirname, ftype='Syscal', info={}, spacing=None,
-                          parser=None, isurveys=[], dump=print):
+                          parser=None, isurveys=[], dump=print, workers=None):
         """Read multiples files from a folders (sorted by alphabetical order).
 
         Parameters
@@ -420,10 +447,13 @@ class R2(object): # R2 master class instanciated by the GUI
             reciprocal measurements. By default all surveys are used.
         dump : function, optional
             Function to dump the information message when importing the files.
+        workers : int, optional
+            Number of processes used to parse the files. By default, files
+            are parsed one after the other in the main process.
         """
         self.createTimeLapseSurvey(dirname=dirname, ftype=ftype, info=info,
                                    spacing=spacing, isurveys=isurveys,
-                                   parser=parser, dump=dump)
+                                   parser=parser, dump=dump, workers=workers)
         self.iTimeLapse = False
         self.iBatch = True
         self.setBorehole(self.iBorehole)
@@ -431,7 +461,7 @@ class R2(object): # R2 master class instanciated by the GUI
 
     def createTimeLapseSurvey(self, dirname, ftype='Syscal', info={},
                               spacing=None, parser=None, isurveys=[],
-                              dump=print):
+                              dump=print, workers=None):
         """Read electrodes and quadrupoles data and return
         a survey object.
 
@@ -453,6 +483,9 @@ class R2(object): # R2 master class instanciated by the GUI
             reciprocal measurements. By default all surveys are used.
         dump : function, optional
             Function to dump information message when importing the files.
+        workers : int, optional
+            Number of processes used to parse the files. By default, files
+            are parsed one after the other in the main process.
         """
         self.iTimeLapse = True
         self.iTimeLapseReciprocal = [] # true if survey has reciprocal
@@ -469,8 +502,10 @@ class R2(object): # R2 master class instanciated by the GUI
                 raise ValueError('dirname should be a directory path or a list of filenames')
 
 
-        for f in files:
-            self.createSurvey(f, ftype=ftype, parser=parser, spacing=spacing)
+        surveys = parseSurveys(files, ftype=ftype, spacing=spacing,
+                               parser=parser, workers=workers)
+        for f, survey in zip(files, surveys):
+            self._addSurvey(survey, info=info)
             haveReciprocal = all(self.surveys[-1].df['irecip'].values == 0)
             self.iTimeLapseReciprocal.append(haveReciprocal)
             dump(f + ' imported')
@@ -485,30 +520,63 @@ class R2(object): # R2 master class instanciated by the GUI
         # create bigSurvey (useful if we want to fit a single error model
         # based on the combined data of all the surveys)
         print('creating bigSurvey')
-        self.bigSurvey = Survey(files[0], ftype=ftype, spacing=spacing)
-        # then override the df
         if len(isurveys) == 0: # assume all surveys would be use for error modelling
             isurveys = np.ones(len(self.surveys), dtype=bool)
         isurveys = np.where(isurveys)[0] # convert to indices
-        df = self.bigSurvey.df.copy()
-        c = 0
-        for i in isurveys:
-            df2 = self.surveys[i].df
-            ipos = df2['irecip'].values > 0
-            ineg = df2['irecip'].values < 0
-            df2.loc[ipos, 'irecip'] = df2[ipos]['irecip'] + c
-            df2.loc[ineg, 'irecip'] = df2[ineg]['irecip'] - c
-            df = df.append(df2, sort=True) # sort to silence the future warning if concatenation axis is not aligned
-            c = c + df2.shape[0]
-        self.bigSurvey.df = df.copy() # override it
-        self.bigSurvey.dfOrigin = df.copy()
-        self.bigSurvey.ndata = df.shape[0]
+        self.bigSurvey = self._createBigSurvey([self.surveys[i] for i in isurveys])
 
         print("{:d} survey files imported".format(len(self.surveys)))
 
 
+    def _createBigSurvey(self, surveys):
+        """Combine the data of several surveys into a single survey used for
+        error modelling. The `irecip` of each survey is offset so that
+        reciprocal pairs stay unique.
+        
+        Parameters
+        ----------
+        surveys : list of Survey
+            Surveys to be combined.
+        
+        Returns
+        -------
+        bigSurvey : Survey
+            Survey with the combined data.
+        """
+        cols = ['a','b','m','n','resist','ip','irecip','recipMean','recipError',
+                'reciprocalErrRel','reci_IP_err','resError','phaseError']
+        cols = [c for c in cols if all([c in s.df.columns for s in surveys])]
+        lengths = np.array([s.df.shape[0] for s in surveys])
+        offsets = np.repeat(np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        data = {}
+        for c in cols:
+            data[c] = np.concatenate([s.df[c].values for s in surveys])
+        data['irecip'] = data['irecip'] + np.sign(data['irecip'])*offsets
+        df = pd.DataFrame(data, columns=cols)
+        bigSurvey = Survey.fromDataframe(df, surveys[0].elec, name='bigSurvey',
+                                         process=False)
+        bigSurvey.kFactor = surveys[0].kFactor
+        bigSurvey.protocolIPFlag = surveys[0].protocolIPFlag
+        return bigSurvey
+    
+    
+    def createSurveyStack(self):
+        """Stack all surveys into dense arrays aligned on a common quadrupole
+        index so filters and error models can be applied to all time steps
+        at once (see `SurveyStack`). Call `SurveyStack.updateSurveys()` to
+        propagate the results back to `R2.surveys`.
+        
+        Returns
+        -------
+        surveyStack : SurveyStack
+            The stack (also stored in `R2.surveyStack`).
+        """
+        self.surveyStack = SurveyStack(self.surveys, elec=self.elec)
+        return self.surveyStack
+
+
     def create3DSurvey(self, fname, lineSpacing=1, zigzag=False, ftype='Syscal',
-                       name=None, parser=None):
+                       name=None, parser=None, dump=print, workers=None):
         """Create a 3D survey based on 2D regularly spaced surveys.
         
         Parameters
@@ -525,6 +593,13 @@ class R2(object): # R2 master class instanciated by the GUI
             Type of the survey to choose which parser to use.
         name : str, optional
             Name of the merged 3D survey.
+        parser : function, optional
+            A parser function to be passed to `Survey` constructor.
+        dump : function, optional
+            Function to dump information message when importing the files.
+        workers : int, optional
+            Number of processes used to parse the files. By default, files
+            are parsed one after the other in the main process.
         """
         if isinstance(fname, list): # it's a list of filename
             fnames = fname
@@ -536,8 +611,10 @@ class R2(object): # R2 master class instanciated by the GUI
                 raise ValueError('fname should be a directory path or a list of filenames')
 
         surveys = []
-        for fname in fnames:
-            surveys.append(Survey(fname, ftype=ftype, parser=parser))
+        for f, survey in zip(fnames, parseSurveys(fnames, ftype=ftype, parser=parser,
+                                                  workers=workers)):
+            surveys.append(survey)
+            dump(f + ' imported')
         survey0 = surveys[0]
         
         # check this is a regular grid
@@ -615,37 +692,13 @@ class R2(object): # R2 master class instanciated by the GUI
         """
         print('Matching quadrupoles between surveys for difference inversion...', end='')
         t0 = time.time()
-        dfs = [s.df for s in self.surveys]
-
-        # sort all dataframe (should already be the case)
-        dfs2 = []
-        for df in dfs:
-            dfs2.append(df)#.sort_values(by=['a','b','m','n']).reset_index(drop=True))
-
-        # concatenate columns of string
-        def cols2str(cols):
-            cols = cols.astype(str)
-            x = cols[:,0]
-            for i in range(1, cols.shape[1]):
-                x = np.core.defchararray.add(x, cols[:,i])
-            return x
-
-        # get measurements common to all surveys
-        df0 = dfs2[0]
-        x0 = cols2str(df0[['a','b','m','n']].values.astype(int))
-        icommon = np.ones(len(x0), dtype=bool)
-        for df in dfs2[1:]:
-            x = cols2str(df[['a','b','m','n']].values.astype(int))
-            ie = np.in1d(x0, x)
-            icommon = icommon & ie
-        print(np.sum(icommon), 'in common...', end='')
-
-        # create boolean index to match those measurements
-        indexes = []
-        xcommon = x0[icommon]
-        for df in dfs2:
-            x = cols2str(df[['a','b','m','n']].values)
-            indexes.append(np.in1d(x, xcommon))
+        # packed integer key of each quadrupole (computed from the current df)
+        keys = [s.getQuadKey() for s in self.surveys]
+        
+        # get measurements common to all surveys and create boolean index
+        # to match those measurements
+        indexes = matchQuadKeys(keys)
+        print(np.sum(indexes[0]), 'in common...', end='')
 
         print('done in {:.5}s'.format(time.time()-t0))
 
@@ -728,6 +781,39 @@ class R2(object): # R2 master class instanciated by the GUI
             self.surveys[index].filterDummy()
 
 
+    def fitError(self, kind='pwl', index=-1):
+        """Fit an error model without plotting. All surveys are fitted in a
+        single vectorized call.
+
+        Parameters
+        ----------
+        kind : str, optional
+            Type of error model: `pwl`, `lin`, `pwlIP` or `parabolaIP`.
+        index : int, optional
+            Index of the survey to fit. If `index == -1` (default) then the fit
+            is done on all surveys independantly.
+            If `ìndex == -2` then the fit is done on the combined surveys.
+
+        Returns
+        -------
+        results : list of dict
+            Results of the fit for each survey fitted (see
+            `Survey.fitErrorSurveys()`).
+        """
+        if index == -2: # apply to combined data of bigSurvey
+            results = fitErrorSurveys([self.bigSurvey], kind=kind)
+            for s in self.surveys:
+                if kind in ['pwl', 'lin']:
+                    s.df['resError'] = self.bigSurvey.errorModel(s.df)
+                else:
+                    s.df['phaseError'] = self.bigSurvey.phaseErrorModel(s.df)
+        elif index == -1: # apply to each
+            results = fitErrorSurveys(self.surveys, kind=kind)
+        else:
+            results = fitErrorSurveys([self.surveys[index]], kind=kind)
+        return results
+
+
     def fitErrorLin(self, index=-1, ax=None):
         """Fit a linear relationship to the resistivity data.
 
@@ -815,7 +901,8 @@ class R2(object): # R2 master class instanciated by the GUI
             If specified, the graph will be plotted against this axis,
             otherwise a new figure will be created.
         rpath : str, optional
-            Path of the directory with R (for Windows only).
+            Not used anymore (the model is fitted in Python), kept for
+            compatibility.
         iplot : bool, optional
             If `True` plot it.
         """
@@ -1239,6 +1326,12 @@ class R2(object): # R2 master class instanciated by the GUI
             length as `R2.elec`.
         kwargs : -
             Keyword arguments to be passed to mesh generation schemes
+
+        Notes
+        -----
+        Triangular and tetrahedral meshes can be reused from an on-disk cache
+        instead of running gmsh again. The cache is disabled by default,
+        enable it with `meshTools.setMeshCache()`.
         """
         self.meshParams = {'typ':typ, 'buried':buried, 'surface':surface,
                            'cl_factor':cl_factor, 'cl':cl, 'dump':dump,
@@ -2468,7 +2561,45 @@ class R2(object): # R2 master class instanciated by the GUI
 #                res = np.array(mesh.attr_cache['Resistivity(Ohm-m)'])
 #                mesh.attr_cache['difference(percent)'] = (res-resRef)/resRef*100
 
-    
+
+    def probeResults(self, x, y=None, z=None, attr='Resistivity(log10)'):
+        """Values of an attribute of the inverted meshes at given points
+        (e.g. along a borehole or on a regular grid).
+
+        Parameters
+        ----------
+        x, y, z : array like
+            Coordinates of the points. `y` can be None for 2D surveys.
+        attr : str, optional
+            Name of the attribute in `Mesh.attr_cache`.
+
+        Returns
+        -------
+        values : numpy array
+            (n_meshResults x n_points) values of the element containing each
+            point, NaN for points outside the mesh.
+
+        Notes
+        -----
+        The points are located once (see `Mesh.locate()`), the look up is
+        shared by all meshes of `R2.meshResults` with the same geometry.
+        """
+        if len(self.meshResults) == 0:
+            raise ValueError('No inverted mesh to probe, run R2.invert() first.')
+        ref = self.meshResults[0]
+        ref.locate(x, y, z)
+        values = []
+        for mesh in self.meshResults:
+            if (mesh is not ref and mesh._locate is None
+                and mesh.connection.shape == ref.connection.shape
+                and mesh.node.shape == ref.node.shape
+                and np.array_equal(mesh.connection, ref.connection)
+                and np.array_equal(mesh.node, ref.node)):
+                mesh._locate = ref._locate # same geometry, share the cached look ups
+            values.append(mesh.probe(x, y, z, attr))
+        return np.array(values)
+
+
     def getR2out(self):
         """Reat the .out file and parse its content.
         
@@ -2849,8 +2980,9 @@ class R2(object): # R2 master class instanciated by the GUI
         print('Reference model successfully assigned')
 
 
-    def createSequence(self, params=[('dpdp1', 1, 8)]):
-        """Create a dipole-dipole sequence.
+    def createSequence(self, params=[('dpdp1', 1, 8)], recip=False):
+        """Create a dipole-dipole sequence. Duplicated quadrupoles are
+        removed (the first occurence is kept).
 
         Parameters
         ----------
@@ -2858,6 +2990,9 @@ class R2(object): # R2 master class instanciated by the GUI
             Each tuple is the form (<array_name>, param1, param2, ...)
             Types of sequences available are : 'dpdp1','dpdp2','wenner_alpha',
             'wenner_beta', 'wenner_gamma', 'schlum1', 'schlum2', 'multigrad'.
+        recip : bool, optional
+            If `True`, the reciprocal quadrupoles are added at the end of the
+            sequence.
 
         Examples
         --------
@@ -2886,25 +3021,64 @@ class R2(object): # R2 master class instanciated by the GUI
               'custSeq': addCustSeq}
 
         for p in params:
-            if p[0] is 'custSeq':
+            if p[0] == 'custSeq':
                 try:
                     qs.append(addCustSeq(p[1]))
                 except Exception as e:
                     print('error when importing custom sequence:', e)
             else:
                 pok = [int(p[i]) for i in np.arange(1, len(p))] # make sure all are int
-                qs.append(fdico[p[0]](nelec, *pok).values.astype(int))
-        self.sequence = np.vstack(qs)
+                qs.append(fdico[p[0]](nelec, *pok))
+        seq = np.vstack(qs).astype(np.int32)
+        if recip:
+            seq = np.vstack([seq, reciprocal(seq)])
+        _, ifirst = np.unique(quadKey(seq), return_index=True)
+        self.sequence = seq[np.sort(ifirst)] # remove duplicates but keep order
+
+
+    def optimizeSequence(self, nchannels=10, swap=True):
+        """Reorder the sequence for a multichannel instrument by grouping the
+        quadrupoles by current dipole and packing the potential dipoles by
+        `nchannels`.
+
+        Parameters
+        ----------
+        nchannels : int, optional
+            Number of channels of the instrument.
+        swap : bool, optional
+            If `True`, (b, a, n, m) is used instead of (a, b, m, n) when
+            b < a so both share the same injection.
+
+        Returns
+        -------
+        ninj : int
+            Number of current injections of the optimized sequence.
+        """
+        if self.sequence is None:
+            raise ValueError('No sequence to optimize, use createSequence() first.')
+        seq = np.asarray(self.sequence).astype(np.int32) # can be a DataFrame if imported
+        ninj0 = countInjections(seq, nchannels)
+        self.sequence, injection = optimizeSequence(seq, nchannels=nchannels, swap=swap)
+        ninj = int(injection[-1]) if len(injection) > 0 else 0
+        print('{:d} quadrupoles: {:d} injections with {:d} channels ({:d} before optimization)'.format(
+            len(seq), ninj, nchannels, ninj0))
+        return ninj
 
 
-    def saveSequence(self, fname=''):
+    def saveSequence(self, fname='', nchannels=None):
         """Save sequence as .csv file.
 
         Parameters
         ----------
         fname : str, optional
             Path where to save the sequence.
+        nchannels : int, optional
+            If specified, the sequence is optimized for an instrument with
+            `nchannels` channels before being saved (see
+            `R2.optimizeSequence()`).
         """
+        if nchannels is not None and self.sequence is not None:
+            self.optimizeSequence(nchannels)
         if self.sequence is not None:
             df = pd.DataFrame(self.sequence, columns=['a','b','m','n'])
             df.to_csv(fname, index=False)
@@ -2937,6 +3111,8 @@ class R2(object): # R2 master class instanciated by the GUI
                 self.iburied = df['buried'].values.astype(bool)
             else:
                 self.iburied = None
+            for s in self.surveys:
+                s.iburied = self.iburied
                 
                 
 
@@ -3072,18 +3248,8 @@ class R2(object): # R2 master class instanciated by the GUI
         seq = self.sequence
 
         # let's check if IP that we have a positive geometric factor
-        if self.typ[0] == 'c': # NOTE this doesn't work for borehole
-            elecpos = self.elec[:,0].copy() # and works only for 2D
-            array = seq.copy()
-            apos = elecpos[array[:,0]-1]
-            bpos = elecpos[array[:,1]-1]
-            mpos = elecpos[array[:,2]-1]
-            npos = elecpos[array[:,3]-1]
-            AM = np.abs(apos-mpos)
-            BM = np.abs(bpos-mpos)
-            AN = np.abs(apos-npos)
-            BN = np.abs(bpos-npos)
-            K = 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN)) # geometric factor
+        if self.typ[0] == 'c':
+            K = geomFactor.computeK(self.elec, seq, buried=self.iburied)
             ie = K < 0
             seq2 = seq.copy()
             seq[ie,2] = seq2[ie,3] # swap if K is < 0
@@ -3151,12 +3317,6 @@ class R2(object): # R2 master class instanciated by the GUI
 
         Same arguments as `R2.createMesh()`.
         """
-        fix_me = False
-        try:
-            old_attr_cache = self.mesh.attr_cache.copy()
-            fix_me = True
-        except AttributeError:
-            pass
         if typ == 'quad':
             elec = self.elec.copy()
             elec_x = self.elec[:,0]
@@ -3243,8 +3403,6 @@ class R2(object): # R2 master class instanciated by the GUI
         self.modErrMesh.add_attribute(np.ones(numel, dtype=int), 'zones')
         self.modErrMesh.add_attribute(np.zeros(numel, dtype=bool), 'fixed')
         self.modErrMesh.add_attribute(np.zeros(numel, dtype=float), 'iter')
-        if fix_me:
-            self.mesh.attr_cache = old_attr_cache
 
 
     def estimateError(self, a_wgt=0.01, b_wgt=0.02):
@@ -3286,12 +3444,6 @@ class R2(object): # R2 master class instanciated by the GUI
             Remove the working directory used for the error modelling. Default
             is True.
         """
-        try:#bug fix for overwriting attr_cache in mesh object
-            attr_cache = self.mesh.attr_cache.copy()
-            #for some reason the mesh.attr_cache is dynamically linked to the modelling mesh, and i cant figure out why
-        except AttributeError:
-            print("No mesh already in place")
-
         node_elec = None # we need this as the node_elec with topo and without might be different
         if all(self.elec[:,2] == 0) is False: # so we have topography
             print('A new mesh will be created as the surface is not flat.')
@@ -3304,10 +3456,8 @@ class R2(object): # R2 master class instanciated by the GUI
             self.createModelErrorMesh(**self.meshParams)
             node_elec = self.modErrMeshNE
             mesh = self.modErrMesh
-            fix_me = True
         else:
             mesh = self.mesh
-            fix_me = False
 
         fwdDir = os.path.join(self.dirname, 'err')
         if os.path.exists(fwdDir):
@@ -3343,13 +3493,10 @@ class R2(object): # R2 master class instanciated by the GUI
         write2in(fparam, fwdDir, typ=self.typ)
 
         # write the protocol.dat based on measured sequence
-        seq = self.surveys[0].df[['a','b','m','n']].values
-        if len(self.surveys) > 0: # multiple survey here
-            seq = []
-            for s in self.surveys:
-                seq.append(s.df[['a','b','m','n']].values)
-            seq = np.vstack(seq)
-            seq = np.unique(seq, axis=0)
+        seq = np.vstack([s.df[['a','b','m','n']].values for s in self.surveys])
+        keys = np.hstack([s.getQuadKey() for s in self.surveys])
+        keys, iunique = np.unique(keys, return_index=True)
+        seq = seq[iunique]
         protocol = pd.DataFrame(np.c_[1+np.arange(seq.shape[0]),seq])
         if self.typ == 'R3t' or self.typ == 'cR3t': # it's a 3D survey
             protocol.insert(1, 'sa', 1)
@@ -3384,18 +3531,15 @@ class R2(object): # R2 master class instanciated by the GUI
         else:
             x = np.genfromtxt(os.path.join(fwdDir, self.typ + '_forward.dat'), skip_header=1)
         modErr = np.abs(100-x[:,-1])/100
-        dferr = pd.DataFrame(np.c_[seq, modErr], columns=['a','b','m','n','modErr'])
         for s in self.surveys:
-            if 'modErr' in s.df:
-                s.df.drop('modErr', axis=1)
-            s.df = pd.merge(s.df, dferr, on=['a','b','m','n'], how='inner')
+            ie = findQuadKey(s.getQuadKey(), keys)
+            df = s.df[ie >= 0].copy()
+            df['modErr'] = modErr[ie[ie >= 0]]
+            s.df = df
 
         if rm_tree:# eventually delete the directory to spare space
             shutil.rmtree(fwdDir)
 
-        if fix_me: #apply fix to sort attr_cache inside mesh object
-            self.mesh.attr_cache = attr_cache.copy()
-
         self.fwdErrMdl = True # class now has a forward error model.
 
 
@@ -3577,11 +3721,14 @@ class R2(object): # R2 master class instanciated by the GUI
             if self.typ == 'cR2':
                 df['phaseInvMisfit'] = np.abs(df['Observed_Phase'] - df['Calculated_Phase'])
                 cols += ['phaseInvMisfit']
-            if 'resInvError' in s.df.columns:
-                s.df = s.df.drop('resInvError', axis=1)
-            if 'phaseInvMisfit' in s.df.columns:
-                s.df = s.df.drop('phaseInvMisfit', axis=1)
-            s.df = pd.merge(s.df, df[cols], on=['a','b','m','n'], how='left')
+            ie = findQuadKey(s.getQuadKey(), quadKey(df[['a','b','m','n']].values))
+            ifound = ie >= 0
+            dfs2 = s.df.copy()
+            for col in cols[4:]:
+                val = np.zeros(dfs2.shape[0])*np.nan
+                val[ifound] = df[col].values[ie[ifound]]
+                dfs2[col] = val
+            s.df = dfs2
         # TODO assign the errors to normal and reciprocal ? in case we use recipMean only ? 
         # This error has nothing to do with reciprocity!
 
@@ -3658,11 +3805,15 @@ class R2(object): # R2 master class instanciated by the GUI
         ----------
         outputname : str, optional
             Output path of the .vtk produced. By default the mesh is saved in
-            the working directory `self.dirname` as `mesh.vtk`.
+            the working directory `self.dirname` as `mesh.vtk`. If the path
+            ends with .vtu, the mesh is saved as a XML .vtu file.
         """
         if outputname is None:
             outputname = os.path.join(self.dirname, 'mesh.vtk')
-        self.mesh.write_vtk(outputname)
+        if outputname.endswith('.vtu'):
+            self.mesh.write_vtu(outputname)
+        else:
+            self.mesh.write_vtk(outputname)
 
 
     def _toParaview(self, fname,  paraview_loc=None):
@@ -3939,14 +4090,21 @@ class R2(object): # R2 master class instanciated by the GUI
             print('Had a problem computing differences for %i attributes'%problem)
 
 
-    def saveVtks(self, dirname=None):
+    def saveVtks(self, dirname=None, fmt='vtk', compress=False):
         """Save vtk files of inversion results to a specified directory.
 
         Parameters
         ------------
         dirname: str
             Directory in which results will be saved. Default is the working directory.
+        fmt: str, optional
+            File format: 'vtk' for ASCII legacy files (default), 'binary'
+            for BINARY legacy .vtk files or 'vtu' for XML .vtu files.
+        compress: bool, optional
+            If `True` and `fmt='vtu'`, the data are compressed with zlib.
         """
+        if fmt not in ['vtk', 'binary', 'vtu']:
+            raise ValueError("fmt should be 'vtk', 'binary' or 'vtu'")
         if dirname is None:
             dirname = self.dirname
         amtContent = startAnmt
@@ -3955,8 +4113,12 @@ class R2(object): # R2 master class instanciated by the GUI
         count=0
         for mesh, s in zip(self.meshResults, self.surveys):
             count+=1
-            file_path = os.path.join(dirname, mesh.mesh_title + '.vtk')
-            mesh.write_vtk(file_path, title=mesh.mesh_title)
+            if fmt == 'vtu':
+                file_path = os.path.join(dirname, mesh.mesh_title + '.vtu')
+                mesh.write_vtu(file_path, compress=compress)
+            else:
+                file_path = os.path.join(dirname, mesh.mesh_title + '.vtk')
+                mesh.write_vtk(file_path, title=mesh.mesh_title, binary=fmt == 'binary')
             amtContent += "\tannotations.append('%s')\n"%mesh.mesh_title
         amtContent += endAnmt
         fh = open(os.path.join(dirname,'amt_track.py'),'w')
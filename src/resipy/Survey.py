@@ -17,15 +17,465 @@ from scipy.stats import norm
 from scipy.stats.kde import gaussian_kde
 #import statsmodels.formula.api as smf
 
-from resipy.parsers import (syscalParser, protocolParser,protocolParserLME,  resInvParser,
+from resipy.parsers import (syscalParser, protocolParser, resInvParser,
                      primeParser, primeParserTab, protocolParserIP,
                      protocol3DParser, forwardProtocolDC, forwardProtocolIP,
                      stingParser, ericParser, lippmannParser, aresParser)
 from resipy.DCA import DCA
+from resipy.LME import fitLME, predictLME
+import resipy.surveyCache as surveyCache
+import resipy.geomFactor as geomFactor
 
 import warnings
 warnings.simplefilter('default', category=DeprecationWarning) # this will show the deprecation warnings
 
+
+def quadKey(array, canonical=False):
+    """Pack quadrupoles into a single int64 key (16 bits per electrode).
+
+    Parameters
+    ----------
+    array : array_like
+        Array of int with 4 columns (a, b, m, n).
+    canonical : bool, optional
+        If `True`, the electrodes within each dipole are sorted before packing
+        so (a,b,m,n), (b,a,m,n), (a,b,n,m) and (b,a,n,m) share the same key.
+
+    Returns
+    -------
+    key : numpy.ndarray
+        Array of int64 keys, one per quadrupole. Electrode numbers are taken
+        modulo 2**16, so keys are unique as long as the electrode numbers
+        span less than 65536 values.
+    """
+    array = np.asarray(array, dtype=np.int64).reshape(-1, 4)
+    if canonical:
+        array = np.c_[np.sort(array[:,:2], axis=1), np.sort(array[:,2:], axis=1)]
+    array = (array & 0xFFFF).astype(np.uint64)
+    key = (array[:,0] << np.uint64(48)) | (array[:,1] << np.uint64(32)) \
+        | (array[:,2] << np.uint64(16)) | array[:,3]
+    return key.view(np.int64)
+
+
+def matchReciprocal(array):
+    """Find the reciprocal of each quadrupole using a sorted key join.
+
+    Parameters
+    ----------
+    array : array_like
+        Array of int with 4 columns (a, b, m, n).
+
+    Returns
+    -------
+    i : numpy.ndarray
+        Index of the quadrupoles which have exactly one reciprocal.
+    j : numpy.ndarray
+        Index of the reciprocal of each quadrupole in `i`.
+    """
+    array = np.asarray(array, dtype=np.int64).reshape(-1, 4)
+    key = quadKey(array, canonical=True)
+    rkey = quadKey(array[:,[2,3,0,1]], canonical=True) # key of the reciprocal
+    isort = np.argsort(key, kind='mergesort')
+    skey = key[isort]
+    left = np.searchsorted(skey, rkey, side='left')
+    right = np.searchsorted(skey, rkey, side='right')
+    i = np.where((right - left) == 1)[0] # only one reciprocal found
+    j = isort[left[i]]
+    return i, j
+
+
+def findQuadKey(key, refKey):
+    """Find the position of each key in a reference array of keys.
+    
+    Parameters
+    ----------
+    key : numpy.ndarray
+        Keys to look for (see `quadKey()`).
+    refKey : numpy.ndarray
+        Keys where to look into.
+    
+    Returns
+    -------
+    index : numpy.ndarray
+        Index of `key` in `refKey` or -1 if not found. If a key appears several
+        times in `refKey`, the first occurence is returned.
+    """
+    index = -np.ones(len(key), dtype=int)
+    if len(refKey) == 0:
+        return index
+    isort = np.argsort(refKey, kind='mergesort')
+    skey = refKey[isort]
+    ie = np.searchsorted(skey, key, side='left')
+    ie[ie == len(skey)] = len(skey) - 1
+    ifound = skey[ie] == key
+    index[ifound] = isort[ie[ifound]]
+    return index
+
+
+def matchQuadKeys(keys):
+    """Find quadrupoles common to all arrays of keys.
+    
+    Parameters
+    ----------
+    keys : list of numpy.ndarray
+        List of keys (see `quadKey()`), one array per survey.
+    
+    Returns
+    -------
+    indexes : list of numpy.ndarray
+        List of boolean index, `True` where the quadrupole is present in all
+        surveys.
+    """
+    common = np.unique(keys[0])
+    for key in keys[1:]:
+        common = np.intersect1d(common, key)
+    return [np.in1d(key, common) for key in keys]
+
+
+errorModelKinds = ['pwl', 'lin', 'pwlIP', 'parabolaIP']
+
+
+def _argsortNan(x):
+    """Argsort with `NaN` placed last (same order as `DataFrame.sort_values()`).
+    """
+    inan = np.isnan(x)
+    ivalid = np.where(~inan)[0]
+    return np.r_[ivalid[np.argsort(x[ivalid])], np.where(inan)[0]].astype(int)
+
+
+_recipColumns = ['irecip', 'recipError', 'recipMean']
+
+
+def _reciprocal(df, kFactor):
+    """Reciprocal analysis of the quadrupoles of `df` (see
+    `Survey.computeReciprocal()`).
+    
+    Returns
+    -------
+    cols : dict
+        Columns 'irecip', 'reciprocalErrRel', 'recipError', 'recipMean' and
+        'reci_IP_err'.
+    notfound : int
+        Number of measurements without reciprocal.
+    nbad : int
+        Number of measurements with a reciprocal error above 20 %.
+    """
+    resist = df['resist'].values
+    phase = -kFactor*df['ip'].values #converting chargeability to phase shift
+    array = df[['a','b','m','n']].values
+    
+    R = np.copy(resist)
+    M = np.copy(phase)
+    ndata = len(R)
+    Ri = np.zeros(ndata)
+    reciprocalErr = np.zeros(ndata)*np.nan
+    reciprocalErrRel = np.zeros(ndata)*np.nan
+    reciprocalMean = np.zeros(ndata)*np.nan
+    reci_IP_err = np.zeros(ndata)*np.nan
+    
+    # search for reciprocal measurement: i[k] has exactly one reciprocal j[k]
+    i, j = matchReciprocal(array)
+    notfound = ndata - len(i)
+    
+    # errors are attached to the reciprocal (if several quadrupoles point
+    # to the same reciprocal, the last one is kept)
+    absR = np.abs(R)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reciprocalErr[j] = absR[i] - absR[j]
+        reciprocalErrRel[j] = (absR[i] - absR[j])/absR[i] # in percent
+    reci_IP_err[j] = M[i] - M[j]
+    
+    # flag the first quadrupole found with a positive number and its
+    # reciprocal with the negative counterpart, the first flag set wins
+    itime = np.r_[i, i]
+    irow = np.r_[i, j]
+    ival = np.r_[i + 1, -(i + 1)]
+    iorder = np.r_[np.zeros(len(i)), np.ones(len(i))]
+    isort = np.lexsort((iorder, itime))
+    rows, ifirst = np.unique(irow[isort], return_index=True)
+    Ri[rows] = ival[isort][ifirst]
+    
+    # replace reciprocalMean by one measurements if the other one
+    # is bad (NaN or Inf). Hopefully, the error model will find an
+    # error to go with
+    ok = ~(np.isnan(R) | np.isinf(R))
+    ok1 = ok[i]
+    ok2 = ok[j]
+    reciprocalMean[i] = np.where(ok1 & ok2, (absR[i] + absR[j])/2,
+                                 np.where(ok1, absR[i],
+                                          np.where(ok2, absR[j], np.nan)))
+    reciprocalMean = np.sign(resist)*reciprocalMean # add sign
+    with np.errstate(invalid='ignore'):
+        nbad = np.sum(np.abs(reciprocalErrRel) > 0.2) # NaN are False
+    
+    # in order to compute error model based on a few reciprocal measurements
+    # we fill 'recipMean' column with simple resist measurements for lonely
+    # quadrupoles (which do not have reciprocals)
+    inotRecip = Ri == 0
+    reciprocalMean[inotRecip] = resist[inotRecip]
+    
+    cols = {'irecip': Ri,
+            'reciprocalErrRel': reciprocalErrRel,
+            'recipError': reciprocalErr,
+            'recipMean': reciprocalMean,
+            'reci_IP_err': reci_IP_err}
+    return cols, notfound, nbad
+
+
+def _errorData(survey, kind):
+    """Extract the sorted data and the binning parameters used to fit an
+    error model on a survey.
+    """
+    df = survey.df
+    if kind in ['pwl', 'lin']:
+        if 'recipMean' not in df.columns:
+            survey.computeReciprocal()
+            df = survey.df
+        ie = df['irecip'].values > 0
+        x = np.abs(df['recipMean'].values[ie])
+        y = np.abs(df['recipError'].values[ie])
+        binsize = 20 # default to 20 sample per bins
+        numbins = int(len(x)/binsize) # max 20 bins
+        if numbins > 20: # we want max 20 bins
+            binsize = int(len(x)/20) # at least 20 samples per bin
+            numbins = 20
+        isort = _argsortNan(x)
+        x, y = x[isort], y[isort]
+    else:
+        x = np.abs(df['recipMean'].values)
+        y = df['reci_IP_err'].values
+        binsize = 16
+        numbins = int(df.shape[0]/binsize)
+        if numbins > 20:
+            binsize = int(df.shape[0]/20)
+            numbins = 20
+        isort = _argsortNan(x)
+        x, y = x[isort], y[isort]
+        with np.errstate(invalid='ignore'): # only keep the input phase range
+            ie = ~np.isnan(x) & (y > -survey.phiCbarMax) & (y < survey.phiCbarMax)
+        x, y = x[ie], y[ie]
+    return x.astype(float), y.astype(float), binsize, numbins
+
+
+def makeErrorModel(kind, coefs):
+    """Build an error model function from fitted coefficients.
+    
+    Parameters
+    ----------
+    kind : str
+        Type of error model: `pwl`, `lin`, `pwlIP` or `parabolaIP`.
+    coefs : array_like
+        Coefficients of the model as returned by `fitErrorSurveys()`.
+    
+    Returns
+    -------
+    errorModel : function
+        Function that takes a dataframe with a `recipMean` column and returns
+        the modelled error.
+    """
+    if kind not in errorModelKinds:
+        raise ValueError('Unknown error model {:s}, choose from {:s}'.format(
+            str(kind), ', '.join(errorModelKinds)))
+    coefs = np.asarray(coefs, dtype=float)
+    def errorModel(df):
+        x = np.abs(df['recipMean'].values)
+        if kind in ['pwl', 'pwlIP']:
+            return coefs[0]*(x**coefs[1])
+        elif kind == 'lin':
+            return coefs[0]*x + coefs[1]
+        else:
+            return (coefs[0]*np.log10(x)**2) + (coefs[1]*np.log10(x) + coefs[2])
+    return errorModel
+
+
+def fitErrorSurveys(surveys, kind='pwl', apply=True):
+    """Fit an error model on several surveys at once without plotting. The
+    measurements of each survey are sorted and binned (max 20 bins) then a
+    model is fitted on the bins of all surveys in a single least-square call.
+    
+    Parameters
+    ----------
+    surveys : list of Survey
+        Surveys to fit (each survey has its own model).
+    kind : str, optional
+        Type of error model:
+            - `pwl` : power-law on the resistance `R_err = a*R_avg^b`
+            - `lin` : linear on the resistance `R_err = a*R_avg + b`
+            - `pwlIP` : power-law on the phase `s(phi) = a*R_avg^b`
+            - `parabolaIP` : parabola on the phase
+              `s(phi) = a*log10(R_avg)^2 + b*log10(R_avg) + c`
+    apply : bool, optional
+        If `True` (default), the error model is evaluated and stored in each
+        survey (`resError` and `errorModel` or `phaseError`, `phase` and
+        `phaseErrorModel` for the IP models).
+    
+    Returns
+    -------
+    results : list of dict
+        One dictionnary per survey with keys `kind`, `coefs` (coefficients in
+        the order of the formula above), `R2` (coefficient of determination
+        of the fit), `bins` (array with the mean resistance and the mean
+        error or the phase discrepancy standard deviation of each bin),
+        `x` and `y` (sorted data used for the binning).
+    """
+    if kind not in errorModelKinds:
+        raise ValueError('Unknown error model {:s}, choose from {:s}'.format(
+            str(kind), ', '.join(errorModelKinds)))
+    ns = len(surveys)
+    data = [_errorData(s, kind) for s in surveys]
+    for s, (x, y, binsize, numbins) in zip(surveys, data):
+        if numbins == 0:
+            raise ValueError('Not enough reciprocal measurements to fit an error'
+                             ' model on survey {:s}.'.format(str(s.name)))
+    
+    # bin boundaries for all surveys (the last sample of each bin is skipped
+    # as in the original implementation)
+    lengths = np.array([len(d[0]) for d in data])
+    offsets = np.r_[0, np.cumsum(lengths)[:-1]]
+    binsizes = np.array([d[2] for d in data])
+    nbmax = np.max([d[3] for d in data])
+    ibin = np.arange(nbmax)
+    start = np.minimum(ibin[None,:]*binsizes[:,None], lengths[:,None])
+    end = np.minimum(start + binsizes[:,None] - 1, lengths[:,None])
+    counts = end - start
+    counts[ibin[None,:] >= np.array([d[3] for d in data])[:,None]] = 0 # bins not used
+    counts = counts.flatten()
+    start = (start + offsets[:,None]).flatten()
+    
+    # sample index and bin number of each sample in a bin (ragged arange)
+    nsample = np.sum(counts)
+    isample = np.repeat(start - np.r_[0, np.cumsum(counts)[:-1]], counts) + np.arange(nsample)
+    ibins = np.repeat(np.arange(len(counts)), counts)
+    x = np.hstack([d[0] for d in data])[isample]
+    y = np.hstack([d[1] for d in data])[isample]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        bx = np.bincount(ibins, weights=x, minlength=len(counts))/counts
+        by = np.bincount(ibins, weights=y, minlength=len(counts))/counts
+        if kind in ['pwlIP', 'parabolaIP']: # standard deviation (ddof=1)
+            by = np.sqrt(np.bincount(ibins, weights=(y - by[ibins])**2,
+                                     minlength=len(counts))/(counts - 1))
+        bx = bx.reshape((ns, nbmax))
+        by = by.reshape((ns, nbmax))
+    
+        # transform and fit all surveys at once
+        if kind in ['pwl', 'pwlIP']:
+            tx, ty, deg = np.log(bx), np.log(by), 1
+        elif kind == 'lin':
+            tx, ty, deg = bx, by, 1
+        else:
+            tx, ty, deg = np.log10(bx), by, 2
+    valid = np.isfinite(tx) & np.isfinite(ty)
+    tx[~valid] = 0
+    ty[~valid] = 0
+    A = tx[:,:,None]**np.arange(deg, -1, -1)[None,None,:] # same order as np.polyfit
+    A[~valid,:] = 0
+    p = np.matmul(np.linalg.pinv(A), ty[:,:,None])[:,:,0]
+    
+    # coefficients and R2 (computed on the transformed data)
+    if kind in ['pwl', 'pwlIP']:
+        coefs = np.c_[np.exp(p[:,1]), p[:,0]]
+    else:
+        coefs = p
+    results = []
+    for i in range(ns):
+        ie = valid[i,:]
+        if np.sum(ie) == 0: # e.g. no IP data, the model is NaN
+            coefs[i,:] = np.nan
+        bins = np.c_[bx[i,ie], by[i,ie]]
+        predict = makeErrorModel(kind, coefs[i,:])(pd.DataFrame({'recipMean': bins[:,0]}))
+        if kind in ['pwl', 'pwlIP']:
+            R2 = Survey.R_sqr(np.log(bins[:,1]), np.log(predict))
+        else:
+            R2 = Survey.R_sqr(bins[:,1], predict)
+        results.append({'kind': kind, 'coefs': coefs[i,:], 'R2': R2,
+                        'bins': bins, 'x': data[i][0], 'y': data[i][1]})
+
+    if apply:
+        for s, res in zip(surveys, results):
+            errorModel = makeErrorModel(kind, res['coefs'])
+            if kind in ['pwl', 'lin']:
+                s.df['resError'] = errorModel(s.df)
+                s.errorModel = errorModel
+            else:
+                s.df['phaseError'] = errorModel(s.df)
+                s.df['phase'] = -s.kFactor*s.df['ip']
+                s.phaseErrorModel = errorModel
+    return results
+
+
+pseudoMaxPoints = 20000 # above this number of points, the pseudo-section is binned
+
+
+def pseudoPosition(elecpos, array, iremote=None):
+    """Compute the position of the quadrupoles in a 2D pseudo-section.
+
+    Parameters
+    ----------
+    elecpos : numpy.ndarray
+        X position of the electrodes.
+    array : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n), electrode numbers start at 1.
+    iremote : numpy.ndarray of bool, optional
+        `True` for remote electrodes (ignored when computing the middle of the
+        dipoles).
+
+    Returns
+    -------
+    xpos, ypos : numpy.ndarray
+        Position and pseudo-depth of each quadrupole.
+    """
+    elecpos = np.array(elecpos, dtype=float) # copy
+    array = np.sort(array, axis=1) # for better presentation of Wenner arrays
+    if iremote is not None:
+        elecpos[iremote] = np.inf # so it will never be taken as minimium
+    apos, bpos = elecpos[array[:,0]-1], elecpos[array[:,1]-1]
+    mpos, npos = elecpos[array[:,2]-1], elecpos[array[:,3]-1]
+    with np.errstate(invalid='ignore'):
+        cadd = np.abs(apos - bpos)/2
+        cadd[np.isinf(cadd)] = 0 # they are inf because of our remote
+        cmiddle = np.minimum(apos, bpos) + cadd
+        padd = np.abs(mpos - npos)/2
+        padd[np.isinf(padd)] = 0
+        pmiddle = np.minimum(mpos, npos) + padd
+    xpos = np.minimum(cmiddle, pmiddle) + np.abs(cmiddle - pmiddle)/2
+    ypos = np.sqrt(2)/2*np.abs(cmiddle - pmiddle)
+    return xpos, ypos
+
+
+def binPseudo(xpos, ypos, nx, ny):
+    """Bin the points of a pseudo-section on a regular grid so that no more
+    points than visible markers are drawn.
+
+    Parameters
+    ----------
+    xpos, ypos : numpy.ndarray
+        Position of the points.
+    nx, ny : int
+        Number of bins in each direction.
+
+    Returns
+    -------
+    ie : numpy.ndarray of bool
+        `True` for the points that have a finite position (binned).
+    ibin : numpy.ndarray of int
+        Bin of each binned point.
+    xbin, ybin : numpy.ndarray
+        Mean position of the points in each (non empty) bin.
+    """
+    ie = np.isfinite(xpos) & np.isfinite(ypos)
+    x, y = xpos[ie], ypos[ie]
+    if len(x) == 0:
+        return ie, np.zeros(0, dtype=int), x, y
+    dx = np.ptp(x)/nx if np.ptp(x) > 0 else 1
+    dy = np.ptp(y)/ny if np.ptp(y) > 0 else 1
+    ix = np.minimum(((x - np.min(x))/dx).astype(int), nx - 1)
+    iy = np.minimum(((y - np.min(y))/dy).astype(int), ny - 1)
+    _, ibin, counts = np.unique(ix*ny + iy, return_inverse=True, return_counts=True)
+    xbin = np.bincount(ibin, x)/counts
+    ybin = np.bincount(ibin, y)/counts
+    return ie, ibin, xbin, ybin
+
+
 class Survey(object):
     """Class that handles geophysical data and some basic functions. One 
     instance is created for each survey.
@@ -50,20 +500,31 @@ class Survey(object):
         If `True` will keep all the measurements even the ones without
         reciprocal. Note that if none of the quadrupoles have reciprocal
         they will all be kept anyway.
+    
+    Notes
+    -----
+    If the survey cache is enabled (see `surveyCache.setCache()`), the
+    parsed and preprocessed data are stored on disk and reused the next time
+    the same file is imported.
     """
     def __init__(self, fname, ftype='', name='', spacing=None, parser=None, keepAll=True):
-        self.elec = []
-        self.df = pd.DataFrame()
         if name == '':
             name = os.path.basename(os.path.splitext(fname)[0])
-        self.name = name
-        self.iBorehole = False # True is it's a borehole
-        self.protocolIPFlag = False
-        self.kFactor = 1
-        self.errorModel = None # function instanticated after fitting an error model with reciprocal errors
-        self.iselect = None # use in filterManual()
-        self.eselect = None # idem
-        self.iremote = None # to be set by R2 class when remote detected
+        self._initAttributes(name)
+        
+        # look for an already parsed version of the file
+        cacheKey = None
+        if parser is None and surveyCache.cacheDir is not None:
+            cacheKey = surveyCache.cacheKey(fname, ftype, spacing)
+            cached = surveyCache.load(cacheKey)
+            if cached is not None:
+                self.df = cached['df']
+                self.dfOrigin = cached['dfOrigin']
+                self.elec = cached['elec']
+                self.kFactor = cached['kFactor']
+                self.protocolIPFlag = cached['protocolIPFlag']
+                self.ndata = len(self.dfReset)
+                return
         
         avail_ftypes = ['Syscal','Protocol','Res2Dinv', 'BGS Prime', 'ProtocolIP',
                         'Sting', 'ABEM-Lund', 'Lippmann', 'ARES']# add parser types here! 
@@ -107,28 +568,23 @@ class Survey(object):
                 raise Exception('Sorry this file type is not implemented yet')
 
         
-        self.df = data
         for c in ['a','b','m','n']:
-            self.df.loc[:,c] = self.df[c].astype(int)
+            data.loc[:,c] = data[c].astype(int)
         
         # add error measured to the error columns (so they can be used if no error model are fitted)
-        if 'magErr' in self.df.columns:
-            self.df['resError'] = self.df['magErr'].copy()
+        if 'magErr' in data.columns:
+            data['resError'] = data['magErr'].copy()
         else:
-            self.df['resError'] = np.nan
-        if 'phiErr' in self.df.columns:
-            self.df['phaseError'] = self.df['phiErr'].copy()
+            data['resError'] = np.nan
+        if 'phiErr' in data.columns:
+            data['phaseError'] = data['phiErr'].copy()
         else:
-            self.df['phaseError'] = np.nan
+            data['phaseError'] = np.nan
             
-        self.dfOrigin = data.copy() # unmodified
+        self.df = data
+        self.dfOrigin = data # unmodified (Survey.df is a copy of it)
         self.elec = elec
         self.ndata = len(data)
-        self.phiCbarmin = 0
-        self.phiCbarMax = 25
-        self.filt_typ = None
-        self.cbar = True
-        self.filterDataIP = pd.DataFrame()
 
         if ftype == 'BGS Prime':
             self.checkTxSign()
@@ -140,12 +596,304 @@ class Survey(object):
         # apply basic filtering
         self.filterDefault()
         self.computeReciprocal()
-        self.dfReset = self.df.copy()
-        self.dfPhaseReset = self.df.copy()
+        self._setBase(self.df)
+        
+        if cacheKey is not None:
+            surveyCache.save(cacheKey, self.dfReset, self.dfOrigin, self.elec,
+                             kFactor=self.kFactor, protocolIPFlag=self.protocolIPFlag)
         
             
+    def _initAttributes(self, name):
+        """Set the default attributes of the survey (before any data are
+        loaded).
+        """
+        self.elec = []
+        self._dfVersion = 0 # incremented each time Survey.df is rebuilt or assigned
+        self._setBase(pd.DataFrame())
+        self.name = name
+        self.iBorehole = False # True is it's a borehole
+        self.iburied = None # True if electrode is buried (set by R2)
+        self.protocolIPFlag = False
+        self.kFactor = 1
+        self.errorModel = None # function instanticated after fitting an error model with reciprocal errors
+        self.iselect = None # use in filterManual()
+        self._pseudoPos = None # (key, xpos, ypos) of the last pseudo-section
+        self._pseudoBins = None # (key, ie, ibin, xbin, ybin) if decimated
+        self._kKey = None # key of the last Survey.computeK()
+        self.eselect = None # idem
+        self.iremote = None # to be set by R2 class when remote detected
+        self.ndata = 0
+        self.phiCbarmin = 0
+        self.phiCbarMax = 25
+        self.filt_typ = None
+        self.cbar = True
+        self.filterDataIP = pd.DataFrame()
+        
+    
+    @property
+    def filterDataIP(self):
+        """Dataframe of the IP filtering. After `Survey.filterRangeIP()`,
+        `Survey.filterRecipIP()` or `Survey.filterNested()` it holds the same
+        rows as `Survey.df` (the filters are recorded as masks)."""
+        if self._filterDataIP is None:
+            return self.df
+        return self._filterDataIP
+    
+    @filterDataIP.setter
+    def filterDataIP(self, df):
+        self._filterDataIP = df
+    
+    
+    @property
+    def df(self):
+        """Dataframe of the survey with all filters applied. It is built from
+        the base table (`Survey.dfReset`) and the stack of filter masks the
+        first time it is accessed after a filter is applied or undone.
+        
+        Assigning a dataframe keeps the base table and the filters: a
+        dataframe with the same rows in the same order (same index or same
+        a, b, m, n columns, e.g. with new columns) replaces the current rows,
+        a dataframe made of a subset of the current rows (matched on the
+        index, same order) is recorded as a new filter. A dataframe that
+        cannot be matched to the current rows (e.g. new measurements or rows
+        reordered) becomes the new base table. The columns added are kept
+        when filters are undone (with NaN for the rows restored).
+        """
+        if self._df is None or self._dfValid is False:
+            self._materialize()
+        return self._df
+    
+    
+    @df.setter
+    def df(self, df):
+        if df is self._df and self._dfValid:
+            return # modified in place
+        if self._dfBase.shape[0] == 0: # no data yet
+            self._setBase(df)
+            return
+        old, pos = self.df, self._dfPos
+        def sameQuad(sel): # same quadrupoles as the rows `sel` of the old one
+            cols = ['a','b','m','n']
+            if not all([c in df.columns for c in cols]):
+                return False
+            return np.array_equal(df[cols].values, old[cols].values[sel])
+        if df.shape[0] == old.shape[0] and (df.index.equals(old.index)
+                                            or sameQuad(np.arange(len(pos)))):
+            sel = np.arange(len(pos)) # same rows (index rebuilt by a merge)
+        elif old.index.is_unique and np.all(df.index.isin(old.index)):
+            sel = old.index.get_indexer(df.index)
+            if np.any(np.diff(sel) <= 0) or not sameQuad(sel): # rows reordered or duplicated
+                self._setBase(df)
+                return
+            mask = np.ones(len(self._alive), dtype=bool)
+            mask[pos] = False
+            mask[pos[sel]] = True
+            self._masks.append((mask, np.zeros(0, dtype=int)))
+            self._alive &= mask
+        else:
+            self._setBase(df)
+            return
+        self._df, self._dfPos, self._dfValid = df, pos[sel], True
+        self._dfVersion += 1
+        
+    
+    @property
+    def dfReset(self):
+        """Base table of the survey, before any filter (should not be
+        modified).
+        """
+        return self._dfBase
+    
+    
+    @property
+    def dfPhaseReset(self):
+        """Dataframe before the phase filters (see `Survey.setPhaseReset()`).
+        """
+        pos = np.where(self._aliveMask(self._masks[:self._phaseLevel]))[0]
+        df = self._dfBase.take(pos)
+        self._unpair(df, self._unpairedMask(self._masks[:self._phaseLevel])[pos])
+        return df
+    
+    
+    def _setBase(self, df):
+        """Make `df` the base table (reset point) and clear the filters.
+        """
+        self._dfBase = df
+        self._masks = [] # list of (mask, unpair), see _addMask()
+        self._alive = np.ones(df.shape[0], dtype=bool)
+        self._phaseLevel = 0 # number of masks kept by resetPhaseFilters()
+        self._df = None # materialized dataframe
+        self._dfPos = None # position of its rows in the base table
+        self._dfValid = False
+        self._recipFiltered = False # True if computeReciprocal() was run on filtered data
+    
+    
+    def _aliveMask(self, masks):
+        """Combine the masks of the stack.
+        """
+        alive = np.ones(self._dfBase.shape[0], dtype=bool)
+        for mask, unpair in masks:
+            alive &= mask
+        return alive
+    
+    
+    def _unpairedMask(self, masks):
+        """Quadrupoles still present but whose reciprocal has been removed by
+        `filterData()`.
+        """
+        unpaired = np.zeros(self._dfBase.shape[0], dtype=bool)
+        for mask, unpair in masks:
+            unpaired[unpair] = True
+        return unpaired & self._aliveMask(masks)
+    
+    
+    @staticmethod
+    def _unpair(df, ie):
+        """Reset the reciprocal columns of the rows of `df` flagged in `ie`.
+        """
+        if np.sum(ie) > 0 and 'irecip' in df.columns:
+            df.loc[ie, 'irecip'] = 0 # as their reciprocal is deleted, we set it to 0
+            df.loc[ie, 'recipError'] = np.nan # they don't contribute to the error model anymore
+            df.loc[ie, 'recipMean'] = df.loc[ie, 'resist'].values
+    
+    
+    def _current(self):
+        """Return the last materialized dataframe (or the base table) and the
+        position of its rows in the base table. It contains at least all the
+        rows not filtered, no copy is made.
+        """
+        if self._df is None:
+            return self._dfBase, np.arange(self._dfBase.shape[0])
+        return self._df, self._dfPos
+    
+    
+    def _columnAlive(self, column):
+        """Values of a column for the rows of `Survey.df` without
+        materializing it.
+        """
+        df, pos = self._current()
+        sel = self._alive[pos]
+        values = df[column].values[sel]
+        if column in ['irecip', 'recipError', 'recipMean'] and self._dfValid is False:
+            iun = self._unpairedMask(self._masks)[pos][sel]
+            if np.sum(iun) > 0:
+                values = values.copy()
+                if column == 'irecip':
+                    values[iun] = 0
+                elif column == 'recipError':
+                    values[iun] = np.nan
+                else:
+                    values[iun] = df['resist'].values[sel][iun]
+        return values
+    
+    
+    def _addMask(self, i2keep, unpair=None):
+        """Push a filter on the stack.
+        
+        Parameters
+        ----------
+        i2keep : numpy.ndarray of bool
+            `True` for the rows of `Survey.df` to keep.
+        unpair : numpy.ndarray of bool, optional
+            `True` for the rows of `Survey.df` whose reciprocal is removed.
+        
+        Returns
+        -------
+        numRemoved : int
+            Number of measurements removed.
+        """
+        i2keep = np.asarray(i2keep, dtype=bool)
+        pos = np.where(self._alive)[0]
+        mask = np.ones(len(self._alive), dtype=bool)
+        mask[pos[~i2keep]] = False
+        unpair = pos[np.asarray(unpair, dtype=bool)] if unpair is not None else np.zeros(0, dtype=int)
+        self._masks.append((mask, unpair))
+        self._alive &= mask
+        if np.sum(~i2keep) > 0 or len(unpair) > 0:
+            self._dfValid = False
+        return np.sum(~i2keep)
+    
+    
+    def _materialize(self):
+        """Build `Survey.df` from the base table and the masks. If the rows
+        are a subset of the last materialized dataframe, it is filtered
+        (keeping the columns added since), otherwise it is rebuilt from the
+        base table. In this case, if `Survey.computeReciprocal()` was called
+        on the filtered data, the reciprocal analysis is done again on the
+        rows restored.
+        """
+        base = self._dfBase
+        pos = np.where(self._alive)[0]
+        old, oldPos = self._df, self._dfPos
+        inOld = np.zeros(len(self._alive), dtype=bool)
+        if old is not None:
+            inOld[oldPos] = True
+        if old is not None and np.all(inOld[pos]):
+            df = old.take(np.where(self._alive[oldPos])[0])
+        else:
+            df = base.take(pos)
+            if old is not None and len(oldPos) > 0: # keep the columns computed since
+                iold = -np.ones(len(self._alive), dtype=int)
+                iold[oldPos] = np.arange(len(oldPos))
+                j = iold[pos]
+                ok = j >= 0
+                for col in old.columns:
+                    if col in _recipColumns and col in base.columns:
+                        continue # recomputed below or unpaired from the base
+                    vals = old[col].values[np.where(ok, j, 0)]
+                    if col in base.columns:
+                        vals = np.where(ok, vals, df[col].values)
+                    elif vals.dtype.kind in 'iufb':
+                        vals = vals.astype(float)
+                        vals[~ok] = np.nan
+                    else:
+                        vals = vals.astype(object)
+                        vals[~ok] = None
+                    df[col] = vals
+            if self._recipFiltered and 'irecip' in df.columns:
+                for col, vals in _reciprocal(df, self.kFactor)[0].items():
+                    df[col] = vals
+                self._df, self._dfPos, self._dfValid = df, pos, True
+                self._dfVersion += 1
+                return
+        self._unpair(df, self._unpairedMask(self._masks)[pos])
+        self._df, self._dfPos, self._dfValid = df, pos, True
+        self._dfVersion += 1
+    
+    
+    def undoFilter(self):
+        """Undo the last filter applied.
+        """
+        if len(self._masks) > 0:
+            self._masks.pop()
+            self._alive = self._aliveMask(self._masks)
+            self._phaseLevel = min(self._phaseLevel, len(self._masks))
+            self._dfValid = False
+    
+    
+    def resetFilters(self):
+        """Remove all filters, `Survey.df` is back to `Survey.dfReset`.
+        """
+        self._setBase(self._dfBase)
+    
+    
+    def setPhaseReset(self):
+        """Mark the current filters as the state restored by
+        `Survey.resetPhaseFilters()`.
+        """
+        self._phaseLevel = len(self._masks)
+        
+    
+    def resetPhaseFilters(self):
+        """Undo the filters applied since the last reciprocal filtering (or
+        `Survey.setPhaseReset()`).
+        """
+        while len(self._masks) > self._phaseLevel:
+            self.undoFilter()
+        
+        
     @classmethod
-    def fromDataframe(cls, df, elec):
+    def fromDataframe(cls, df, elec, name='', process=True):
         """Create a survey class from pandas dataframe.
         
         Parameters
@@ -154,24 +902,51 @@ class Survey(object):
             Pandas dataframe.
         elec : numpy.ndarray
             A nx3 numpy array witht the XYZ electrodes positions.
+        name : str, optional
+            Name of the survey.
+        process : bool, optional
+            If `True` (default), reciprocal are computed and the default
+            filtering is applied. If `False`, the dataframe is used as it is
+            (it must then contains the reciprocal columns).
             
         Returns
         -------
         s_svy : Survey
             An instance of the Survey class.
         """
-        surrogate_file = '\examples\dc-2d\protocol.dat'
-        path2resipy = os.path.realpath(__file__).replace('\\src\resipy\\',surrogate_file)
-        path = path2resipy # map to the protocol test file
-        s_svy = cls(fname = path, ftype='Protocol')#surrogate survey
+        s_svy = cls.__new__(cls) # no file to parse
+        s_svy._initAttributes(name)
+        df = df.copy()
+        for c in ['resError', 'phaseError']:
+            if c not in df.columns:
+                df[c] = np.nan
+        if 'ip' not in df.columns:
+            df['ip'] = 0
         s_svy.df = df
         s_svy.elec = elec
-        s_svy.ndata = 1#len(data)
-        s_svy.computeReciprocal()
-        s_svy.filterDefault()
+        s_svy.dfOrigin = df # Survey.df is a copy
+        s_svy.ndata = len(df)
+        if process:
+            s_svy.computeReciprocal()
+            s_svy.filterDefault()
+        s_svy._setBase(s_svy.df)
         return s_svy
     
     
+    def getQuadKey(self):
+        """Return the packed integer key of each quadrupole of `Survey.df`.
+        The key is computed from the current a, b, m, n columns at each call
+        (not cached, so in-place edits of the electrode columns are taken
+        into account).
+        
+        Returns
+        -------
+        key : numpy.ndarray
+            Array of int64, one per row of `Survey.df` (see `quadKey()`).
+        """
+        return quadKey(self.df[['a','b','m','n']].values)
+    
+    
     def __str__(self):
         out = "Survey class with %i measurements and %i electrodes"%(len(self.df),len(self.elec[:,0]))
         return out
@@ -186,17 +961,8 @@ class Survey(object):
         """
         
         elecpos = self.elec[:,0]
-        array = self.df[['a','b','m','n']].values.copy().astype(int)
-        
-        apos = elecpos[array[:,0]-1]
-        bpos = elecpos[array[:,1]-1]
-        mpos = elecpos[array[:,2]-1]
-        npos = elecpos[array[:,3]-1]
-        AM = np.abs(apos-mpos)
-        BM = np.abs(bpos-mpos)
-        AN = np.abs(apos-npos)
-        BN = np.abs(bpos-npos)
-        K = 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN)) # geometric factor
+        array = self.df[['a','b','m','n']].values.astype(int)
+        K = geomFactor.computeK(elecpos, array) # x only
         return K
         
     
@@ -226,7 +992,7 @@ class Survey(object):
         """Remove NaN, Inf and duplicates values in the data frame.
         """
         # remove Inf and NaN
-        resist = self.df['resist'].values
+        resist = self._columnAlive('resist')
         iout = np.isnan(resist) | np.isinf(resist)
         if np.sum(iout) > 0:
             print('Survey.filterDefault: Number of Inf or NaN : ', np.sum(iout))
@@ -234,17 +1000,17 @@ class Survey(object):
         self.filterData(~iout)
         
         # remove duplicates
-        shapeBefore = self.df.shape[0]
-        self.df = self.df.drop_duplicates(subset=['a','b','m','n'], keep = 'first')
-        ndup = shapeBefore - self.df.shape[0]
+        array = pd.DataFrame(dict([(c, self._columnAlive(c)) for c in ['a','b','m','n']]))
+        ndup = self._addMask(~array.duplicated(keep='first').values)
         if ndup > 0:
             print('Survey.filterDefault: ', ndup, 'duplicates removed.')
         
         # remove quadrupoles were A or B are also potential electrodes
-        ie1 = self.df['a'].values == self.df['m'].values
-        ie2 = self.df['a'].values == self.df['n'].values
-        ie3 = self.df['b'].values == self.df['m'].values
-        ie4 = self.df['b'].values == self.df['n'].values
+        a, b, m, n = [self._columnAlive(c) for c in ['a','b','m','n']]
+        ie1 = a == m
+        ie2 = a == n
+        ie3 = b == m
+        ie4 = b == n
         ie = ie1 | ie2 | ie3 | ie4
         if np.sum(ie) > 0:
             print('Survey.filterDefault: ', np.sum(ie), 'measurements with A or B == M or N')
@@ -259,9 +1025,8 @@ class Survey(object):
 #        if self.elec[:,1].sum() == 0: # it's a 2D case
 #            self.removeDummy() # filter dummy by the rule if n < m then it's a dummy
         
-        # create a backup of the clean dataframe
-        self.dfReset = self.df.copy()
-        self.dfPhaseReset = self.df.copy()
+        # the clean dataframe is the base for the next filters
+        self._setBase(self.df)
         
         ''' the following piece of code is not useful anymore. The default
         behavior is to keep all measurements except NaN, duplicates, Inf and
@@ -321,7 +1086,7 @@ class Survey(object):
             if np.all(self.df['vp'] >= 0):
                 self.checkTxSign()
             
-        self.dfOrigin = self.df.copy()
+        self.dfOrigin = self.dfReset # Survey.df is a copy
         self.ndata = len(self.df)
         self.computeReciprocal()
         self.filterDefault() # we assume the user input reciprocal data not another
@@ -336,28 +1101,33 @@ class Survey(object):
         i2keep : ndarray of bool
             Index where all measurement to be retained are `True` and the
             others `False`.
+        
+        Notes
+        -----
+        The filter is recorded as a mask over `Survey.dfReset` (no copy of
+        the dataframe), it can be undone with `Survey.undoFilter()`.
         """
-        if len(i2keep) != self.df.shape[0]:
-            if 'ip' not in self.df.columns:
+        i2keep = np.asarray(i2keep, dtype=bool)
+        ndata = np.sum(self._alive)
+        if len(i2keep) != ndata:
+            if 'ip' not in self._current()[0].columns:
                 raise ValueError('The length of index to be kept (' + str(len(i2keep)) + ')\n'
-                                 'does not match the length of the data (' + str(self.df.shape[0]) +').')
+                                 'does not match the length of the data (' + str(ndata) +').')
             else:
                 raise ValueError('The length of index to be kept (' + str(len(i2keep)) + ') '
-                                 'does not match the length of the data (' + str(self.df.shape[0]) +').\n'
+                                 'does not match the length of the data (' + str(ndata) +').\n'
                                  'Reciprocal Filtering cannot be done after Phase Filtering.\n'
                                  'Reset the filters and redo the filterings, first reciprocity then phase.')
             return
         else:
             self.ndata = len(i2keep)
-            if 'irecip' in self.df.columns:
+            unpair = None
+            if 'irecip' in self._current()[0].columns:
                 # get a list of measurement that would be affected by the removal
-                recip2reset = self.df[~i2keep]['irecip'].values*-1
-            self.df = self.df[i2keep]
-            if 'irecip' in self.df.columns:
-                ie = np.in1d(self.df['irecip'].values, recip2reset)
-                self.df.loc[ie, 'irecip'] = 0 # as their reciprocal is deleted, we set it to 0
-                self.df.loc[ie, 'recipError'] = np.nan # they don't contribute to the error model anymore
-                self.df.loc[ie, 'recipMean'] = self.df.loc[ie, 'resist'].values
+                irecip = self._columnAlive('irecip')
+                recip2reset = irecip[~i2keep]*-1
+                unpair = i2keep & np.in1d(irecip, recip2reset)
+            self._addMask(i2keep, unpair)
             print('filterData:', np.sum(~i2keep), '/', len(i2keep), 'quadrupoles removed.')
             return np.sum(~i2keep)
 
@@ -367,7 +1137,7 @@ class Survey(object):
         """Remove quadrupoles that don't have a reciprocals. This might
         remove dummy measurements added for sequence optimization.
         """
-        i2keep = self.df['irecip'] != 0
+        i2keep = self._columnAlive('irecip') != 0
         print('removeUnpaired:', end='')
         self.filterData(i2keep)
         return np.sum(~i2keep)
@@ -412,80 +1182,15 @@ class Survey(object):
         in the columns `irecip`. Measurements with `ìrecip=0` are measurements
         without reciprocal.
         """
-        resist = self.df['resist'].values
-        phase = -self.kFactor*self.df['ip'].values #converting chargeability to phase shift
-        ndata = self.ndata
-        array = self.df[['a','b','m','n']].values
-        
-        R = np.copy(resist)
-        M = np.copy(phase)
-        ndata = len(R)
-        Ri = np.zeros(ndata)
-        reciprocalErr = np.zeros(ndata)*np.nan
-        reciprocalErrRel = np.zeros(ndata)*np.nan
-        reciprocalMean = np.zeros(ndata)*np.nan
-        reci_IP_err = np.zeros(ndata)*np.nan
-        # search for reciprocal measurement
-        count=1
-        notfound=0
-        for i in range(0,ndata):
-            rev1=[2,3,0,1]
-            rev2=[3,2,0,1]
-            rev3=[2,3,1,0]
-            rev4=[3,2,1,0]
-            index1=(array[:,:] == array[i,rev1]).all(1)
-            index2=(array[:,:] == array[i,rev2]).all(1)
-            index3=(array[:,:] == array[i,rev3]).all(1)
-            index4=(array[:,:] == array[i,rev4]).all(1)
-            index=index1|index2|index3|index4
-            
-            if len(index[index]) == 1:
-                reciprocalErr[index] = np.abs(R[i])-np.abs(R[index])
-                reciprocalErrRel[index] = (np.abs(R[i])-np.abs(R[index]))/np.abs(R[i]) # in percent
-                # flag first reciprocal found like this we can
-                # delete the second one when we find it
-                # (no loss of information)
-                reci_IP_err[index] = M[i]-M[index]
-                if Ri[i] == 0: # only if Ri == 0 otherwise we will
-                    # overwrite all the data
-                    Ri[i] = count # flag the first found
-                if Ri[index] == 0:
-                    Ri[index] = -count # flag its reciprocal
-                # replace reciprocalMean by one measurements if the other one
-                # is bad (NaN or Inf). Hopefully, the error model will find an
-                # error to go with
-                ok1 = ~(np.isnan(R[i]) | np.isinf(R[i]))
-                ok2 = ~(np.isnan(R[index]) | np.isinf(R[index]))
-                if ok1 & ok2:
-                    reciprocalMean[i]=np.mean([np.abs(R[i]),np.abs(R[index])])
-                elif ok1 & ~ok2:
-                    reciprocalMean[i] = np.abs(R[i])
-                elif ~ok1 & ok2:
-                    reciprocalMean[i] = np.abs(R[index])
-            else:
-                #print("no reciprocal found for "+str(array[i,:]))
-                notfound=notfound+1
-            count=count+1
-        print(str(notfound)+'/'+str(ndata)+' reciprocal measurements NOT found.')
-        reciprocalMean = np.sign(resist)*reciprocalMean # add sign
-#        ibad = np.abs(reciprocalErrRel) > 0.2 # error if np.nan in this
-        ibad = np.array([np.abs(a) > 0.2 if ~np.isnan(a) else False for a in reciprocalErrRel])
-        print(str(np.sum(ibad)) + ' measurements error > 20 %')
-        
-        irecip = Ri        
-        
-        self.df['irecip'] = irecip
-        self.df['reciprocalErrRel'] = reciprocalErrRel
-        self.df['recipError'] = reciprocalErr
-        self.df['recipMean'] = reciprocalMean
-        self.df['reci_IP_err'] = reci_IP_err
-        # in order to compute error model based on a few reciprocal measurements
-        # we fill 'recipMean' column with simple resist measurements for lonely
-        # quadrupoles (which do not have reciprocals)
-        inotRecip = irecip == 0
-        self.df.loc[inotRecip, 'recipMean'] = self.df.loc[inotRecip, 'resist']
-        
-        return Ri
+        cols, notfound, nbad = _reciprocal(self.df, self.kFactor)
+        print(str(notfound)+'/'+str(len(self.df))+' reciprocal measurements NOT found.')
+        print(str(nbad) + ' measurements error > 20 %')
+        for col, vals in cols.items():
+            self.df[col] = vals
+        if len(self._masks) > 0:
+            self._recipFiltered = True # redone if filters are undone
+        
+        return cols['irecip']
     
     
     def showErrorDist(self, ax=None):
@@ -525,7 +1230,8 @@ class Survey(object):
         """Remove measurements where abs(a-b) != abs(m-n) (likely to be dummy
         measurements added for speed).
         """
-        i2keep = np.abs(self.df['a'] - self.df['b']) == np.abs(self.df['m'] - self.df['n'])
+        a, b, m, n = [self._columnAlive(c) for c in ['a','b','m','n']]
+        i2keep = np.abs(a - b) == np.abs(m - n)
         self.filterData(i2keep)
         
     
@@ -541,15 +1247,13 @@ class Survey(object):
         debug : bool, optional
             Print output to screen. Default is True. 
         """
-        if all(np.isnan(self.df['recipError']) == True):
+        if all(np.isnan(self._columnAlive('recipError')) == True):
             raise ValueError("No reciprocal measurements present, cannot filter by reciprocal!")
-        reciprocalErrRel = np.abs(self.df['reciprocalErrRel'].replace(np.nan, 0))
+        reciprocalErrRel = np.abs(np.nan_to_num(self._columnAlive('reciprocalErrRel'), nan=0))
         igood = reciprocalErrRel < (percent/100) # good indexes to keep 
-        df_temp = self.df.copy()
-        self.df = df_temp[igood] #keep the indexes where the error is below the threshold
-        self.dfPhaseReset = self.df.copy()
+        numRemoved = self._addMask(igood) # keep the indexes where the error is below the threshold
+        self.setPhaseReset()
         if debug:
-            numRemoved = len(df_temp)-len(self.df)
             msgDump = "%i measurements with greater than %3.1f%% reciprocal error removed!" % (numRemoved, percent)
             print(msgDump)
             return numRemoved
@@ -560,7 +1264,8 @@ class Survey(object):
         because the IP filtering is done on a different dataframe and only
         merged when called this method.
         """
-        self.df = pd.merge(self.df, self.filterDataIP[['a','b','m','n']].copy(), how='inner', on=['a','b','m','n'])
+        array = np.vstack([self._columnAlive(c) for c in ['a','b','m','n']]).T
+        self._addMask(np.in1d(quadKey(array), quadKey(self.filterDataIP[['a','b','m','n']].values)))
 
     
     @staticmethod
@@ -681,6 +1386,25 @@ class Survey(object):
         return t    
     
     
+    def fitError(self, kind='pwl', apply=True):
+        """Fit an error model without plotting (see `fitErrorSurveys()`).
+        
+        Parameters
+        ----------
+        kind : str, optional
+            Type of error model: `pwl`, `lin`, `pwlIP` or `parabolaIP`.
+        apply : bool, optional
+            If `True` (default), the error model is evaluated and stored in
+            the survey.
+        
+        Returns
+        -------
+        result : dict
+            Dictionnary with keys `kind`, `coefs`, `R2`, `bins`, `x` and `y`.
+        """
+        return fitErrorSurveys([self], kind=kind, apply=apply)[0]
+    
+    
     def fitErrorPwlIP(self, ax=None):
         """Plot the reciprocal phase errors with a power-law fit.
         
@@ -694,48 +1418,21 @@ class Survey(object):
         fig : matplotlib figure, optional
             If ax is not specified, the function will return a figure object.
         """
+        res = self.fitError('pwlIP')
+        bins, (a1, a2), R2_ip = res['bins'], res['coefs'], res['R2']
         if ax is None:
             fig, ax = plt.subplots()
-#        numbins_ip = 16
-#        binsize_ip = int(len(self.df['reci_IP_err'])/numbins_ip)
-        binsize_ip = 16 # default to 20 sample per bins
-        numbins_ip = int(self.df.shape[0]/binsize_ip) # max 20 bins
-        if numbins_ip > 20: # we want max 20 bins
-            binsize_ip = int(len(self.df['reci_IP_err'])/20) # at least 20 samples per bin
-            numbins_ip = 20
-        Rn = np.abs(self.df['recipMean'])
-        phasedisc = self.df['reci_IP_err']
-        error_input_ip = (pd.concat((Rn,phasedisc),axis=1).rename(columns = {'recipMean':'absRn','reci_IP_err':'Phase_dicrep'})).sort_values(by='absRn').reset_index(drop = True).dropna().query('Phase_dicrep>%s & Phase_dicrep<%s' % (-self.phiCbarMax, self.phiCbarMax))# Sorting data based on R. the querry is based on input  phase range
-        bins_ip = pd.DataFrame(np.zeros((numbins_ip,2))).rename(columns = {0:'R_mean',1:'Phi_dis_STD'})
-        for i in range(numbins_ip): # bining 
-            ns=i*binsize_ip
-            ne=ns+binsize_ip-1
-            bins_ip.iloc[i,0] = np.abs(error_input_ip['absRn'].iloc[ns:ne].mean())
-            bins_ip.iloc[i,1] = error_input_ip['Phase_dicrep'].iloc[ns:ne].std()  
-        bins_ip = bins_ip.dropna()
-#        coefs_ip= np.linalg.lstsq(np.vstack([np.ones(len(bins_ip.iloc[:,0])), np.log(bins_ip.iloc[:,0])]).T, np.log(bins_ip.iloc[:,1]), rcond=None)[0] # calculating fitting coefficients (a,m)
-        coefs_ip = np.polyfit(np.log(bins_ip.iloc[:,0]), np.log(bins_ip.iloc[:,1]), 1)[::-1]
-        R_error_predict_ip = np.exp(coefs_ip[0])*(bins_ip.iloc[:,0]**coefs_ip[1]) # error prediction based of fitted power law model       
-        ax.semilogx(error_input_ip['absRn'],np.abs(error_input_ip['Phase_dicrep']), '+', label = "Raw")
-        ax.semilogx(bins_ip.iloc[:,0],bins_ip.iloc[:,1],'o',label="Bin Means")
-        ax.plot(bins_ip.iloc[:,0],R_error_predict_ip,'r', label="Power Law Fit")
+        ax.semilogx(res['x'], np.abs(res['y']), '+', label = "Raw")
+        ax.semilogx(bins[:,0], bins[:,1], 'o', label="Bin Means")
+        ax.plot(bins[:,0], a1*(bins[:,0]**a2), 'r', label="Power Law Fit")
         ax.set_ylabel(r's($\phi$) [mrad]')
         ax.set_xlabel(r'$R_{avg}$ [$\Omega$]')      
         ax.legend(loc='best', frameon=True)
-        R2_ip= self.R_sqr(np.log(bins_ip.iloc[:,1]),np.log(R_error_predict_ip))
-        a1 = np.exp(coefs_ip[0])
-        a2 = coefs_ip[1]
         print ('Error model is: Sp(m) = {:.2f}*R^{:.2f} (R^2 = {:.2f})'.format(a1,a2,R2_ip))
         if a1 > 0.001:
             ax.set_title('Multi bin power-law phase error plot\n' + r's($\phi$) = {:.2f}$R^{{{:.3f}}}$ (R$^2$ = {:.3f})'.format(a1, a2, R2_ip))
         else:
             ax.set_title('Multi bin power-law phase error plot\n' + r's($\phi$) = {:.2e}$R^{{{:.3e}}}$ (R$^2$ = {:.3f})'.format(a1, a2, R2_ip))
-        self.df['phaseError'] = a1*(np.abs(self.df['recipMean'])**a2)
-        self.df['phase'] = -self.kFactor*self.df['ip']
-        def errorModel(df):
-            x = df['recipMean'].values
-            return a1*(np.abs(x)**a2)
-        self.phaseErrorModel = errorModel
         if ax is None:
             return fig   
 
@@ -753,47 +1450,21 @@ class Survey(object):
         fig : matplotlib figure, optional
             If ax is not specified, the function will return a figure object.
         """
+        res = self.fitError('parabolaIP')
+        bins, (a3, b3, c3), R2_ip = res['bins'], res['coefs'], res['R2']
+        R_error_predict_ip = (a3*np.log10(bins[:,0])**2) + (b3*np.log10(bins[:,0]) + c3)
         if ax is None:
             fig, ax = plt.subplots()        
-#        numbins_ip = 16
-#        binsize_ip = int(len(self.df['reci_IP_err'])/numbins_ip) 
-        binsize_ip = 16 # default to 20 sample per bins
-        numbins_ip = int(self.df.shape[0]/binsize_ip) # max 20 bins
-        if numbins_ip > 20: # we want max 20 bins
-            binsize_ip = int(len(self.df['reci_IP_err'])/20) # at least 20 samples per bin
-            numbins_ip = 20
-        Rn = np.abs(self.df['recipMean'])
-        phasedisc = self.df['reci_IP_err']
-        error_input_ip = (pd.concat((Rn,phasedisc),axis=1).rename(columns = {'recipMean':'absRn','reci_IP_err':'Phase_dicrep'})).sort_values(by='absRn').reset_index(drop = True).dropna().query('Phase_dicrep>%s & Phase_dicrep<%s' % (-self.phiCbarMax, self.phiCbarMax))# Sorting data based on R. the querry is based on environmental IP
-        bins_ip = pd.DataFrame(np.zeros((numbins_ip,2))).rename(columns = {0:'R_mean',1:'Phi_dis_STD'})
-        for i in range(numbins_ip): # bining 
-            ns=i*binsize_ip
-            ne=ns+binsize_ip-1
-            bins_ip.iloc[i,0] = np.abs(error_input_ip['absRn'].iloc[ns:ne].mean())
-            bins_ip.iloc[i,1] = error_input_ip['Phase_dicrep'].iloc[ns:ne].std()  
-        bins_ip = bins_ip.dropna()
-        coefs_ip = np.polyfit(np.log10(bins_ip.iloc[:,0]), bins_ip.iloc[:,1], 2) # calculating fitting coefficients (a, b, c)
-        R_error_predict_ip = (coefs_ip[0]*np.log10(bins_ip.iloc[:,0])**2) + (coefs_ip[1]*np.log10(bins_ip.iloc[:,0]) + coefs_ip[2] ) # error prediction based of fitted parabola model       
-        ax.semilogx(error_input_ip['absRn'],np.abs(error_input_ip['Phase_dicrep']), '+', label = "Raw")
-        ax.semilogx(bins_ip.iloc[:,0],bins_ip.iloc[:,1],'o',label="Bin Means")
-        ax.semilogx(bins_ip.iloc[:,0],R_error_predict_ip,'r', label="Parabola Fit")
+        ax.semilogx(res['x'], np.abs(res['y']), '+', label = "Raw")
+        ax.semilogx(bins[:,0], bins[:,1], 'o', label="Bin Means")
+        ax.semilogx(bins[:,0], R_error_predict_ip, 'r', label="Parabola Fit")
         ax.set_ylabel(r's($\phi$) [mrad]')
         ax.set_xlabel(r'$R_{avg}$ [$\Omega$]')      
         ax.legend(loc='best', frameon=True)
-        R2_ip= self.R_sqr(bins_ip.iloc[:,1],R_error_predict_ip)
-        a3 = coefs_ip[0]
-        b3 = coefs_ip[1]
-        c3 = coefs_ip[2]
         if a3 > 0.001:
             ax.set_title('Multi bin parabola phase error plot\n' + r's($\phi$) = {:.3f}$R_{{avg}}^2${:+.3f}$R_{{avg}}${:+.3f} ($R_{{avg}}^2$ = {:.3f})'.format(a3, b3, c3, R2_ip))
         else:
             ax.set_title('Multi bin parabola phase error plot\n' + r's($\phi$) = {:.2e}$R_{{avg}}^2${:+.2e}$R_{{avg}}${:+.2e} ($R_{{avg}}^2$ = {:.3f})'.format(a3, b3, c3, R2_ip))
-        self.df['phaseError'] = (a3*np.log10(np.abs(self.df['recipMean']))**2) + (b3*np.log10(np.abs(self.df['recipMean'])) + c3)
-        self.df['phase'] = -self.kFactor*self.df['ip']
-        def errorModel(df):
-            x = df['recipMean'].values
-            return (a3*np.log10(np.abs(x))**2) + (b3*np.log10(np.abs(x)) + c3)
-        self.phaseErrorModel = errorModel
         if ax is None:
             return fig   
 
@@ -811,54 +1482,24 @@ class Survey(object):
         fig : matplotlib figure, optional
             If ax is not specified, the function will return a figure object.
         """
+        res = self.fitError('pwl')
+        bins, (a1, a2), R2 = res['bins'], res['coefs'], res['R2']
         if ax is None:
             fig, ax = plt.subplots()        
-        if 'recipMean' not in self.df.columns:
-            self.computeReciprocal()
-        dfg = self.df[self.df['irecip'] > 0]
-        binsize = 20 # default to 20 sample per bins
-        numbins = int(dfg.shape[0]/binsize) # max 20 bins
-        if numbins > 20: # we want max 20 bins
-            binsize = int(len(dfg['recipMean'])/20) # at least 20 samples per bin
-            numbins = 20
-        error_input = np.abs(dfg[['recipMean', 'recipError']]).sort_values(by='recipMean').reset_index(drop=True) # Sorting data based on R_avg
-        error_input['recipError'] = error_input['recipError']
-        bins = np.zeros((numbins,2))
-        for i in range(numbins): # bining 
-            ns=i*binsize
-            ne=ns+binsize-1
-            bins[i,0] = error_input['recipMean'].iloc[ns:ne].mean()
-            bins[i,1] = error_input['recipError'].iloc[ns:ne].mean()    
-#        print(bins)
-#        print(np.sum(np.isnan(bins)))
-#        print(np.sum(np.isinf(bins)))
-#        coefs= np.linalg.lstsq(np.vstack([np.ones(len(bins[:,0])), np.log(bins[:,0])]).T, np.log(bins[:,1]), rcond=None)[0] # calculating fitting coefficients (a,m)       
-        coefs = np.polyfit(np.log(bins[:,0]), np.log(bins[:,1]), 1)[::-1] #order is of coefs is opposite to lstqd       
-        R_error_predict = np.exp(coefs[0])*(bins[:,0]**coefs[1]) # error prediction based of power law model        
-        ax.plot(np.abs(dfg['recipMean']),np.abs(dfg['recipError']), '+', label = "Raw")
-        ax.plot(bins[:,0],bins[:,1],'o',label="Bin Means")
-        ax.plot(bins[:,0],R_error_predict,'r', label="Power Law Fit")
+        ax.plot(res['x'], res['y'], '+', label = "Raw")
+        ax.plot(bins[:,0], bins[:,1], 'o', label="Bin Means")
+        ax.plot(bins[:,0], a1*(bins[:,0]**a2), 'r', label="Power Law Fit")
         ax.set_xscale('log')
         ax.set_yscale('log')
         # lines above are work around to https://github.com/matplotlib/matplotlib/issues/5541/
         ax.set_ylabel(r'$R_{error} [\Omega]$')
         ax.set_xlabel(r'$R_{avg} [\Omega]$')      
         ax.legend(loc='best', frameon=True)
-        R2= self.R_sqr(np.log(bins[:,1]),np.log(R_error_predict))
-        a1 = np.exp(coefs[0])
-        a2 = coefs[1]
-#        a3 = np.exp(coefs[0])
-#        a4 = coefs[1]
         print('Error model is R_err = {:.2f} R_avg^{:.3f} (R^2 = {:.4f})'.format(a1,a2,R2))
         if a1 > 0.001:
             ax.set_title('Multi bin power-law resistance error plot\n' + r'$R_{{error}}$ = {:.3f}$R_{{avg}}^{{{:.3f}}}$ (R$^2$ = {:.3f})'.format(a1,a2,R2))
         else:
             ax.set_title('Multi bin power-law resistance error plot\n' + r'$R_{{error}}$ = {:.2e}$R_{{avg}}^{{{:.3e}}}$ (R$^2$ = {:.3f})'.format(a1,a2,R2))
-        self.df['resError'] = a1*(np.abs(self.df['recipMean'])**a2)
-        def errorModel(df):
-            x = df['recipMean'].values
-            return a1*(np.abs(x)**a2)
-        self.errorModel = errorModel
         if ax is None:
             return fig
         
@@ -876,61 +1517,32 @@ class Survey(object):
         fig : matplotlib figure, optional
             If ax is not specified, the function will return a figure object.
         """
+        res = self.fitError('lin')
+        bins, (a1, a2), R2 = res['bins'], res['coefs'], res['R2']
+        R_error_predict = a1*bins[:,0] + a2
         if ax is None:
             fig, ax = plt.subplots()        
-        if 'recipMean' not in self.df.columns:
-            self.computeReciprocal()
-        dfg = self.df[self.df['irecip'] > 0]
-        binsize = 20 # default to 20 sample per bins
-        numbins = int(dfg.shape[0]/binsize) # max 20 bins
-        if numbins > 20: # we want max 20 bins
-            binsize = int(len(dfg['recipMean'])/20) # at least 20 samples per bin
-            numbins = 20
-        error_input = np.abs(dfg[['recipMean', 'recipError']]).sort_values(by='recipMean').reset_index(drop=True) # Sorting data based on R_avg
-        error_input['recipError'] = error_input['recipError']
-        bins = np.zeros((numbins,2))
-        for i in range(numbins): # bining 
-            ns=i*binsize
-            ne=ns+binsize-1
-            bins[i,0] = error_input['recipMean'].iloc[ns:ne].mean()
-            bins[i,1] = error_input['recipError'].iloc[ns:ne].mean()
-#        coefs= np.linalg.lstsq(np.vstack([bins[:,0], np.ones(len(bins[:,0]))]).T, bins[:,1], rcond=None)[0] # calculating fitting coefficients (a,m) 
-        coefs = np.polyfit(bins[:,0], bins[:,1], 1)
-#        if coefs[1] < 0: # we don't want negative error -> doesn't make sense
-#            slope = np.polyfit(bins[:,0], bins[:,1], 0)
-#            coefs = [slope, 0]
-        R_error_predict = ((coefs[0])*(bins[:,0]))+coefs[1] # error prediction based of linear model        
-        print(np.min(R_error_predict)) # TODO negative error here ! that's why the red fit line goes down
-        ax.plot(error_input['recipMean'], error_input['recipError'], '+', label = "Raw")
-        ax.plot(bins[:,0],bins[:,1],'o',label="Bin Means")
-        ax.plot(bins[:,0],R_error_predict,'r', label="Linear Fit")
+        ax.plot(res['x'], res['y'], '+', label = "Raw")
+        ax.plot(bins[:,0], bins[:,1], 'o', label="Bin Means")
+        ax.plot(bins[:,0], R_error_predict, 'r', label="Linear Fit") # TODO negative error here ! that's why the red fit line goes down
         ax.set_xscale('log')
         ax.set_yscale('log')
         # lines above are work around to https://github.com/matplotlib/matplotlib/issues/5541/
         ax.set_ylabel(r'$R_{error} [\Omega]$')
         ax.set_xlabel(r'$R_{avg} [\Omega]$')      
         ax.legend(loc='best', frameon=True)
-        R2= self.R_sqr((bins[:,1]),(R_error_predict))
-        a1 = coefs[0]
-        a2 = coefs[1]
         print('Error model is R_err = {:.2f}*R_avg + {:.2f} (R^2 = {:.4f})'.format(a1,a2,R2))
         if a1 > 0.001:
             ax.set_title('Multi bin linear resistance error plot\n' + r'$R_{{error}}$ = {:.3f}$R_{{avg}}${:+.3f} (R$^2$ = {:.3f})'.format(a1,a2,R2))
         else:
             ax.set_title('Multi bin linear resistance error plot\n' + r'$R_{{error}}$ = {:.2e}$R_{{avg}}${:+.2e} (R$^2$ = {:.3f})'.format(a1,a2,R2))
-        self.df['resError'] = a1*(np.abs(self.df['recipMean']))+a2
-        def errorModel(df):
-            x = df['recipMean'].values
-            return a1*(np.abs(x))+a2
-        self.errorModel = errorModel
-#        self.errorModel = lambda x : a1*(np.abs(x))+a2
         if ax is None:
             return fig                  
         
     
     def fitErrorLME(self, iplot=True, ax=None, rpath=None):
         """Fit a linear mixed effect (LME) model by having the electrodes as
-        as grouping variables.
+        as grouping variables (see `resipy.LME`).
         
         Parameters
         ----------
@@ -940,78 +1552,32 @@ class Survey(object):
             If specified, the graph will be plotted against this axis,
             otherwise a new figure will be created.
         rpath : str, optional
-            Path of the directory with R (for Windows only).
+            Not used anymore (the model used to be fitted in R), kept for
+            compatibility.
         """
         # MATLAB code: lme4= fitlme(tbl,'recipErr~recipR+(recipR|c1)+(recipR|c2)+(recipR|p1)+(recipR|p2)'); 
-        # requires R
-        # statmodels or other python packages can't handle variable interaction yet
-
-        OS = platform.system()
-        
+        # the model fitted is Err ~ avgR + (1|a) + (1|b) + (1|m) + (1|n) (same as lmefit.R)
         if 'recipMean' not in self.df.columns:
             self.computeReciprocal()
         dfg = self.df[self.df['irecip'] > 0]
         
         recipMean = np.abs(dfg['recipMean'].values)
         recipError = np.abs(dfg['recipError'].values)
-        array = dfg[['a','b','m','n']].values.astype(int)        
-        data = np.vstack([recipMean, recipError]).T
-        data = np.hstack((array,data))
-        df = pd.DataFrame(data, columns=['a','b','m','n','recipMean','obsErr'])  
-        df.insert(0, 'idx', df.index + 1)
-        df = df.astype({"idx": int, "a": int, "b": int, "m": int, "n": int})
-        
-        outputname = os.path.join(os.path.dirname(os.path.realpath(__file__)),'invdir','protocol-lmeInRecip.dat')
-        if outputname != '':
-            with open(outputname, 'w') as f:
-                f.write(str(len(df)) + '\n')
-            with open(outputname, 'a') as f:
-                df.to_csv(f, sep='\t', header=False, index=False,float_format='%8.6e')
-
-        outputname = os.path.join(os.path.dirname(os.path.realpath(__file__)),'invdir','protocol-lmeIn.dat')
-        if outputname != '':
-            with open(outputname, 'w') as f:
-                f.write(str(len(self.df)) + '\n')
-            with open(outputname, 'a') as f:
-                self.df.to_csv(f, sep='\t', header=False, index=True,float_format='%8.6e',columns=['a','b','m','n','recipMean'])
-                
-        try:        
-            if (OS == 'Windows') and (rpath is None):
-                R_dir = input("Enter the directory where R.exe is installed: ")
-                os.system('R_PATH'+R_dir)
-            os.system('Rscript ' + os.path.join(os.path.dirname(os.path.realpath(__file__)),'lmefit.R'))  # Run R
-            lmeError = protocolParserLME(os.path.join(os.path.dirname(os.path.realpath(__file__)),'invdir','protocol-lmeOutRecip.dat'))
-            df['resError'] = lmeError # fitted results, only with results
-            lmeError = protocolParserLME(os.path.join(os.path.dirname(os.path.realpath(__file__)),'invdir','protocol-lmeOut.dat'))
-            self.df['resError'] = lmeError # predicted results, entire survey
-            
-#        df['resError'] = lmeError 
+        array = dfg[['a','b','m','n']].values.astype(int)
+        model = fitLME(array, recipMean, recipError)
+        print('LME model: R_err = {:.2e}*R_avg {:+.2e} (random effects std: {:s})'.format(
+            model['beta'][1], model['beta'][0], ', '.join(['{:.2e}'.format(a) for a in
+            model['theta']*np.sqrt(model['sigma2'])])))
         
-#        if 'recipMean' not in self.df.columns:
-#            self.computeReciprocal()
-#        dfg = self.df[self.df['irecip'] > 0]
-#        
-#        recipMean = np.abs(dfg['recipMean'].values)
-#        recipError = np.abs(dfg['recipError'].values)
-#        array = dfg[['a','b','m','n']].values.astype(int)
-#        
-#        data = np.vstack([recipMean, recipError]).T
-#        data = np.hstack((data, array))
-#        df = pd.DataFrame(data, columns=['recipMean','obsErr','a','b','m','n'])
-#        md = smf.mixedlm('obsErr~recipMean', df, groups=df[['a','b','m','n']])
-#        mdf = md.fit()
-#        print(mdf.summary())
-# 
-#        def errorModel(df):
-#            return mdf.predict(np.abs(df[['recipMean','a','b','m','n']]))
-#        self.errorModel = errorModel
-#        self.df['resError'] = self.errorModel(self.df)
- 
+        # predicted results, entire survey
+        self.df['resError'] = np.abs(predictLME(model, self.df[['a','b','m','n']].values.astype(int),
+                                                np.abs(self.df['recipMean'].values)))
         
+        if iplot:
             if ax is None:
                 fig, ax = plt.subplots()
-            ax.plot(df['obsErr'], df['resError'], 'o')
-            ax.plot([np.min(df['obsErr']),np.max(df['obsErr'])], [np.min(df['obsErr']), np.max(df['obsErr'])], 'r-', label='1:1')
+            ax.plot(recipError, model['fitted'], 'o')
+            ax.plot([np.min(recipError),np.max(recipError)], [np.min(recipError), np.max(recipError)], 'r-', label='1:1')
             ax.grid()
             ax.legend()
             ax.set_title('Linear Mixed Effect Model Fit')
@@ -1019,8 +1585,6 @@ class Survey(object):
             ax.set_ylabel('Reciprocal Error Predicted [$\Omega$]')
             ax.set_xscale('log')
             ax.set_yscale('log')
-        except Exception as e:
-            print('ERROR in Survey.lmefit(): Rscript command might not be available or the lme4 package is not installed.', e)
 
     
     def showHeatmap(self, ax=None):
@@ -1085,51 +1649,50 @@ class Survey(object):
         phimax : float
             Maximum phase angle [mrad].
         """
-        if self.filterDataIP.empty:
-            if self.protocolIPFlag == True:
-                self.filterDataIP = self.df.query('ip > %s and ip < %s' % (-phimax, -phimin))
-            else:
-                self.filterDataIP = self.df.query('ip > %s and ip < %s' % (phimin/np.abs(self.kFactor), phimax/np.abs(self.kFactor)))
+        if self.protocolIPFlag == True:
+            vmin, vmax = -phimax, -phimin
         else:
-            if self.protocolIPFlag == True:
-                self.filterDataIP = self.filterDataIP.query('ip > %s and ip < %s' % (-phimax, -phimin))
-            else:
-                self.filterDataIP = self.filterDataIP.query('ip > %s and ip < %s' % (phimin/np.abs(self.kFactor), phimax/np.abs(self.kFactor)))
-        self.addFilteredIP()
+            vmin, vmax = phimin/np.abs(self.kFactor), phimax/np.abs(self.kFactor)
+        ip = self._columnAlive('ip')
+        self._filterIP((ip > vmin) & (ip < vmax))
         
     
     def filterRecipIP(self):
         """Removing reciprocal measurements from dataset - only for visualization purposes on heatmap()
         """
-        if self.filterDataIP.empty:
-            self.filterDataIP = self.df.query('irecip>=0')
-        else:
-            self.filterDataIP = self.filterDataIP.query('irecip>=0')
-        self.addFilteredIP()
+        self._filterIP(self._columnAlive('irecip') >= 0)
 
     
     def filterNested(self):
         """Removes nested measurements:
             Where M or N are in between A and B
         """
-        if self.filterDataIP.empty:
-            temp_data = self.df.copy()
-            mask = (temp_data.m < temp_data.b) & (temp_data.m > temp_data.a) | (temp_data.n < temp_data.b) & (temp_data.n > temp_data.a)
-            temp_data.loc[mask, 'ip'] = np.nan
-            self.filterDataIP = temp_data.dropna(subset = ['ip'])
-        else:
-            temp_data = self.filterDataIP.copy()
-            mask = (temp_data.m < temp_data.b) & (temp_data.m > temp_data.a) | (temp_data.n < temp_data.b) & (temp_data.n > temp_data.a)
-            temp_data.loc[mask, 'ip'] = np.nan
-            self.filterDataIP = temp_data.dropna(subset = ['ip'])
-        self.addFilteredIP()
+        a, b, m, n = [self._columnAlive(c) for c in ['a','b','m','n']]
+        nested = (m < b) & (m > a) | (n < b) & (n > a)
+        self._filterIP(~nested & ~np.isnan(self._columnAlive('ip').astype(float)))
+        
+    
+    def _filterIP(self, i2keep):
+        """Apply an IP filter as a mask on `Survey.df`. If `Survey.filterDataIP`
+        holds other rows (e.g. from DCA), only its measurements are kept.
+        
+        Parameters
+        ----------
+        i2keep : numpy.ndarray of bool
+            `True` for the rows of `Survey.df` to keep.
+        """
+        ipdf = self._filterDataIP
+        if ipdf is not None and not ipdf.empty and ipdf is not self._df:
+            array = np.vstack([self._columnAlive(c) for c in ['a','b','m','n']]).T
+            i2keep = i2keep & np.in1d(quadKey(array), quadKey(ipdf[['a','b','m','n']].values))
+        self._addMask(i2keep)
+        self._filterDataIP = None # same rows as Survey.df
         
     
     def filterNegative(self):
         """Remove negative apparent resistivty values
         """
-        df = self.df.copy()
-        keep_idx = df['resist']>0 # apparant resistivity values must be bigger than zero
+        keep_idx = self._columnAlive('resist') > 0 # apparant resistivity values must be bigger than zero
         self.filterData(keep_idx)
 
     
@@ -1183,40 +1746,124 @@ class Survey(object):
 #        
 #        self.df['K'] = K
         
-    def computeK(self):
-        """Compute geomatrix factor (assuming flat 2D surface) and store it
-        in self.df['K'].
-        """
-        array = self.df[['a','b','m','n']].values.astype(int)
-        elec = self.elec
-        aposx = elec[:,0][array[:,0]-1]
-        aposy = elec[:,1][array[:,0]-1]
-        aposz = elec[:,2][array[:,0]-1]
-        
-        bposx = elec[:,0][array[:,1]-1]
-        bposy = elec[:,1][array[:,1]-1]
-        bposz = elec[:,2][array[:,1]-1]
-        
-        mposx = elec[:,0][array[:,2]-1]
-        mposy = elec[:,1][array[:,2]-1]
-        mposz = elec[:,2][array[:,2]-1]
+    def computeK(self, image=False):
+        """Compute geomatrix factor and store it in self.df['K']. It is only
+        recomputed if the electrodes change or if `Survey.df` is rebuilt
+        (filters) or assigned. In-place edits of the a, b, m, n columns are
+        not detected.
         
-        nposx = elec[:,0][array[:,3]-1]
-        nposy = elec[:,1][array[:,3]-1]
-        nposz = elec[:,2][array[:,3]-1]
-        
-        AM = np.sqrt((aposx-mposx)**2 + (aposy-mposy)**2 + (aposz-mposz)**2)
-        BM = np.sqrt((bposx-mposx)**2 + (bposy-mposy)**2 + (bposz-mposz)**2)
-        AN = np.sqrt((aposx-nposx)**2 + (aposy-nposy)**2 + (aposz-nposz)**2)
-        BN = np.sqrt((bposx-nposx)**2 + (bposy-nposy)**2 + (bposz-nposz)**2)
-        
-        K = 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN)) # geometric factor
+        Parameters
+        ----------
+        image : bool, optional
+            If `True`, the image method is used for the buried electrodes
+            (`Survey.iburied`). Default is `False` (half-space factor).
+        """
+        df = self.df # materialize first (the version may change)
+        key = (self._dfVersion, np.asarray(self.elec, dtype=float).tobytes(),
+               None if self.iburied is None else np.asarray(self.iburied).tobytes(),
+               image)
+        if self._kKey == key and 'K' in df.columns:
+            return
+        array = df[['a','b','m','n']].values.astype(int)
+        K = geomFactor.computeK(self.elec, array, buried=self.iburied, image=image)
+        df['K'] = K
+        self._kKey = key
         
-        self.df['K'] = K
         
+    def getPseudoPosition(self):
+        """Compute the position of the quadrupoles in the pseudo-section. The
+        positions are cached and only recomputed if the electrodes change or
+        if `Survey.df` is rebuilt (filters) or assigned. In-place edits of
+        the a, b, m, n columns are not detected.
+
+        Returns
+        -------
+        xpos, ypos : numpy.ndarray
+            Position and pseudo-depth of each quadrupole.
+        """
+        df = self.df # materialize first (the version may change)
+        elecpos = self.elec[:,0]
+        key = (self._dfVersion, np.asarray(elecpos, dtype=float).tobytes(),
+               None if self.iremote is None else np.asarray(self.iremote).tobytes())
+        if self._pseudoPos is None or self._pseudoPos[0] != key:
+            array = df[['a','b','m','n']].values.astype(int)
+            xpos, ypos = pseudoPosition(elecpos, array, self.iremote)
+            self._pseudoPos = (key, xpos, ypos)
+        return self._pseudoPos[1], self._pseudoPos[2]
+    
+    
+    def _scatterPseudo(self, ax, xpos, ypos, values, vmin=None, vmax=None,
+                       label='', decimate=None, size=70):
+        """Draw the points of a pseudo-section. If the axis already contains
+        a pseudo-section, its collection and colorbar are updated in place
+        instead of creating new ones.
         
+        Parameters
+        ----------
+        ax : matplotlib.Axes
+            Axis where to draw.
+        xpos, ypos : numpy.ndarray
+            Position of the points (from `Survey.getPseudoPosition()`).
+        values : numpy.ndarray
+            Values of the points.
+        vmin : float, optional
+            Minimum value for the colorbar.
+        vmax : float, optional
+            Maximum value for the colorbar.
+        label : str, optional
+            Label of the colorbar.
+        decimate : bool, optional
+            If `True`, points are binned at the resolution of the figure and
+            the values averaged in each bin. By default, only if there are
+            more than `pseudoMaxPoints` points.
+        size : float, optional
+            Size of the markers in points^2.
+        """
+        values = np.asarray(values, dtype=float)
+        if decimate is None:
+            decimate = len(values) > pseudoMaxPoints
+        if decimate:
+            # grid of half a marker based on the figure size (the bins stay
+            # the same when switching between views)
+            fig = ax.get_figure()
+            d = np.sqrt(size)*fig.dpi/72/2
+            nx = max(int(fig.bbox.width/d), 1)
+            ny = max(int(fig.bbox.height/d), 1)
+            key = (self._pseudoPos[0] if self._pseudoPos is not None else None, nx, ny, len(xpos))
+            if self._pseudoBins is None or self._pseudoBins[0] != key:
+                self._pseudoBins = (key,) + binPseudo(xpos, ypos, nx, ny)
+            _, ie, ibin, xpos, ypos = self._pseudoBins
+            v = values[ie]
+            ok = np.isfinite(v)
+            with np.errstate(invalid='ignore', divide='ignore'): # empty bins are NaN
+                values = np.bincount(ibin[ok], v[ok], minlength=len(xpos))/np.bincount(
+                    ibin[ok], minlength=len(xpos))
+        
+        coll = [c for c in ax.collections if c.get_gid() == 'pseudo']
+        if len(coll) > 0:
+            coll = coll[0]
+            coll.set_offsets(np.c_[xpos, ypos])
+            coll.set_array(values)
+            finite = values[np.isfinite(values)]
+            if len(finite) > 0:
+                coll.set_clim(np.min(finite) if vmin is None else vmin,
+                              np.max(finite) if vmax is None else vmax)
+            if coll.colorbar is not None:
+                coll.colorbar.set_label(label)
+            if len(xpos) > 0: # the survey may have changed
+                ax.ignore_existing_data_limits = True
+                ax.update_datalim(np.c_[xpos, ypos])
+                ax.autoscale_view()
+            ax.get_figure().canvas.draw_idle()
+        else:
+            coll = ax.scatter(xpos, ypos, c=values, s=size, vmin=vmin, vmax=vmax, gid='pseudo')
+            cbar = ax.get_figure().colorbar(coll, ax=ax, fraction=0.046, pad=0.04)
+            cbar.set_label(label)
+        return coll
+    
+    
     def _showPseudoSection(self, ax=None, contour=False, log=False, geom=True,
-                           vmin=None, vmax=None, column='resist'):
+                           vmin=None, vmax=None, column='resist', decimate=None):
         """Create a pseudo-section for 2D given electrode positions.
         
         Parameters
@@ -1235,51 +1882,27 @@ class Survey(object):
             Minimum value for the colorbar.
         vmax : float, optional
             Maximum value for the colorbar.
+        column : str, optional
+            Column of the dataframe to plot. Default is 'resist'.
+        decimate : bool, optional
+            If `True`, points are binned at screen resolution. By default,
+            only for surveys with more than `pseudoMaxPoints` quadrupoles.
+            Positions and bins are cached, so switching between views only
+            updates the colors.
         """
-        array = self.df[['a','b','m','n']].values.astype(int)
-        elecpos = self.elec[:,0].copy()
         resist = self.df[column].values
         
-        if geom: # compute and applied geometric factor
-#            apos = elecpos[array[:,0]-1]
-#            bpos = elecpos[array[:,1]-1]
-#            mpos = elecpos[array[:,2]-1]
-#            npos = elecpos[array[:,3]-1]
-#            AM = np.abs(apos-mpos)
-#            BM = np.abs(bpos-mpos)
-#            AN = np.abs(apos-npos)
-#            BN = np.abs(bpos-npos)
-#            K = 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN)) # geometric factor
+        if geom: # compute and apply geometric factor (cached on df version and electrodes)
             self.computeK()
-            resist = resist*self.df['K']
+            resist = resist*self.df['K'].values
 
-        # sorting the array in case of Wenner measurements (just for plotting)
-        array = np.sort(array, axis=1) # for better presentation
-            
         if log:
             resist = np.sign(resist)*np.log10(np.abs(resist))
             label = r'$\log_{10}(\rho_a)$ [$\Omega.m$]'
         else:
             label = r'$\rho_a$ [$\Omega.m$]'
-                
-        # cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        # pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        
-        if self.iremote is not None:
-            elecpos[self.iremote] = np.inf # so it will never be taken as minimium
-        
-        cadd = np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        cadd[np.isinf(cadd)] = 0 # they are inf because of our remote
-        cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) + cadd
         
-        padd = np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        padd[np.isinf(padd)] = 0
-        pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) + padd
-
-        xpos = np.min([cmiddle, pmiddle], axis=0) + np.abs(cmiddle-pmiddle)/2
-        ypos = np.sqrt(2)/2*np.abs(cmiddle-pmiddle)
+        xpos, ypos = self.getPseudoPosition()
 
         if ax is None:
             fig, ax = plt.subplots()
@@ -1287,9 +1910,8 @@ class Survey(object):
             fig = ax.get_figure()
        
         if contour is False:
-            plotPsRes = ax.scatter(xpos, ypos, c=resist, s=70, vmin=vmin, vmax=vmax)#, norm=mpl.colors.LogNorm())
-            cbar = fig.colorbar(plotPsRes, ax=ax, fraction=0.046, pad=0.04, label=label)
-            cbar.set_label(label)
+            self._scatterPseudo(ax, xpos, ypos, resist, vmin=vmin, vmax=vmax,
+                                label=label, decimate=decimate)
 
         if contour:
             if vmin is None:
@@ -1299,8 +1921,9 @@ class Survey(object):
             levels = np.linspace(vmin, vmax, 13)
             plotPsRes = ax.tricontourf(xpos, ypos, resist, levels = levels, extend = 'both')
             fig.colorbar(plotPsRes, ax=ax, fraction=0.046, pad=0.04, label=label)
-            
-        ax.invert_yaxis() # to remove negative sign in y axis    
+        
+        if not ax.yaxis_inverted():
+            ax.invert_yaxis() # to remove negative sign in y axis    
         ax.set_title('Apparent Resistivity\npseudo section')
         ax.set_xlabel('Distance [m]')
         ax.set_ylabel('Pseudo depth [m]')
@@ -1308,7 +1931,8 @@ class Survey(object):
             return fig
 
     
-    def _showPseudoSectionIP(self, ax=None, contour=False, vmin=None, vmax=None): #IP pseudo section
+    def _showPseudoSectionIP(self, ax=None, contour=False, vmin=None, vmax=None,
+                             decimate=None): #IP pseudo section
         """Create pseudo section of IP data with points (default)
         
         Parameters
@@ -1321,18 +1945,15 @@ class Survey(object):
             Miminum value for colorscale.
         vmax : float, optional
             Maximum value for colorscale.
+        decimate : bool, optional
+            If `True`, points are binned at screen resolution. By default,
+            only for surveys with more than `pseudoMaxPoints` quadrupoles.
             
         Returns
         -------
         fig : matplotlib figure
             If `ax` is not specified, the method returns a figure.
         """
-        array = self.df[['a','b','m','n']].values.astype(int)
-        elecpos = self.elec[:,0].copy()
-        
-        # sorting the array in case of Wenner measurements (just for plotting)
-        array = np.sort(array, axis=1) # for better presentation
-        
         if self.protocolIPFlag == True:
             ip = self.df['ip'].values
         else:
@@ -1340,27 +1961,7 @@ class Survey(object):
 
         label = r'$\phi$ [mrad]'
         
-
-        # sorting the array in case of Wenner measurements (just for plotting)
-        array = np.sort(array, axis=1) # for better presentation
-        # cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        # pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        
-        if self.iremote is not None:
-            elecpos[self.iremote] = np.inf # so it will never be taken as minimium
-        
-        cadd = np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        cadd[np.isinf(cadd)] = 0 # they are inf because of our remote
-        cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) + cadd
-        
-        padd = np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        padd[np.isinf(padd)] = 0
-        pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) + padd
-        
-        xpos = np.min([cmiddle, pmiddle], axis=0) + np.abs(cmiddle-pmiddle)/2
-        ypos = np.sqrt(2)/2*np.abs(cmiddle-pmiddle)
+        xpos, ypos = self.getPseudoPosition()
 
         if ax is None:
             fig, ax = plt.subplots()
@@ -1368,17 +1969,8 @@ class Survey(object):
             fig = ax.get_figure()
 
         if contour is False:
-#            if ax is None:
-#                fig, ax = plt.subplots()
-#            else:
-#                fig = ax.get_figure()
-            plotPsIP = ax.scatter(xpos, ypos, c=ip, s=70, vmin=vmin, vmax=vmax)#, norm=mpl.colors.LogNorm())
-#            divider = make_axes_locatable(ax)
-#            cax = divider.append_axes("right", size="5%", pad=0.05)
-            cbar = fig.colorbar(plotPsIP, ax=ax, fraction=0.046, pad=0.04)
-            cbar.set_label(label)
-#            ax.set_title('Phase Shift\npseudo section')
-        
+            self._scatterPseudo(ax, xpos, ypos, ip, vmin=vmin, vmax=vmax,
+                                label=label, decimate=decimate)
         else:
             if vmin is None:
                 vmin = np.min(ip)
@@ -1387,9 +1979,8 @@ class Survey(object):
             levels = np.linspace(vmin, vmax, 13)
             plotPsIP = ax.tricontourf(xpos, ypos, ip, levels = levels, extend = 'both')
             fig.colorbar(plotPsIP, ax=ax, fraction=0.046, pad=0.04, label=label)
-#            cbar.set_label(label)
-#            ax.set_title('Phase Shift\npseudo section')
-        ax.invert_yaxis() # to remove negative sign in y axis
+        if not ax.yaxis_inverted():
+            ax.invert_yaxis() # to remove negative sign in y axis
         ax.set_title('Phase Shift\npseudo section')  
         ax.set_xlabel('Distance [m]')
         ax.set_ylabel('Pseudo depth [m]')
@@ -1581,24 +2172,9 @@ class Survey(object):
             resist = np.sign(resist)*np.log10(np.abs(resist))
 
         array = np.sort(array, axis=1) # need to sort the array to make good wenner pseudo section
-        # cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        # pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) \
-        #     + np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        
+        xpos, ypos = pseudoPosition(elecpos, array, self.iremote)
         if self.iremote is not None:
-            elecpos[self.iremote] = np.inf # so it will never be taken as minimium
-        
-        cadd = np.abs(elecpos[array[:,0]-1]-elecpos[array[:,1]-1])/2
-        cadd[np.isinf(cadd)] = 0 # they are inf because of our remote
-        cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) + cadd
-        
-        padd = np.abs(elecpos[array[:,2]-1]-elecpos[array[:,3]-1])/2
-        padd[np.isinf(padd)] = 0
-        pmiddle = np.min([elecpos[array[:,2]-1], elecpos[array[:,3]-1]], axis=0) + padd
-        
-        xpos = np.min([cmiddle, pmiddle], axis=0) + np.abs(cmiddle-pmiddle)/2
-        ypos = np.sqrt(2)/2*np.abs(cmiddle-pmiddle)
+            elecpos[self.iremote] = np.inf # remote not shown
 
         
         def onpick(event):
@@ -1692,7 +2268,8 @@ class Survey(object):
         
         """
         for e in elec:
-            i2keep = (self.df[['a','b','m','n']].values != e).all(1)
+            array = np.vstack([self._columnAlive(c) for c in ['a','b','m','n']]).T
+            i2keep = (array != e).all(1)
             self.filterData(i2keep)
             print(np.sum(~i2keep), '/', len(i2keep), 'quadrupoles removed.')
     
@@ -1707,19 +2284,16 @@ class Survey(object):
         debug : bool, optional
             Print output to screen. Default is True.
         """
-        df = self.df.copy()
         self.computeK()
-        appRes = self.df['K']*self.df['resist']
+        appRes = self.df['K'].values*self.df['resist'].values
         if vmin is None:
             vmin = np.min(appRes)
         if vmax is None:
             vmax = np.max(appRes)
         ikeep = (appRes >= vmin) & (appRes <= vmax)
-        self.df = df[ikeep]
-        self.df.reset_index()
+        numRemoved = self._addMask(ikeep)
         
         if debug:
-            numRemoved = len(df)-len(self.df)
             msgDump = "%i measurements outside [%s,%s] removed!" % (numRemoved, vmin, vmax)
             print(msgDump)
             return numRemoved
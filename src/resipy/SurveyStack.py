@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stack of surveys aligned on a common quadrupole index for time-lapse and
+batch processing.
+"""
+import numpy as np
+import pandas as pd
+import resipy.geomFactor as geomFactor
+
+
+class SurveyStack(object):
+    """Hold the data of several surveys as dense (n_surveys x n_quadrupoles)
+    arrays aligned on the union of their quadrupoles so that filters and
+    error models are applied to all surveys at once. Quadrupoles not measured
+    in a survey are `NaN` and flagged `False` in `SurveyStack.mask`. 
+    Quadrupoles repeated within a survey are averaged (the first value is
+    taken for `SurveyStack.irecip`).
+
+    Parameters
+    ----------
+    surveys : list of Survey
+        Surveys to be stacked (e.g. `R2.surveys`).
+    elec : numpy.ndarray, optional
+        Electrodes position used to compute the geometric factor. By default
+        the electrodes of the first survey are used.
+    """
+    def __init__(self, surveys, elec=None):
+        if len(surveys) == 0:
+            raise ValueError('At least one survey is needed to build a SurveyStack.')
+        self.elec = surveys[0].elec if elec is None else elec
+        self._build(surveys)
+    
+    
+    def _build(self, surveys):
+        """Build the common quadrupole index and the dense arrays.
+        """
+        self.surveys = surveys
+        self.names = [s.name for s in surveys]
+
+        # common quadrupole index (sorted keys)
+        keys = [s.getQuadKey() for s in surveys]
+        array = np.vstack([s.df[['a','b','m','n']].values.astype(int) for s in surveys])
+        self.key, iunique = np.unique(np.hstack(keys), return_index=True)
+        self.array = array[iunique]
+        self.ipos = [np.searchsorted(self.key, key) for key in keys] # column of each row of s.df
+        self.nsurveys = len(surveys)
+        self.nquad = len(self.key)
+        self.nrepeat = np.array([len(ipos) - len(np.unique(ipos)) for ipos in self.ipos])
+        for name, n in zip(self.names, self.nrepeat):
+            if n > 0:
+                print('%i repeated quadrupoles in survey %s are averaged'%(n, name))
+
+        # dense arrays
+        self.present = np.zeros((self.nsurveys, self.nquad), dtype=bool)
+        for i, ipos in enumerate(self.ipos):
+            self.present[i, ipos] = True
+        self.mask = self.present.copy() # True if the measurement is kept
+        self.resist = self._stack('resist')
+        self.recipMean = self._stack('recipMean')
+        self.reciprocalErrRel = self._stack('reciprocalErrRel')
+        self.irecip = self._stack('irecip', fill=0, first=True) # flag, not averaged
+        self.resError = self._stack('resError')
+        self.phaseError = self._stack('phaseError')
+        ip = self._stack('ip')
+        factor = np.array([1 if s.protocolIPFlag else -s.kFactor for s in surveys])
+        self.phase = factor[:,None]*ip # chargeability to phase (if needed)
+        self.K = None
+
+
+    def _stack(self, column, fill=np.nan, first=False):
+        """Build a dense array from a column of each survey dataframe. 
+        Values of repeated quadrupoles are averaged (ignoring NaN), or the
+        first one is taken if `first` is `True` (for flag columns).
+        """
+        values = np.zeros((self.nsurveys, self.nquad)) + fill
+        for i, s in enumerate(self.surveys):
+            if column not in s.df.columns:
+                continue
+            ipos = self.ipos[i]
+            v = s.df[column].values.astype(float)
+            if self.nrepeat[i] == 0:
+                values[i, ipos] = v
+            elif first:
+                _, ifirst = np.unique(ipos, return_index=True)
+                values[i, ipos[ifirst]] = v[ifirst]
+            else:
+                ok = ~np.isnan(v)
+                total = np.bincount(ipos[ok], weights=v[ok], minlength=self.nquad)
+                count = np.bincount(ipos[ok], minlength=self.nquad)
+                with np.errstate(invalid='ignore', divide='ignore'):
+                    values[i, ipos] = (total/count)[ipos] # NaN if only NaN
+        return values
+
+
+    def __str__(self):
+        out = "SurveyStack of %i surveys with %i quadrupoles (%i kept)"%(
+            self.nsurveys, self.nquad, np.sum(self.mask))
+        return out
+
+
+    def computeK(self, image=False):
+        """Compute the geometric factor of each quadrupole of the stack (same
+        electrodes for all surveys).
+        
+        Parameters
+        ----------
+        image : bool, optional
+            If `True`, the image method is used for the buried electrodes.
+            Default is `False` (half-space factor).
+        """
+        self.K = geomFactor.computeK(self.elec, self.array,
+                                     buried=self.surveys[0].iburied, image=image)
+        return self.K
+
+
+    def _applyMask(self, ikeep):
+        """Combine `ikeep` with the current mask and return the number of
+        measurements removed in each survey.
+        """
+        ikeep = ikeep | ~self.present # absent quadrupoles are not counted
+        numRemoved = np.sum(self.mask & ~ikeep, axis=1)
+        self.mask = self.mask & ikeep
+        return numRemoved
+
+
+    def filterRecip(self, percent=20):
+        """Filter measurements based on the level reciprocal error.
+
+        Parameters
+        ----------
+        percent : float, optional
+            Percentage level of reciprocal error in which to filter the
+            measurements. Default is 20 %.
+
+        Returns
+        -------
+        numRemoved : numpy.ndarray
+            Number of measurements removed in each survey.
+        """
+        if np.all(np.isnan(self.reciprocalErrRel[self.present])):
+            raise ValueError("No reciprocal measurements present, cannot filter by reciprocal!")
+        err = np.abs(np.nan_to_num(self.reciprocalErrRel, nan=0))
+        numRemoved = self._applyMask(err < (percent/100))
+        print("%i measurements with greater than %3.1f%% reciprocal error removed!" % (
+            np.sum(numRemoved), percent))
+        return numRemoved
+
+
+    def filterAppResist(self, vmin=None, vmax=None):
+        """Filter measurements by apparent resistivity. If not specified,
+        `vmin` and `vmax` are the minimum and maximum of each survey.
+
+        Parameters
+        ----------
+        vmin : float, optional
+            Minimum value.
+        vmax : float, optional
+            Maximum value.
+
+        Returns
+        -------
+        numRemoved : numpy.ndarray
+            Number of measurements removed in each survey.
+        """
+        if self.K is None:
+            self.computeK()
+        appRes = self.K[None,:]*self.resist
+        if vmin is None:
+            vmin = np.nanmin(appRes, axis=1)
+        if vmax is None:
+            vmax = np.nanmax(appRes, axis=1)
+        vmin = np.atleast_1d(vmin)[:,None]
+        vmax = np.atleast_1d(vmax)[:,None]
+        with np.errstate(invalid='ignore'):
+            numRemoved = self._applyMask((appRes >= vmin) & (appRes <= vmax))
+        print("%i measurements outside apparent resistivity range removed!" % np.sum(numRemoved))
+        return numRemoved
+
+
+    def filterNegative(self):
+        """Remove negative transfer resistances.
+
+        Returns
+        -------
+        numRemoved : numpy.ndarray
+            Number of measurements removed in each survey.
+        """
+        with np.errstate(invalid='ignore'):
+            numRemoved = self._applyMask(self.resist > 0)
+        return numRemoved
+
+
+    def computeError(self, errorModel=None, phaseErrorModel=None):
+        """Evaluate error models on all surveys at once.
+
+        Parameters
+        ----------
+        errorModel : function, optional
+            Error model for the resistance (e.g. `Survey.errorModel` after
+            calling `Survey.fitErrorPwl()`). It takes a dataframe with a
+            `recipMean` column.
+        phaseErrorModel : function, optional
+            Error model for the phase (e.g. `Survey.phaseErrorModel`).
+        """
+        df = pd.DataFrame({'recipMean': self.recipMean.flatten()})
+        if errorModel is not None:
+            self.resError = np.asarray(errorModel(df), dtype=float).reshape(self.resist.shape)
+        if phaseErrorModel is not None:
+            self.phaseError = np.asarray(phaseErrorModel(df), dtype=float).reshape(self.resist.shape)
+
+
+    def updateSurveys(self):
+        """Apply the mask and the errors of the stack to each `Survey.df`.
+        """
+        for i, s in enumerate(self.surveys):
+            if s.df.shape[0] != len(self.ipos[i]):
+                raise ValueError('Survey {:s} has been modified since the stack was '
+                                 'created.'.format(s.name))
+            ipos = self.ipos[i]
+            s.df['resError'] = self.resError[i, ipos]
+            s.df['phaseError'] = self.phaseError[i, ipos]
+            s.filterData(self.mask[i, ipos])
+        # keys and positions need to follow the filtered dataframes
+        self._build(self.surveys)
+
+
+    def write2protocol(self, outputname='', isurveys=None, err=False,
+                       errTot=False, ip=False, res0=False, common=False,
+                       threed=False):
+        """Write all surveys in a single protocol.dat (one block per survey).
+
+        Parameters
+        ----------
+        outputname : str, optional
+            Path of the output file.
+        isurveys : list of int, optional
+            Index of the surveys to write. By default all surveys.
+        err : bool, optional
+            If `True`, the `resError` (and `phaseError` if `ip`) will be added.
+        errTot : bool, optional
+            If `True`, the modelling error (`modErr` column of each survey) is
+            added to the error from the error model to form the *total error*.
+        ip : bool, optional
+            If `True`, the phase will be added (chargeability is converted to
+            phase as in `Survey.write2protocol()`).
+        res0 : bool, optional
+            If `True` the transfer resistance of the first survey is added as
+            background for time-lapse inversion.
+        common : bool, optional
+            If `True`, only the quadrupoles kept in all surveys are written
+            (difference inversion). Otherwise half of the paired and all the
+            non-paired quadrupoles of each survey are written. Quadrupoles
+            are written in the order of the stack index.
+        threed : bool, optional
+            If `True`, add the line numbers for 3D codes.
+
+        Returns
+        -------
+        content : str
+            Content of the protocol.dat.
+        """
+        if isurveys is None:
+            isurveys = np.arange(self.nsurveys)
+        isurveys = np.asarray(isurveys, dtype=int)
+        if common:
+            ikeep = np.tile(np.all(self.mask[isurveys,:], axis=0), (len(isurveys), 1))
+        else:
+            ikeep = self.mask[isurveys,:] & (self.irecip[isurveys,:] >= 0)
+        isurvey, iquad = np.where(ikeep) # row-major so grouped by survey
+        counts = np.sum(ikeep, axis=1)
+        num = np.arange(len(iquad)) - np.repeat(np.r_[0, np.cumsum(counts)[:-1]], counts) + 1
+        protocol = pd.DataFrame(np.c_[num, self.array[iquad,:]],
+                                columns=['num','a','b','m','n'])
+        protocol['res'] = self.recipMean[isurveys[isurvey], iquad]
+        if res0:
+            protocol['res0'] = self.recipMean[0, iquad]
+        if ip:
+            protocol['phase'] = self.phase[isurveys[isurvey], iquad]
+        if err:
+            resError = self.resError[isurveys[isurvey], iquad]
+            if np.sum(np.isnan(resError)) > 0:
+                raise ValueError('You requested DC error but no error model can be found.')
+            if errTot:
+                modErr = self._stack('modErr')[isurveys[isurvey], iquad]
+                if np.sum(np.isnan(modErr)) > 0:
+                    raise ValueError('ERROR : you must specify a modelling error')
+                resError = np.sqrt(resError**2 + modErr**2)
+            protocol['resError'] = resError
+        if ip and err:
+            phaseError = self.phaseError[isurveys[isurvey], iquad]
+            if np.sum(np.isnan(phaseError)) > 0:
+                raise ValueError('You requested IP error but none can be found.')
+            protocol['phaseError'] = phaseError
+        if threed:
+            protocol.insert(1, 'sa', 1)
+            protocol.insert(3, 'sb', 1)
+            protocol.insert(5, 'sm', 1)
+            protocol.insert(7, 'sn', 1)
+
+        # one to_csv call for all blocks, then insert the block headers
+        lines = protocol.to_csv(sep='\t', header=False, index=False).splitlines(True)
+        istart = np.r_[0, np.cumsum(counts)]
+        content = ''.join([str(counts[i]) + '\n' + ''.join(lines[istart[i]:istart[i+1]])
+                           for i in range(len(counts))])
+        if outputname != '':
+            with open(outputname, 'w') as f:
+                f.write(content)
+        return content
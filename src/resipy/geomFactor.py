@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Geometric factor of quadrupoles. The inverse distances between all
+electrodes are computed once per electrode geometry and cached, the
+geometric factors are then gathered from them (they are not cached as
+hashing the sequence costs as much as computing them).
+
+By default the half-space factor is used for all electrodes (2D or 3D):
+    K = 2*pi/(1/AM - 1/BM - 1/AN + 1/BN)
+If `image=True` and some electrodes are buried (borehole), the image of the
+current electrodes above the surface is added:
+    K = 4*pi/(1/AM - 1/BM - 1/AN + 1/BN + 1/A'M - 1/B'M - 1/A'N + 1/B'N)
+which reduces to the half-space factor for surface electrodes (and to the
+full-space factor 4*pi/(...) if all electrodes are buried). This changes the
+geometric factor of borehole quadrupoles, hence it is opt-in.
+"""
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+maxMatrixSize = 2000 # above this number of electrodes, no distance matrix is built
+_distCache = OrderedDict() # elec hash -> (inverse distance, inverse distance to image)
+_distCacheSize = 4
+
+
+def hashArray(array):
+    """Hash of the content of an array.
+    """
+    array = np.ascontiguousarray(array)
+    md5 = hashlib.md5(str((array.dtype, array.shape)).encode())
+    md5.update(array.view(np.uint8))
+    return md5.hexdigest()
+
+
+def _store(cache, key, value, size):
+    """Add an entry to a LRU cache.
+    """
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+
+def clearCache():
+    """Remove all cached distance matrices.
+    """
+    _distCache.clear()
+
+
+def _imageElec(elec, buried, surface=None):
+    """Image of the electrodes through the ground surface (flat, at the
+    elevation of the highest surface electrode).
+    """
+    if surface is None:
+        surface = np.max(elec[~buried, 2])
+    img = elec.copy()
+    img[:,2] = 2*surface - img[:,2]
+    return img
+
+
+def _invDistance(elec, img=None):
+    """Inverse distance between electrodes (and images) as matrices.
+    """
+    def dist(e1, e2):
+        d = np.zeros((e1.shape[0], e2.shape[0]))
+        for i in range(3): # same operations order as the quadrupole formula
+            d += (e1[:,i][:,None] - e2[:,i][None,:])**2
+        return np.sqrt(d)
+    with np.errstate(divide='ignore'):
+        invd = 1/dist(elec, elec)
+        invdImg = None if img is None else 1/dist(img, elec)
+    return invd, invdImg
+
+
+def computeK(elec, array, buried=None, surface=None, image=False):
+    """Compute the geometric factor of quadrupoles.
+
+    Parameters
+    ----------
+    elec : numpy.ndarray
+        Array of electrodes positions (x, y, z), 2D surveys have y = 0.
+    array : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n), electrode numbers start at 1.
+    buried : numpy.ndarray of bool, optional
+        `True` for buried electrodes. If `None` or no electrodes are buried,
+        all electrodes are considered at the surface. Only used if `image`
+        is `True`.
+    surface : float, optional
+        Elevation of the (flat) ground surface used for the image of the
+        buried electrodes. By default the elevation of the highest surface
+        electrode. If all electrodes are buried, the full-space factor is
+        used.
+    image : bool, optional
+        If `True`, the image method is used for the buried electrodes.
+        Default is `False` (half-space factor for all electrodes, as for
+        surface electrodes).
+
+    Returns
+    -------
+    K : numpy.ndarray
+        Geometric factor of each quadrupole.
+    """
+    elec = np.asarray(elec, dtype=float)
+    if elec.ndim == 1:
+        elec = np.c_[elec, np.zeros((len(elec), 2))]
+    elif elec.shape[1] < 3:
+        elec = np.c_[elec, np.zeros((elec.shape[0], 3 - elec.shape[1]))]
+    array = np.asarray(array).astype(int) - 1
+    if image is False:
+        buried = None
+    if buried is not None:
+        buried = np.asarray(buried, dtype=bool)
+        if len(buried) != elec.shape[0] or np.sum(buried) == 0:
+            buried = None
+
+    # full space (no image) if all electrodes are buried
+    img = None
+    if buried is not None and np.sum(~buried) > 0:
+        img = _imageElec(elec, buried, surface)
+
+    a, b, m, n = array[:,0], array[:,1], array[:,2], array[:,3]
+    if elec.shape[0] <= maxMatrixSize:
+        dkey = (hashArray(elec), None if img is None else hashArray(img))
+        if dkey in _distCache:
+            _distCache.move_to_end(dkey)
+            invd, invdImg = _distCache[dkey]
+        else:
+            invd, invdImg = _invDistance(elec, img)
+            _store(_distCache, dkey, (invd, invdImg), _distCacheSize)
+        def inv(i, j, image=False):
+            return invdImg[i, j] if image else invd[i, j]
+    else: # too many electrodes, gather positions
+        def inv(i, j, image=False):
+            e1 = img if image else elec
+            d = np.sqrt((e1[i,0] - elec[j,0])**2 + (e1[i,1] - elec[j,1])**2 + (e1[i,2] - elec[j,2])**2)
+            with np.errstate(divide='ignore'):
+                return 1/d
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = inv(a, m) - inv(b, m) - inv(a, n) + inv(b, n)
+        if buried is None:
+            K = 2*np.pi/s # geometric factor
+        elif img is None:
+            K = 4*np.pi/s
+        else:
+            s += inv(a, m, True) - inv(b, m, True) - inv(a, n, True) + inv(b, n, True)
+            K = 4*np.pi/s
+    return K
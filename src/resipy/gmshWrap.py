@@ -12,6 +12,7 @@ Programs:
     moving_average() - as says on tin, used to smooth surface topography which is repeated at the base of the fine mesh region in the inversion
     genGeoFile () - generates a .geo file for gmsh
     msh_parse() - converts a 2d gmsh.msh file to a mesh class readable by R2. 
+    msh_read() - reads the nodes and elements of a gmsh.msh file (format 2.2 or 4.1, ascii or binary)
 
 Dependencies: 
     numpy (conda library)
@@ -673,6 +674,249 @@ def genGeoFile(electrodes, electrode_type = None, geom_input = None,
     
     return ordered_node_pos 
 
+#%% read a .msh file
+# number of nodes of the gmsh element types
+_mshNodes = {1:2, 2:3, 3:4, 4:4, 5:8, 6:6, 7:5, 8:3, 9:6, 10:9, 11:10, 12:27,
+             13:18, 14:14, 15:1, 16:8, 17:20, 18:15, 19:13, 20:9, 21:10, 22:12,
+             23:15, 24:15, 25:21, 26:4, 27:5, 28:6, 29:20, 30:35, 31:56}
+
+def _mshSection(data, name, start=0):
+    """Position of the first line after `$name` and of the `$Endname` line
+    (only meaningful for ASCII sections). -1 if not found.
+    """
+    i = data.find(b'$' + name.encode() + b'\n', start)
+    if i == -1:
+        i = data.find(b'$' + name.encode() + b'\r\n', start)
+        if i == -1:
+            return -1, -1
+    i = data.find(b'\n', i) + 1
+    return i, data.find(b'$End' + name.encode(), i)
+
+def _wordCounts(block):
+    """Number of words on each non empty line of an ASCII block.
+    """
+    b = np.frombuffer(block, dtype=np.uint8)
+    space = (b == 32) | (b == 9) | (b == 10) | (b == 13)
+    start = ~space
+    start[1:] &= space[:-1] # first character of each word
+    line = np.searchsorted(np.flatnonzero(b == 10), np.flatnonzero(start))
+    counts = np.bincount(line)
+    return counts[counts > 0]
+
+def _fromstring(block, dtype=float):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return np.fromstring(block, dtype=dtype, sep=' ')
+
+class _BinaryReader(object):
+    """Read values of a binary .msh file sequentially.
+    """
+    def __init__(self, data, pos, endian, size_t):
+        self.data = data
+        self.pos = pos
+        self.endian = endian
+        self.size_t = '%su%i'%(endian, size_t)
+
+    def read(self, typ, count=1):
+        dtype = np.dtype(self.size_t if typ == 'size_t' else self.endian + typ)
+        values = np.frombuffer(self.data, dtype=dtype, count=count, offset=self.pos)
+        self.pos += count*dtype.itemsize
+        return values.astype(np.int64) if dtype.kind in 'iu' else values
+
+def _msh2(data, binary, endian):
+    """Nodes and element blocks of a gmsh 2.x file.
+    """
+    s, e = _mshSection(data, 'Nodes')
+    nl = data.find(b'\n', s) + 1
+    no_nodes = int(data[s:nl])
+    if binary:
+        dtype = np.dtype([('id', endian + 'i4'), ('xyz', endian + 'f8', 3)])
+        nodes = np.frombuffer(data, dtype=dtype, count=no_nodes, offset=nl)
+        node_id, node = nodes['id'].astype(np.int64), nodes['xyz'].astype(float)
+    else:
+        nodes = _fromstring(data[nl:e])[:4*no_nodes].reshape((no_nodes, 4))
+        node_id, node = nodes[:,0].astype(np.int64), nodes[:,1:]
+
+    s, e = _mshSection(data, 'Elements', nl)
+    nl = data.find(b'\n', s) + 1
+    no_elms = int(data[s:nl])
+    blocks = []
+    if binary: # blocks of elements with the same type and number of tags
+        reader = _BinaryReader(data, nl, endian, 8)
+        count = 0
+        while count < no_elms:
+            typ, n, ntags = reader.read('i4', 3)
+            k = _mshNodes[typ]
+            rec = reader.read('i4', n*(1+ntags+k)).reshape((n, 1+ntags+k))
+            blocks.append((typ, rec[:,0], rec[:,1] if ntags > 0 else np.zeros(n, dtype=np.int64),
+                           rec[:,2] if ntags > 1 else np.zeros(n, dtype=np.int64), rec[:,1+ntags:]))
+            count += n
+        return node_id, node, blocks
+
+    # ASCII: all lines parsed at once, split using the number of words per line
+    block = data[nl:e]
+    flat = _fromstring(block, dtype=np.int64)
+    offsets = np.r_[0, np.cumsum(_wordCounts(block))[:-1]]
+    elm_type = flat[offsets+1]
+    ntags = flat[offsets+2]
+    last = flat.size - 1
+    phys = np.where(ntags > 0, flat[np.minimum(offsets+3, last)], 0)
+    geom = np.where(ntags > 1, flat[np.minimum(offsets+4, last)], 0)
+    start = offsets + 3 + ntags
+    for typ in np.unique(elm_type):
+        ie = elm_type == typ
+        con = flat[start[ie][:,None] + np.arange(_mshNodes[typ])[None,:]]
+        blocks.append((typ, flat[offsets[ie]], phys[ie], geom[ie], con))
+    return node_id, node, blocks
+
+def _msh4Entities(data, binary, endian, size_t):
+    """Physical tag (first one, 0 if none) of each (dimension, entity tag).
+    """
+    s, e = _mshSection(data, 'Entities')
+    phys = {}
+    if s == -1:
+        return phys
+    if binary:
+        reader = _BinaryReader(data, s, endian, size_t)
+        counts = reader.read('size_t', 4)
+        for dim, n in enumerate(counts):
+            for i in range(n):
+                tag = reader.read('i4')[0]
+                reader.read('f8', 3 if dim == 0 else 6) # point or bounding box
+                tags = reader.read('i4', reader.read('size_t')[0])
+                phys[(dim, tag)] = tags[0] if len(tags) > 0 else 0
+                if dim > 0: # bounding entities
+                    reader.read('i4', reader.read('size_t')[0])
+        return phys
+    lines = [l.split() for l in data[s:e].decode().splitlines() if l.strip() != '']
+    counts = [int(c) for c in lines[0]]
+    i = 1
+    for dim, n in enumerate(counts):
+        for line in lines[i:i+n]:
+            j = 4 if dim == 0 else 7 # number of physical tags after the coordinates
+            nphys = int(line[j])
+            phys[(dim, int(line[0]))] = int(line[j+1]) if nphys > 0 else 0
+        i += n
+    return phys
+
+def _msh4(data, binary, endian, size_t):
+    """Nodes and element blocks of a gmsh 4.1 file.
+    """
+    entities = _msh4Entities(data, binary, endian, size_t)
+    s, e = _mshSection(data, 'Nodes')
+    node_id, node = [], []
+    if binary:
+        reader = _BinaryReader(data, s, endian, size_t)
+        nblocks = reader.read('size_t', 4)[0]
+        for i in range(nblocks):
+            dim, tag, parametric = reader.read('i4', 3)
+            n = reader.read('size_t')[0]
+            node_id.append(reader.read('size_t', n))
+            nc = 3 + (dim if parametric and dim in [1, 2] else 0)
+            node.append(reader.read('f8', n*nc).reshape((n, nc))[:,:3])
+    else:
+        flat = _fromstring(data[s:e])
+        nblocks = int(flat[0])
+        pos = 4
+        for i in range(nblocks):
+            dim, tag, parametric, n = flat[pos:pos+4].astype(int)
+            pos += 4
+            node_id.append(flat[pos:pos+n].astype(np.int64))
+            pos += n
+            nc = 3 + (dim if parametric and dim in [1, 2] else 0)
+            node.append(flat[pos:pos+n*nc].reshape((n, nc))[:,:3])
+            pos += n*nc
+    node_id, node = np.concatenate(node_id), np.vstack(node).astype(float)
+
+    s, e = _mshSection(data, 'Elements', s)
+    blocks = []
+    if binary:
+        reader = _BinaryReader(data, s, endian, size_t)
+        nblocks = reader.read('size_t', 4)[0]
+        for i in range(nblocks):
+            dim, tag, typ = reader.read('i4', 3)
+            n = reader.read('size_t')[0]
+            k = _mshNodes[typ]
+            rec = reader.read('size_t', n*(k+1)).reshape((n, k+1))
+            blocks.append((typ, rec[:,0], np.full(n, entities.get((dim, tag), 0)), np.full(n, tag), rec[:,1:]))
+    else:
+        flat = _fromstring(data[s:e], dtype=np.int64)
+        nblocks = flat[0]
+        pos = 4
+        for i in range(nblocks):
+            dim, tag, typ, n = flat[pos:pos+4]
+            pos += 4
+            k = _mshNodes[typ]
+            rec = flat[pos:pos+n*(k+1)].reshape((n, k+1))
+            pos += n*(k+1)
+            blocks.append((typ, rec[:,0], np.full(n, entities.get((dim, tag), 0)), np.full(n, tag), rec[:,1:]))
+    return node_id, node, blocks
+
+def msh_read(file_path):
+    """Read the nodes and elements of a gmsh .msh file (format 2.x or 4.1,
+    ASCII or binary). Each section is read at once with numpy.
+
+    Parameters
+    ----------
+    file_path: string
+        File path to mesh file.
+
+    Returns
+    -------
+    msh : dict
+        Dictionary with the node tags 'node_id' (sorted), the node coordinates
+        'node' (n x 3), the 'format' line and the 'elements' as a dictionary
+        with the gmsh element type as key and a tuple (element tags, physical
+        tags, elementary tags, connection matrix) as value. The connection
+        matrix gives the (0 based) index of the nodes.
+    """
+    with open(file_path, 'rb') as fh:
+        data = fh.read()
+    if data[:11] != b'$MeshFormat':#checks if the file is a gmsh file
+        raise ImportError("unrecognised file type...")
+    s = data.find(b'\n') + 1
+    nl = data.find(b'\n', s) + 1
+    mesh_format = data[s:nl].decode()
+    version, binary, size_t = mesh_format.split()
+    version = float(version)
+    binary = binary == '1'
+    endian = '<'
+    if binary and np.frombuffer(data, dtype='<i4', count=1, offset=nl)[0] != 1:
+        endian = '>'
+    if version < 3:
+        node_id, node, blocks = _msh2(data, binary, endian)
+    elif version >= 4.1:
+        node_id, node, blocks = _msh4(data, binary, endian, int(size_t))
+    else:
+        raise ImportError("gmsh format %s is not supported, save the mesh in format 2.2 or 4.1"%version)
+
+    # nodes sorted by tag, connection matrices as node indexes
+    order = np.argsort(node_id, kind='stable')
+    node_id, node = node_id[order], node[order]
+    if np.array_equal(node_id, np.arange(1, len(node_id) + 1)):
+        lookup = None
+    else:
+        lookup = np.full(np.max(node_id) + 1, -1, dtype=np.int64)
+        lookup[node_id] = np.arange(len(node_id))
+    elements = {}
+    for typ, elm_id, phys, geom, con in blocks:
+        con = con - 1 if lookup is None else lookup[con]
+        if typ in elements: # same type in several blocks
+            old = elements[typ]
+            elements[typ] = tuple(np.r_[a, b] if a.ndim == 1 else np.vstack([a, b])
+                                  for a, b in zip(old, (elm_id, phys, geom, con)))
+        else:
+            elements[typ] = (elm_id, phys, geom, con)
+    return {'node_id':node_id, 'node':node, 'format':mesh_format, 'elements':elements}
+
+def _ccw(node, con):
+    """Vectorised `ccw()`, True for triangles (first 3 columns of `con`)
+    to be swapped (see `ccw()`, x y coordinates).
+    """
+    p, q, r = node[con[:,0]], node[con[:,1]], node[con[:,2]]
+    val = ((q[:,1]-p[:,1])*(r[:,0]-q[:,0]))-((q[:,0]-p[:,0])*(r[:,1]-q[:,1]))
+    return val > 0
+
 #%% parse a .msh file
 def msh_parse(file_path):
     """
@@ -686,137 +930,68 @@ def msh_parse(file_path):
     Returns
     ----------
     Mesh class
+    
+    Notes
+    -----
+    The file is read with `msh_read()`, so gmsh 2.2 and 4.1 files (ASCII or 
+    binary) are accepted.
     """
     if not isinstance(file_path,str):
         raise Exception("expected a string argument for msh_parser")
-    # open file and read in header lines
     print("parsing gmsh mesh...\n")
-    fid=open(file_path,'r')# Open text file
-    #Idea: Read Mesh format lines $MeshFormat until $Nodes
-    line1=fid.readline()
-    #check the file is a mesh format
-    if line1.strip() != '$MeshFormat':#removes formating strings, checks if the file is a gmsh file
-        raise ImportError("unrecognised file type...")
-    mesh_format=fid.readline()#reads the next line
-    if mesh_format.strip() != '2.2 0 8':#warn people that the code was developed with this file format in mind
-        print('Warning: the mesh file type version is different to the mesh converter development version ... some errors may occur!\n')   
-    line3=fid.readline()#endofmeshformat
-    line4=fid.readline()#nodes
-    
     print('importing node coordinates...')
-    #read in number of nodes - at line 5
-    no_nodes=int(fid.readline().strip())
-    #allocate lists for node numbers and coordinates
-    node_num=[0]*no_nodes
-    x_coord=[0]*no_nodes
-    y_coord=[0]*no_nodes
-    z_coord=[0]*no_nodes
-    #read in node information
-    for i in range(no_nodes):
-        line_info=fid.readline().split()
-        #convert string info into floats
-        data_dump=[float(k) for k in line_info]
-        node_num[i]=int(data_dump[0])
-        x_coord[i]=data_dump[1]
-        y_coord[i]=data_dump[2]
-        z_coord[i]=data_dump[3]
+    msh = msh_read(file_path)
+    node = msh['node']
+    no_nodes = len(node)
     
     #### read in elements   
     print('reading connection matrix')
-    #read in two lines $EndNodes and $Elements
-    Endnodes=fid.readline()
-    Elements=fid.readline()
-    #number of elements
-    no_elements=int(fid.readline().strip())
-    #engage for loop - this time we want to filter out elements which are not triangles
+    #filter out elements which are not triangles
     #... looking at the gmsh docs its elements of type 2 we are after (R2 only needs this information) 
-    nat_elm_num = []#native element number to gmsh
-    elm_type = []#element type
-    number_of_tags = []
-    phys_entity = []#defines the physical entity type the element is assocaited with
-    elem_entity = []#which plane surface the element is assocaited with
-    node1 = []#first node of triangle 
-    node2 = []
-    node3 = []#last node of triangle 
-    ignored_elements=0#count the number of ignored elements
-    for i in range(no_elements):
-        line_info=fid.readline().split()
-        if line_info[1]=='2':# then its the right element type!
-        #convert string info into floats and cache data
-            data_dump=[int(k) for k in line_info]
-            nat_elm_num.append(data_dump[0])
-            elm_type.append(data_dump[1]) 
-            number_of_tags.append(data_dump[2]) 
-            phys_entity.append(data_dump[3]) 
-            elem_entity.append(data_dump[4]) 
-            node1.append(data_dump[5]) 
-            node2.append(data_dump[6]) 
-            node3.append(data_dump[7])
-        else:
-            ignored_elements += 1
-    print("ignoring %i non-triangle elements in the mesh file, as they are not required for R2"%ignored_elements)
-    real_no_elements=len(nat_elm_num) #'real' number of elements that we actaully want
+    no_elements = np.sum([len(msh['elements'][typ][0]) for typ in msh['elements']])
+    empty = np.zeros(0, dtype=int)
+    nat_elm_num, phys_entity, elem_entity, con = msh['elements'].get(2, (empty, empty, empty, np.zeros((0, 3), dtype=int)))
+    real_no_elements = len(nat_elm_num) #'real' number of elements that we actaully want
+    print("ignoring %i non-triangle elements in the mesh file, as they are not required for R2"%(no_elements - real_no_elements))
     
     ##clock wise correction and area / centre computations 
     #make sure in nodes in triangle are counterclockwise as this is waht r2 expects
-    c_triangles=[]#'corrected' triangles 
-    num_corrected=0#number of elements that needed 'correcting'
-    centriod_x=[]
-    centriod_y=[]
-    areas=[]
-    for i in range(real_no_elements):
-        n1=(x_coord[node1[i]-1],y_coord[node1[i]-1])#define node coordinates
-        n2=(x_coord[node2[i]-1],y_coord[node2[i]-1])#we have to take 1 off here cos of how python indexes lists and tuples
-        n3=(x_coord[node3[i]-1],y_coord[node3[i]-1])
-        #see if triangle is counter-clockwise
-        if ccw(n1,n2,n3) == 1: #points are clockwise and therefore need swapping round
-            #exchange elements in rows 6 and 7 to change direction
-            c_triangles.append((node2[i],node1[i],node3[i]))
-            num_corrected=num_corrected+1
-        else:
-            c_triangles.append((node1[i],node2[i],node3[i]))
-        #compute triangle centre
-        xy_tuple=tri_cent(n1,n2,n3)#actual calculation
-        centriod_x.append(xy_tuple[0])
-        centriod_y.append(xy_tuple[1])
-        #compute area (for a triangle this is 0.5*base*height)
-        base=(((n1[0]-n2[0])**2) + ((n1[1]-n2[1])**2))**0.5
-        mid_pt=((n1[0]+n2[0])/2,(n1[1]+n2[1])/2)
-        height=(((mid_pt[0]-n3[0])**2) + ((mid_pt[1]-n3[1])**2))**0.5
-        areas.append(0.5*base*height)
+    iswap = _ccw(node, con)
+    num_corrected = np.sum(iswap) #number of elements that needed 'correcting'
+    c_triangles = con.copy() #'corrected' triangles 
+    c_triangles[iswap, 0], c_triangles[iswap, 1] = con[iswap, 1], con[iswap, 0]
+    X, Y = node[:,0][con], node[:,1][con]
+    #compute triangle centre (see tri_cent)
+    k = 2/3
+    centriod_x = X[:,2] + k*((X[:,0] + X[:,1])/2 - X[:,2])
+    centriod_y = Y[:,2] + k*((Y[:,0] + Y[:,1])/2 - Y[:,2])
+    #compute area (for a triangle this is 0.5*base*height)
+    base = (((X[:,0]-X[:,1])**2) + ((Y[:,0]-Y[:,1])**2))**0.5
+    height = ((((X[:,0]+X[:,1])/2-X[:,2])**2) + (((Y[:,0]+Y[:,1])/2-Y[:,2])**2))**0.5
+    areas = 0.5*base*height
         
     #print warning if areas of zero found, this will cuase problems in R2
-    try:
-        if min(areas)==0:
-            warnings.warn("elements with no area have been detected in 'mesh.dat', inversion with R2 unlikey to work!" )
-    except ValueError:#if mesh hasnt been read in this is where the error occurs 
+    if real_no_elements == 0:#if mesh hasnt been read in
         raise Exception("It looks like no elements have read into pyR2, its likley gmsh has failed to produced a stable mesh. Consider checking the mesh input (.geo) file.")
+    if np.min(areas)==0:
+        warnings.warn("elements with no area have been detected in 'mesh.dat', inversion with R2 unlikey to work!" )
             
     print("%i element node orderings had to be corrected because they were found to be orientated clockwise\n"%num_corrected)
-    fid.close()
     
     ### return dictionary which can be converted to mesh class ### 
-    no_regions=max(elem_entity)#number of regions in the mesh
-    regions=arange(1,1,no_regions,1)
+    no_regions = np.max(elem_entity)#number of regions in the mesh
     assctns=[]
-    #following for loop finds the element number ranges assocaited with a distinct region in the mesh
-    for k in regions:
-        indx=[m for m in range(len(elem_entity)) if elem_entity[m]==k]
+    #find the element number ranges assocaited with a distinct region in the mesh
+    for k in range(1, no_regions+1):
+        indx = np.flatnonzero(elem_entity == k)
         if len(indx) > 0:
-            assctns.append((k,min(indx)+1,max(indx)+1))
+            assctns.append((k,indx[0]+1,indx[-1]+1))
     #create a dump of the mesh data incase the user wants to see it later on   
     dump={'nat_elm_num':nat_elm_num,
-          'elm_type':elm_type,
-          'number_of_tags':number_of_tags,
+          'elm_type':np.full(real_no_elements, 2),
           'phys_entity':phys_entity,
           'elem_entity':elem_entity,
-          'string_data':[line1,mesh_format,line3,line4,Endnodes,Elements]} 
-    #convert c_triangles into mesh object format for later recall
-    node_dump=[[],[],[]]
-    for i in range(real_no_elements):
-        node_dump[0].append(c_triangles[i][0]-1)#node 1
-        node_dump[1].append(c_triangles[i][1]-1)#node 2
-        node_dump[2].append(c_triangles[i][2]-1)#node 3
+          'mesh_format':msh['format']} 
     
     #return a dictionary detailing the mesh 
     return {'num_elms':real_no_elements,
@@ -825,14 +1000,14 @@ def msh_parse(file_path):
             'regions':elem_entity,
             'element_ranges':assctns,
             'dump':dump,      
-            'node_x':x_coord,#x coordinates of nodes 
-            'node_y':z_coord,#y coordinates of nodes - nb swapped around as meshTools sees z as elevation
-            'node_z':y_coord,#z coordinates of nodes 
-            'node_id':node_num,#node id number 
+            'node_x':node[:,0],#x coordinates of nodes 
+            'node_y':node[:,2],#y coordinates of nodes - nb swapped around as meshTools sees z as elevation
+            'node_z':node[:,1],#z coordinates of nodes 
+            'node_id':msh['node_id'],#node id number 
             'elm_id':np.arange(1,real_no_elements+1,1),#element id number 
             'num_elm_nodes':3,#number of points which make an element
-            'node_data':node_dump,#nodes of element vertices
-            'elm_centre':(centriod_x,[0]*len(centriod_x),centriod_y),#centre of elements (x,y)
+            'node_data':c_triangles.T,#nodes of element vertices
+            'elm_centre':(centriod_x,np.zeros(real_no_elements),centriod_y),#centre of elements (x,y)
             'elm_area':areas,
             'cell_type':[5],
             'parameters':phys_entity,#the values of the attributes given to each cell 
@@ -844,6 +1019,7 @@ def msh_parse(file_path):
     #also we'd need to import the mesh class, and its not a good idea to have modules
     #importing each other, as meshTools has a dependency on gmshWrap. 
         
+
 #%% 2D whole space 
 def gen_2d_whole_space(electrodes, padding = 20, electrode_type = None, geom_input = None,
                        file_path='mesh.geo',cl=-1,cl_factor=50,doi=None,dp_len=None):
@@ -1376,189 +1552,67 @@ def msh_parse_3d(file_path):
     Returns
     ----------
     Mesh class
+    
+    Notes
+    -----
+    The file is read with `msh_read()`, so gmsh 2.2 and 4.1 files (ASCII or 
+    binary) are accepted. Prisms are kept if the mesh has any, else tetrahedra.
     """
     if not isinstance(file_path,str):
         raise Exception("expected a string argument for msh_parser")
     print("parsing gmsh mesh...\n")
-    fid=open(file_path,'r')# Open text file
-    #Idea: Read Mesh format lines $MeshFormat until $Nodes
-    dump=fid.readlines()
-    fid.close()
-    #check the file is a mesh format
-    if dump[0].strip() != '$MeshFormat':#removes formating strings, checks if the file is a gmsh file
-        raise ImportError("unrecognised file type...")
-    mesh_format=dump[1] 
-    if mesh_format.strip() != '2.2 0 8':#warn people that the code was developed with this file format in mind
-        print('Warning: the mesh file type version is different to the mesh converter development version ... some errors may occur!\n')   
-    
-    #find where the nodes start 
-    for i, line in enumerate(dump):
-        if line.find("$Nodes") != -1:#node flag 
-            no_nodes=int(dump[i+1])
-            node_start = i+2
-        if line.find("$EndNodes") != -1:
-            node_end = i
-            break # stop the loop, should find the nodes start before the end 
     print('importing node coordinates...')
-    #read in number of nodes - at line 5
-    #allocate lists for node numbers and coordinates
-    node_num=[0]*no_nodes
-    x_coord=[0]*no_nodes
-    y_coord=[0]*no_nodes
-    z_coord=[0]*no_nodes
-    #read in node information
-    node_idx = 1
-    for i in range(node_start, node_end):
-        line_info=dump[i].split()
-        #convert string info into floats
-        line_data=[float(k) for k in line_info]
-        previous_node = node_idx 
-        node_idx = int(line_data[0])
-        if not node_idx < previous_node: # else then its some weird flag used by gmsh, ignore
-            node_num[node_idx-1]=node_idx
-            x_coord[node_idx-1]=line_data[1]
-            y_coord[node_idx-1]=line_data[2]
-            z_coord[node_idx-1]=line_data[3]
-    
-    #### read in elements 
-    # find where the elements start 
-    for i, line in enumerate(dump):
-        if line.find("$Elements") != -1:#node flag 
-            no_elements=int(dump[i+1])#number of elements
-            element_start = i+2
-        if line.find("$EndElements") != -1:
-            element_end = i
-            break # stop the loop, should find the nodes start before the end 
+    msh = msh_read(file_path)
+    node = msh['node']
+    no_nodes = len(node)
     print('reading connection matrix...')
     
-    #engage for loop - this time we want to filter out elements which are not tetrahedron
-    #... looking at the gmsh docs its elements of type 2 we are after (R2 only needs this information) 
-    nat_elm_num = []#native element number to gmsh
-    elm_type = []#element type
-    number_of_tags = []
-    phys_entity = []#defines the physical entity type the element is assocaited with
-    elem_entity = []#which plane surface the element is assocaited with
-    node1 = []#first node of triangle 
-    node2 = []
-    node3 = []
-    node4 = []#last node of tetrahedra
-    node5 = []
-    node6 = []
-    npere = 4 
-    ignored_elements=0#count the number of ignored elements
-    for i in range(element_start,element_end):
-        line_data=[int(k) for k in dump[i].split()]
-        if line_data[1]==4:# then its the right element type!
-        #convert string info into floats and cache data
-            prism = False
-            nat_elm_num.append(line_data[0])
-            elm_type.append(line_data[1]) 
-            number_of_tags.append(line_data[2]) 
-            phys_entity.append(line_data[3]) 
-            elem_entity.append(line_data[4]) 
-            node1.append(line_data[5]-1) #we have to take 1 off here cos of how python indexes lists and tuples
-            node2.append(line_data[6]-1) 
-            node3.append(line_data[7]-1)
-            node4.append(line_data[8]-1)
-        elif line_data[1]==6: # prism mesh 
-            prism = True
-            nat_elm_num.append(line_data[0])
-            elm_type.append(line_data[1]) 
-            number_of_tags.append(line_data[2]) 
-            phys_entity.append(line_data[3]) 
-            elem_entity.append(line_data[4]) 
-            node1.append(line_data[5]-1) 
-            node2.append(line_data[6]-1) 
-            node3.append(line_data[7]-1)
-            node4.append(line_data[8]-1)
-            node5.append(line_data[9]-1)
-            node6.append(line_data[10]-1)
-            npere = 6
-        else:
-            ignored_elements += 1
-    print("ignoring %i non-tetrahedra (or prism) elements in the mesh file, as they are not required for R3t"%ignored_elements)
-    real_no_elements=len(nat_elm_num) #'real' number of elements that we actaully want
+    #filter out elements which are not tetrahedra (type 4) or prisms (type 6)
+    prism = 6 in msh['elements']
+    typ = 6 if prism else 4
+    no_elements = np.sum([len(msh['elements'][t][0]) for t in msh['elements']])
+    npere = 6 if prism else 4
+    empty = np.zeros(0, dtype=int)
+    nat_elm_num, phys_entity, elem_entity, con = msh['elements'].get(typ, (empty, empty, empty, np.zeros((0, npere), dtype=int)))
+    real_no_elements = len(nat_elm_num) #'real' number of elements that we actaully want
+    print("ignoring %i non-tetrahedra (or prism) elements in the mesh file, as they are not required for R3t"%(no_elements - real_no_elements))
     
     #compute element centres 
-    centriod_x=[]
-    centriod_y=[]
-    centriod_z=[]
-    areas=[]
+    centriod = np.sum(node[con], axis=1)/npere
     
     if not prism:
-        node_dump = [node1,node2,node3,node4]
+        node_dump = con.T
         cell_typ = [10]
-        for i in range(real_no_elements):
-            n1=(x_coord[node1[i]],y_coord[node1[i]],z_coord[node1[i]])#define node coordinates
-            n2=(x_coord[node2[i]],y_coord[node2[i]],z_coord[node2[i]])
-            n3=(x_coord[node3[i]],y_coord[node3[i]],z_coord[node3[i]])
-            n4=(x_coord[node4[i]],y_coord[node4[i]],z_coord[node4[i]])
-            centriod_x.append(sum((n1[0],n2[0],n3[0],n4[0]))/npere)
-            centriod_y.append(sum((n1[1],n2[1],n3[1],n4[1]))/npere)
-            centriod_z.append(sum((n1[2],n2[2],n3[2],n4[2]))/npere)
+        areas = []
     else:
         #make sure in nodes in triangle are counterclockwise as this is what R3t expects
-        c_triangles_bot=[]#'corrected' triangles 
-        c_triangles_top=[]#'corrected' triangles 
-        num_corrected=0#number of elements that needed 'correcting'
-        areas=[]
-        #upside_down = 0 
-        for i in range(real_no_elements):
-            n1=(x_coord[node1[i]],y_coord[node1[i]],z_coord[node1[i]])#define node coordinates
-            n2=(x_coord[node2[i]],y_coord[node2[i]],z_coord[node2[i]])
-            n3=(x_coord[node3[i]],y_coord[node3[i]],z_coord[node3[i]])
-            n4=(x_coord[node4[i]],y_coord[node4[i]],z_coord[node4[i]])
-            n5=(x_coord[node5[i]],y_coord[node5[i]],z_coord[node5[i]])
-            n6=(x_coord[node6[i]],y_coord[node6[i]],z_coord[node6[i]])
-            #see if triangle is counter-clockwise
-            if ccw(n1,n2,n3) == 1: #points are clockwise and therefore need swapping round
-                c_triangles_bot.append((node2[i],node1[i],node3[i]))
-                num_corrected=num_corrected+1
-            else:
-                c_triangles_bot.append((node1[i],node2[i],node3[i]))
-            if ccw(n4,n5,n6) == 1: 
-                c_triangles_top.append((node5[i],node4[i],node6[i]))
-                num_corrected=num_corrected+1
-            else:
-                c_triangles_top.append((node4[i],node5[i],node6[i]))
-            #see if prisms are upside down 
-#            if n4[2] < n1[2]:
-#                print('uppy duppy prism')
+        node_dump = con.copy()
+        iswap_bot = _ccw(node, con[:,:3])
+        iswap_top = _ccw(node, con[:,3:])
+        node_dump[iswap_bot, 0], node_dump[iswap_bot, 1] = con[iswap_bot, 1], con[iswap_bot, 0]
+        node_dump[iswap_top, 3], node_dump[iswap_top, 4] = con[iswap_top, 4], con[iswap_top, 3]
+        num_corrected = np.sum(iswap_bot) + np.sum(iswap_top) #number of elements that needed 'correcting'
+        node_dump = node_dump.T
 
-            #compute volume (for a prism this is 0.5*base*height*width)
-            base=(((n1[0]-n2[0])**2) + ((n1[1]-n2[1])**2))**0.5
-            mid_pt=((n1[0]+n2[0])/2,(n1[1]+n2[1])/2)
-            width=(((mid_pt[0]-n3[0])**2) + ((mid_pt[1]-n3[1])**2))**0.5
-            height = abs(n1[2] - n4[2])
-            areas.append(0.5*base*width*height)
-            centriod_x.append(sum((n1[0],n2[0],n3[0],n4[0],n5[0],n6[0]))/npere)
-            centriod_y.append(sum((n1[1],n2[1],n3[1],n4[1],n5[1],n6[1]))/npere)
-            centriod_z.append(sum((n1[2],n2[2],n3[2],n4[2],n5[2],n6[2]))/npere)
-            
-        #node_dump = [node1,node2,node3,node4,node5,node6]
+        #compute volume (for a prism this is 0.5*base*height*width)
+        X, Y, Z = node[:,0][con], node[:,1][con], node[:,2][con]
+        base = (((X[:,0]-X[:,1])**2) + ((Y[:,0]-Y[:,1])**2))**0.5
+        width = ((((X[:,0]+X[:,1])/2-X[:,2])**2) + (((Y[:,0]+Y[:,1])/2-Y[:,2])**2))**0.5
+        height = np.abs(Z[:,0] - Z[:,3])
+        areas = 0.5*base*width*height
         cell_typ = [13]
-        node_dump=[[],[],[],[],[],[]]
-        for i in range(real_no_elements):
-            node_dump[0].append(c_triangles_bot[i][0])#node 1
-            node_dump[1].append(c_triangles_bot[i][1])#node 2
-            node_dump[2].append(c_triangles_bot[i][2])#node 3
-            node_dump[3].append(c_triangles_top[i][0])#node 5
-            node_dump[4].append(c_triangles_top[i][1])#node 4
-            node_dump[5].append(c_triangles_top[i][2])#node 6
-            
         print('%i node orderings had to be corrected into a counterclockwise direction'%num_corrected)
             
     mesh_dict = {'num_elms':real_no_elements,
             'num_nodes':no_nodes,
-            'dump':dump,      
-            'node_x':x_coord,#x coordinates of nodes 
-            'node_y':y_coord,#y coordinates of nodes
-            'node_z':z_coord,#z coordinates of nodes 
-            'node_id':node_num,#node id number 
+            'node_x':node[:,0],#x coordinates of nodes 
+            'node_y':node[:,1],#y coordinates of nodes
+            'node_z':node[:,2],#z coordinates of nodes 
+            'node_id':msh['node_id'],#node id number 
             'elm_id':np.arange(1,real_no_elements+1,1),#element id number 
-            'num_elm_nodes':elm_type[0],#number of points which make an element
+            'num_elm_nodes':npere,#number of points which make an element
             'node_data':node_dump,#nodes of element vertices
-            'elm_centre':[centriod_x,centriod_y,centriod_z],#centre of elements (x,y,z)
+            'elm_centre':[centriod[:,0],centriod[:,1],centriod[:,2]],#centre of elements (x,y,z)
             'elm_area':areas,
             'cell_type':cell_typ,
             'parameters':phys_entity,#the values of the attributes given to each cell 
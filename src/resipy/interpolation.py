@@ -488,29 +488,25 @@ def nearest(xnew, ynew, xknown, yknown, zknown, maxDist=None):
     znew: numpy array
         z coordinates at xnew and ynew.  
         
+    Notes
+    ------------
+    The closest known points are found with a KD-tree (scipy.spatial.cKDTree).
     """
+    if maxDist is not None and not isinstance(maxDist,float):# or not isinstance(maxDist,int):
+        raise ValueError("maxDist argument must be of type int or float, not %s"%type(maxDist))
+    tree = cKDTree(np.c_[np.asarray(xknown, dtype=float), np.asarray(yknown, dtype=float)])
+    dist, ref = tree.query(np.c_[np.asarray(xnew, dtype=float), np.asarray(ynew, dtype=float)])
     znew = np.zeros_like(xnew)
-    znew.fill(np.nan)        
-    if maxDist is None:
-        check=False
-    else:
-        if not isinstance(maxDist,float):# or not isinstance(maxDist,int):
-            raise ValueError("maxDist argument must be of type int or float, not %s"%type(maxDist))
-        check=True
-    for i in range(len(xnew)):#,ncols=100,desc="Extrapolating values"):#go through each extrapolated point and find the closest known coordinate
-        dist = pdist(xnew[i],ynew[i],xknown,yknown)
-        ref = np.argmin(dist)
-        znew[i] = zknown[ref] 
-        if check:
-            if dist[ref]>maxDist:
-                znew[i] = float('NaN')
+    znew[:] = np.asarray(zknown)[ref]
+    if maxDist is not None:
+        znew[dist>maxDist] = float('NaN')
             
     return znew
 
 #%% nearest neighbour interpolation in 3D 
-def nearest3d(xnew,ynew,znew,xknown, yknown, zknown, iknown, return_idx=False):
-    """Nearest neighbour look up for 3D unstructured data. This process can be 
-    RAM and CPU demanding. 
+def nearest3d(xnew,ynew,znew,xknown, yknown, zknown, iknown, return_idx=False,
+              maxDist=None):
+    """Nearest neighbour look up for 3D unstructured data (using a KD-tree).
     
     Parameters
     ------------
@@ -530,6 +526,10 @@ def nearest3d(xnew,ynew,znew,xknown, yknown, zknown, iknown, return_idx=False):
         known values in 3D space. 
     return_idx: bool 
         Also return the look indexes of the iknown array. 
+    maxDist : float, optional
+        Maximum distance for nearest neighbour interpolation. If given, the 
+        values outside the maximum distance are returned as NaN (and their 
+        index as -1).
 
     Returns
     ------------
@@ -545,29 +545,23 @@ def nearest3d(xnew,ynew,znew,xknown, yknown, zknown, iknown, return_idx=False):
     #as this process can take some time to compute progress is output to the screen
     sys.stdout.write('Running 3D nearest neighbour interpolation job...\n')
 
-    sys.stdout.write('Computing delta x matrix ... ')
-    a,b = np.meshgrid(xknown,xnew)
-    dX = (a - b)**2
-    sys.stdout.flush()
-    sys.stdout.write('\rComputing delta y matrix ... ')
-    a,b = np.meshgrid(yknown,ynew)
-    dY = (a - b)**2
-    sys.stdout.flush()
-    sys.stdout.write('\rComputing delta z matrix ... ')
-    a,b = np.meshgrid(zknown,znew)
-    dZ = (a - b)**2
-    #use meshgrid function to make a euclidian matrix 
-    
-    sys.stdout.flush()
-    sys.stdout.write('\rComputing distance matrix .. ')
-    dist = np.sqrt(dX+dY+dZ)#compute distance matrix 
-    
-    idx = np.argmin(dist,axis=1)
-    sys.stdout.flush()
-    sys.stdout.write('\rDone ...                     \n')   
+    tree = cKDTree(np.c_[np.asarray(xknown, dtype=float),
+                         np.asarray(yknown, dtype=float),
+                         np.asarray(zknown, dtype=float)])
+    dist, idx = tree.query(np.c_[np.asarray(xnew, dtype=float),
+                                 np.asarray(ynew, dtype=float),
+                                 np.asarray(znew, dtype=float)])
+    iknown = np.asarray(iknown)
+    inew = iknown[idx]
+    if maxDist is not None:
+        ifar = dist > maxDist
+        inew = inew.astype(float)
+        inew[ifar] = np.nan
+        idx[ifar] = -1
+    sys.stdout.write('Done ...\n')   
     
     if return_idx:
-        return iknown[idx], idx
+        return inew, idx
     else: 
-        return iknown[idx]
+        return inew
 
@@ -12,11 +12,16 @@ Dependencies:
     python3 standard libaries
 """
 #import standard python packages
-import os, platform, warnings, multiprocessing, re, sys
+import os, platform, warnings, multiprocessing, re, sys, zlib, hashlib
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import quoteattr
 from subprocess import PIPE, Popen, call
 import time
 #import matplotlib and numpy packages 
 import numpy as np
+from scipy.spatial import cKDTree
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
 import matplotlib.pyplot as plt
 from matplotlib.collections import PolyCollection, PatchCollection
 from matplotlib.colors import ListedColormap
@@ -93,7 +98,189 @@ def cropSurface(triang, xsurf, ysurf):
     return i2keep1 & i2keep2
 
 
-        
+
+#%% attribute store
+attrDtype = np.float64 # np.float32 halves the memory of the attributes
+
+class AttributeStore(object):
+    """Dictionary-like store of the element attributes of a mesh. Float
+    attributes are rows of a single (n_attributes x n_elements) array so
+    adding an attribute does not allocate a new array each time and cropping
+    the mesh indexes all attributes at once. Other attributes (int, bool,
+    object or with a different length) are kept as they are.
+
+    Parameters
+    ----------
+    num_elms : int
+        Number of elements.
+    dtype : numpy.dtype, optional
+        Type of the float attributes, by default `attrDtype`.
+    attr_dict : dict, optional
+        Attributes to add to the store.
+
+    Notes
+    -----
+    `store[key]` returns a read-only view of the row (use `store[key] = x`
+    or copy it to modify the values). Rows are never written again once
+    assigned: assigning an existing attribute uses a new row and the rows of
+    deleted attributes are not reused, so an array returned before keeps its
+    values. When the array is full, the rows in use are copied in a new one
+    (arrays returned before still refer to the old one).
+    """
+    def __init__(self, num_elms, dtype=None, attr_dict=None):
+        self.num_elms = int(num_elms)
+        self.dtype = np.dtype(attrDtype if dtype is None else dtype)
+        self._data = np.empty((0, self.num_elms), dtype=self.dtype)
+        self._n = 0 # number of rows used (including deleted attributes)
+        self._keys = {} # name -> row, -1 if in self._other
+        self._other = {}
+        if attr_dict is not None:
+            self.update(attr_dict)
+
+    def _newRow(self):
+        if self._n == self._data.shape[0]: # full, copy the rows in use
+            keys = [key for key in self._keys if self._keys[key] >= 0]
+            rows = [self._keys[key] for key in keys]
+            data = np.empty((max(4, 2*len(rows)), self.num_elms), dtype=self.dtype)
+            data[:len(rows)] = self._data[rows]
+            for i, key in enumerate(keys):
+                self._keys[key] = i
+            self._data = data
+            self._n = len(rows)
+        self._n += 1
+        return self._n - 1
+
+    def __setitem__(self, key, values):
+        array = np.asarray(values)
+        if array.shape == (self.num_elms,) and array.dtype.kind == 'f':
+            self._other.pop(key, None)
+            row = self._newRow()
+            self._data[row] = array
+            self._keys[key] = row
+        else:
+            self._other[key] = values
+            self._keys[key] = -1
+
+    def __getitem__(self, key):
+        row = self._keys[key]
+        if row < 0:
+            return self._other[key]
+        values = self._data[row]
+        values.flags.writeable = False
+        return values
+
+    def __delitem__(self, key):
+        row = self._keys.pop(key)
+        if row < 0:
+            del self._other[key]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return 'AttributeStore(%i elements, %s)'%(self.num_elms, list(self._keys))
+
+    def keys(self):
+        return self._keys.keys()
+
+    def values(self):
+        return [self[key] for key in self._keys]
+
+    def items(self):
+        return [(key, self[key]) for key in self._keys]
+
+    def get(self, key, default=None):
+        return self[key] if key in self._keys else default
+
+    def pop(self, key, *default):
+        if key not in self._keys and len(default) > 0:
+            return default[0]
+        values = self[key]
+        if self._keys[key] >= 0:
+            values = values.copy() # writable
+        del self[key]
+        return values
+
+    def update(self, attr_dict):
+        for key in attr_dict.keys():
+            self[key] = attr_dict[key]
+
+    def _new(self, data, other):
+        store = AttributeStore(data.shape[1], dtype=data.dtype)
+        store._data = data
+        store._n = self._n
+        store._keys = dict(self._keys)
+        store._other = other
+        return store
+
+    def copy(self):
+        """Return an independent copy of the store.
+        """
+        other = {}
+        for key, values in self._other.items():
+            other[key] = values.copy() if isinstance(values, np.ndarray) else values
+        return self._new(self._data[:self._n].copy(), other)
+
+    def take(self, index):
+        """Return a store with the attributes of the selected elements.
+
+        Parameters
+        ----------
+        index : slice or array
+            Slice, boolean mask or indices of the elements to keep. With a
+            slice the float attributes are a view of this store, otherwise
+            they are copied once in a new array.
+        """
+        if isinstance(index, slice):
+            data = self._data[:self._n, index]
+        else:
+            index = np.asarray(index)
+            data = self._data[:self._n][:, index]
+        other = {}
+        for key, values in self._other.items():
+            if hasattr(values, '__len__') and len(values) == self.num_elms:
+                values = np.asarray(values)[index]
+            other[key] = values
+        return self._new(data, other)
+
+    def astype(self, dtype):
+        """Return a copy of the store with float attributes of type `dtype`
+        (e.g. np.float32).
+        """
+        store = self.copy()
+        store._data = store._data.astype(dtype)
+        store.dtype = store._data.dtype
+        return store
+
+
+#%% element faces
+# local node indexes of the faces (edges in 2D) of each vtk cell type, for
+# tetrahedra face i is opposite to node i (tetgen convention)
+_cellFaces = {5:[[0,1],[1,2],[2,0]], # triangle
+              8:[[0,1],[1,3],[3,2],[2,0]], # pixel
+              9:[[0,1],[1,2],[2,3],[3,0]], # quad
+              10:[[1,2,3],[0,3,2],[0,1,3],[0,1,2]], # tetrahedron
+              11:[[0,1,3,2],[4,5,7,6],[0,1,5,4],[2,3,7,6],[0,2,6,4],[1,3,7,5]], # voxel
+              12:[[0,1,2,3],[4,5,6,7],[0,1,5,4],[1,2,6,5],[2,3,7,6],[3,0,4,7]], # hexahedron
+              13:[[0,1,2],[3,4,5],[0,1,4,3],[1,2,5,4],[0,2,5,3]]} # prism (wedge)
+
+# split of each vtk cell type into triangles (2D) or tetrahedra (3D), as local
+# node indexes, used to locate points in the elements
+_cellSimplices = {5:[[0,1,2]], # triangle
+                  8:[[0,1,3],[0,3,2]], # pixel
+                  9:[[0,1,2],[0,2,3]], # quad
+                  10:[[0,1,2,3]], # tetrahedron
+                  11:[[0,1,3,7],[0,3,2,7],[0,2,6,7],[0,6,4,7],[0,4,5,7],[0,5,1,7]], # voxel
+                  12:[[0,1,2,6],[0,2,3,6],[0,3,7,6],[0,7,4,6],[0,4,5,6],[0,5,1,6]], # hexahedron
+                  13:[[0,1,2,3],[1,2,3,4],[2,3,4,5]]} # prism (wedge)
+
+
 #%% create mesh object
 class Mesh:
     """Mesh class.
@@ -135,12 +322,25 @@ class Mesh:
     Returns
     -------
     Mesh : class
+    
+    Notes
+    -----
+    Nodes are stored in `Mesh.node` as a (n_nodes x 3) float64 array and
+    elements in `Mesh.connection` as a (n_elms x n_verts) int32 array. 
+    `node_x`, `node_y`, `node_z`, `con_matrix` and `elm_centre` are views
+    of these arrays. KD-trees of the nodes and element centres (`node_tree`
+    and `elm_tree`) are built on first use for nearest neighbour look ups,
+    `Mesh.locate()` finds the element containing given points.
     """
-    cax = None 
-    zone = None
-    attr_cache={}
-    mesh_title = "2D_R2_mesh"
-    no_attributes = 0
+    __slots__ = ['num_nodes', 'num_elms', 'node', 'connection', 'node_id',
+                 'elm_id', '_elm_centre', 'elm_area', 'cell_type',
+                 'cell_attributes', 'atribute_title', 'original_file_path',
+                 'regions', 'surface', 'iremote', 'ndims', 'mesh_title',
+                 'attr_cache', 'no_attributes', 'cax', 'zone', 'e_nodes',
+                 'elec_x', 'elec_y', 'elec_z', 'sensitivities', 'fig', 'ax',
+                 'cbar', '_node_tree', '_elm_tree', '_faces', '_boundary',
+                 '_adjacency', '_locate']
+    
     def __init__(self,#function constructs our mesh object. 
                  num_nodes,#number of nodes
                  num_elms,#number of elements 
@@ -161,28 +361,502 @@ class Mesh:
         #assign varaibles to the mesh object 
         self.num_nodes=num_nodes
         self.num_elms=num_elms
-        self.node_x = node_x
-        self.node_y = node_y
-        self.node_z = node_z
-        self.node_id=node_id
-        self.elm_id=elm_id
+        self.node = np.c_[np.asarray(node_x, dtype=float),
+                          np.asarray(node_y, dtype=float),
+                          np.asarray(node_z, dtype=float)] # contiguous (n_nodes x 3)
+        self.node_id = np.asarray(node_id)
+        self.elm_id = np.asarray(elm_id)
+        self._node_tree = None # built when needed
+        self._elm_tree = None
+        self._faces = None
+        self._boundary = None
+        self._adjacency = None
+        self._locate = None
         self.con_matrix = node_data #connection matrix
-        self.elm_centre=elm_centre
-        self.elm_area=elm_area
+        self.elm_centre = elm_centre # computed from the nodes if None
+        self.elm_area = np.asarray(elm_area)
         self.cell_type=cell_type
         self.cell_attributes=cell_attributes 
         self.atribute_title=atribute_title
         self.original_file_path=original_file_path
         self.regions = regions
         self.surface = None # surface points for cropping the mesh when contouring
-        #decide if mesh is 3D or not 
         self.iremote = None # specify which electrode is remote
-        if max(node_y) - min(node_y) == 0: # mesh is probably 2D 
+        self.cax = None
+        self.zone = None
+        self.attr_cache = AttributeStore(num_elms) # per mesh
+        self.no_attributes = 0
+        #decide if mesh is 3D or not 
+        if np.ptp(self.node[:,1]) == 0: # mesh is probably 2D 
             self.ndims=2
+            self.mesh_title = "2D_R2_mesh"
         else:
             self.ndims=3
             self.mesh_title = '3D_R3t_mesh' 
     
+    # nodes and connection matrix are numpy arrays, the old list-like
+    # attributes are views on them
+    @property
+    def node_x(self):
+        return self.node[:,0]
+    
+    @node_x.setter
+    def node_x(self, values):
+        self.node[:,0] = values
+        self._elm_centre = None # to be recomputed
+        self._node_tree = None
+        self._elm_tree = None
+        self._boundary = None
+        self._locate = None
+    
+    @property
+    def node_y(self):
+        return self.node[:,1]
+    
+    @node_y.setter
+    def node_y(self, values):
+        self.node[:,1] = values
+        self._elm_centre = None
+        self._node_tree = None
+        self._elm_tree = None
+        self._boundary = None
+        self._locate = None
+    
+    @property
+    def node_z(self):
+        return self.node[:,2]
+    
+    @node_z.setter
+    def node_z(self, values):
+        self.node[:,2] = values
+        self._elm_centre = None
+        self._node_tree = None
+        self._elm_tree = None
+        self._boundary = None
+        self._locate = None
+    
+    @property
+    def con_matrix(self):
+        """Connection matrix as (n_verts x n_elms), view of `Mesh.connection`.
+        """
+        return self.connection.T
+    
+    @con_matrix.setter
+    def con_matrix(self, values):
+        self.connection = np.ascontiguousarray(np.asarray(values, dtype=np.int32).T)
+        self._elm_tree = None
+        self._faces = None
+        self._boundary = None
+        self._adjacency = None
+        self._locate = None
+    
+    @property
+    def elm_centre(self):
+        """Centre of the elements as (x, y, z) arrays. If not given, it is
+        computed (and cached) as the mean of the element vertices.
+        """
+        if self._elm_centre is None:
+            self._elm_centre = np.mean(self.node[self.connection], axis=1)
+        return tuple(self._elm_centre.T)
+    
+    @elm_centre.setter
+    def elm_centre(self, values):
+        self._elm_tree = None
+        self._locate = None
+        if values is None:
+            self._elm_centre = None
+        else:
+            self._elm_centre = np.c_[np.asarray(values[0], dtype=float),
+                                     np.asarray(values[1], dtype=float),
+                                     np.asarray(values[2], dtype=float)]
+    
+    @property
+    def node_tree(self):
+        """`scipy.spatial.cKDTree` of the node coordinates (built on first use).
+        """
+        if self._node_tree is None:
+            self._node_tree = cKDTree(self.node)
+        return self._node_tree
+    
+    @property
+    def elm_tree(self):
+        """`scipy.spatial.cKDTree` of the element centres (built on first use).
+        """
+        if self._elm_tree is None:
+            self.elm_centre # make sure the centres are computed
+            self._elm_tree = cKDTree(self._elm_centre)
+        return self._elm_tree
+    
+    def _nearest(self, tree, x, y, z, max_dist=None):
+        x = np.asarray(x, dtype=float)
+        y = np.zeros_like(x) if y is None else np.asarray(y, dtype=float)
+        dist, idx = tree.query(np.c_[x, y, np.asarray(z, dtype=float)])
+        if max_dist is not None:
+            idx[dist > max_dist] = -1
+        return idx
+    
+    def nearest_node(self, x, y, z, max_dist=None):
+        """Index of the nodes closest to the given points.
+        
+        Parameters
+        ----------
+        x, y, z : array like
+            Coordinates of the points. `y` can be None for 2D meshes.
+        max_dist : float, optional
+            If given, -1 is returned for points further than `max_dist` from
+            any node.
+        
+        Returns
+        -------
+        idx : numpy array
+            Node indexes (starting at 0).
+        """
+        return self._nearest(self.node_tree, x, y, z, max_dist)
+    
+    def nearest_elm(self, x, y, z, max_dist=None):
+        """Index of the elements whose centre is the closest to the given 
+        points. Same arguments as `Mesh.nearest_node()`.
+        """
+        return self._nearest(self.elm_tree, x, y, z, max_dist)
+
+    def _simplices(self):
+        """Elements split in triangles (2D, x z coordinates) or tetrahedra
+        (3D) as the first vertex and the inverse of the edge matrix of each
+        simplex, with the radius of the elements around their centre. Cached
+        until the nodes or the connection matrix change.
+        """
+        if self._locate is None:
+            cell_type = int(self.cell_type[0])
+            cols = [0,2] if self.ndims == 2 else [0,1,2]
+            if cell_type not in _cellSimplices or len(_cellSimplices[cell_type][0]) != len(cols) + 1:
+                raise ValueError('cannot locate points in %iD mesh with vtk cell type %i'%(self.ndims, cell_type))
+            sub = np.array(_cellSimplices[cell_type])
+            vert = self.node[:,cols][self.connection[:,sub]] # (n_elms, n_sub, d+1, d)
+            v0 = vert[:,:,0]
+            e = vert[:,:,1:] - v0[:,:,None,:] # edges as rows
+            # inverse of the transposed edge matrix, NaN for flat simplices
+            if len(cols) == 2:
+                det = e[...,0,0]*e[...,1,1] - e[...,0,1]*e[...,1,0]
+                inv = np.stack([np.stack([e[...,1,1], -e[...,1,0]], axis=-1),
+                                np.stack([-e[...,0,1], e[...,0,0]], axis=-1)], axis=-2)
+            else:
+                rows = np.stack([np.cross(e[...,1,:], e[...,2,:]),
+                                 np.cross(e[...,2,:], e[...,0,:]),
+                                 np.cross(e[...,0,:], e[...,1,:])], axis=-2)
+                det = np.sum(e[...,0,:]*rows[...,0,:], axis=-1)
+                inv = rows
+            with np.errstate(divide='ignore', invalid='ignore'):
+                inv = inv/np.where(det == 0, np.nan, det)[...,None,None]
+            self.elm_centre # make sure the centres are computed
+            radius = np.max(np.sqrt(np.sum((self.node[self.connection] - self._elm_centre[:,None,:])**2, axis=2)), axis=1)
+            self._locate = {'sub':sub, 'v0':v0, 'inv':inv,
+                            'radius':radius*(1 + 1e-6), 'points':{}}
+        return self._locate
+
+    def _locateChunk(self, points, k, tol):
+        """Locate a chunk of points (see `Mesh.locate()`).
+        """
+        simplices = self._simplices()
+        sub, v0, inv, radius = simplices['sub'], simplices['v0'], simplices['inv'], simplices['radius']
+        cols = [0,2] if self.ndims == 2 else [0,1,2]
+        elm = np.full(len(points), -1, dtype=np.int64)
+        weights = np.full((len(points), self.connection.shape[1]), np.nan)
+        todo = np.arange(len(points))
+        k0, k, kmax = 0, min(k, self.num_elms), 64*k
+        while len(todo) > 0:
+            # closest element centres, an element can only contain a point
+            # closer to its centre than its radius
+            dist, cand = self.elm_tree.query(points[todo], k=k, distance_upper_bound=np.max(radius))
+            dist, cand = dist.reshape((len(todo), k)), cand.reshape((len(todo), k))
+            found = np.zeros(len(todo), dtype=bool)
+            for j in range(k0, k):
+                valid = np.isfinite(dist[:,j]) & ~found
+                valid[valid] = dist[valid,j] <= radius[cand[valid,j]]
+                i = np.flatnonzero(valid)
+                c = cand[i,j]
+                p = points[todo[i]][:,cols]
+                for s in range(len(sub)): # barycentric coordinates in each simplex
+                    lam = np.einsum('nij,nj->ni', inv[c,s], p - v0[c,s])
+                    lam = np.c_[1 - np.sum(lam, axis=1), lam]
+                    inside = np.all(lam >= -tol, axis=1) # False for NaN
+                    ii = i[inside]
+                    elm[todo[ii]] = c[inside]
+                    w = np.zeros((len(ii), weights.shape[1]))
+                    w[:,sub[s]] = lam[inside]
+                    weights[todo[ii]] = w
+                    found[ii] = True
+                    i, c, p = i[~inside], c[~inside], p[~inside]
+            if k >= min(kmax, self.num_elms):
+                break
+            # look further for points with more candidates within the largest radius
+            todo = todo[~found & np.isfinite(dist[:,-1])]
+            k0, k = k, min(8*k, self.num_elms)
+        return elm, weights
+
+    def locate(self, x, y, z, tol=1e-9, k=8, chunk=100000):
+        """Element containing each point and the interpolation weights of the
+        element nodes. Candidate elements are the closest element centres
+        (`Mesh.elm_tree`), then a point is in an element if its barycentric
+        coordinates in one of the triangles (2D, x z plane) or tetrahedra (3D)
+        of the element are all positive. Results are cached so the same
+        points can be probed again cheaply.
+
+        Parameters
+        ----------
+        x, y, z : array like
+            Coordinates of the points. `y` can be None for 2D meshes.
+        tol : float, optional
+            Tolerance on the barycentric coordinates, points on a face shared
+            by two elements are given to the element with the closest centre.
+        k : int, optional
+            Number of candidate elements per point. Points not found among the
+            `k` closest elements are searched again among the `8*k` then the
+            `64*k` closest (elongated elements may need a larger `k`).
+        chunk : int, optional
+            Number of points located at once (limits the memory used).
+
+        Returns
+        -------
+        elm : numpy array
+            Index of the element containing each point, -1 for points outside
+            the mesh.
+        weights : numpy array
+            (n_points x n_verts) weights of the nodes `Mesh.connection[elm]`
+            (linear in the triangles or tetrahedra of the element), NaN for
+            points outside the mesh.
+
+        Notes
+        -----
+        The returned arrays are read only as they are shared with the cache.
+        """
+        x = np.asarray(x, dtype=float).ravel()
+        z = np.asarray(z, dtype=float).ravel()
+        if y is None or self.ndims == 2: # 2D meshes are in the x z plane
+            y = np.full(len(x), self.node[0,1])
+        y = np.asarray(y, dtype=float).ravel()
+        points = np.c_[x, y, z]
+        h = hashlib.sha1()
+        _hashValue(h, [points, tol, k])
+        key = h.hexdigest()
+        cache = self._simplices()['points']
+        if key not in cache:
+            elm = np.full(len(points), -1, dtype=np.int64)
+            weights = np.full((len(points), self.connection.shape[1]), np.nan)
+            for a in range(0, len(points), chunk):
+                elm[a:a+chunk], weights[a:a+chunk] = self._locateChunk(points[a:a+chunk], k, tol)
+            elm.flags.writeable = False
+            weights.flags.writeable = False
+            if len(cache) >= 8: # keep the last probed point sets only
+                del cache[next(iter(cache))]
+            cache[key] = (elm, weights)
+        return cache[key]
+
+    def probe(self, x, y, z, attr='Resistivity(log10)'):
+        """Values of an attribute at given points.
+
+        Parameters
+        ----------
+        x, y, z : array like
+            Coordinates of the points. `y` can be None for 2D meshes.
+        attr : str or array like, optional
+            Name of an attribute in `Mesh.attr_cache` or values for each
+            element or each node. Element values are taken from the element
+            containing the point, node values are interpolated.
+
+        Returns
+        -------
+        values : numpy array
+            Values at the points, NaN for points outside the mesh.
+        """
+        values = np.asarray(self.attr_cache[attr] if isinstance(attr, str) else attr, dtype=float)
+        elm, weights = self.locate(x, y, z)
+        inside = elm >= 0
+        out = np.full(len(elm), np.nan)
+        if len(values) == self.num_elms:
+            out[inside] = values[elm[inside]]
+        elif len(values) == self.num_nodes:
+            out[inside] = np.sum(weights[inside]*values[self.connection[elm[inside]]], axis=1)
+        else:
+            raise ValueError('attr must have one value per element or per node')
+        return out
+
+    def _faceIndex(self):
+        """Faces of the elements, grouped by number of vertices (triangles and
+        quads for prisms), with the index of each face among the unique faces
+        of the mesh. Cached until the connection matrix changes.
+        
+        Returns
+        -------
+        groups : list of tuple
+            One (local, faces, inverse, counts) tuple per group: local face 
+            numbers in the element, (n_elms x n_faces x n_verts) node indexes, 
+            (n_elms x n_faces) index of the unique faces and number of elements
+            sharing each unique face.
+        """
+        if self._faces is None:
+            cell_type = int(self.cell_type[0])
+            if cell_type not in _cellFaces:
+                raise ValueError('faces not available for vtk cell type %i'%cell_type)
+            table = _cellFaces[cell_type]
+            groups = []
+            for k in sorted(set(len(f) for f in table)):
+                local = np.array([i for i, f in enumerate(table) if len(f) == k])
+                faces = self.connection[:, [table[i] for i in local]] # (n_elms, n_faces, k)
+                sfaces = np.sort(faces.reshape((-1, k)), axis=1).astype(np.int64)
+                if float(self.num_nodes)**k < 2**62: # faces as a single integer
+                    key = sfaces[:,0]
+                    for j in range(1, k):
+                        key = key*self.num_nodes + sfaces[:,j]
+                    _, inverse, counts = np.unique(key, return_inverse=True, return_counts=True)
+                else:
+                    _, inverse, counts = np.unique(sfaces, axis=0, return_inverse=True, return_counts=True)
+                groups.append((local, faces, inverse.reshape(faces.shape[:2]), counts))
+            self._faces = groups
+        return self._faces
+    
+    def _faceNeighbours(self):
+        """Element sharing each face of each element (-1 if the face is on
+        the boundary), as a (n_elms x n_faces) array in the order of 
+        `_cellFaces`.
+        """
+        table = _cellFaces[int(self.cell_type[0])]
+        neigh = np.full((self.num_elms, len(table)), -1, dtype=np.int64)
+        for local, faces, inverse, counts in self._faceIndex():
+            nf = len(local)
+            flat = inverse.ravel()
+            order = np.argsort(flat, kind='stable')
+            ipair = np.flatnonzero(flat[order][1:] == flat[order][:-1]) # faces shared by 2 elements
+            ea, fa = np.divmod(order[ipair], nf) # element and face of each side
+            eb, fb = np.divmod(order[ipair+1], nf)
+            neigh[ea, local[fa]] = eb
+            neigh[eb, local[fb]] = ea
+        return neigh
+    
+    def adjacency(self):
+        """Element adjacency in compressed sparse row (CSR) format: the 
+        neighbours of element i (elements sharing a face, or an edge for 2D 
+        meshes) are `indices[indptr[i]:indptr[i+1]]`. Cached until the 
+        connection matrix changes.
+        
+        Returns
+        -------
+        indptr : numpy array
+            (n_elms + 1) offsets of each element in `indices`.
+        indices : numpy array
+            Indexes of the neighbouring elements.
+        """
+        if self._adjacency is None:
+            neigh = self._faceNeighbours()
+            valid = neigh >= 0
+            indptr = np.r_[0, np.cumsum(np.sum(valid, axis=1))]
+            self._adjacency = (indptr, neigh[valid])
+        return self._adjacency
+    
+    def neighbours(self, elm):
+        """Indexes of the elements sharing a face (edge in 2D) with element
+        `elm`.
+        """
+        indptr, indices = self.adjacency()
+        return indices[indptr[elm]:indptr[elm+1]]
+    
+    def boundary_elms(self):
+        """Boolean array, `True` for elements with at least one face on the
+        boundary of the mesh.
+        """
+        indptr, indices = self.adjacency()
+        return np.diff(indptr) < len(_cellFaces[int(self.cell_type[0])])
+    
+    def connected_components(self, elms=None):
+        """Label the groups of elements connected by their faces (edges in 
+        2D).
+        
+        Parameters
+        ----------
+        elms : array like, optional
+            Boolean mask or indexes of the elements to consider (e.g. the 
+            elements of a zone), by default all elements.
+        
+        Returns
+        -------
+        labels : numpy array
+            Group number of each element (from 0 to n_groups - 1), -1 for
+            elements not in `elms`.
+        """
+        indptr, indices = self.adjacency()
+        graph = csr_matrix((np.ones(len(indices), dtype=np.int8), indices, indptr),
+                           shape=(self.num_elms, self.num_elms))
+        labels = np.full(self.num_elms, -1, dtype=int)
+        if elms is None:
+            labels[:] = connected_components(graph, directed=False)[1]
+        else:
+            mask = np.zeros(self.num_elms, dtype=bool)
+            mask[elms] = True
+            labels[mask] = connected_components(graph[mask][:,mask], directed=False)[1]
+        return labels
+    
+    def boundary_faces(self, elms=None):
+        """Faces (edges for 2D meshes) on the boundary of the mesh, that is 
+        faces which belong to a single element. 
+        
+        Parameters
+        ----------
+        elms : array like, optional
+            Boolean mask or indexes of the elements to consider, the faces on
+            the boundary of this subset of the mesh are returned. By default 
+            all elements are used and the result is cached.
+        
+        Returns
+        -------
+        faces : numpy array
+            (n_faces x n_verts) node indexes of the faces, ordered so that the 
+            normal points outward. For meshes with both triangular and quad 
+            faces (prisms), triangles repeat their last node.
+        elm : numpy array
+            Index of the element each face belongs to.
+        normals : numpy array
+            (n_faces x 3) outward unit normals of the faces.
+        """
+        if elms is None and self._boundary is not None:
+            return self._boundary
+        groups = self._faceIndex()
+        if elms is not None:
+            mask = np.zeros(self.num_elms, dtype=bool)
+            mask[elms] = True
+        nk = max(g[1].shape[2] for g in groups)
+        faces, elm = [], []
+        for local, gfaces, inverse, counts in groups:
+            if elms is None:
+                iface = counts[inverse] == 1
+            else: # count the faces in the subset only
+                counts = np.bincount(inverse[mask].ravel(), minlength=len(counts))
+                iface = (counts[inverse] == 1) & mask[:,None]
+            ie, jf = np.nonzero(iface)
+            f = gfaces[ie, jf]
+            if f.shape[1] < nk: # pad triangles
+                f = np.c_[f, np.repeat(f[:,-1:], nk - f.shape[1], axis=1)]
+            faces.append(f)
+            elm.append(ie)
+        faces, elm = np.vstack(faces), np.concatenate(elm)
+        order = np.argsort(elm, kind='stable')
+        faces, elm = faces[order], elm[order]
+        
+        # outward normals
+        verts = self.node[faces]
+        if nk == 2: # edges in the x z plane
+            edge = verts[:,1] - verts[:,0]
+            normals = np.c_[-edge[:,2], np.zeros(len(edge)), edge[:,0]]
+        else:
+            normals = np.cross(verts[:,1] - verts[:,0], verts[:,2] - verts[:,0])
+        self.elm_centre # make sure the centres are computed
+        iflip = np.sum(normals*(np.mean(verts, axis=1) - self._elm_centre[elm]), axis=1) < 0
+        normals[iflip] *= -1
+        faces[iflip] = faces[iflip, ::-1]
+        length = np.sqrt(np.sum(normals**2, axis=1))
+        normals = normals/np.where(length == 0, 1, length)[:,None]
+        if elms is None:
+            self._boundary = (faces, elm, normals)
+        return faces, elm, normals
+    
     @classmethod # creates a mesh object from a mesh dictionary
     def mesh_dict2class(cls, mesh_info):
         """ Converts a mesh dictionary produced by the gmsh2r2mesh and
@@ -243,12 +917,13 @@ class Mesh:
             array of ints which index the electrode nodes in a mesh
         """
         self.e_nodes = e_nodes
-        self.elec_x = np.array(self.node_x)[np.array(e_nodes, dtype=int)]
+        e_nodes = np.array(e_nodes, dtype=int)
+        self.elec_x = self.node_x[e_nodes]
         if self.ndims==3:
-            self.elec_y = np.array(self.node_y)[np.array(e_nodes, dtype=int)]
+            self.elec_y = self.node_y[e_nodes]
         else:
             self.elec_y = np.zeros_like(self.elec_x)
-        self.elec_z = np.array(self.node_z)[np.array(e_nodes, dtype=int)]
+        self.elec_z = self.node_z[e_nodes]
     
     #add some functions to allow adding some extra attributes to mesh 
     def add_sensitivity(self,values):#sensitivity of the mesh
@@ -312,21 +987,18 @@ class Mesh:
 #            print(len(values),self.num_elms)
             raise ValueError("The length of the new attributes array does not match the number of elements in the mesh")
         self.no_attributes += 1
-        try: 
-            self.attr_cache[key]=values #allows us to add an attributes to each element.
-        except AttributeError:
-            self.attr_cache = {}
-            self.attr_cache[key]=values #add attribute 
+        self.attr_cache[key]=values #allows us to add an attributes to each element.
     
     def add_attr_dict(self,attr_dict):
-        """Mesh attributes are stored inside a dictionary, mesh.attr_cache.
+        """Mesh attributes are stored inside mesh.attr_cache (see 
+        `AttributeStore`).
         
         Parameters
         ------------
         attr_dict: dict 
             Each key in the dictionary should reference an array like of values. 
         """
-        self.attr_cache=attr_dict
+        self.attr_cache = AttributeStore(self.num_elms, attr_dict=attr_dict)
         self.no_attributes = len(attr_dict)
         
     def show_avail_attr(self,flag=True):
@@ -394,21 +1066,23 @@ class Mesh:
         """
         # get points inside the polygon
         path = mpath.Path(polyline)
-        centroids = np.c_[self.elm_centre[0], self.elm_centre[2]]
+        elm_centre = self.elm_centre
+        centroids = np.c_[elm_centre[0], elm_centre[2]]
         i2keep = path.contains_points(centroids) # TODO benchmark agains isinpolygon
         # https://stackoverflow.com/questions/36399381/whats-the-fastest-way-of-checking-if-a-point-is-inside-a-polygon-in-python
         
         # filter element-based attribute
-        ecx = np.array(self.elm_centre[0])[i2keep].tolist()
-        ecy = np.array(self.elm_centre[1])[i2keep].tolist()
-        ecz = np.array(self.elm_centre[2])[i2keep].tolist()
-        self.elm_centre = (ecx, ecy, ecz)
-        self.con_matrix = tuple(np.array(self.con_matrix)[:,i2keep].tolist())
-        self.elm_area = np.array(self.elm_area)[i2keep].tolist()
-        self.elm_id = np.array(self.elm_id)[i2keep].tolist()
+        self._elm_centre = self._elm_centre[i2keep]
+        self.connection = self.connection[i2keep]
+        self._elm_tree = None
+        self._faces = None
+        self._boundary = None
+        self._adjacency = None
+        self._locate = None
+        self.elm_area = self.elm_area[i2keep]
+        self.elm_id = self.elm_id[i2keep]
         self.cell_attributes = np.array(self.cell_attributes)[i2keep].tolist()
-        for c in self.attr_cache.keys():
-            self.attr_cache[c] = np.array(self.attr_cache[c])[i2keep].tolist()
+        self.attr_cache = self.attr_cache.take(i2keep)
         self.num_elms = np.sum(i2keep)
         
         # filter node-based attribute (may use the powerful np.searchsorted trick see parsers.py)
@@ -558,9 +1232,9 @@ class Mesh:
                 zlim=[min(self.elec_z)-doiEstimate,max(self.elec_z)]
         except AttributeError:
             if xlim=="default":
-                xlim=[min(self.node_x),max(self.node_x)]
+                xlim=[np.min(self.node_x),np.max(self.node_x)]
             if zlim=="default":
-                zlim=[min(self.node_z),max(self.node_z)]
+                zlim=[np.min(self.node_z),np.max(self.node_z)]
                 
         if np.diff(xlim) == 0: # protection against thin axis margins 
             xlim=[xlim[0]-2,xlim[1]+2]
@@ -570,8 +1244,8 @@ class Mesh:
         ##plot mesh! ##
         t0 = time.time() #start timer on how long it takes to plot the mesh
         #compile mesh coordinates into polygon coordinates  
-        nodes = np.c_[self.node_x, self.node_z]
-        connection = np.array(self.con_matrix).T # connection matrix 
+        nodes = self.node[:,[0,2]]
+        connection = self.connection # connection matrix 
         #compile polygons patches into a "patch collection"
         ###X=np.array(self.cell_attributes) # maps resistivity values on the color map### <-- disabled 
         coordinates = nodes[connection]
@@ -602,8 +1276,8 @@ class Mesh:
             self.cax = coll
             
         else:#use contour algorithm (only for 2D and y is considered depth here)
-            xc = np.array(self.elm_centre[0])
-            yc = np.array(self.elm_centre[2])
+            xc = self.elm_centre[0]
+            yc = self.elm_centre[2]
             zc = np.array(X)
             
             # check for 0 in sigma log
@@ -612,8 +1286,8 @@ class Mesh:
                 zc = zc[ie]
                 xc = xc[ie]
                 yc = yc[ie]
-            x = np.array(self.node_x)
-            y = np.array(self.node_z)
+            x = self.node_x
+            y = self.node_z
             
             # set scale arrangement
             if vmin is None:
@@ -1011,7 +1685,7 @@ class Mesh:
         ax.set_ylabel('y')
         
         if zlim=="default":
-            zlim=[min(self.node_z),max(self.node_z)]
+            zlim=[np.min(self.node_z),np.max(self.node_z)]
         try: 
             if xlim=="default":
                 xlim=[min(self.elec_x[~self.iremote]), max(self.elec_x[~self.iremote])]
@@ -1019,9 +1693,9 @@ class Mesh:
                 ylim=[min(self.elec_y[~self.iremote]), max(self.elec_y[~self.iremote])]
         except AttributeError:
             if xlim=="default":
-                xlim=[min(self.node_x), max(self.node_x)]
+                xlim=[np.min(self.node_x), np.max(self.node_x)]
             if ylim=="default":
-                ylim=[min(self.node_y), max(self.node_y)]
+                ylim=[np.min(self.node_y), np.max(self.node_y)]
 
             
         if abs(xlim[0] - xlim[1]) < 0.001:# protection against thin axis margins 
@@ -1052,70 +1726,22 @@ class Mesh:
         elm_y = self.elm_centre[1]
         elm_z = self.elm_centre[2]
         in_elem = in_box(elm_x,elm_y,elm_z,xlim[1],xlim[0],ylim[1],ylim[0],zlim[1],zlim[0])#find elements veiwable in axis
-        X = X[in_elem]#reassign X to elements inside the box limits 
-        temp_con_mat = np.array(self.con_matrix,dtype='int64')#temporary connection matrix which is just the elements inside the box
-        con_mat=temp_con_mat[:,in_elem] # truncate elements
-        inside_numel = len(con_mat[0])#number of inside elements 
-        tri_combo = np.zeros((inside_numel,4),dtype='float64')
         
-        S = [0]*self.num_elms 
+        S = np.zeros(self.num_elms)
         if sens:
             try:
-                S = self.sensitivities
+                S = np.array(self.sensitivities)
             except AttributeError:
                 sens = False
                 print('no sensitivities to plot')
         
-        for i in range(inside_numel):
-            idx1 = con_mat[0][i]#extract indexes 
-            idx2 = con_mat[1][i]
-            idx3 = con_mat[2][i]
-            idx4 = con_mat[3][i]
-            
-            face1 = idx1*idx2*idx3 # assign each face a code
-            face2 = idx1*idx2*idx4
-            face3 = idx2*idx3*idx4
-            face4 = idx1*idx4*idx3
-
-            tri_combo[i,0] = face1#face 1 
-            tri_combo[i,1] = face2#face 2 
-            tri_combo[i,2] = face3#face 3 
-            tri_combo[i,3] = face4#face 4 
-            
-        temp,index,counts = np.unique(tri_combo.flatten(),return_index=True,return_counts=True) # find the unique values 
-        single_vals_idx = counts==1 # faces on edge of volume only appear once
-        edge_element_idx = index[single_vals_idx]/4
-        face_element_idx = np.floor(edge_element_idx)
-        face_probe = edge_element_idx - np.floor(edge_element_idx)
-        
-        truncated_numel = len(face_element_idx)
-        face_list = [0] * truncated_numel
-        assign = [0] * truncated_numel # the number assigned to each face
-        sensi = [0] * truncated_numel # the sensitivity assigned to each face
-        
-        for i in range(truncated_numel):
-            ref = int(face_element_idx[i])
-            idx1 = con_mat[0][ref]
-            idx2 = con_mat[1][ref]
-            idx3 = con_mat[2][ref]
-            idx4 = con_mat[3][ref]
-            
-            vert1 = (self.node_x[idx1],self.node_y[idx1],self.node_z[idx1])
-            vert2 = (self.node_x[idx2],self.node_y[idx2],self.node_z[idx2])
-            vert3 = (self.node_x[idx3],self.node_y[idx3],self.node_z[idx3])
-            vert4 = (self.node_x[idx4],self.node_y[idx4],self.node_z[idx4])
-            
-            if face_probe[i] == 0: #if single_val_idx. == 0 > face1
-                face_list[i] = (vert1,vert2,vert3)#face 1 
-            elif face_probe[i] == 0.25:#if single_val_idx. == 0.25 > face2
-                face_list[i] = (vert1,vert2,vert4)#face 2
-            elif face_probe[i] == 0.5:#if single_val_idx. == 0.5 > face3
-                face_list[i] = (vert2,vert3,vert4)#face 3 
-            elif face_probe[i] == 0.75:#if single_val_idx. == 0.75 > face4
-                face_list[i] = (vert1,vert4,vert3)#face 4
-            
-            assign[i] = X[ref]#get attribute value into assigned array
-            sensi[i] = S[ref]
+        if np.all(in_elem):
+            faces, elm, _ = self.boundary_faces()
+        else: # boundary of the elements inside the box limits
+            faces, elm, _ = self.boundary_faces(in_elem)
+        face_list = self.node[faces] # vertices of the faces
+        assign = X[elm] # attribute value of the face
+        sensi = S[elm] # the sensitivity assigned to each face
           
         polly = Poly3DCollection(face_list,linewidth=0.5) # make 3D polygon collection
         polly.set_alpha(alpha)#add some transparancy to the elements
@@ -1178,8 +1804,8 @@ class Mesh:
         values = np.array(self.attr_cache[attr])        
         dimDico = {'x':0,'y':1,'z':2}
         dim = dimDico[axis]
-        elms = np.array(self.con_matrix).T
-        nodes = np.array([self.node_x, self.node_y, self.node_z]).T
+        elms = self.connection
+        nodes = self.node
         sliceMesh(nodes, elms, values, label=attr, dim=dim, vmin=vmin, vmax=vmax, ax=ax)
         
         
@@ -1268,11 +1894,11 @@ class Mesh:
         ax.set_ylabel('y')
         
         if zlim=="default":
-            zlim=[min(self.node_z),max(self.node_z)]
+            zlim=[np.min(self.node_z),np.max(self.node_z)]
         if xlim=="default":
-            xlim=[min(self.node_x), max(self.node_x)]
+            xlim=[np.min(self.node_x), np.max(self.node_x)]
         if ylim=="default":
-            ylim=[min(self.node_y), max(self.node_y)]
+            ylim=[np.min(self.node_y), np.max(self.node_y)]
         #set axis limits     
         ax.set_xlim(xlim)
         ax.set_ylim(ylim)
@@ -1288,81 +1914,18 @@ class Mesh:
             edge_color='face'#set the edge colours to the colours of the polygon patches
             
         #construct patches 
-        #print('constructing patches')
-        S = [0]*self.num_elms 
+        S = np.zeros(self.num_elms)
         if sens:
             try:
-                S = self.sensitivities
+                S = np.array(self.sensitivities)
             except AttributeError:
                 sens = False
                 print('no sensitivities to plot')
                 
-        con_mat = self.con_matrix # just plotting top and bottom parts of elements 
-        combo = np.zeros((self.num_elms,5),dtype='float64')
-        
-        for i in range(self.num_elms):
-            idx1 = con_mat[0][i]
-            idx2 = con_mat[1][i]
-            idx3 = con_mat[2][i]
-            idx4 = con_mat[3][i]
-            idx5 = con_mat[4][i]
-            idx6 = con_mat[5][i]
-            
-            #assign each face a code 
-            fc1 = int(str(idx1)+str(idx2)+str(idx3))#face code 1 
-            fc2 = int(str(idx4)+str(idx5)+str(idx6))#face code 2 
-            fc3 = int(str(idx1)+str(idx2)+str(idx5)+str(idx4))#face code 3
-            fc4 = int(str(idx2)+str(idx3)+str(idx6)+str(idx5))#face code 4 
-            fc5 = int(str(idx1)+str(idx3)+str(idx6)+str(idx4))#face code 5
-            
-            combo[i,0] = fc1
-            combo[i,1] = fc2
-            combo[i,2] = fc3
-            combo[i,3] = fc4
-            combo[i,4] = fc5
-            
-        #return combo
-        temp,index,counts = np.unique(combo.flatten(),return_index=True,return_counts=True) 
-        single_vals_idx = counts==1 # faces on edge of volume only appear once
-        edge_element_idx = index[single_vals_idx]/5
-        face_element_idx = np.floor(edge_element_idx)
-        face_probe = edge_element_idx - np.floor(edge_element_idx)
-        face_probe = np.round(face_probe,1) # round to nearest 1 decimal 
-        
-        
-        truncated_numel = len(face_element_idx)
-        face_list = [()] * truncated_numel
-        assign = [0] * truncated_numel # the number assigned to each face
-        sensi = [0] * truncated_numel # the sensitivity assigned to each face
-            
-        for i in range(truncated_numel):
-            ref = int(face_element_idx[i])
-            idx1 = con_mat[0][ref]
-            idx2 = con_mat[1][ref]
-            idx3 = con_mat[2][ref]
-            idx4 = con_mat[3][ref]
-            idx5 = con_mat[4][ref]
-            idx6 = con_mat[5][ref]
-            vert1 = (self.node_x[idx1],self.node_y[idx1],self.node_z[idx1])
-            vert2 = (self.node_x[idx2],self.node_y[idx2],self.node_z[idx2])
-            vert3 = (self.node_x[idx3],self.node_y[idx3],self.node_z[idx3])
-            vert4 = (self.node_x[idx4],self.node_y[idx4],self.node_z[idx4])
-            vert5 = (self.node_x[idx5],self.node_y[idx5],self.node_z[idx5])
-            vert6 = (self.node_x[idx6],self.node_y[idx6],self.node_z[idx6])
-            
-            if face_probe[i] == 0: #if single_val_idx. == 0 > face1
-                face_list[i] = (vert1,vert2,vert3)#face 1 
-            elif face_probe[i] == 0.2:#if single_val_idx. == 0.2 > face2
-                face_list[i] = (vert4,vert5,vert6)#face 2
-            elif face_probe[i] == 0.4:#if single_val_idx. == 0.4 > face3
-                face_list[i] = (vert1,vert2,vert5,vert4)#face 3 
-            elif face_probe[i] == 0.6:#if single_val_idx. == 0.6 > face4
-                face_list[i] = (vert2,vert3,vert6,vert5)#face 4
-            elif face_probe[i] == 0.8:#if single_val_idx. == 0.8 > face5
-                face_list[i] = (vert1,vert3,vert6,vert4)
-                
-            sensi[i] = S[ref]
-            assign[i] = X[ref]
+        faces, elm, _ = self.boundary_faces() # faces on the edge of the volume
+        face_list = self.node[faces] # triangles repeat their last vertex
+        sensi = S[elm] # the sensitivity assigned to each face
+        assign = X[elm]
             
         #add patches to 3D figure 
         polly = Poly3DCollection(face_list,linewidth=0.5) # make 3D polygon collection
@@ -1602,8 +2165,8 @@ class Mesh:
         datum_y = np.array(datum_y)
         datum_z = np.array(datum_z)
         if self.ndims == 2: # use 1D interpolation
-            elm_x = np.array(self.elm_centre[0])
-            elm_z = np.array(self.elm_centre[2])
+            elm_x = self.elm_centre[0]
+            elm_z = self.elm_centre[2]
             min_idx = np.argmin(datum_x)
             max_idx = np.argmax(datum_x)
             Z = np.interp(elm_x,datum_x,datum_z,left=datum_y[min_idx],right=datum_y[max_idx])
@@ -1612,9 +2175,7 @@ class Mesh:
             self.no_attributes += 1
             return depth
         if self.ndims == 3: # use 2D interpolation
-            elm_x = np.array(self.elm_centre[0])
-            elm_y = np.array(self.elm_centre[1])
-            elm_z = np.array(self.elm_centre[2])  
+            elm_x, elm_y, elm_z = self.elm_centre
             #use interpolation to work out depth to datum 
             if method == 'bilinear':
                 Z = interp.interp2d(elm_x, elm_y, datum_x, datum_y, datum_z)
@@ -1672,14 +2233,8 @@ class Mesh:
         if new_y is None:
             new_y = np.zeros_like(new_x)
             
-        self.node_x = np.array(self.node_x)
-        self.node_y = np.array(self.node_y)
-        self.node_z = np.array(self.node_z)
-            
-        node_in_mesh = [0]*len(new_x)    
+        node_in_mesh = self.nearest_node(new_x, new_y, new_z) # min distance should be zero, ie. the node index.
         for i in range(len(new_x)):
-            sq_dist = (self.node_x - new_x[i])**2 + (self.node_y - new_y[i])**2 + (self.node_z - new_z[i])**2 # find the minimum square distance
-            node_in_mesh[i] = np.argmin(sq_dist) # min distance should be zero, ie. the node index.
             if has_nodes and debug:
                 if node_in_mesh[i] != self.e_nodes[i]:
                     print("Electrode %i moved from node %i to node %i"%(i,node_in_mesh[i],self.e_nodes[i]))#print to show something happening
@@ -1753,35 +2308,23 @@ class Mesh:
         if zlim is None:
             zlim=[min(self.elec_z), max(self.elec_z)]
             
-        elm_x = np.array(self.elm_centre[0])
-        elm_y = np.array(self.elm_centre[1])
-        elm_z = np.array(self.elm_centre[2])
+        elm_x, elm_y, elm_z = self.elm_centre
         in_elem = in_box(elm_x,elm_y,elm_z,xlim[1],xlim[0],ylim[1],ylim[0],zlim[1],zlim[0])#find inside of limits 
-        temp_con_mat = np.array(self.con_matrix,dtype='int64')#temporary connection matrix which is just the elements inside the box
-        con_mat=list(temp_con_mat[:,in_elem]) # truncate connection matrix
         
-        new_attr_cache = self.attr_cache.copy()
         new_attr = np.array(self.cell_attributes)
         
-        elm_id = np.array(self.elm_id)
-        elm_area = np.array(self.elm_area)
-
-        #truncate the attribute table down to the inside elements 
-        for key in self.attr_cache.keys():
-            X = np.array(self.attr_cache[key])
-            new_attr_cache[key] = X[in_elem]
-        
-        self.con_matrix = con_mat
-        self.attr_cache = new_attr_cache
-        self.num_elms = len(con_mat[0])
+        self.connection = self.connection[in_elem] # truncate connection matrix
+        self.attr_cache = self.attr_cache.take(in_elem) #truncate the attribute table down to the inside elements 
+        self.num_elms = self.connection.shape[0]
         self.cell_attributes = new_attr[in_elem]
-        self.elm_id = elm_id[in_elem]
-        self.elm_area = elm_area[in_elem]
-        new_elm_centre = [[],[],[]]
-        new_elm_centre[0] = elm_x[in_elem]
-        new_elm_centre[1] = elm_y[in_elem]
-        new_elm_centre[2] = elm_z[in_elem]
-        self.elm_centre = new_elm_centre
+        self.elm_id = self.elm_id[in_elem]
+        self.elm_area = self.elm_area[in_elem]
+        self._elm_centre = self._elm_centre[in_elem]
+        self._elm_tree = None
+        self._faces = None
+        self._boundary = None
+        self._adjacency = None
+        self._locate = None
         
         
     def write_dat(self,file_path='mesh.dat', param=None, zone=None):
@@ -1836,39 +2379,24 @@ class Mesh:
             if len(param) != self.num_elms:
                 raise IndexError("the number of parameters does not match the number of elements")
         
-        #write out elements         
+        #write out elements: element number, nodes, parameter, zone
         no_verts = self.type2VertsNo()
-        for i in range(self.num_elms):
-            elm_no=i+1
-            fid.write("%i "%elm_no)
-            [fid.write("%i "%(self.con_matrix[k][i]+1)) for k in range(no_verts)]
-            fid.write("%i %i\n"%(param[i],zone[i]))
+        elms = np.c_[1 + np.arange(self.num_elms), self.connection.astype(np.int64) + 1,
+                     np.asarray(param).astype(np.int64), np.asarray(zone).astype(np.int64)]
+        fid.write(_formatTable(' '.join(['%i']*(no_verts+3)) + '\n', elms))
     
         #now add nodes
-        x_coord = self.node_x
-        y_coord = self.node_y
-        z_coord = self.node_z
-        if self.ndims==3:
-            for i in range(self.num_nodes):
-                ni_no=i+1
-                fid.write("%i %6.3f %6.3f %6.3f\n"%#node number, x coordinate, y coordinate, z coordinate
-                          (ni_no,
-                           x_coord[i],
-                           y_coord[i],
-                           z_coord[i]))
+        node_no = 1 + np.arange(self.num_nodes)
+        if self.ndims==3: #node number, x coordinate, y coordinate, z coordinate
+            fid.write(_formatTable("%i %6.3f %6.3f %6.3f\n", np.c_[node_no, self.node]))
             fid.write('1')
-        else:
-            for i in range(self.num_nodes):
-                ni_no=i+1
-                fid.write("%i %6.3f %6.3f\n"%#node number, x coordinate, y coordinate
-                          (ni_no,
-                           x_coord[i],
-                           z_coord[i]))
+        else: #node number, x coordinate, y coordinate
+            fid.write(_formatTable("%i %6.3f %6.3f\n", np.c_[node_no, self.node_x, self.node_z]))
 
         fid.close()#close the file 
         print('written mesh.dat file to \n%s'%file_path)
 
-    def write_vtk(self,file_path="mesh.vtk", title=None):
+    def write_vtk(self,file_path="mesh.vtk", title=None, binary=False):
         """ Writes a vtk file for the mesh object, everything in the attr_cache
         will be written to file as attributes. We suggest using Paraview 
         to display the mesh outside of ResIPy. It's fast and open source :). 
@@ -1880,6 +2408,9 @@ class Mesh:
             will be written the current working directory. 
         title: string, optional
             Header string written at the top of the vtk file .
+        binary: bool, optional
+            If `True`, the legacy BINARY format is written (smaller and faster
+            to write and read than ASCII).
         """
         #formalities 
         if title == None:
@@ -1889,6 +2420,9 @@ class Mesh:
                 title = "output from resipy meshTools module"
         if not file_path.endswith('.vtk'):
             file_path +='.vtk'#append .vtk extension to end of file path if not there
+        if binary:
+            self._write_vtk_binary(file_path, title)
+            return
         #open file and write header information  
         fh = open(file_path,'w')
         fh.write("# vtk DataFile Version 3.0\n")
@@ -1905,10 +2439,11 @@ class Mesh:
         no_verts = self.type2VertsNo()
         no_readable = self.num_elms*(1+no_verts)
         fh.write("CELLS %i %i\n"%(self.num_elms,no_readable))
+        con_mat = self.connection.tolist()
         for i in range(self.num_elms):
             fh.write("%i\t"%no_verts)
             for k in range(no_verts):
-                fh.write("{}    ".format(self.con_matrix[k][i]))
+                fh.write("{}    ".format(con_mat[i][k]))
             fh.write("\n")
         #cell types
         fh.write("CELL_TYPES %i\n"%self.num_elms)
@@ -1925,6 +2460,84 @@ class Mesh:
         fh.write("POINT_DATA %i"%self.num_nodes)        
         fh.close()
     
+    def _vtk_points(self):
+        """Node coordinates as written in vtk files (there is no Z in 2D).
+        """
+        if self.ndims == 2:
+            return self.node[:,[0,2,1]]
+        return self.node
+    
+    def _write_vtk_binary(self, file_path, title):
+        """Writes a BINARY legacy vtk file (big endian), see `write_vtk()`.
+        """
+        no_verts = self.type2VertsNo()
+        with open(file_path, 'wb') as fh:
+            fh.write(("# vtk DataFile Version 3.0\n%s\nBINARY\nDATASET UNSTRUCTURED_GRID\n"%title).encode())
+            fh.write(("POINTS %i double\n"%self.num_nodes).encode())
+            fh.write(self._vtk_points().astype('>f8').tobytes())
+            fh.write(("\nCELLS %i %i\n"%(self.num_elms, self.num_elms*(1+no_verts))).encode())
+            fh.write(np.c_[np.full(self.num_elms, no_verts), self.connection].astype('>i4').tobytes())
+            fh.write(("\nCELL_TYPES %i\n"%self.num_elms).encode())
+            fh.write(np.full(self.num_elms, self.cell_type[0]).astype('>i4').tobytes())
+            fh.write(("\nCELL_DATA %i\n"%self.num_elms).encode())
+            for key in self.attr_cache:
+                fh.write(("SCALARS %s double 1\nLOOKUP_TABLE default\n"%key.replace(' ','_')).encode())
+                fh.write(np.asarray(self.attr_cache[key], dtype='>f8').tobytes())
+                fh.write(b"\n")
+            fh.write(("POINT_DATA %i"%self.num_nodes).encode())
+    
+    def write_vtu(self, file_path="mesh.vtu", compress=False):
+        """ Writes a XML unstructured grid (.vtu) file for the mesh object with
+        the data appended as raw binary, everything in the attr_cache will be
+        written to file as attributes.
+        
+        Parameters
+        ------------
+        file_path: string, optional
+            Maps where python will write the file.
+        compress: bool, optional
+            If `True`, the data are compressed with zlib (smaller files but
+            slower to write).
+        """
+        if not file_path.endswith('.vtu'):
+            file_path +='.vtu'
+        no_verts = self.type2VertsNo()
+        arrays = [('Float64', None, self._vtk_points().astype('<f8')),
+                  ('Int32', 'connectivity', self.connection.astype('<i4')),
+                  ('Int32', 'offsets', (np.arange(1, self.num_elms+1)*no_verts).astype('<i4')),
+                  ('UInt8', 'types', np.full(self.num_elms, self.cell_type[0], dtype='u1'))]
+        for key in self.attr_cache:
+            arrays.append(('Float64', key, np.asarray(self.attr_cache[key], dtype='<f8')))
+        
+        #appended data blocks and their offsets
+        blocks = [_vtuBlock(array, compress) for _, _, array in arrays]
+        offsets = np.r_[0, np.cumsum([len(b) for b in blocks])]
+        tags = []
+        for (typ, name, array), offset in zip(arrays, offsets):
+            tags.append('<DataArray type="%s"%s%s format="appended" offset="%i"/>'%(
+                typ, '' if name is None else ' Name=%s'%quoteattr(name),
+                ' NumberOfComponents="3"' if name is None else '', offset))
+        
+        compressor = ' compressor="vtkZLibDataCompressor"' if compress else ''
+        xml = ['<?xml version="1.0"?>',
+               '<VTKFile type="UnstructuredGrid" version="1.0" byte_order="LittleEndian" header_type="UInt64"%s>'%compressor,
+               '  <UnstructuredGrid>',
+               '    <Piece NumberOfPoints="%i" NumberOfCells="%i">'%(self.num_nodes, self.num_elms),
+               '      <Points>', '        ' + tags[0], '      </Points>',
+               '      <Cells>'] + ['        ' + t for t in tags[1:4]] + [
+               '      </Cells>',
+               '      <CellData>'] + ['        ' + t for t in tags[4:]] + [
+               '      </CellData>',
+               '    </Piece>',
+               '  </UnstructuredGrid>',
+               '  <AppendedData encoding="raw">',
+               '   _']
+        with open(file_path, 'wb') as fh:
+            fh.write('\n'.join(xml).encode())
+            for block in blocks:
+                fh.write(block)
+            fh.write(b'\n  </AppendedData>\n</VTKFile>\n')
+    
 
     def write_attr(self,attr_key,file_name='_res.dat',file_path='default'):
         """ Writes a attribute to a _res.dat type file. file_name entered
@@ -2137,12 +2750,13 @@ class Mesh:
         #First line: <# of tetrahedra> <nodes per tet. (4 or 10)> <region attribute (0 or 1)>
         fh.write('{:d}\t{:d}\t{:d}\n'.format(self.num_elms,self.type2VertsNo(),1))
         #Remaining lines list # of tetrahedra:<tetrahedron #> <node> <node> ... <node> [attribute]
+        con_mat = self.connection.tolist()
         for i in range(self.num_elms):
             line = '{:d}\t{:d}\t{:d}\t{:d}\t{:d}\t{:d}\n'.format((i+1),
-                                                         self.con_matrix[0][i]+1,#need to add one because of fortran indexing 
-                                                         self.con_matrix[1][i]+1,
-                                                         self.con_matrix[2][i]+1,
-                                                         self.con_matrix[3][i]+1,
+                                                         con_mat[i][0]+1,#need to add one because of fortran indexing 
+                                                         con_mat[i][1]+1,
+                                                         con_mat[i][2]+1,
+                                                         con_mat[i][3]+1,
                                                          zone[i])
             fh.write(line)
         fh.write('# exported from meshTools module in ResIPy electrical resistivity processing package')
@@ -2157,74 +2771,9 @@ class Mesh:
         print('done.')
         
         #write .face file - which describes elements on the outer edges of the mesh
-        
-        #todo this we need to find the elements on the outside of the mesh, idea
-        #is to find the elements with faces which are used only once. 
         print('Computing which elements lie on the edge of the mesh... ',end='')
-        tri_combo = np.zeros((self.num_elms,4),dtype='int64')
-        con_mat=self.con_matrix
-       
-        #first construct unique identifiers for each face in the mesh 
-        for i in range(self.num_elms):
-            idx1 = con_mat[0][i]#extract indexes 
-            idx2 = con_mat[1][i]
-            idx3 = con_mat[2][i]
-            idx4 = con_mat[3][i]
-            
-            # assign each face an organised and unique code
-            #sort face indexes 
-            face1s = sorted((idx2,idx3,idx4))
-            face2s = sorted((idx1,idx4,idx3))
-            face3s = sorted((idx1,idx2,idx4))
-            face4s = sorted((idx1,idx2,idx3))
-            face1t = [str(face1s[i]) for i in range(3)]
-            face2t = [str(face2s[i]) for i in range(3)]
-            face3t = [str(face3s[i]) for i in range(3)]
-            face4t = [str(face4s[i]) for i in range(3)]
-            face1 = int(''.join(face1t))
-            face2 = int(''.join(face2t))
-            face3 = int(''.join(face3t))
-            face4 = int(''.join(face4t))
-
-            tri_combo[i,0] = face1#face 1 
-            tri_combo[i,1] = face2#face 2 
-            tri_combo[i,2] = face3#face 3 
-            tri_combo[i,3] = face4#face 4 
-            
-        #shape = tri_combo.shape
-        tri_combof = tri_combo.flatten()#flattening the array means every 4th entry is in the 1st column of the original tri_combo
-        #find the unique values 
-        temp,index,counts = np.unique(tri_combof,return_index=True,return_counts=True)
-        #find faces which only appear once 
-        single_vals_idx = counts==1
-        edge_element_idx = index[single_vals_idx]/4
-        face_element_idx = np.floor(edge_element_idx)
-        face_probe = edge_element_idx - np.floor(edge_element_idx)
-        
-        truncated_numel = len(face_element_idx)
-        face_list = [0] * truncated_numel
-        
-        #construct 2d triangles (with nodes) from faces 
-        for i in range(truncated_numel):
-            ref = int(face_element_idx[i])
-            idx1 = con_mat[0][ref]
-            idx2 = con_mat[1][ref]
-            idx3 = con_mat[2][ref]
-            idx4 = con_mat[3][ref]
-            
-            face1 = (idx2,idx3,idx4)
-            face2 = (idx1,idx4,idx3)
-            face3 = (idx1,idx2,idx4)
-            face4 = (idx1,idx2,idx3)                     
-            
-            if face_probe[i] == 0: #if single_val_idx. == 0 >>> face1
-                face_list[i] = face1#face 1 
-            elif face_probe[i] == 0.25:#if single_val_idx. == 0.25 >>> face2
-                face_list[i] = face2#face 2
-            elif face_probe[i] == 0.5:#if single_val_idx. == 0.5 >>> face3
-                face_list[i] = face3#face 3 
-            elif face_probe[i] == 0.75:#if single_val_idx. == 0.75 >>> face4
-                face_list[i] = face4#face 4  
+        face_list, _, _ = self.boundary_faces() # faces used only once
+        truncated_numel = len(face_list)
         print('done.')    
         
         print('writing .face file... ',end='')
@@ -2247,29 +2796,8 @@ class Mesh:
         #out .neigh file
         #Here we want look for faces which share with another element. 
         print('Calculating neighbouring cells...', end='\n')            
-        #using variables from .face creation
-        double_vals_idx = counts==2
-        tri_comboft = temp[double_vals_idx]#flattened and truncated 
-        indext = index[double_vals_idx] # truncated indexes
-        neigh_array = np.ones((len(tri_combof),1),dtype='int64')*-1
-        
-        #apply correction for moving columns around
-        flatten_idx = np.zeros_like(tri_combo)
-        for i in range(self.num_elms):
-            flatten_idx[i,:] = i
-        
-        correction = flatten_idx.flatten()
-        
-        for i in range(len(tri_comboft)):
-            idx = np.argwhere(tri_combof == tri_comboft[i])
-            #idx should always return 2 values, we want the one which isn't the current index
-            curr_idx = indext[i]
-            neigh_idx = idx[idx!=curr_idx]
-        
-            neigh_array[curr_idx] = correction[neigh_idx]+1#look up neighbour index
-            
-        neigh_matrix = neigh_array.reshape((self.num_elms,4))
-            
+        neigh_matrix = self._faceNeighbours() + 1 # neighbour i is opposite to node i
+        neigh_matrix[neigh_matrix == 0] = -1
         print('done.')
         
         print('writing .neigh file... ',end='')
@@ -2288,7 +2816,7 @@ class Mesh:
         fh.close()
         print('done.')
                 
-    def meshLookUp(self,look_up_mesh):
+    def meshLookUp(self,look_up_mesh,max_dist=None):
         """Look up values from another mesh using nearest neighbour look up, 
         assign attributes to the current mesh class. 
         
@@ -2296,35 +2824,33 @@ class Mesh:
         -------------
         look_up_mesh: class
             Another mesh class. 
+        max_dist: float, optional
+            If given, elements further than `max_dist` from any element of 
+            `look_up_mesh` get NaN values.
         
         Notes
         -------------
-        This can fail for  large meshes due to the size of matrices involved. 
+        The look up uses the KD-tree of the element centres of `look_up_mesh`
+        (see `Mesh.elm_tree`).
         """
-        #assign coordinate arrays 
-        x_old = look_up_mesh.elm_centre[0]
-        x_new = self.elm_centre[0]
-        y_old = look_up_mesh.elm_centre[1]
-        y_new = self.elm_centre[1]
-        z_old = look_up_mesh.elm_centre[2]
-        z_new = self.elm_centre[2]
-        i_old = np.array(look_up_mesh.cell_attributes)
         #do look up 
-        i_new, idxes = interp.nearest3d(x_new,y_new,z_new,
-                                        x_old,y_old,z_old,i_old,
-                                        return_idx=True)
+        x_new, y_new, z_new = self.elm_centre
+        idxes = look_up_mesh.nearest_elm(x_new, y_new, z_new, max_dist=max_dist)
+        ifar = idxes == -1
         look_up_cache = look_up_mesh.attr_cache
         look_up_keys = look_up_cache.keys()
         for k in look_up_keys:
             look_up_array = np.array(look_up_cache[k])
+            if np.any(ifar): # -1 points to NaN
+                look_up_array = np.r_[look_up_array.astype(float if look_up_array.dtype.kind in 'biuf' else object), np.nan]
             self.attr_cache[k] = look_up_array[idxes]
             
     def trans_mesh(self,x,y,z):
         """Translate mesh 
         """
-        self.node_x = np.array(self.node_x)+x
-        self.node_y = np.array(self.node_y)+y
-        self.node_z = np.array(self.node_z)+z
+        self.node_x = self.node_x+x
+        self.node_y = self.node_y+y
+        self.node_z = self.node_z+z
                                  
 #%% triangle centriod 
 def tri_cent(p,q,r):
@@ -2352,306 +2878,464 @@ def tri_cent(p,q,r):
     Yc=r[1]+(k*(Ym-r[1]))
     return(Xc,Yc)
     
-#%% import a vtk file 
+#%% import a vtk file
+_vtkKeyword = re.compile(r'\n[ \t]*(?:POINTS|CELLS|CELL_TYPES|CELL_DATA|POINT_DATA|SCALARS|'
+                         r'LOOKUP_TABLE|FIELD|VECTORS|NORMALS|TENSORS|METADATA)\b')
+_vtkLookup = re.compile(r'[ \t]*LOOKUP_TABLE\b')
+
+def _vtkBlock(text, start, dtype=float):
+    """Parse the numbers from `start` to the next keyword line of a legacy
+    vtk file (whole block at once).
+
+    Returns
+    -------
+    values : numpy.ndarray
+        Values in the block.
+    end : int
+        Position of the next keyword line (or end of the text).
+    """
+    m = _vtkKeyword.search(text, start - 1) # keyword lines start after a newline
+    end = len(text) if m is None else m.start() + 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning) # block not fully parsed
+        values = np.fromstring(text[start:end], dtype=dtype, sep=' ')
+    return values, end
+
+def _vtkLine(text, keyword, start=0):
+    """Find the line starting with `keyword` in a legacy vtk file.
+
+    Returns
+    -------
+    tokens : list of str
+        Words of the line (None if the keyword is not found).
+    end : int
+        Position of the start of the next line.
+    """
+    m = re.compile(r'\n[ \t]*%s\b'%keyword).search(text, start - 1)
+    if m is None:
+        return None, start
+    end = text.find('\n', m.start() + 1)
+    end = len(text) if end == -1 else end + 1
+    return text[m.start():end].split(), end
+
+def _vtkCentre(node, connection):
+    """Element centres and areas (volumes in 3D) as computed by R2/R3t
+    utilities for triangles, quads (or tetrahedra), prisms and hexahedra.
+    """
+    X = node[:,0][connection]
+    Y = node[:,1][connection]
+    Z = node[:,2][connection]
+    vert_no = connection.shape[1]
+    if vert_no == 3:
+        #find the centriod of the element for triangles (see tri_cent)
+        k = 2/3
+        cx = X[:,2] + k*((X[:,0] + X[:,1])/2 - X[:,2])
+        cy = Y[:,2] + k*((Y[:,0] + Y[:,1])/2 - Y[:,2])
+        cz = np.zeros(len(cx))
+        #find area of element (for a triangle this is 0.5*base*height)
+        base = (((X[:,0]-X[:,1])**2) + ((Y[:,0]-Y[:,1])**2))**0.5
+        height = ((((X[:,0]+X[:,1])/2-X[:,2])**2) + (((Y[:,0]+Y[:,1])/2-Y[:,2])**2))**0.5
+        areas = 0.5*base*height
+    else:
+        #assuming element centres are the average of the vertices
+        cx, cy, cz = np.mean(X, axis=1), np.mean(Y, axis=1), np.mean(Z, axis=1)
+        if vert_no == 4: #finding element areas, base times height
+            areas = np.abs(X[:,1]-X[:,0])*np.abs(Y[:,1]-Y[:,2])
+        elif vert_no == 6: #estimate element VOLUMES, base area times height
+            base = (((X[:,0]-X[:,1])**2) + ((Y[:,0]-Y[:,1])**2))**0.5
+            height = ((((X[:,0]+X[:,1])/2-X[:,2])**2) + (((Y[:,0]+Y[:,1])/2-Y[:,2])**2))**0.5
+            areas = 0.5*base*height*np.abs(Z[:,4]-Z[:,0])
+        else:
+            areas = np.abs(X[:,1]-X[:,0])*np.abs(Y[:,0]-Y[:,2])*np.abs(Z[:,4]-Z[:,0])
+    return (cx, cy, cz), areas
+
+def _vtkCells(cells, no_elms):
+    """Connection matrix from the CELLS block of a legacy vtk file (number
+    of vertices followed by the vertices of each cell).
+
+    Returns
+    -------
+    connection : numpy.ndarray
+        Array of int with the vertices of each cell, only the cells with the
+        same number of vertices as the first one are kept.
+    ikeep : numpy.ndarray
+        Boolean array of the cells kept (None if all cells are kept).
+    """
+    vert_no = cells[0]
+    if vert_no not in [3, 4, 6, 8]:
+        raise ImportError("Unrecognised cell type with %i vertices"%vert_no)
+    if cells.size == no_elms*(vert_no+1) and np.all(cells[::vert_no+1] == vert_no):
+        return cells.reshape((no_elms, vert_no+1))[:,1:], None
+    offsets = np.zeros(no_elms, dtype=np.int64) # mixed cells
+    for i in range(1, no_elms):
+        offsets[i] = offsets[i-1] + cells[offsets[i-1]] + 1
+    ikeep = cells[offsets] == vert_no
+    return cells[offsets[ikeep][:,None] + np.arange(1, vert_no+1)[None,:]], ikeep
+
+def _vtkMesh(node, connection, ikeep, cell_type, attr_dict, file_path, title):
+    """Build a mesh object from the blocks read in a vtk file.
+    """
+    no_nodes = node.shape[0]
+    no_elms = connection.shape[0]
+    vert_no = connection.shape[1]
+    if ikeep is not None: # remove ignored cells
+        warnings.warn("WARNING: unkown cell type encountered!")
+        print("%i cells ignored in the vtk file"%np.sum(~ikeep))
+        if cell_type is not None and len(cell_type) == len(ikeep):
+            cell_type = cell_type[ikeep]
+        for key in attr_dict.keys():
+            if len(attr_dict[key]) == len(ikeep):
+                attr_dict[key] = attr_dict[key][ikeep]
+
+    #primary attribute defaults to the first attribute found
+    if len(attr_dict) > 0:
+        parameter_title = list(attr_dict.keys())[0]
+        values_oi = attr_dict[parameter_title]
+    else: #put in fail safe if no attributes are found
+        print("no cell attributes found in vtk file")
+        attr_dict = {"no attributes":np.full(no_elms, np.nan)}
+        values_oi= np.zeros(no_elms)
+        parameter_title = "n/a"
+
+    #compile some information
+    centriod, areas = _vtkCentre(node, connection)
+    if np.all(node[:,2] == 0):#then mesh is 2D and node y and node z, centriod y and centriod z columns need swapping so they work in mesh tools
+        node = node[:,[0,2,1]]
+        centriod = (centriod[0], centriod[2], centriod[1])
+
+    #information in a dictionary, this is easier to debug than an object in spyder:
+    mesh_dict = {'num_nodes':no_nodes,#number of nodes
+            'num_elms':no_elms,#number of elements
+            'node_x':node[:,0],#x coordinates of nodes
+            'node_y':node[:,1],#y coordinates of nodes
+            'node_z':node[:,2],#z coordinates of nodes
+            'node_id':np.arange(no_nodes),#node id number
+            'elm_id':np.arange(no_elms) + 1,#element id number
+            'num_elm_nodes':np.full(no_elms, vert_no),#number of points which make an element
+            'node_data':connection.T,#nodes of element vertices
+            'elm_centre':centriod,#centre of elements (x,y)
+            'elm_area':areas,#area of each element (or volume)
+            'cell_type':cell_type,
+            'parameters':values_oi,#the values of the attributes given to each cell
+            'parameter_title':parameter_title,
+            'cell_attributes':attr_dict,
+            'dict_type':'mesh_info',
+            'original_file_path':file_path}
+
+    mesh = Mesh.mesh_dict2class(mesh_dict)#convert to mesh object
+    try:
+        if mesh.ndims==2:
+            mesh.add_sensitivity(mesh.attr_cache['Sensitivity(log10)'])
+        else:
+            mesh.add_sensitivity(mesh.attr_cache['Sensitivity_map(log10)'])
+    except:
+        pass
+
+    mesh.mesh_title = title
+    return mesh
+
+# legacy vtk binary types (big endian)
+_vtkTypes = {'char':'>i1', 'unsigned_char':'>u1', 'short':'>i2', 'unsigned_short':'>u2',
+             'int':'>i4', 'unsigned_int':'>u4', 'long':'>i8', 'unsigned_long':'>u8',
+             'vtktypeint64':'>i8', 'vtktypeuint64':'>u8', 'float':'>f4', 'double':'>f8'}
+
+def _vtkBinaryLine(data, pos):
+    """Words of the next non empty line of a binary legacy vtk file and the
+    position of the line after it.
+    """
+    while pos < len(data):
+        end = data.find(b'\n', pos)
+        end = len(data) if end == -1 else end
+        line = data[pos:end].split()
+        pos = end + 1
+        if len(line) > 0:
+            return [l.decode() for l in line], pos
+    return [], pos
+
+def _vtkBinary(data):
+    """Read the blocks of a binary legacy vtk file (after the header).
+    """
+    def read(pos, typ, count):
+        dtype = np.dtype(_vtkTypes[typ])
+        return np.frombuffer(data, dtype=dtype, count=count, offset=pos), pos + count*dtype.itemsize
+
+    node, cells, cell_type = None, None, None
+    attr_dict = {}
+    no_elms = no_data = 0
+    line, pos = _vtkBinaryLine(data, 0)
+    while len(line) > 0:
+        if line[0] == 'POINTS':
+            node, pos = read(pos, line[2], 3*int(line[1]))
+            node = node.reshape((int(line[1]), 3)).astype(float)
+        elif line[0] == 'CELLS':
+            no_elms = int(line[1])
+            cells, pos = read(pos, 'int', int(line[2]))
+        elif line[0] == 'CELL_TYPES':
+            cell_type, pos = read(pos, 'int', int(line[1]))
+        elif line[0] in ['CELL_DATA', 'POINT_DATA']:
+            no_data = int(line[1])
+        elif line[0] == 'SCALARS':
+            ncomp = int(line[3]) if len(line) > 3 else 1
+            if data.startswith(b'LOOKUP_TABLE', pos):
+                lookup, pos = _vtkBinaryLine(data, pos)
+                if lookup[1] != "default":
+                    warnings.warn("unrecognised lookup table type")
+            values, pos = read(pos, line[2], ncomp*no_data)
+            attr_dict[line[1]] = values.astype(float)
+        else:
+            warnings.warn("%s not supported in binary vtk files, the rest of the file is ignored"%line[0])
+            break
+        line, pos = _vtkBinaryLine(data, pos)
+    return node, cells, no_elms, cell_type, attr_dict
+
 def vtk_import(file_path='mesh.vtk',parameter_title='default'):
     """
     Imports a mesh file into the python workspace, can have triangular, quad or tetraheral shaped elements.
-            
+
     Parameters
     ----------
     file_path : string, optional
         File path to mesh file. Note that a error will occur if the file format is not as expected.
     parameter_title : string, optional
-        Name of the parameter table in the vtk file, if left as default the first look up table found will be returned 
-        also note that all parameters will be imported. Just the title highlights which one the mesh object will use as 
-        default cell attribute. 
-            
+        Name of the parameter table in the vtk file, if left as default the first look up table found will be returned
+        also note that all parameters will be imported. Just the title highlights which one the mesh object will use as
+        default cell attribute.
+
     Returns
     -------
-    mesh : class 
-        a <pyR2> mesh class 
+    mesh : class
+        a <pyR2> mesh class
+
+    Notes
+    -----
+    Both ASCII and BINARY legacy files can be read. The POINTS, CELLS,
+    CELL_TYPES and SCALARS blocks are each parsed at once with numpy. If the
+    node coordinates cannot be split (fixed width columns without spaces),
+    they are read as 12 characters wide columns.
     """
-    if os.path.getsize(file_path)==0: # So that people dont ask me why you cant read in an empty file, throw up this error. 
+    if os.path.getsize(file_path)==0: # So that people dont ask me why you cant read in an empty file, throw up this error.
         raise ImportError("Provided mesh file is empty! Check that (c)R2/3t code has run correctly!")
     #open the selected file for reading
-    fid=open(file_path,'r')
-    #print("importing vtk mesh file into python workspace...")
+    fid=open(file_path,'rb')
     #read in header info and perform checks to make sure things are as expected
-    vtk_ver=fid.readline().strip()#read first line
+    vtk_ver=fid.readline().decode(errors='replace').strip()#read first line
     if vtk_ver.find('vtk')==-1:
         raise ImportError("Unexpected file type... ")
     elif vtk_ver.find('3.0')==-1:#not the development version for this code
         print("Warning: vtk manipulation code was developed for vtk datafile version 3.0, unexpected behaviour may occur in resulting mesh")
-    title=fid.readline().strip()#read line 2
-    format_type=fid.readline().strip()#read line 3
-    if format_type=='BINARY':
-        raise ImportError("expected ASCII type file format, not binary")
-    dataset_type=fid.readline().strip().split()#read line 4
+    title=fid.readline().decode(errors='replace').strip()#read line 2
+    format_type=fid.readline().decode().strip()#read line 3
+    dataset_type=fid.readline().decode().strip().split()#read line 4
     if dataset_type[1]!='UNSTRUCTURED_GRID':
         print("Warning: code is built to parse a vtk 'UNSTRUCTURED_GRID' data type not %s"%dataset_type[1])
-    
+    if format_type=='BINARY':
+        node, cells, no_elms, cell_type, attr_dict = _vtkBinary(fid.read())
+        fid.close()
+        if node is None or node.shape[0] == 0:
+            raise ImportError("No nodes in vtk file to import! Aborting... ")
+        if no_elms == 0:
+            raise ImportError("No elements in vtk file to import!")
+        connection, ikeep = _vtkCells(cells, no_elms)
+        return _vtkMesh(node, connection, ikeep, cell_type, attr_dict, file_path, title)
+    text = '\n' + fid.read().decode(errors='replace') # rest of the file, parsed by blocks
+    fid.close()
+
     #read node data
-    #print("importing mesh nodes...")
-    node_info=fid.readline().strip().split()#read line 5
-    try:
-        no_nodes=int(node_info[1])
-    except IndexError:#if we get this then there is a white space between the node info and header lines
-        node_info=fid.readline().strip().split()#read line 5
-        no_nodes=int(node_info[1])      
-    if no_nodes == 0: 
+    node_info, pos = _vtkLine(text, 'POINTS', 1)
+    no_nodes = 0 if node_info is None else int(node_info[1])
+    if no_nodes == 0:
         raise ImportError("No nodes in vtk file to import! Aborting... ")
-    #now read in node data
-    x_coord=[]#make lists for each of the relevant parameters for each node
-    y_coord=[]
-    z_coord=[]
-    node_num=[]
-    for i in range(no_nodes):
-        try:
-            coord_data=fid.readline().strip().split()
-            x_coord.append(float(coord_data[0]))
-            y_coord.append(float(coord_data[1]))
-            z_coord.append(float(coord_data[2]))
-        except:# ValueError:
-            coord_data=fid.readline()
-            x_coord.append(float(coord_data[0:12])) # retrive fixed width columns if cannot parse as split strings
-            y_coord.append(float(coord_data[12:24]))
-            z_coord.append(float(coord_data[24:36]))
-        node_num.append(i)
-    
+    node, end = _vtkBlock(text, pos)
+    if node.size != 3*no_nodes: # retrive fixed width columns if cannot parse as split strings
+        lines = [l for l in text[pos:end].splitlines() if l.strip() != '']
+        node = np.array([(l[0:12], l[12:24], l[24:36]) for l in lines[:no_nodes]], dtype=float)
+    node = node.reshape((no_nodes, 3))
+
     #now read in element data
-    #print("importing mesh element info...")
-    elm_info=fid.readline().strip().split()#read line with cell data
-    try:
-        no_elms=int(elm_info[1])
-    except IndexError: # quick bug fix
-        elm_info=fid.readline().strip().split()#read line with cell data
-        no_elms=int(elm_info[1])
-    
-    if no_elms ==0: 
+    elm_info, pos = _vtkLine(text, 'CELLS', end)
+    no_elms = 0 if elm_info is None else int(elm_info[1])
+    if no_elms ==0:
         raise ImportError("No elements in vtk file to import!")
-    
-    no_pts=[]#assign lists to nodes 
-    node1=[]
-    node2=[]
-    node3=[]
-    node4=[]
-    node5=[]
-    node6=[]
-    node7=[]
-    node8=[]
-    #node9=[]
-    elm_num=[]
-    centriod_x=[]#list will contain the centre points of elements 
-    centriod_y=[]
-    centriod_z=[]
-    areas=[]#areas of cells (might be useful in the future)
-    ignored_cells=0
-    #import element data ... expects triangles or quads 
-    for i in range(no_elms):
-        elm_data=fid.readline().strip().split()
-        if int(elm_data[0])==3:
-            if i==0:
-                #print("triangular elements detected")
-                vert_no=3
-            no_pts.append(int(elm_data[0]))
-            #nodes
-            node1.append(int(elm_data[1]))
-            node2.append(int(elm_data[2]))
-            node3.append(int(elm_data[3]))
-            elm_num.append(i+1)
-            #find the centriod of the element for triangles
-            n1=(x_coord[int(elm_data[1])],y_coord[int(elm_data[1])])#in vtk files the 1st element id is 0 
-            n2=(x_coord[int(elm_data[2])],y_coord[int(elm_data[2])])
-            n3=(x_coord[int(elm_data[3])],y_coord[int(elm_data[3])])
-            xy_tuple=tri_cent(n1,n2,n3)#actual calculation
-            centriod_x.append(xy_tuple[0])
-            centriod_y.append(xy_tuple[1])
-            #find area of element (for a triangle this is 0.5*base*height)
-            base=(((n1[0]-n2[0])**2) + ((n1[1]-n2[1])**2))**0.5
-            mid_pt=((n1[0]+n2[0])/2,(n1[1]+n2[1])/2)
-            height=(((mid_pt[0]-n3[0])**2) + ((mid_pt[1]-n3[1])**2))**0.5
-            areas.append(0.5*base*height)
-        elif int(elm_data[0])==4:
-            if i==0:
-                vert_no=4
-            no_pts.append(int(elm_data[0]))
-            #nodes
-            node1.append(int(elm_data[1]))
-            node2.append(int(elm_data[2]))
-            node3.append(int(elm_data[3]))
-            node4.append(int(elm_data[4]))
-            elm_num.append(i+1)
-            #assuming element centres are the average of the x - y coordinates for the quad
-            n1=(x_coord[int(elm_data[1])],y_coord[int(elm_data[1])],z_coord[int(elm_data[1])])#in vtk files the 1st element id is 0 
-            n2=(x_coord[int(elm_data[2])],y_coord[int(elm_data[2])],z_coord[int(elm_data[2])])
-            n3=(x_coord[int(elm_data[3])],y_coord[int(elm_data[3])],z_coord[int(elm_data[3])])
-            n4=(x_coord[int(elm_data[4])],y_coord[int(elm_data[4])],z_coord[int(elm_data[4])])
-            centriod_x.append(np.mean((n1[0],n2[0],n3[0],n4[0])))
-            centriod_y.append(np.mean((n1[1],n2[1],n3[1],n4[1])))
-            centriod_z.append(np.mean((n1[2],n2[2],n3[2],n4[2])))
-            #finding element areas, base times height.  
-            elm_len=abs(n2[0]-n1[0])#element length
-            elm_hgt=abs(n2[1]-n3[1])#element hieght
-            areas.append(elm_len*elm_hgt)
-        elif int(elm_data[0])==6: # this following code is getting silly in how long it is. Need to work on a more efficent way
-            if i==0:
-                vert_no=6
-            no_pts.append(int(elm_data[0]))
-            #nodes
-            node1.append(int(elm_data[1]))
-            node2.append(int(elm_data[2]))
-            node3.append(int(elm_data[3]))
-            node4.append(int(elm_data[4]))
-            node5.append(int(elm_data[5]))
-            node6.append(int(elm_data[6]))
-            #assuming element centres are the average of the x - y coordinates for the quad
-            n1=(x_coord[int(elm_data[1])],y_coord[int(elm_data[1])],z_coord[int(elm_data[1])])#in vtk files the 1st element id is 0 
-            n2=(x_coord[int(elm_data[2])],y_coord[int(elm_data[2])],z_coord[int(elm_data[2])])
-            n3=(x_coord[int(elm_data[3])],y_coord[int(elm_data[3])],z_coord[int(elm_data[3])])
-            n4=(x_coord[int(elm_data[4])],y_coord[int(elm_data[4])],z_coord[int(elm_data[4])])
-            n5=(x_coord[int(elm_data[5])],y_coord[int(elm_data[5])],z_coord[int(elm_data[5])]) 
-            n6=(x_coord[int(elm_data[6])],y_coord[int(elm_data[6])],z_coord[int(elm_data[6])])
-            centriod_x.append(np.mean((n1[0],n2[0],n3[0],n4[0],n5[0],n6[0])))
-            centriod_y.append(np.mean((n1[1],n2[1],n3[1],n4[1],n5[1],n6[1])))
-            centriod_z.append(np.mean((n1[2],n2[2],n3[2],n4[2],n5[2],n6[2])))
-            #estimate element VOLUMES, base area times height.  
-            base=(((n1[0]-n2[0])**2) + ((n1[1]-n2[1])**2))**0.5
-            mid_pt=((n1[0]+n2[0])/2,(n1[1]+n2[1])/2)
-            height=(((mid_pt[0]-n3[0])**2) + ((mid_pt[1]-n3[1])**2))**0.5
-            thick=abs(n5[2]-n1[2])#element hieght
-            areas.append(0.5*base*height*thick)
-        elif int(elm_data[0])==8: # this following code is getting silly in how long it is. Need to work on a more efficent way
-            if i==0:
-                vert_no=8
-            no_pts.append(int(elm_data[0]))
-            #nodes
-            node1.append(int(elm_data[1]))
-            node2.append(int(elm_data[2]))
-            node3.append(int(elm_data[3]))
-            node4.append(int(elm_data[4]))
-            node5.append(int(elm_data[5]))
-            node6.append(int(elm_data[6]))
-            node7.append(int(elm_data[7]))
-            node8.append(int(elm_data[8]))
-            #assuming element centres are the average of the x - y coordinates for the quad
-            n1=(x_coord[int(elm_data[1])],y_coord[int(elm_data[1])],z_coord[int(elm_data[1])])#in vtk files the 1st element id is 0 
-            n2=(x_coord[int(elm_data[2])],y_coord[int(elm_data[2])],z_coord[int(elm_data[2])])
-            n3=(x_coord[int(elm_data[3])],y_coord[int(elm_data[3])],z_coord[int(elm_data[3])])
-            n4=(x_coord[int(elm_data[4])],y_coord[int(elm_data[4])],z_coord[int(elm_data[4])])
-            n5=(x_coord[int(elm_data[5])],y_coord[int(elm_data[5])],z_coord[int(elm_data[5])]) 
-            n6=(x_coord[int(elm_data[6])],y_coord[int(elm_data[6])],z_coord[int(elm_data[6])])
-            n7=(x_coord[int(elm_data[7])],y_coord[int(elm_data[7])],z_coord[int(elm_data[7])])
-            n8=(x_coord[int(elm_data[8])],y_coord[int(elm_data[8])],z_coord[int(elm_data[8])])
-            centriod_x.append(np.mean((n1[0],n2[0],n3[0],n4[0],n5[0],n6[0],n7[0],n8[0])))
-            centriod_y.append(np.mean((n1[1],n2[1],n3[1],n4[1],n5[1],n6[1],n7[1],n8[1])))
-            centriod_z.append(np.mean((n1[2],n2[2],n3[2],n4[2],n5[2],n6[2],n7[2],n8[2])))
-            #estimate element VOLUMES, base area times height.  
-            elm_len=abs(n2[0]-n1[0])#element length
-            elm_width = abs(n1[1]-n3[1])
-            elm_thick=abs(n5[2]-n1[2])#element hieght
-            areas.append(elm_len*elm_width*elm_thick)
-            
-        else: 
-            warnings.warn("WARNING: unkown cell type encountered!")
-            ignored_cells+=1
-    #compile some information   
-    
-    if len(centriod_z)==0:#check if mesh is 2D 
-        centriod_z=[0]*len(centriod_x)
-    if sum(z_coord)==0:#then mesh is 2D and node y and node z, centriod y and centriod z columns need swapping so they work in mesh tools 
-        temp_y = y_coord
-        y_coord = z_coord
-        z_coord = temp_y
-        temp_y = centriod_y
-        centriod_y = centriod_z
-        centriod_z = temp_y
-    
-    centriod=(centriod_x,centriod_y,centriod_z)#centres of each element in form (x...,y...,z...)
-    if vert_no==3:
-        node_maps=(node1,node2,node3)
-    elif vert_no==4:
-        node_maps=(node1,node2,node3,node4)  
-    elif vert_no==6:
-        node_maps=(node1,node2,node3,node4,node5,node6)
-    elif vert_no==8:
-        node_maps=(node1,node2,node3,node4,node5,node6,node7,node8)
-        
-    if ignored_cells>0:
-        print("%i cells ignored in the vtk file"%ignored_cells)
-    
-    cell_attr_dump=fid.readlines()#reads the last portion of the file
-    #finished reading the file
-    
+    cells, end = _vtkBlock(text, pos, dtype=np.int32)
+    connection, ikeep = _vtkCells(cells, no_elms)
+
     #find cell types
-    for i,line_info in enumerate(cell_attr_dump):
-        if line_info.find("CELL_TYPES") == 0:
-            cell_type = [int(k) for k in cell_attr_dump[i+1].strip().split()]
-            break
-    
-    fid.close()
-    #print("reading cell attributes...")
-    # read through cell attributes to find the relevant parameter table?
-    
+    type_info, pos = _vtkLine(text, 'CELL_TYPES', end)
+    cell_type = None
+    if type_info is not None:
+        cell_type, end = _vtkBlock(text, pos, dtype=np.int32)
+
     #find scalar values in the vtk file
-    num_attr = 0
     attr_dict = {}
-    #found = False # boolian if we have found the parameter of interest
-    for i,line_info in enumerate(cell_attr_dump):
-        if line_info.find("SCALARS") == 0:
-            attr_title = line_info.split()[1]
-            #check look up table
-            if cell_attr_dump[i+1].split()[1] != "default":
+    scalars, pos = _vtkLine(text, 'SCALARS', end)
+    while scalars is not None:
+        #check look up table
+        if _vtkLookup.match(text, pos) is not None:
+            lookup, pos = _vtkLine(text, 'LOOKUP_TABLE', pos)
+            if lookup[1] != "default":
                 warnings.warn("unrecognised lookup table type")
-            values=[float(k) for k in cell_attr_dump[i+2].split()]
-            attr_dict[attr_title] = values
-            if num_attr ==0:# primary attribute defaults to the first attribute found
-                parameter_title = attr_title
-                values_oi = values
-            if attr_title == parameter_title:#then its the parameter of interest that the user was trying extract
-                #found = True
-                values_oi = values        
-            num_attr += 1
-    
-    #put in fail safe if no attributes are found        
-    if num_attr == 0:
-        print("no cell attributes found in vtk file")
-        attr_dict = {"no attributes":[float("nan")]*no_elms}
-        values_oi= [0]*no_elms
-        parameter_title = "n/a"
-        
-    #print("finished importing mesh.\n")
-    #information in a dictionary, this is easier to debug than an object in spyder: 
-    mesh_dict = {'num_nodes':no_nodes,#number of nodes
-            'num_elms':no_elms,#number of elements 
-            'node_x':x_coord,#x coordinates of nodes 
-            'node_y':y_coord,#y coordinates of nodes
-            'node_z':z_coord,#z coordinates of nodes 
-            'node_id':node_num,#node id number 
-            'elm_id':elm_num,#element id number 
-            'num_elm_nodes':no_pts,#number of points which make an element
-            'node_data':node_maps,#nodes of element vertices
-            'elm_centre':centriod,#centre of elements (x,y)
-            'elm_area':areas,#area of each element (or volume)
-            'cell_type':cell_type,
-            'parameters':values_oi,#the values of the attributes given to each cell 
-            'parameter_title':parameter_title,
-            'cell_attributes':attr_dict,
-            'dict_type':'mesh_info',
-            'original_file_path':file_path} 
+        attr_dict[scalars[1]], end = _vtkBlock(text, pos)
+        scalars, pos = _vtkLine(text, 'SCALARS', end)
+
+    return _vtkMesh(node, connection, ikeep, cell_type, attr_dict, file_path, title)
+
+#%% import a vtu file
+_vtuBlockSize = 2**15 # uncompressed size of the compressed blocks (same as VTK)
+
+def _vtuBlock(array, compress=False):
+    """Appended raw data of an array in a vtu file: UInt64 header with the
+    number of bytes followed by the data, or zlib compressed blocks.
+    """
+    raw = np.ascontiguousarray(array).tobytes()
+    if not compress:
+        return np.array([len(raw)], dtype='<u8').tobytes() + raw
+    comp = [zlib.compress(raw[i:i+_vtuBlockSize]) for i in range(0, len(raw), _vtuBlockSize)]
+    header = [len(comp), _vtuBlockSize, len(raw) % _vtuBlockSize] + [len(c) for c in comp]
+    return np.array(header, dtype='<u8').tobytes() + b''.join(comp)
+
+# xml vtk types
+_vtuTypes = {'Int8':'i1', 'UInt8':'u1', 'Int16':'i2', 'UInt16':'u2', 'Int32':'i4',
+             'UInt32':'u4', 'Int64':'i8', 'UInt64':'u8', 'Float32':'f4', 'Float64':'f8'}
+
+def vtu_import(file_path='mesh.vtu'):
+    """Imports a mesh from a XML unstructured grid (.vtu) file with the
+    data arrays appended as raw binary (optionally compressed with zlib,
+    as written by `Mesh.write_vtu()` and ParaView) or inlined as ascii.
+
+    Parameters
+    ----------
+    file_path : string, optional
+        File path to mesh file.
+
+    Returns
+    -------
+    mesh : class
+        a <pyR2> mesh class
+    """
+    with open(file_path, 'rb') as fh:
+        data = fh.read()
+    iappended = data.find(b'<AppendedData')
+    if iappended == -1:
+        root = ET.fromstring(data)
+    else:
+        root = ET.fromstring(data[:iappended] + b'</VTKFile>')
+        base = data.find(b'_', iappended) + 1 # start of the raw data
+    if root.get('type') != 'UnstructuredGrid':
+        raise ImportError("Expected a vtk 'UnstructuredGrid' file")
+    endian = '<' if root.get('byte_order', 'LittleEndian') == 'LittleEndian' else '>'
+    header = np.dtype(endian + _vtuTypes[root.get('header_type', 'UInt32')])
+    compressed = root.get('compressor') is not None
+    if compressed and root.get('compressor') != 'vtkZLibDataCompressor':
+        raise ImportError("Unsupported compressor %s"%root.get('compressor'))
+
+    def read(array):
+        dtype = np.dtype(endian + _vtuTypes[array.get('type')])
+        if array.get('format') == 'ascii':
+            return np.array(array.text.split(), dtype=dtype)
+        if array.get('format') != 'appended' or iappended == -1:
+            raise ImportError("Only appended raw or ascii data arrays can be read")
+        pos = base + int(array.get('offset'))
+        if compressed: # header: number of blocks, block size, last block size, compressed sizes
+            nblocks = int(np.frombuffer(data, dtype=header, count=1, offset=pos)[0])
+            sizes = np.frombuffer(data, dtype=header, count=nblocks, offset=pos + 3*header.itemsize).tolist()
+            pos += (3 + nblocks)*header.itemsize
+            raw = []
+            for size in sizes:
+                raw.append(zlib.decompress(data[pos:pos+size]))
+                pos += size
+            return np.frombuffer(b''.join(raw), dtype=dtype)
+        nbytes = int(np.frombuffer(data, dtype=header, count=1, offset=pos)[0])
+        return np.frombuffer(data, dtype=dtype, count=nbytes//dtype.itemsize, offset=pos + header.itemsize)
+
+    piece = root.find('UnstructuredGrid').find('Piece')
+    no_elms = int(piece.get('NumberOfCells'))
+    node = read(piece.find('Points').find('DataArray')).reshape((-1, 3)).astype(float)
+    cells = {}
+    for array in piece.find('Cells').findall('DataArray'):
+        cells[array.get('Name')] = read(array)
+    if node.shape[0] == 0:
+        raise ImportError("No nodes in vtu file to import! Aborting... ")
+    if no_elms == 0:
+        raise ImportError("No elements in vtu file to import!")
+
+    # connection matrix from connectivity and offsets (end of each cell)
+    offsets = cells['offsets'].astype(np.int64)
+    counts = np.diff(np.r_[0, offsets])
+    vert_no = counts[0]
+    if vert_no not in [3, 4, 6, 8]:
+        raise ImportError("Unrecognised cell type with %i vertices"%vert_no)
+    ikeep = counts == vert_no
+    connection = cells['connectivity'][(offsets[ikeep] - vert_no)[:,None] + np.arange(vert_no)[None,:]]
+    if np.all(ikeep):
+        ikeep = None
+    cell_type = cells['types'].astype(np.int32)
+
+    attr_dict = {}
+    if piece.find('CellData') is not None:
+        for array in piece.find('CellData').findall('DataArray'):
+            attr_dict[array.get('Name')] = read(array).astype(float)
+    title = os.path.splitext(os.path.basename(file_path))[0]
+    return _vtkMesh(node, connection.astype(np.int32), ikeep, cell_type, attr_dict, file_path, title)
+
+#%% import mesh from native .dat format
+def _formatTable(fmt, table, chunk=100000):
+    """Format a 2D array with the format `fmt` of one line, the lines are
+    formatted by blocks of `chunk` rows (one string formatting per block).
+    """
+    table = np.asarray(table)
+    out = []
+    for i in range(0, table.shape[0], chunk):
+        block = table[i:i+chunk]
+        out.append((fmt*block.shape[0])%tuple(block.ravel().tolist()))
+    return ''.join(out)
+
+def readMeshDat(file_path):
+    """Read mesh.dat or mesh3d.dat and returns elements and nodes.
     
-    mesh = Mesh.mesh_dict2class(mesh_dict)#convert to mesh object
-    try:
-        if mesh.ndims==2:
-            mesh.add_sensitivity(mesh.attr_cache['Sensitivity(log10)'])
-        else:
-            mesh.add_sensitivity(mesh.attr_cache['Sensitivity_map(log10)'])
-    except:
-        pass 
+    Parameters
+    ----------
+    file_path: str
+        Maps to the mesh (.dat) file.
     
-    mesh.mesh_title = title
-    return mesh
+    Returns
+    -------
+    elems: numpy.ndarray
+        Element table (element number, nodes, parameter, zone) as float.
+    nodes: numpy.ndarray
+        Node table (node number, x, (y), z) as float.
+    """
+    with open(file_path, 'r') as fh:
+        header = fh.readline().split()
+        first = fh.readline() # gives the number of columns of the elements
+        text = first + fh.read()
+    numel = int(header[0]) # number of elements 
+    numnp = int(header[1]) # number of nodes 
+    ncol = len(first.split())
+    nncol = 3 if len(header) == 2 else 4 # 3D mesh has a longer header
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning) # text after the nodes
+        values = np.fromstring(text, sep=' ')
+    elems = values[:numel*ncol].reshape((numel, ncol))
+    nodes = values[numel*ncol:numel*ncol + numnp*nncol].reshape((numnp, nncol))
+    return elems, nodes
+
+def writeMeshDat(fname, elems, nodes, extraHeader='', footer='1'):
+    """Write mesh.dat/mesh3d.dat provided elements and nodes at least.
+    """
+    numel = len(elems)
+    nnodes = len(nodes)
+    threed = nodes.shape[1] == 4 # it's a 3D mesh
+    if threed is True:
+        extraHeader = '\t1\t0\t4'
+    with open(fname, 'w') as f:
+        f.write('{:.0f} {:.0f}{}\n'.format(numel, nnodes, extraHeader))
+        f.write(_formatTable(' '.join(['%.0f']*elems.shape[1]) + '\n', elems))
+        if threed is True:
+            f.write(_formatTable('%.0f %f %f %f\n', nodes))
+            f.write(footer) # for 3D only
+        else:
+            f.write(_formatTable('%.0f %f %f\n', nodes))
 
-#%% import mesh from native .dat format
 def dat_import(file_path='mesh.dat'):
     """ Import R2/cR2/R3t/cR3t .dat kind of mesh. 
     
@@ -2667,80 +3351,44 @@ def dat_import(file_path='mesh.dat'):
     """
     if not isinstance(file_path,str):
         raise TypeError("Expected string type argument for 'file_path'")
-    fid=open(file_path,'r')#open file
-    #discover if the file is 2 or 3D 
-    header = fid.readline().split()
-    if len(header)==2: # its a 2D mesh 
-        flag_3d = False
-        npere = 3
-    else:
-        flag_3d = True
-        npere = int(header[-1])
-    numel = int(header[0]) # number of elements 
-    numnp = int(header[1]) # number of nodes 
-    #now read in element data
-    elm_no = [0]*numel # element number / index 
-    #allocate nodes
-    for i in range(npere):
-        exec('node%i = [0]*%i'%(i,numel))
-    node_map = np.array([[0]*numel]*npere,dtype=int)
-    zone = [0]*numel # mesh zone 
-    for i in range(numel):
-        line = fid.readline().split()#read in line data
-        elm_no[i] = int(line[0])
-        zone[i] = int(line[-1])
-        ref=1 # read through each node index 
-        if i==0 and not flag_3d and len(line)==7: # we have a special case of a quad mesh .dat file
-            npere=4
-        for j in range(npere):
-            #exec('node%i[i] = int(line[ref])-1'%j)
-            node_map[j][i]=int(line[ref])-1
-            ref += 1
-
+    elems, nodes = readMeshDat(file_path)
+    elems = elems.astype(int)
+    flag_3d = nodes.shape[1] == 4
+    numel = elems.shape[0] # number of elements 
+    numnp = nodes.shape[0] # number of nodes 
+    npere = elems.shape[1] - 3 # number of nodes per element (quad or triangle in 2D)
+    elm_no = elems[:,0] # element number / index 
+    zone = elems[:,-1] # mesh zone 
+    node_map = elems[:,1:1+npere] - 1
+    
     #read in nodes 
-    node_x = [0]*numnp
-    node_y = [0]*numnp
-    node_z = [0]*numnp
-    node_id = [0]*numnp
-    for i in range(numnp):
-        line = fid.readline().split()#read in line data
-        while len(line)==0: # then we have a space between elements and nodes 
-            line = fid.readline().split()#read in line data
-        node_id[i] = int(line[0])
-        node_x[i] = float(line[1])
-        if flag_3d:
-            node_y[i] = float(line[2])
-            node_z[i] = float(line[3])
-        else:
-            node_y[i] = float(0)
-            node_z[i] = float(line[2])
-    #iniate mesh class 
+    node_id = nodes[:,0].astype(int)
+    node_x = nodes[:,1]
+    if flag_3d:
+        node_y = nodes[:,2]
+        node_z = nodes[:,3]
+    else:
+        node_y = np.zeros(numnp)
+        node_z = nodes[:,2]
+    
     #compute each cell area and centriod 
-    areas = [0]*numel
-    centriod_x = [0]*numel
-    centriod_y = [0]*numel
-    centriod_z = [0]*numel
-    for i in range(numel):
-        if npere==3:
-            n1=(node_x[node_map[0][i]],node_z[node_map[0][i]])#in vtk files the 1st element id is 0 
-            n2=(node_x[node_map[1][i]],node_z[node_map[1][i]])
-            n3=(node_x[node_map[2][i]],node_z[node_map[2][i]])
-            xy_tuple=tri_cent(n1,n2,n3)#actual calculation
-            centriod_x[i] = xy_tuple[0]
-            centriod_z[i] = xy_tuple[1]
-            #find area of element (for a triangle this is 0.5*base*height)
-            base=(((n1[0]-n2[0])**2) + ((n1[1]-n2[1])**2))**0.5
-            mid_pt=((n1[0]+n2[0])/2,(n1[1]+n2[1])/2)
-            height=(((mid_pt[0]-n3[0])**2) + ((mid_pt[1]-n3[1])**2))**0.5
-            areas[i] = 0.5*base*height
-        else:
-            x_vec = [node_x[node_map[j][i]] for j in range(npere)]
-            y_vec = [node_y[node_map[j][i]] for j in range(npere)]
-            z_vec = [node_z[node_map[j][i]] for j in range(npere)]
-            centriod_x[i] = sum(x_vec)/npere
-            centriod_y[i] = sum(y_vec)/npere
-            centriod_z[i] = sum(z_vec)/npere
-            #dont compute area as it is not needed 
+    X = node_x[node_map]
+    Y = node_y[node_map]
+    Z = node_z[node_map]
+    if npere==3:
+        k = 2/3 # see tri_cent()
+        centriod_x = X[:,2] + k*((X[:,0] + X[:,1])/2 - X[:,2])
+        centriod_y = np.zeros(numel)
+        centriod_z = Z[:,2] + k*((Z[:,0] + Z[:,1])/2 - Z[:,2])
+        #find area of element (for a triangle this is 0.5*base*height)
+        base = (((X[:,0]-X[:,1])**2) + ((Z[:,0]-Z[:,1])**2))**0.5
+        height = ((((X[:,0]+X[:,1])/2-X[:,2])**2) + (((Z[:,0]+Z[:,1])/2-Z[:,2])**2))**0.5
+        areas = 0.5*base*height
+    else:
+        centriod_x = np.sum(X, axis=1)/npere
+        centriod_y = np.sum(Y, axis=1)/npere
+        centriod_z = np.sum(Z, axis=1)/npere
+        areas = np.zeros(numel) #dont compute area as it is not needed 
     
     #probe vtk cell type
     if flag_3d:
@@ -2761,7 +3409,7 @@ def dat_import(file_path='mesh.dat'):
                  node_z = node_z,#z coordinates of nodes 
                  node_id= node_id,#node id number 
                  elm_id=elm_no,#element id number 
-                 node_data=node_map,#nodes of element vertices
+                 node_data=node_map.T,#nodes of element vertices
                  elm_centre= (centriod_x,centriod_y,centriod_z),#centre of elements (x,y)
                  elm_area = areas,#area of each element
                  cell_type = [cell_type],#according to vtk format
@@ -3139,10 +3787,7 @@ def quad_mesh(elec_x, elec_z, elec_type = None, elemx=4, xgf=1.5, zf=1.1, zgf=1.
                     'no attribute')
     
     #find the node which the electrodes are actually on in terms of the mesh. 
-    node_in_mesh = [0]*len(elec_x)
-    for i in range(len(elec_x)):
-        sq_dist = (node_x - elec_x[i])**2 + (node_z - elec_z[i])**2 # find the minimum square distance
-        node_in_mesh[i] = np.argmin(sq_dist) # min distance should be zero, ie. the node index.
+    node_in_mesh = mesh.nearest_node(elec_x, None, elec_z) # min distance should be zero, ie. the node index.
             
     mesh.add_e_nodes(node_in_mesh) # add nodes to the mesh class
 
@@ -3164,9 +3809,155 @@ def quad_mesh(elec_x, elec_z, elec_type = None, elemx=4, xgf=1.5, zf=1.1, zgf=1.
 
 
 
+#%% mesh cache
+# the meshes produced by tri_mesh() and tetra_mesh() can be stored on disk
+# and reused when the same .geo file is meshed again, the cache is disabled
+# by default, enable it with setMeshCache()
+meshCacheDir = None # None means the cache is disabled
+meshCacheSize = 20 # maximum number of meshes kept, the least recently used are removed
+
+def setMeshCache(dirname=None, size=20):
+    """Enable the mesh cache.
+
+    Parameters
+    ----------
+    dirname : str, optional
+        Directory where the meshes are stored. Default is
+        `~/.resipy/meshCache`.
+    size : int, optional
+        Maximum number of meshes kept. When exceeded, the least recently
+        used meshes are deleted.
+    """
+    global meshCacheDir, meshCacheSize
+    if dirname is None:
+        dirname = os.path.join(os.path.expanduser('~'), '.resipy', 'meshCache')
+    os.makedirs(dirname, exist_ok=True)
+    meshCacheDir = dirname
+    meshCacheSize = size
+
+def disableMeshCache():
+    """Disable the mesh cache (the files on disk are kept).
+    """
+    global meshCacheDir
+    meshCacheDir = None
+
+def _hashValue(h, value):
+    """Update the hash `h` with a (nested) value of the mesh options.
+    """
+    if isinstance(value, dict):
+        for key in sorted(value, key=str):
+            h.update(repr(key).encode())
+            _hashValue(h, value[key])
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        h.update(('%s%s'%(value.dtype.str, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple, np.ndarray)):
+        h.update(('[%i'%len(value)).encode())
+        for v in value:
+            _hashValue(h, v)
+        h.update(b']')
+    else:
+        h.update(repr(value).encode())
+
+def _meshCacheKey(geo_file, ewd, **options):
+    """Key of a mesh in the cache: hash of the .geo file, of the gmsh
+    executables (size and modification time) and of the options used to
+    post-process the gmsh output.
+    """
+    h = hashlib.sha1()
+    with open(geo_file, 'rb') as fh:
+        h.update(fh.read())
+    for exe in ['gmsh.exe', 'gmsh_linux']: # version of gmsh
+        fname = os.path.join(ewd, exe)
+        if os.path.isfile(fname):
+            stat = os.stat(fname)
+            h.update(('%s %i %i'%(exe, stat.st_size, stat.st_mtime)).encode())
+    _hashValue(h, options)
+    return h.hexdigest()
+
+def _loadMeshCache(key, msh_file=None):
+    """Return the mesh stored under `key` in the cache (None if not found).
+    If `msh_file` is given, the .msh file produced by gmsh is written there.
+    """
+    if meshCacheDir is None:
+        return None
+    fname = os.path.join(meshCacheDir, key + '.npz')
+    if not os.path.isfile(fname):
+        return None
+    try:
+        with np.load(fname, allow_pickle=False) as data:
+            data = dict(data)
+    except (OSError, ValueError, KeyError): # corrupted file, mesh will be regenerated
+        return None
+    os.utime(fname) # most recently used
+    if msh_file is not None and 'msh' in data:
+        with open(msh_file, 'wb') as fh:
+            fh.write(data['msh'].tobytes())
+    node, connection = data['node'], data['connection']
+    mesh = Mesh(len(node), len(connection), node[:,0], node[:,1], node[:,2],
+                data['node_id'], data['elm_id'], connection.T, data['elm_centre'],
+                data['elm_area'], data['cell_type'].tolist(), data['cell_attributes'],
+                str(data['atribute_title']), str(data['original_file_path']),
+                data.get('regions'))
+    for name, values in zip(data['attr_names'], data['attr_values']):
+        mesh.add_attribute(values, str(name))
+    if 'e_nodes' in data:
+        mesh.add_e_nodes(data['e_nodes'])
+    mesh.surface = data.get('surface')
+    mesh.iremote = data.get('iremote')
+    return mesh
+
+def _storeMeshCache(key, mesh, msh=None):
+    """Store `mesh` (with its electrode nodes and surface) in the cache and
+    remove the least recently used meshes if the cache is full. `msh` is
+    the content of the .msh file produced by gmsh (optional).
+    """
+    if meshCacheDir is None:
+        return
+    data = {'node':mesh.node, 'connection':mesh.connection,
+            'node_id':mesh.node_id, 'elm_id':mesh.elm_id,
+            'elm_centre':np.array(mesh.elm_centre), 'elm_area':mesh.elm_area,
+            'cell_type':np.asarray(mesh.cell_type), 
+            'cell_attributes':np.asarray(mesh.cell_attributes),
+            'atribute_title':str(mesh.atribute_title),
+            'original_file_path':str(mesh.original_file_path)}
+    attr_names = [a for a, values in mesh.attr_cache.items() # float attributes only
+                  if np.asarray(values).shape == (mesh.num_elms,) and np.asarray(values).dtype.kind == 'f']
+    data['attr_names'] = np.array(attr_names, dtype=str)
+    data['attr_values'] = np.array([mesh.attr_cache[a] for a in attr_names], dtype=float).reshape((len(attr_names), mesh.num_elms))
+    for name in ['regions', 'e_nodes', 'surface', 'iremote']:
+        value = getattr(mesh, name, None)
+        if value is not None:
+            data[name] = np.asarray(value)
+    if msh is not None:
+        data['msh'] = np.frombuffer(msh, dtype=np.uint8)
+    try:
+        os.makedirs(meshCacheDir, exist_ok=True)
+        fname = os.path.join(meshCacheDir, key + '.npz')
+        with open(fname + '.tmp', 'wb') as fh:
+            np.savez(fh, **data)
+        os.replace(fname + '.tmp', fname)
+        # remove least recently used meshes
+        fnames = [os.path.join(meshCacheDir, f) for f in os.listdir(meshCacheDir) if f.endswith('.npz')]
+        fnames = sorted(fnames, key=os.path.getmtime)
+        for f in fnames[:max(0, len(fnames) - meshCacheSize)]:
+            os.remove(f)
+    except OSError as e: # cache not writable, not needed to create the mesh
+        warnings.warn('mesh could not be stored in the cache: %s'%e)
+
+def clearMeshCache():
+    """Remove all meshes from the mesh cache (see `meshCacheDir`).
+    """
+    if meshCacheDir is None or not os.path.isdir(meshCacheDir):
+        return
+    for f in os.listdir(meshCacheDir):
+        if f.endswith('.npz') or f.endswith('.tmp'):
+            os.remove(os.path.join(meshCacheDir, f))
+
 #%% build a triangle mesh - using the gmsh wrapper
 def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True, 
-             show_output=True, path='exe', dump=print, whole_space=False, **kwargs):
+             show_output=True, path='exe', dump=print, whole_space=False, 
+             cache=True, **kwargs):
     """ Generates a triangular mesh for r2. Returns mesh class ...
     this function expects the current working directory has path: exe/gmsh.exe.
     Uses gmsh version 3.0.6.
@@ -3199,6 +3990,11 @@ def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True,
     dump : function, optional
         Function to which pass the output during mesh generation. `print()` is
         the default.
+    cache : bool, optional
+        If `True` (default) and the mesh cache is enabled (see
+        `setMeshCache()`), the mesh is loaded from the cache if the same .geo
+        file was already meshed, in which case gmsh is not run (the cached
+        .msh file is written if `keep_files` is `True`).
     **kwargs : optional
         Key word arguments to be passed to genGeoFile. 
             
@@ -3256,6 +4052,18 @@ def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True,
         node_pos = gw.gen_2d_whole_space([elec_x,elec_z], geom_input = geom_input, 
                                          file_path=file_name,**kwargs)    
     
+    #look for the same mesh in the cache
+    if cache and meshCacheDir is not None:
+        key = _meshCacheKey(file_name+'.geo', ewd, mesh_type='tri_mesh', 
+                            node_pos=node_pos, elec_x=elec_x, elec_z=elec_z, elec_type=elec_type,
+                            surface=None if geom_input is None else geom_input.get('surface'))
+        mesh = _loadMeshCache(key, file_name+'.msh' if keep_files else None)
+        if mesh is not None:
+            print('mesh loaded from cache')
+            if keep_files is False: 
+                os.remove(file_name+".geo")
+            return mesh
+    
     # handling gmsh
     if platform.system() == "Windows":#command line input will vary slighty by system 
 #        cmd_line = ewd+'\gmsh.exe '+file_name+'.geo -2'
@@ -3286,6 +4094,10 @@ def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True,
         
     #convert into mesh.dat 
     mesh_dict = gw.msh_parse(file_path = file_name+'.msh') # read in mesh file
+    msh = None
+    if cache and meshCacheDir is not None: # stored with the mesh
+        with open(file_name+'.msh', 'rb') as fh:
+            msh = fh.read()
     mesh = Mesh.mesh_dict2class(mesh_dict) # convert output of parser into an object
     #mesh.write_dat(file_path='mesh.dat') # write mesh.dat - disabled as handled higher up in the R2 class 
     
@@ -3311,7 +4123,9 @@ def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True,
     surfacePoints = np.array([xsurf, zsurf]).T
     isort = np.argsort(xsurf)
     mesh.surface = surfacePoints[isort, :]
-
+    
+    if cache and meshCacheDir is not None:
+        _storeMeshCache(key, mesh, msh)
     
     return mesh#, mesh_dict['element_ranges']
 
@@ -3320,7 +4134,7 @@ def tri_mesh(elec_x, elec_z, elec_type=None, geom_input=None,keep_files=True,
 def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, interp_method = 'bilinear',
                surface_refinement = None, mesh_refinement = None,show_output=True, 
                path='exe', dump=print,whole_space=False, padding=20, search_radius = 10,
-               **kwargs):
+               cache=True, **kwargs):
     """ Generates a tetrahedral mesh for R3t (with topography). returns mesh3d.dat 
     in the working directory. This function expects the current working directory 
     has path: exe/gmsh.exe.
@@ -3366,6 +4180,12 @@ def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, int
     search_radius: float, None, optional
         Defines search radius used in the inverse distance weighting interpolation. 
         If None then no search radius will be used and all points will be considered in the interpolation. 
+    cache : bool, optional
+        If `True` (default) and the mesh cache is enabled (see
+        `setMeshCache()`), the mesh is loaded from the cache if the same .geo
+        file was already meshed with the same topography, in which case gmsh
+        is not run (the cached .msh file is written if `keep_files` is
+        `True`).
     **kwargs : optional
         Key word arguments to be passed to box_3d. 
             
@@ -3505,6 +4325,20 @@ def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, int
         
     else:
         node_pos = gw.box_3d([elec_x,elec_y,elec_z], file_path=file_name, **kwargs)
+    
+    #look for the same mesh in the cache
+    if cache and meshCacheDir is not None:
+        key = _meshCacheKey(file_name+'.geo', ewd, mesh_type='tetra_mesh', 
+                            node_pos=node_pos, elec=[elec_x, elec_y, elec_z],
+                            surf_elec=[surf_elec_x, surf_elec_y, surf_elec_z],
+                            surf=[surf_x, surf_y, surf_z], rem_elec_idx=rem_elec_idx,
+                            interp_method=interp_method, search_radius=search_radius)
+        mesh = _loadMeshCache(key, file_name+'.msh' if keep_files else None)
+        if mesh is not None:
+            print('mesh loaded from cache')
+            if keep_files is False: 
+                os.remove(file_name+".geo")
+            return mesh
             
     # handling gmsh
     if platform.system() == "Windows":#command line input will vary slighty by system 
@@ -3539,6 +4373,10 @@ def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, int
         
     #convert into mesh.dat
     mesh_dict = gw.msh_parse_3d(file_path = file_name+'.msh') # read in 3D mesh file
+    msh = None
+    if cache and meshCacheDir is not None: # stored with the mesh
+        with open(file_name+'.msh', 'rb') as fh:
+            msh = fh.read()
     mesh = Mesh.mesh_dict2class(mesh_dict) # convert output of parser into an object
     #mesh.write_dat(file_path='mesh.dat') # write mesh.dat - disabled as handled higher up in the R2 class 
     node_x = np.array(mesh.node_x)
@@ -3566,28 +4404,7 @@ def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, int
         nodez = np.zeros_like(node_x,dtype=float)
     print('done')
     
-    mesh.node_z = np.array(mesh.node_z) + nodez
-    node_z = mesh.node_z
-    #need to recompute cell centres as well as they will have changed. It's more efficient to recompute them rather than interpolate.
-    elm_x = np.array(mesh.elm_centre[0])
-    elm_y = np.array(mesh.elm_centre[1])
-    elm_z = np.array(mesh.elm_centre[2])
-    numel = mesh.num_elms
-    npere = 4
-    node1 = mesh.con_matrix[0]#indexes for node positions 
-    node2 = mesh.con_matrix[1]
-    node3 = mesh.con_matrix[2]
-    node4 = mesh.con_matrix[3]
-    for i in range(numel):
-        n1=(node_x[node1[i]],node_y[node1[i]],node_z[node1[i]])#define node coordinates
-        n2=(node_x[node2[i]],node_y[node2[i]],node_z[node2[i]])#we have to take 1 off here cos of how python indexes lists and tuples
-        n3=(node_x[node3[i]],node_y[node3[i]],node_z[node3[i]])
-        n4=(node_x[node4[i]],node_y[node4[i]],node_z[node4[i]])
-        elm_x[i] = sum((n1[0],n2[0],n3[0],n4[0]))/npere
-        elm_y[i] = sum((n1[1],n2[1],n3[1],n4[1]))/npere
-        elm_z[i] = sum((n1[2],n2[2],n3[2],n4[2]))/npere
-    
-    mesh.elm_centre = (elm_x, elm_y, elm_z)
+    mesh.node_z = np.array(mesh.node_z) + nodez # element centres are recomputed from the new nodes
 
     #check if remeote electrodes present, and insert them into the node position array
     if len(rem_elec_idx)>0: 
@@ -3599,6 +4416,9 @@ def tetra_mesh(elec_x,elec_y,elec_z=None, elec_type = None, keep_files=True, int
     #add nodes to mesh
     mesh.add_e_nodes(node_pos-1)#in python indexing starts at 0, in gmsh it starts at 1 
     
+    if cache and meshCacheDir is not None:
+        _storeMeshCache(key, mesh, msh)
+    
     return mesh
 
 #%% column mesh 
@@ -3794,7 +4614,7 @@ def dat_import_v1(file_path):
 #%% import a custom mesh, you must know the node positions 
 def custom_mesh_import(file_path, node_pos=None, flag_3D=False):
     """ 
-    Import user defined mesh, currently supports .msh, .vtk and .dat (native to R2/3t)
+    Import user defined mesh, currently supports .msh, .vtk, .vtu and .dat (native to R2/3t)
     format for quad, triangular and tetrahedral meshes. The type of file is guessed from the 
     extension given to the code. 
     
@@ -3821,6 +4641,8 @@ def custom_mesh_import(file_path, node_pos=None, flag_3D=False):
     path,ext = os.path.splitext(file_path)
     if ext == '.vtk':
         mesh = vtk_import(file_path)
+    elif ext == '.vtu':
+        mesh = vtu_import(file_path)
     elif ext == '.msh':
         if flag_3D:
             mesh_dict = gw.msh_parse_3d(file_path)
@@ -3832,7 +4654,7 @@ def custom_mesh_import(file_path, node_pos=None, flag_3D=False):
     elif ext == '.node':
         mesh = tetgen_import(file_path)
     else:
-        avail_ext = ['.vtk','.msh','.dat','.node / .exe']
+        avail_ext = ['.vtk','.vtu','.msh','.dat','.node / .exe']
         raise ImportError("Unrecognised file extension, available extensions are "+str(avail_ext))
     
     if node_pos is not None:
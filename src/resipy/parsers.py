@@ -13,6 +13,7 @@ Currently supports:
 import numpy as np
 import pandas as pd
 import os 
+import resipy.geomFactor as geomFactor
 
 #%% function to compute geometric factor - Jamyd91
 def geom_fac(C1,C2,P1,P2):
@@ -34,13 +35,11 @@ def geom_fac(C1,C2,P1,P2):
     k: float, np array
         geometric factor to convert transfer resistance into apparent resistivity 
     """
-    Rc1p1 = np.abs(C1 - P1)
-    Rc2p1 = np.abs(C2 - P1)
-    Rc1p2 = np.abs(C1 - P2)
-    Rc2p2 = np.abs(C2 - P2)
-    
-    denom = (1/Rc1p1) - (1/Rc2p1) - (1/Rc1p2) + (1/Rc2p2)
-    k = (2*np.pi)/denom
+    pos = np.column_stack(np.broadcast_arrays(*np.atleast_1d(C1, C2, P1, P2)))
+    xpos, array = np.unique(pos, return_inverse=True) # electrodes from positions
+    k = geomFactor.computeK(xpos, array.reshape(pos.shape) + 1)
+    if np.ndim(C1) == 0:
+        k = k[0]
     return k 
 
 #%% usual syscal parser
@@ -179,39 +178,6 @@ def protocolParser(fname):
 #protocolParser('api/test/protocol.dat')
 
 
-def protocolParserLME(fname):
-# read LME predicted errors passed back from R, only add LME predictions to df
-# Michael Tso @ 190310
-
-    with open(fname,'r') as fh:
-        num_meas = int(fh.readline().strip()) # read in first line - number of measurements 
-        dump = fh.readlines()
-    protocol = {'index':[0]*num_meas,# protocol dictionary 
-                'a':[0]*num_meas,
-                'b':[0]*num_meas,
-                'm':[0]*num_meas,
-                'n':[0]*num_meas,
-                'resist':[0]*num_meas,
-                'lmeErr':[0]*num_meas}
-
-    for i, line in enumerate(dump):
-        data = line.split()
-        protocol['index'][i] = int(data[0])
-        protocol['a'][i] = int(data[1])
-        protocol['b'][i] = int(data[2])
-        protocol['m'][i] = int(data[3])
-        protocol['n'][i] = int(data[4])
-        protocol['resist'][i] = float(data[5])
-        if len(data) == 7:
-            protocol['lmeErr'][i] = float(data[6])
-    lmeError = protocol['lmeErr']
-    
-    return lmeError
-
-# test code
-#protocolParserLME('api/test/protocol-lmeOut.dat')
-
-
 
 #def protocolParser2(fname): # with pandas = twice slower but same time if we use np.genfromtxt()
 #    colnames = np.array(['index','a','b','m','n','resist','appResist'])
@@ -6,11 +6,58 @@ Created on Tue Nov 14 16:05:59 2018
 @author: pmclachlan
 """
 import numpy as np
-import pandas as pd
+
+
+def _asList(*args):
+    """Convert the parameters of a sequence to lists of the same length
+    (a single int is a list of one element).
+    """
+    args = [list(np.atleast_1d(arg).astype(int)) for arg in args]
+    if len(set([len(arg) for arg in args])) > 1:
+        raise ValueError('All parameters of the sequence should have the same length.')
+    return args
+
+
+def _checkSpacing(a):
+    for a_ in a:
+        if a_ < 1:
+            raise ValueError('a must be >= 1, it\'s the electrode spacing between C and V pairs (a = 1 is the same as skip 0)')
+
+
+def _quad(A, B, M, N):
+    """Broadcast A, B, M, N and return them as a (n, 4) array.
+    """
+    A, B, M, N = np.broadcast_arrays(A, B, M, N)
+    return np.column_stack([A.ravel(), B.ravel(), M.ravel(), N.ravel()]).astype(np.int32)
+
+
+def _stack(quads, elec_num):
+    """Stack the quadrupoles and remove the ones with electrodes beyond
+    `elec_num`.
+    """
+    proto_mtrx = np.vstack(quads)
+    return proto_mtrx[(proto_mtrx <= elec_num).all(1)]
+
+
+def reciprocal(proto_mtrx):
+    ''' Reciprocal of a sequence (current and potential dipoles swapped).
+
+    Parameters
+    ----------
+    proto_mtrx : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n).
+
+    Returns
+    -------
+    recip : numpy.ndarray
+        Array of int32 with 4 columns (m, n, a, b).
+    '''
+    return np.asarray(proto_mtrx)[:,[2,3,0,1]].astype(np.int32)
+
 
 def dpdp1(elec_num, a, n):
     ''' Generates quadrupole matrix for dipole-dipole survey.
-    
+
     Parameters
     ----------
     elec_num : int
@@ -20,51 +67,32 @@ def dpdp1(elec_num, a, n):
         (a = 1 is the same as skip 0).
     n : int or list of int
         Quadrupole seperation in electrode spacing.
-    
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
+
     Notes
     -----
     Length of `a` should match `n`.
     '''
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        if a < 1:
-            raise ValueError('a must be >= 1, it\'s the electrode spacing between C and V pairs (a = 1 is the same as skip 0)')
-        n_ = np.array(range(0,n))+1
-        for j in np.array(range(0,len(n_))):
-            A = elec_id
-            B = A + a
-            M = B + n_[j] * a
-            N = M + a
-            if (j) == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if (j) > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-    
-    else:
-        for i in np.array(range(0,len(a))):
-            if a[i] < 1:
-                raise ValueError('a must be >= 1, it\'s the electrode spacing between C and V pairs (a = 1 is the same as skip 0)')
-            n_ = np.array(range(0,n[i]))+1
-            for j in np.array(range(0,len(n_))):
-                A = elec_id
-                B = A + a[i]
-                M = B + n_[j] * a[i]
-                N = M + a[i]
-                if (i + j) == 0:
-                    proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                if (i + j) > 0:
-                    new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    proto_mtrx = proto_mtrx.append(new_rows)
-    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,3] <= elec_num]
-    return proto_mtrx
+    a, n = _asList(a, n)
+    _checkSpacing(a)
+    A = np.arange(elec_num) + 1
+    quads = []
+    for a_, n_ in zip(a, n):
+        n_ = (np.arange(n_) + 1)[:,None] # one row per n
+        B = A + a_
+        M = B + n_ * a_
+        N = M + a_
+        quads.append(_quad(A, B, M, N))
+    return _stack(quads, elec_num)
 
 
 def dpdp2(elec_num, a, n):
     ''' Generates quadrupole matrix for dipole-dipole survey.
-    
+
     Parameters
     ----------
     elec_num : int
@@ -74,168 +102,107 @@ def dpdp2(elec_num, a, n):
         (a = 1 is the same as skip 0).
     n : int or list of int
         Quadrupole seperation in electrode spacing.
-    
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
+
     Notes
     -----
     Length of `a` should match `n`.
     '''
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        if a[0] < 1:
-            raise ValueError('a must be >= 1, it\'s the electrode spacing between C and V pairs (a = 1 is the same as skip 0)')
-        n_ = np.array(range(0,n))+1
-        for j in np.array(range(0,len(n_))):
-            A = elec_id
-            B = A + a
-            M = B + n_[j]
-            N = M + a
-            if (j) == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if (j) > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-    
-    else:
-        for i in np.array(range(0,len(a))):
-            if a[i] < 1:
-                raise ValueError('a must be >= 1, it\'s the electrode spacing between C and V pairs (a = 1 is the same as skip 0)')
-            n_ = np.array(range(0,n[i]))+1
-            for j in np.array(range(0,len(n_))):
-                A = elec_id
-                B = A + a[i]
-                M = B + n_[j]
-                N = M + a[i]
-                if (i + j) == 0:
-                    proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                if (i + j) > 0:
-                    new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    proto_mtrx = proto_mtrx.append(new_rows)
-    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,3] <= elec_num]
-    return proto_mtrx
+    a, n = _asList(a, n)
+    _checkSpacing(a)
+    A = np.arange(elec_num) + 1
+    quads = []
+    for a_, n_ in zip(a, n):
+        n_ = (np.arange(n_) + 1)[:,None]
+        B = A + a_
+        M = B + n_
+        N = M + a_
+        quads.append(_quad(A, B, M, N))
+    return _stack(quads, elec_num)
 
 
 def wenner(elec_num, n):
     ''' Generate quadrupoles matrix for Wenner alpha survey for a = 1 ... n.
     '''
-    seq = []
-    for a in np.arange(n) + 1:
-        seq.append(wenner_alpha(elec_num, a))
-    return pd.concat(seq).reset_index(drop=True)
-    
-    
+    return wenner_alpha(elec_num, list(np.arange(n) + 1))
+
+
 def wenner_alpha(elec_num, a):
     ''' Generates quadrupole matrix for Wenner alpha survey.
-    
+
     Parameters
     ----------
     elec_num : int
         Number of electrodes
     a : int or list of int
         Spacing between electrodes (in electrode spacing).
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
    '''
-    
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        A = elec_id
-        M = A + a
-        N = M + a
-        B = N + a
-        proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-    
-    else:
-        for i in np.array(range(0,len(a))):
-            A = elec_id
-            M = A + a[i]
-            N = M + a[i]
-            B = N + a[i]
-            if (i) == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if (i) > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-                    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return(proto_mtrx)
-    
-    
+    a = np.array(_asList(a)[0])[:,None] # one row per spacing
+    A = np.arange(elec_num) + 1
+    M = A + a
+    N = M + a
+    B = N + a
+    return _stack([_quad(A, B, M, N)], elec_num)
+
+
 def wenner_beta(elec_num, a):
     ''' Generates quadrupole matrix for Wenner beta survey.
-    
+
     Parameters
     ----------
     elec_num : int
         Number of electrodes
     a : int or list of int
         Spacing between electrodes (in electrode spacing).
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
    '''
-    
-    elec_id = np.arange(elec_num)+1
-    
-    if type(a) == int:
-        B = elec_id
-        A = B + a
-        M = A + a
-        N = M + a
-        proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-    
-    if type(a) == list:
-        for i in np.array(range(0,len(a))):
-            B = elec_id
-            A = B + a[i]
-            M = A + a[i]
-            N = M + a[i]
-            if (i) == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if (i) > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-                    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return(proto_mtrx)
-    
+    a = np.array(_asList(a)[0])[:,None]
+    B = np.arange(elec_num) + 1
+    A = B + a
+    M = A + a
+    N = M + a
+    return _stack([_quad(A, B, M, N)], elec_num)
+
 def wenner_gamma(elec_num, a):
     ''' Generates quadrupole matrix for Wenner gamma survey.
-    
+
     Parameters
     ----------
     elec_num : int
         Number of electrodes
     a : int or list of int
         Spacing between electrodes (in electrode spacing).
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
    '''
-    
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        A = elec_id
-        M = A + a
-        B = M + a
-        N = B + a
-        proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-    
-    else:
-        for i in np.array(range(0,len(a))):
-            A = elec_id
-            M = A + a[i]
-            B = M + a[i]
-            N = B + a[i]
-            if (i) == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if (i) > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-                    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return(proto_mtrx)
-    
-    
-    
+    a = np.array(_asList(a)[0])[:,None]
+    A = np.arange(elec_num) + 1
+    M = A + a
+    B = M + a
+    N = B + a
+    return _stack([_quad(A, B, M, N)], elec_num)
+
+
+
 def schlum1(elec_num, a, n):
     ''' Generates quadrupole matrix for Schlumberger survey.
-    
+
     Parameters
     ----------
     elec_num : int
@@ -243,44 +210,28 @@ def schlum1(elec_num, a, n):
     a : int or list of int
         Spacing between electrodes (in electrode spacing).
     n : int or list of int
-        Quadrupole seperation in electrode spacing. 
+        Quadrupole seperation in electrode spacing.
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
    '''
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        n_ = np.array(range(0,n))+1
-        for j in np.array(range(0,len(n_))):
-            A = elec_id
-            M = A + n_[j] * a
-            N = M + a
-            B = N + n_[j] * a
-            if j == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if j > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-                
-    else:
-        for i in np.array(range(0,len(a))):
-            n_ = np.array(range(0,n[i]))+1
-            for j in np.array(range(0,len(n_))):
-                A = elec_id
-                M = A + n_[j] * a[i]
-                N = M + a[i]
-                B = N + n_[j] * a[i]
-                if (i + j) == 0:
-                    proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                if (i + j) > 0:
-                    new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    proto_mtrx = proto_mtrx.append(new_rows)
-    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return(proto_mtrx)
-    
-    
+    a, n = _asList(a, n)
+    A = np.arange(elec_num) + 1
+    quads = []
+    for a_, n_ in zip(a, n):
+        n_ = (np.arange(n_) + 1)[:,None]
+        M = A + n_ * a_
+        N = M + a_
+        B = N + n_ * a_
+        quads.append(_quad(A, B, M, N))
+    return _stack(quads, elec_num)
+
+
 def schlum2(elec_num, a, n):
     ''' Generates quadrupole matrix for Schlumberger survey.
-    
+
     Parameters
     ----------
     elec_num : int
@@ -288,45 +239,28 @@ def schlum2(elec_num, a, n):
     a : int or list of int
         Spacing between electrodes (in electrode spacing).
     n : int or list of int
-        Quadrupole seperation in electrode spacing. 
+        Quadrupole seperation in electrode spacing.
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
    '''
-    
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        n_ = np.array(range(0,n))+1
-        for j in np.array(range(0,len(n_))):
-            A = elec_id
-            M = A + n_[j] * a
-            N = M + a
-            B = N + n_[j] * a
-            if j == 0:
-                proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-            if j > 0:
-                new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                proto_mtrx = proto_mtrx.append(new_rows)
-                
-    else:
-        for i in np.array(range(0,len(a))):
-            n_ = np.array(range(0,n[i]))+1
-            for j in np.array(range(0,len(n_))):
-                A = elec_id
-                M = A + n_[j] 
-                N = M + a[i]
-                B = N + n_[j] 
-                if (i + j) == 0:
-                    proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                if (i + j) > 0:
-                    new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    proto_mtrx = proto_mtrx.append(new_rows)
-    
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return proto_mtrx
-    
-    
+    a, n = _asList(a, n)
+    A = np.arange(elec_num) + 1
+    quads = []
+    for a_, n_ in zip(a, n):
+        n_ = (np.arange(n_) + 1)[:,None]
+        M = A + n_
+        N = M + a_
+        B = N + n_
+        quads.append(_quad(A, B, M, N))
+    return _stack(quads, elec_num)
+
+
 def multigrad(elec_num, a, n, s):
     ''' Genetrate measurement matrix for multigradient array Torleif Dahlin.
-    
+
     Parameters
     ----------
     elec_num : int
@@ -338,43 +272,90 @@ def multigrad(elec_num, a, n, s):
     s : int
         Seperation factor for current electrodes, should be the intermediate
         numbers.
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n).
     '''
-    elec_id = np.arange(elec_num)+1
-    
-    if isinstance(a, list) is False:
-        n_ = np.array(range(0, n))+1
-        s_ = np.array(range(0, s))+1
-        for j in np.array(range(0, len(n_))):
-            for k in np.array(range(0, len(s_))):
-                A = elec_id
-                B = A + s_[k] + 2
-                M = A + n_[j] * a
-                N = M + a
-                if (j + k) == 0:
-                    proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                if (j + k) > 0:
-                    new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    proto_mtrx = proto_mtrx.append(new_rows)
-                    
-    else:
-        for i in np.array(range(0,len(a))):
-            n_ = np.array(range(0, n[i]))+1
-            s_ = np.array(range(0, s[i]))+1
-            for j in np.array(range(0, len(n_))):
-                for k in np.array(range(0, len(s_))):
-                    A = elec_id
-                    B = A + s_[k] + 2
-                    M = A + n_[j] * a[i]
-                    N = M + a[i]
-                    if (i + j + k) == 0:
-                        proto_mtrx = pd.DataFrame(np.column_stack((A, B, M, N)))
-                    if (i + j + k) > 0:
-                        new_rows = pd.DataFrame(np.column_stack((A, B, M, N)))
-                        proto_mtrx = proto_mtrx.append(new_rows)
-                
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] > proto_mtrx.iloc[:,3]]          
-    proto_mtrx = proto_mtrx[proto_mtrx.iloc[:,1] <= elec_num]
-    return proto_mtrx    
+    a, n, s = _asList(a, n, s)
+    A = np.arange(elec_num) + 1
+    quads = []
+    for a_, n_, s_ in zip(a, n, s):
+        n_ = (np.arange(n_) + 1)[:,None,None] # shape (n, s, elec)
+        s_ = (np.arange(s_) + 1)[None,:,None]
+        B = A + s_ + 2
+        M = A + n_ * a_
+        N = M + a_
+        quads.append(_quad(A, B, M, N))
+    proto_mtrx = _stack(quads, elec_num)
+    return proto_mtrx[proto_mtrx[:,1] > proto_mtrx[:,3]]
+
+def _injections(seq, nchannels):
+    """Injection number (starting at 1) of each quadrupole of a sequence.
+    """
+    if nchannels < 1:
+        raise ValueError('The number of channels should be >= 1.')
+    new = np.r_[True, (seq[1:,0] != seq[:-1,0]) | (seq[1:,1] != seq[:-1,1])]
+    irun = np.cumsum(new) - 1 # group of consecutive quadrupoles with the same current
+    pos = np.arange(len(seq)) - np.flatnonzero(new)[irun] # position in the group
+    injection = np.cumsum(pos % nchannels == 0) # a new injection when the channels are full
+    return pos, injection
+
+
+def countInjections(proto_mtrx, nchannels=10):
+    ''' Number of current injections needed to measure a sequence in its
+    order. Consecutive quadrupoles sharing the same current dipole are
+    measured during the same injection, up to `nchannels` at a time.
+
+    Parameters
+    ----------
+    proto_mtrx : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n).
+    nchannels : int, optional
+        Number of channels of the instrument.
+
+    Returns
+    -------
+    ninj : int
+        Number of injections.
+    '''
+    _, injection = _injections(np.asarray(proto_mtrx), nchannels)
+    return int(injection[-1]) if len(injection) > 0 else 0
+
+
+def optimizeSequence(proto_mtrx, nchannels=10, swap=True):
+    ''' Reorder a sequence for a multichannel instrument. Quadrupoles are
+    grouped by current dipole and the potential dipoles of each group are
+    packed by `nchannels` so the sequence needs as few current injections as
+    possible.
+
+    Parameters
+    ----------
+    proto_mtrx : numpy.ndarray
+        Array of int with 4 columns (a, b, m, n).
+    nchannels : int, optional
+        Number of channels of the instrument (e.g. 10 for a Syscal Pro).
+    swap : bool, optional
+        If `True`, quadrupoles with a > b are measured as (b, a, n, m) (same
+        transfer resistance) so they can share the injection of (b, a).
+
+    Returns
+    -------
+    proto_mtrx : numpy.ndarray
+        Array of int32 with 4 columns (a, b, m, n), reordered.
+    injection : numpy.ndarray
+        Injection number of each quadrupole (starting at 1).
+    '''
+    seq = np.array(proto_mtrx, dtype=np.int32)
+    if swap:
+        iswap = seq[:,0] > seq[:,1]
+        seq[iswap] = seq[iswap][:,[1,0,3,2]]
+    isort = np.lexsort((seq[:,3], seq[:,2], seq[:,1], seq[:,0]))
+    seq = seq[isort]
+    _, injection = _injections(seq, nchannels)
+    return seq, injection
+
 
 # test code
 #x1 = dpdp1(24, 2, 8)
@@ -385,6 +366,8 @@ def multigrad(elec_num, a, n, s):
 #x6 = schlum1(24, 1, 10)
 #x7 = schlum2(24, 1, 10)
 #x8 = multigrad(24, 1, 10, 2)
+#x9 = reciprocal(x1)
+#x10, inj = optimizeSequence(x1, nchannels=10)
 
 
 
@@ -393,7 +376,7 @@ def multigrad(elec_num, a, n, s):
 #
 #N = 24
 #elecpos = np.linspace(0, 8, N)
-#quad = pd.concat([wenner_alpha(N, 1), wenner_alpha(N, 2)]).values
+#quad = np.vstack([wenner_alpha(N, 1), wenner_alpha(N, 2)])
 #array = np.sort(quad, axis=1)
 #
 #cmiddle = np.min([elecpos[array[:,0]-1], elecpos[array[:,1]-1]], axis=0) \
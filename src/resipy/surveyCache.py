@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of parsed survey files. Each entry is a numpy .npz
+archive where the columns of the survey dataframes are stored as contiguous
+blocks (one block per dtype), so repeated imports of the same file skip the
+text parsers, the default filtering and the reciprocal computation. Object
+columns are stored as strings so entries are loaded without unpickling.
+
+The cache is disabled by default, enable it with `setCache()`.
+"""
+import os, hashlib, glob, uuid
+import numpy as np
+import pandas as pd
+
+cacheDir = None # None means the cache is disabled
+cacheMaxSize = 500 # MB
+_version = None
+
+
+def setCache(dirname=None, maxSize=500):
+    """Enable the survey cache.
+
+    Parameters
+    ----------
+    dirname : str, optional
+        Directory where the cache is stored. Default is `~/.resipy/cache`.
+    maxSize : float, optional
+        Maximum size of the cache in MB. When exceeded, the least recently
+        used entries are deleted.
+    """
+    global cacheDir, cacheMaxSize
+    if dirname is None:
+        dirname = os.path.join(os.path.expanduser('~'), '.resipy', 'cache')
+    if os.path.exists(dirname) is False:
+        os.makedirs(dirname)
+    cacheDir = dirname
+    cacheMaxSize = maxSize
+
+
+def disableCache():
+    """Disable the survey cache (the files on disk are kept).
+    """
+    global cacheDir
+    cacheDir = None
+
+
+def clearCache():
+    """Delete all entries of the survey cache.
+    """
+    if cacheDir is not None:
+        for f in glob.glob(os.path.join(cacheDir, '*.npz')):
+            os.remove(f)
+
+
+def parserVersion():
+    """Return a hash of the code that produces the cached data (parsers and
+    Survey preprocessing) so the cache is invalidated when it changes.
+    """
+    global _version
+    if _version is None:
+        md5 = hashlib.md5()
+        dirname = os.path.dirname(os.path.realpath(__file__))
+        for f in ['parsers.py', 'Survey.py', 'surveyCache.py']:
+            with open(os.path.join(dirname, f), 'rb') as fh:
+                md5.update(fh.read())
+        _version = md5.hexdigest()
+    return _version
+
+
+def cacheKey(fname, ftype, spacing=None):
+    """Compute the cache key of a file.
+
+    Parameters
+    ----------
+    fname : str
+        Path of the survey file.
+    ftype : str
+        Type of file (parser used).
+    spacing : float, optional
+        Electrode spacing passed to the parser.
+
+    Returns
+    -------
+    key : str
+        Hexadecimal key.
+    """
+    fname = os.path.abspath(fname)
+    stat = os.stat(fname)
+    txt = '|'.join([fname, str(stat.st_mtime_ns), str(stat.st_size),
+                    str(ftype), str(spacing), parserVersion()])
+    return hashlib.md5(txt.encode()).hexdigest()
+
+
+def _str(values):
+    """Object array as unicode strings (ValueError if it holds other types).
+    """
+    values = np.asarray(values, dtype=object)
+    if not all(isinstance(v, str) for v in values.ravel()):
+        raise ValueError('object columns, column names and index can only contain strings')
+    return values.astype(str)
+
+
+def _df2arrays(df, prefix):
+    """Convert a dataframe to a dictionnary of arrays. Columns are grouped by
+    dtype into 2D blocks (one row per column) to limit the number of arrays.
+    Object columns (and index) are stored as unicode strings, a ValueError is
+    raised if they contain anything else (the dataframe is then not cached).
+    """
+    index = df.index.values
+    arrays = {prefix + 'columns': _str(df.columns),
+              prefix + 'index': _str(index) if index.dtype == object else index}
+    dtypes = np.array([d if isinstance(d, np.dtype) else np.dtype(object)
+                       for d in df.dtypes], dtype=object) # pandas extension types as object
+    for i, dtype in enumerate(pd.unique(dtypes)):
+        icols = np.where(dtypes == dtype)[0]
+        block = np.vstack([df.iloc[:,j].values for j in icols]).astype(dtype)
+        if dtype == object:
+            block = _str(block)
+        arrays['{:s}icols{:d}'.format(prefix, i)] = icols
+        arrays['{:s}block{:d}'.format(prefix, i)] = block
+    return arrays
+
+
+def _arrays2df(arrays, prefix):
+    """Build a dataframe from a dictionnary of arrays (see `_df2arrays()`).
+    """
+    columns = arrays[prefix + 'columns']
+    data = [None]*len(columns)
+    i = 0
+    while '{:s}icols{:d}'.format(prefix, i) in arrays:
+        block = arrays['{:s}block{:d}'.format(prefix, i)]
+        if block.dtype.kind == 'U': # strings back to object columns
+            block = block.astype(object)
+        for j, icol in enumerate(arrays['{:s}icols{:d}'.format(prefix, i)]):
+            data[icol] = block[j,:]
+        i += 1
+    index = arrays[prefix + 'index']
+    df = pd.DataFrame(dict(zip(range(len(columns)), data)),
+                      index=index.astype(object) if index.dtype.kind == 'U' else index)
+    df.columns = columns.astype(object)
+    return df
+
+
+def load(key):
+    """Load a cached survey.
+
+    Parameters
+    ----------
+    key : str
+        Key returned by `cacheKey()`.
+
+    Returns
+    -------
+    cached : dict or None
+        Dictionnary with `df`, `dfOrigin`, `elec`, `kFactor` and
+        `protocolIPFlag` or `None` if the entry is not in the cache.
+    """
+    if cacheDir is None:
+        return None
+    fname = os.path.join(cacheDir, key + '.npz')
+    if os.path.exists(fname) is False:
+        return None
+    try:
+        with np.load(fname, allow_pickle=False) as npz:
+            arrays = dict(npz)
+    except Exception as e: # corrupted entry
+        print('surveyCache: cannot read entry', key, e)
+        os.remove(fname)
+        return None
+    os.utime(fname) # most recently used
+    cached = {'df': _arrays2df(arrays, 'df_'),
+              'dfOrigin': _arrays2df(arrays, 'dfOrigin_'),
+              'elec': arrays['elec'],
+              'kFactor': float(arrays['kFactor']),
+              'protocolIPFlag': bool(arrays['protocolIPFlag'])}
+    return cached
+
+
+def save(key, df, dfOrigin, elec, kFactor=1, protocolIPFlag=False):
+    """Save a survey in the cache and evict the least recently used entries
+    if the cache is too large.
+
+    Parameters
+    ----------
+    key : str
+        Key returned by `cacheKey()`.
+    df : pandas.DataFrame
+        Processed dataframe (`Survey.df`).
+    dfOrigin : pandas.DataFrame
+        Unprocessed dataframe (`Survey.dfOrigin`).
+    elec : numpy.ndarray
+        Electrodes positions.
+    kFactor : float, optional
+        Factor to convert chargeability to phase.
+    protocolIPFlag : bool, optional
+        `True` if the IP data are already phase.
+    """
+    if cacheDir is None:
+        return
+    try:
+        arrays = _df2arrays(df, 'df_')
+        arrays.update(_df2arrays(dfOrigin, 'dfOrigin_'))
+    except ValueError as e: # cannot be stored without pickling
+        print('surveyCache: survey not cached,', e)
+        return
+    arrays['elec'] = np.asarray(elec)
+    arrays['kFactor'] = kFactor
+    arrays['protocolIPFlag'] = protocolIPFlag
+    fname = os.path.join(cacheDir, key + '.npz')
+    ftmp = os.path.join(cacheDir, key + '-' + uuid.uuid4().hex + '.tmp')
+    with open(ftmp, 'wb') as f: # write then rename so other processes never read half a file
+        np.savez(f, **arrays)
+    os.replace(ftmp, fname)
+    evict()
+
+
+def evict():
+    """Delete the least recently used entries until the cache size is below
+    `cacheMaxSize`.
+    """
+    if cacheDir is None:
+        return
+    fnames = glob.glob(os.path.join(cacheDir, '*.npz'))
+    stats = []
+    for f in fnames:
+        try:
+            st = os.stat(f)
+            stats.append((st.st_mtime, st.st_size, f))
+        except OSError: # deleted by another process
+            pass
+    stats.sort()
+    total = np.sum([s[1] for s in stats])
+    for mtime, size, f in stats:
+        if total <= cacheMaxSize*1e6:
+            break
+        try:
+            os.remove(f)
+        except OSError:
+            pass
+        total -= size
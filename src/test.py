@@ -97,6 +97,19 @@ k.fitErrorParabolaIP(index=2)
 
 timings['methods-error-modelling'] = time.time() - tstart
 
+#%% stacked time-lapse processing
+k = R2()
+k.createTimeLapseSurvey(testdir + 'ip-2d-timelapse-syscal/')
+stack = k.createSurveyStack()
+stack.filterRecip(percent=20)
+stack.filterAppResist()
+k.bigSurvey.fitErrorPwl()
+stack.computeError(k.bigSurvey.errorModel)
+stack.write2protocol(isurveys=[1,2], err=True, res0=True, common=True)
+stack.updateSurveys()
+
+timings['methods-stack'] = time.time() - tstart
+
 #%% mesh generation (will be tested in the cases)
 # 2D flat
 k = R2()
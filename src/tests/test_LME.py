@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the LME error model (run with `python -m pytest tests` from src/).
+"""
+import numpy as np
+from scipy import sparse
+from resipy.LME import fitLME, predictLME, _deviance, _groupIndex
+
+
+def simulate(nelec=24, n=4000, seed=0, random=False):
+    """Errors from a known model: 0.01 + 0.02*R + electrode effects (std
+    0.005) + noise (std 0.002).
+    """
+    rng = np.random.default_rng(seed)
+    if random:
+        array = rng.integers(1, nelec+1, (n, 4))
+    else: # dipole-dipole like
+        a = rng.integers(1, nelec-8, n)
+        m = a + rng.integers(2, 8, n)
+        array = np.c_[a, a+1, m, m+1]
+    effects = rng.normal(0, 0.005, (4, nelec+2))
+    x = rng.uniform(0.1, 10, n)
+    y = 0.01 + 0.02*x + np.sum([effects[k][array[:,k]] for k in range(4)], axis=0) \
+        + rng.normal(0, 0.002, n)
+    return array, x, y
+
+
+def designArgs(array, x, y):
+    levels = [np.unique(array[:,k]) for k in range(4)]
+    nlevels = np.array([len(lev) for lev in levels])
+    icol = _groupIndex(array, levels)
+    Z = sparse.csr_matrix((np.ones(icol.size), icol.flatten(), np.arange(0, icol.size+1, 4)),
+                          shape=(len(y), np.sum(nlevels)))
+    X = np.c_[np.ones(len(y)), x]
+    return (nlevels, Z.T.dot(Z).tocsr(), np.asarray(Z.T.dot(X)), Z.T.dot(y),
+            X.T.dot(X), X.T.dot(y), Z, X, y)
+
+
+def test_deviance_dense_reference():
+    # profiled deviance equals -2 log-likelihood of y ~ N(X beta, s2 (Z L L Z' + I))
+    array, x, y = simulate(nelec=12, n=300, random=True)
+    args = designArgs(array, x, y)
+    nlevels, Z, X = args[0], args[6], args[7]
+    for theta in [np.array([1., 1., 1., 1.]), np.array([0.5, 2., 0., 3.])]:
+        lam = np.repeat(theta, nlevels)
+        ZL = Z.toarray()*lam[None,:]
+        V = ZL.dot(ZL.T) + np.eye(len(y))
+        Vi = np.linalg.inv(V)
+        beta = np.linalg.solve(X.T.dot(Vi).dot(X), X.T.dot(Vi).dot(y))
+        r = y - X.dot(beta)
+        s2 = r.dot(Vi).dot(r)/len(y)
+        dev = np.linalg.slogdet(V)[1] + len(y)*(1 + np.log(2*np.pi*s2))
+        dev2, beta2 = _deviance(theta**2, *args, full=True)[:2]
+        assert np.isclose(dev, dev2, rtol=1e-10)
+        assert np.allclose(beta, beta2)
+
+
+def test_deviance_gradient():
+    for random in [False, True]: # sparse and dense factorization
+        args = designArgs(*simulate(random=random))
+        phi = np.array([0.5, 1.2, 2., 0.])
+        dev, grad = _deviance(phi, *args, grad=True)
+        h = 1e-6 # forward difference for the variance at the bound
+        fd = [(_deviance(phi + h*e, *args) - _deviance(np.maximum(phi - h*e, 0), *args))
+              /(h + min(h, phi[i])) for i, e in enumerate(np.eye(4))]
+        assert np.allclose(grad, fd, rtol=1e-4)
+
+
+def test_fitLME_estimates():
+    array, x, y = simulate(nelec=48, n=20000, random=True)
+    model = fitLME(array, x, y)
+    sigma = np.sqrt(model['sigma2'])
+    assert np.allclose(model['beta'], [0.01, 0.02], atol=[2e-3, 1e-4])
+    assert np.isclose(sigma, 0.002, rtol=0.05)
+    assert np.allclose(model['theta']*sigma, 0.005, rtol=0.3) # random effects std
+    assert np.allclose(predictLME(model, array, x), model['fitted'])
+    # unknown electrodes only get the fixed effect
+    assert np.isclose(predictLME(model, np.array([[99, 98, 97, 96]]), [1.])[0],
+                      model['beta'][0] + model['beta'][1])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the geometric factor (run with `python -m pytest tests` from src/).
+"""
+import os
+import numpy as np
+import pandas as pd
+from resipy import geomFactor
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def halfSpaceK(elec, array):
+    """Baseline formula (half-space for all electrodes)."""
+    def dist(i, j):
+        return np.sqrt(np.sum((elec[array[:,i]-1] - elec[array[:,j]-1])**2, axis=1))
+    AM, BM, AN, BN = dist(0, 2), dist(1, 2), dist(0, 3), dist(1, 3)
+    return 2*np.pi/((1/AM)-(1/BM)-(1/AN)+(1/BN))
+
+
+def test_wenner_reference():
+    elec = np.c_[np.arange(4.), np.zeros(4), np.zeros(4)]
+    array = np.array([[1, 4, 2, 3]])
+    assert np.allclose(geomFactor.computeK(elec, array), 2*np.pi)
+    buried = np.zeros(4, dtype=bool)
+    assert np.allclose(geomFactor.computeK(elec, array, buried=buried, image=True), 2*np.pi)
+    
+    # all buried: full space
+    buried = np.ones(4, dtype=bool)
+    assert np.allclose(geomFactor.computeK(elec, array, buried=buried), 2*np.pi)
+    assert np.allclose(geomFactor.computeK(elec, array, buried=buried, image=True), 4*np.pi)
+    
+    # Wenner at depth 1 below a surface electrode at z = 0 (images at z = 2)
+    elec = np.r_[elec - [0, 0, 1], [[10, 0, 0]]]
+    buried = np.r_[np.ones(4, dtype=bool), False]
+    s = 1 - 1/2 - 1/2 + 1 + 1/np.sqrt(5) - 1/np.sqrt(8) - 1/np.sqrt(8) + 1/np.sqrt(5)
+    K = geomFactor.computeK(elec, array, buried=buried, image=True)
+    assert np.allclose(K, 4*np.pi/s)
+
+
+def test_borehole_default():
+    df = pd.read_csv(os.path.join(testdir, 'dc-2d-borehole', 'elec.csv'))
+    elec = df[['x','y','z']].values.astype(float)
+    buried = df['buried'].values.astype(bool)
+    array = np.genfromtxt(os.path.join(testdir, 'dc-2d-borehole', 'protocol.dat'),
+                          skip_header=1)[:,1:5].astype(int)
+    K0 = halfSpaceK(elec, array)
+    assert np.allclose(geomFactor.computeK(elec, array), K0)
+    assert np.allclose(geomFactor.computeK(elec, array, buried=buried), K0)
+    K = geomFactor.computeK(elec, array, buried=buried, image=True)
+    assert np.all(np.isfinite(K))
+    assert not np.allclose(K, K0) # opt-in image method
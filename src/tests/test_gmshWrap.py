@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the gmsh wrapper (run with `python -m pytest tests` from src/).
+"""
+import os
+import numpy as np
+import pytest
+import resipy.gmshWrap as gw
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+mshdir = os.path.join(testdir, 'mesh', 'formats')
+
+
+@pytest.mark.parametrize('fname', ['square_2.2_binary.msh',
+                                   'square_4.1_ascii.msh',
+                                   'square_4.1_binary.msh'])
+def test_msh_read_formats(fname):
+    # same 2D mesh (2 lines, 8 triangles in 2 regions) saved in each format,
+    # the 4.1 files have their node blocks not sorted by tag
+    ref = gw.msh_read(os.path.join(mshdir, 'square_2.2_ascii.msh'))
+    msh = gw.msh_read(os.path.join(mshdir, fname))
+    assert np.array_equal(msh['node_id'], ref['node_id'])
+    assert np.allclose(msh['node'], ref['node'])
+    assert sorted(msh['elements']) == sorted(ref['elements']) == [1, 2]
+    for typ in ref['elements']:
+        for a, b in zip(msh['elements'][typ], ref['elements'][typ]):
+            assert np.array_equal(a, b)
+    assert np.array_equal(ref['elements'][2][1], [1, 1, 1, 1, 2, 2, 2, 2]) # physical
+    
+    # 2D parser built on top of it
+    mref = gw.msh_parse(os.path.join(mshdir, 'square_2.2_ascii.msh'))
+    m = gw.msh_parse(os.path.join(mshdir, fname))
+    assert m['num_elms'] == mref['num_elms'] == 8
+    assert np.array_equal(np.array(m['node_data']), np.array(mref['node_data']))
+    assert np.allclose(m['node_x'], mref['node_x'])
+    assert np.allclose(m['node_y'], mref['node_y'])
+    assert np.array_equal(m['parameters'], mref['parameters'])
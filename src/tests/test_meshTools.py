@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the mesh tools (run with `python -m pytest tests` from src/).
+"""
+import os
+import numpy as np
+import pytest
+import resipy.meshTools as mt
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def test_attributeStore_aliasing():
+    s = mt.AttributeStore(3)
+    s['a'] = np.array([1., 2., 3.])
+    s['b'] = np.zeros(3)
+    s['c'] = np.ones(3)
+    c = s['c']
+    with pytest.raises(ValueError): # read-only view
+        c[0] = 2
+    
+    # deleting and adding does not change the arrays returned before
+    del s['c']
+    s['g'] = np.ones(3)*5
+    assert np.all(c == 1)
+    assert 'c' not in s
+    
+    # same when assigning an existing attribute
+    a = s['a']
+    s['a'] = a*2
+    assert np.allclose(a, [1, 2, 3])
+    assert np.allclose(s['a'], [2, 4, 6])
+    
+    # grow the store beyond its capacity
+    b = s['b']
+    for i in range(20):
+        s['x%i'%i] = np.ones(3)*i
+    assert np.all(b == 0)
+    assert np.allclose(s['x7'], 7)
+    assert np.allclose(s['a'], [2, 4, 6])
+    assert np.allclose(s['g'], 5)
+    assert s._data.shape[0] < 2*len(s) + 4 # deleted rows are not kept
+    
+    # pop returns a writable copy
+    g = s.pop('g')
+    g[0] = 0
+    assert 'g' not in s
+    
+    # non-float attributes are kept as they are
+    s['zones'] = np.array([1, 1, 2])
+    assert s['zones'].dtype.kind == 'i'
+    s['zones'] = np.array([1., 1., 2.])
+    assert s['zones'].dtype.kind == 'f'
+
+
+def test_attributeStore_take():
+    s = mt.AttributeStore(4, attr_dict={'a':np.arange(4.), 'name':np.array(['w','x','y','z'])})
+    s2 = s.take(slice(1, 3)) # view of s
+    s3 = s.take(np.array([True, False, True, False]))
+    assert np.allclose(s2['a'], [1, 2])
+    assert np.allclose(s3['a'], [0, 2])
+    assert list(s3['name']) == ['w', 'y']
+    s2['a'] = np.array([9., 9.]) # does not write in s
+    s2['b'] = np.array([5., 5.])
+    assert np.allclose(s['a'], np.arange(4))
+    assert 'b' not in s
+    s4 = s.copy()
+    s4['a'] = np.zeros(4)
+    assert np.allclose(s['a'], np.arange(4))
+
+
+def test_meshCache(tmp_path, monkeypatch):
+    # no gmsh needed, the mesh is stored and loaded back directly
+    assert mt.meshCacheDir is None # disabled by default
+    monkeypatch.setattr(mt, 'meshCacheDir', None)
+    monkeypatch.setattr(mt, 'meshCacheSize', 20)
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    mesh.add_e_nodes(np.arange(5))
+    mt._storeMeshCache('a', mesh) # disabled, nothing written
+    assert mt._loadMeshCache('a') is None
+    
+    mt.setMeshCache(str(tmp_path), size=2)
+    assert mt._loadMeshCache('a') is None # miss
+    mt._storeMeshCache('a', mesh, msh=b'$MeshFormat\n')
+    fmsh = str(tmp_path / 'mesh.msh')
+    mesh2 = mt._loadMeshCache('a', msh_file=fmsh) # hit
+    assert mesh2.num_elms == mesh.num_elms
+    assert np.allclose(mesh2.node, mesh.node)
+    assert np.array_equal(mesh2.connection, mesh.connection)
+    assert np.array_equal(mesh2.e_nodes, mesh.e_nodes)
+    assert np.allclose(mesh2.attr_cache['res0'], mesh.attr_cache['res0'])
+    with open(fmsh, 'rb') as fh: # .msh file written back
+        assert fh.read() == b'$MeshFormat\n'
+    
+    # eviction of the least recently used mesh
+    os.utime(str(tmp_path / 'a.npz'), (0, 0))
+    mt._storeMeshCache('b', mesh)
+    os.utime(str(tmp_path / 'b.npz'), (1, 1))
+    mt._storeMeshCache('c', mesh)
+    assert mt._loadMeshCache('a') is None
+    assert mt._loadMeshCache('b') is not None
+    assert mt._loadMeshCache('c') is not None
+    mt.clearMeshCache()
+    assert mt._loadMeshCache('c') is None
+    mt.disableMeshCache()
+
+
+def test_elm_tree_after_moving_nodes():
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    mesh.nearest_elm([0], [0], [0]) # build the tree on the old centres
+    mesh.trans_mesh(100, 0, 0)
+    cx, cy, cz = [np.asarray(a)[:5] for a in mesh.elm_centre]
+    assert np.array_equal(mesh.nearest_elm(cx, cy, cz), np.arange(5))
+    mesh.node_z = mesh.node_z - 10
+    assert np.array_equal(mesh.nearest_elm(cx, cy, cz - 10), np.arange(5))
+
+
+def _linearField(node):
+    return 2*node[:,0] - 0.5*node[:,1] - 3*node[:,2] + 1
+
+
+def _checkLocate(mesh, points):
+    x, y, z = points.T
+    # element centres are in their own element
+    cx, cy, cz = [np.asarray(a) for a in mesh.elm_centre]
+    elm, weights = mesh.locate(cx, cy, cz)
+    assert np.array_equal(elm, np.arange(mesh.num_elms))
+    assert np.allclose(np.sum(weights, axis=1), 1)
+    
+    # linear field interpolated exactly from the nodes
+    elm, weights = mesh.locate(x, y, z)
+    assert np.all(elm >= 0)
+    values = mesh.probe(x, y, z, _linearField(mesh.node))
+    assert np.allclose(values, _linearField(points))
+    
+    # element values, points outside the mesh
+    mesh.add_attribute(np.arange(mesh.num_elms, dtype=float), 'index')
+    assert np.array_equal(mesh.probe(x, y, z, 'index'), elm)
+    far = np.max(np.abs(mesh.node)) + 1e3
+    elm, weights = mesh.locate([far], [far], [far])
+    assert elm[0] == -1 and np.all(np.isnan(weights))
+    assert np.isnan(mesh.probe([far], [far], [far], 'index')[0])
+
+
+def test_locate_probe_quad():
+    mesh = mt.quad_mesh(np.linspace(0, 10, 11), np.zeros(11), elec_type=['electrode']*11)[0]
+    rng = np.random.default_rng(0)
+    points = np.c_[rng.uniform(-20, 30, 500), np.zeros(500), rng.uniform(-30, -0.01, 500)]
+    _checkLocate(mesh, points)
+
+
+def test_locate_probe_tetra():
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    rng = np.random.default_rng(0)
+    points = np.c_[rng.uniform(-5, 50, 500), rng.uniform(-5, 5, 500), rng.uniform(-30, -0.01, 500)]
+    _checkLocate(mesh, points)
+
+
+def test_locate_after_moving_nodes():
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    cx, cy, cz = [np.asarray(a)[:50] for a in mesh.elm_centre]
+    elm, _ = mesh.locate(cx, cy, cz) # cache the look up and the tree
+    assert np.array_equal(elm, np.arange(50))
+    mesh.trans_mesh(100, 0, 0)
+    elm, _ = mesh.locate(cx + 100, cy, cz)
+    assert np.array_equal(elm, np.arange(50))
+    values = mesh.probe(cx + 100, cy, cz, _linearField(mesh.node))
+    assert np.allclose(values, _linearField(np.c_[cx + 100, cy, cz]))
+
+
+def test_probeResults(tmp_path):
+    from resipy.R2 import R2
+    k = R2(str(tmp_path), typ='R3t')
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    mesh.add_attribute(np.arange(mesh.num_elms, dtype=float), 'index')
+    mesh2 = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk')) # same geometry
+    mesh2.add_attribute(2*np.arange(mesh.num_elms, dtype=float), 'index')
+    k.meshResults = [mesh, mesh2]
+    cx, cy, cz = [np.asarray(a)[:10] for a in mesh.elm_centre]
+    values = k.probeResults(cx, cy, cz, attr='index')
+    assert values.shape == (2, 10)
+    assert np.allclose(values[0], np.arange(10))
+    assert np.allclose(values[1], 2*np.arange(10))
+    assert mesh2._locate is mesh._locate # look up shared
+
+
+def _bruteFaces(mesh):
+    """Elements (and local face number) sharing each face, with loops."""
+    table = mt._cellFaces[int(mesh.cell_type[0])]
+    faces = {}
+    for i, elm in enumerate(mesh.connection.tolist()):
+        for j, f in enumerate(table):
+            faces.setdefault(tuple(sorted(elm[k] for k in f)), []).append((i, j))
+    return faces
+
+
+def test_boundary_faces_tetra():
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    faces, elm, normals = mesh.boundary_faces()
+    brute = [v[0] for v in _bruteFaces(mesh).values() if len(v) == 1]
+    assert len(faces) == len(brute)
+    assert sorted(map(tuple, np.sort(faces, axis=1).tolist())) == sorted(
+        tuple(sorted(mesh.connection[i, mt._cellFaces[10][j]])) for i, j in brute)
+    assert np.all(np.isin(faces, mesh.connection[elm]).reshape(faces.shape))
+    
+    # outward unit normals, consistent with the order of the nodes
+    verts = mesh.node[faces]
+    centre = np.c_[[np.asarray(a) for a in mesh.elm_centre]].T
+    assert np.all(np.sum(normals*(np.mean(verts, axis=1) - centre[elm]), axis=1) > 0)
+    assert np.allclose(np.sqrt(np.sum(normals**2, axis=1)), 1)
+    cross = np.cross(verts[:,1] - verts[:,0], verts[:,2] - verts[:,0])
+    assert np.all(np.sum(cross*normals, axis=1) > 0)
+    
+    # divergence theorem: the closed boundary gives the volume of the mesh
+    vol = np.sum(np.sum(np.mean(verts, axis=1)*cross, axis=1))/6
+    tet = mesh.node[mesh.connection]
+    vtet = np.abs(np.sum(np.cross(tet[:,1] - tet[:,0], tet[:,2] - tet[:,0])*(tet[:,3] - tet[:,0]), axis=1))/6
+    assert np.isclose(vol, np.sum(vtet))
+
+
+def test_exportTetgenMesh(tmp_path):
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    prefix = str(tmp_path / 'mesh')
+    mesh.exportTetgenMesh(prefix)
+    face = np.genfromtxt(prefix + '.1.face', skip_header=1, comments='#').astype(int)
+    assert len(face) == len(mesh.boundary_faces()[0])
+    neigh = np.genfromtxt(prefix + '.1.neigh', skip_header=1, comments='#').astype(int)
+    assert neigh.shape == (mesh.num_elms, 5)
+    elm_id = neigh[:,0]
+    assert np.array_equal(elm_id, np.arange(1, mesh.num_elms + 1))
+    nb = neigh[:,1:]
+    assert np.sum(nb == -1) == len(face)
+    
+    # symmetric, neighbour i shares the face opposite to node i
+    ie, jf = np.nonzero(nb > 0)
+    other = nb[ie, jf] - 1
+    assert np.all(np.sum(nb[other] == (ie + 1)[:,None], axis=1) == 1)
+    con = mesh.connection
+    for i, j, k in zip(ie[:1000], jf[:1000], other[:1000]):
+        shared = set(con[i]) & set(con[k])
+        assert len(shared) == 3 and con[i, j] not in shared
+
+
+def _bruteComponents(nelm, pairs, elms):
+    """Label connected elements with a union find."""
+    parent = list(range(nelm))
+    def find(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+    for i, j in pairs:
+        if elms[i] and elms[j]:
+            parent[find(i)] = find(j)
+    return np.array([find(i) if elms[i] else -1 for i in range(nelm)])
+
+
+@pytest.mark.parametrize('typ', ['quad', 'tetra'])
+def test_adjacency(typ):
+    if typ == 'quad':
+        mesh = mt.quad_mesh(np.linspace(0, 10, 11), np.zeros(11), elec_type=['electrode']*11)[0]
+    else:
+        mesh = mt.vtk_import(os.path.join(testdir, 'mesh', 'mesh3D.vtk'))
+    faces = _bruteFaces(mesh)
+    nface = len(mt._cellFaces[int(mesh.cell_type[0])])
+    brute = [set() for i in range(mesh.num_elms)]
+    pairs = []
+    for v in faces.values():
+        assert len(v) <= 2
+        if len(v) == 2:
+            (i, _), (j, _) = v
+            brute[i].add(j)
+            brute[j].add(i)
+            pairs.append((i, j))
+    
+    indptr, indices = mesh.adjacency()
+    assert len(indptr) == mesh.num_elms + 1
+    for i in range(mesh.num_elms):
+        nb = mesh.neighbours(i)
+        assert len(nb) == len(brute[i]) and set(nb.tolist()) == brute[i]
+    assert np.array_equal(mesh.boundary_elms(), np.array([len(b) < nface for b in brute]))
+    
+    # connected components, compared as partitions
+    def same(labels, ref):
+        assert np.array_equal(labels == -1, ref == -1)
+        keep = ref != -1
+        _, a = np.unique(labels[keep], return_inverse=True)
+        _, b = np.unique(ref[keep], return_inverse=True)
+        assert len(set(zip(a, b))) == len(set(a)) == len(set(b))
+    allElms = np.ones(mesh.num_elms, dtype=bool)
+    labels = mesh.connected_components()
+    same(labels, _bruteComponents(mesh.num_elms, pairs, allElms))
+    assert np.all(labels == 0) # a single piece
+    cx, cy, cz = [np.asarray(a) for a in mesh.elm_centre]
+    mid, width = (cz.min() + cz.max())/2, (cz.max() - cz.min())/10
+    elms = np.abs(cz - mid) > width # a horizontal slice removed
+    labels = mesh.connected_components(elms)
+    assert np.max(labels) >= 1
+    same(labels, _bruteComponents(mesh.num_elms, pairs, elms))
+    assert np.array_equal(mesh.connected_components(np.flatnonzero(elms)), labels)
+
+
+def _smallMesh(typ):
+    """Small triangle, quad or tetrahedral mesh with non round coordinates."""
+    if typ == 'tri':
+        x, y = np.array([0, 1.25, 2.5, 0, 1.25, 2.5]), np.zeros(6)
+        z = np.array([0, 0.1, 0, -1.333, -1.2, -1.4])
+        con, cell_type = np.array([[0,3,4],[0,4,1],[1,4,5],[1,5,2]]), 5
+    elif typ == 'quad':
+        x, y = np.array([0, 0.5, 1.75, 0, 0.5, 1.75, 0, 0.5, 1.75]), np.zeros(9)
+        z = np.array([0, 0.05, 0.1, -0.5, -0.55, -0.6, -1.2345, -1.3, -1.4])
+        con, cell_type = np.array([[0,1,4,3],[1,2,5,4],[3,4,7,6],[4,5,8,7]]), 9
+    else:
+        cube = np.array([[0,0,0],[1,0,0],[1,1,0],[0,1,0],[0,0,1],[1,0,1],[1,1,1],[0,1,1]], dtype=float)
+        x, y, z = (cube*[1.2345, 2.5, -0.75] + [10.1, -3.3, 0.001]).T
+        con, cell_type = np.array([[0,1,2,6],[0,2,3,6],[0,3,7,6],[0,7,4,6],[0,4,5,6],[0,5,1,6]]), 10
+    n, e = len(x), len(con)
+    centre = [np.mean(a[con], axis=1) for a in (x, y, z)]
+    return mt.Mesh(n, e, x, y, z, np.arange(n) + 1, np.arange(e) + 1, con.T, centre,
+                   np.zeros(e), [cell_type], np.ones(e), 'zone')
+
+
+@pytest.mark.parametrize('typ', ['tri', 'quad', 'tetra'])
+def test_write_dat_golden(tmp_path, typ):
+    # golden files written by the loop based writers they replace
+    datdir = os.path.join(testdir, 'mesh', 'dat')
+    mesh = _smallMesh(typ)
+    e = mesh.num_elms
+    param, zone = np.r_[0, np.arange(e - 1) + 2], np.arange(e) % 2
+    for fname, kwargs in [(typ + '.dat', {}),
+                          (typ + '_zone.dat', {'param':param, 'zone':zone})]:
+        mesh.write_dat(str(tmp_path / fname), **kwargs)
+        with open(str(tmp_path / fname), 'rb') as f, open(os.path.join(datdir, fname), 'rb') as g:
+            assert f.read() == g.read()
+    
+    # read back, including quad and 3D files
+    elems, nodes = mt.readMeshDat(str(tmp_path / (typ + '_zone.dat')))
+    assert np.array_equal(elems[:,1:-2] - 1, mesh.connection)
+    assert np.array_equal(elems[:,-2], param) and np.array_equal(elems[:,-1], zone + 1)
+    m = mt.dat_import(str(tmp_path / (typ + '_zone.dat')))
+    assert m.num_elms == e and m.cell_type[0] == mesh.cell_type[0]
+    assert np.array_equal(m.connection, mesh.connection)
+    assert np.allclose(m.node, mesh.node, atol=5e-4) # 3 decimals
+    assert np.array_equal(m.attr_cache['zone'], zone + 1)
+
+
+def test_writeMeshDat_golden(tmp_path):
+    datdir = os.path.join(testdir, 'mesh', 'dat')
+    nodes = np.c_[np.arange(3) + 1, [0.5, 1.123456789, -2.], [0, -1, -2.25]]
+    nodes3 = np.c_[np.arange(4) + 1, [0.5, 1.123456789, -2., 0], [0, 1, 0, 0.5], [0, -1, -2.25, -3]]
+    for fname, elems, n in [('mesh_writeMeshDat.dat', np.array([[1, 1, 2, 3, 1, 1]]), nodes),
+                            ('mesh3d_writeMeshDat.dat', np.array([[1, 1, 2, 3, 4, 1, 1]]), nodes3)]:
+        mt.writeMeshDat(str(tmp_path / fname), elems, n)
+        with open(str(tmp_path / fname), 'rb') as f, open(os.path.join(datdir, fname), 'rb') as g:
+            assert f.read() == g.read()
+        e, nd = mt.readMeshDat(str(tmp_path / fname))
+        assert np.array_equal(e, elems) and np.allclose(nd, n, atol=1e-6)
+
+
+def _checkSameMesh(m, mesh):
+    assert m.num_elms == mesh.num_elms and m.num_nodes == mesh.num_nodes
+    assert int(m.cell_type[0]) == int(mesh.cell_type[0])
+    assert np.array_equal(m.connection, mesh.connection)
+    assert np.allclose(m.node, mesh.node)
+    for key in mesh.attr_cache:
+        assert np.allclose(np.asarray(m.attr_cache[key], dtype=float),
+                           np.asarray(mesh.attr_cache[key], dtype=float), equal_nan=True)
+
+
+@pytest.mark.parametrize('fname', ['mesh3D.vtk', 'f001.vtk'])
+def test_vtk_vtu_roundtrip(tmp_path, fname):
+    mesh = mt.vtk_import(os.path.join(testdir, 'mesh', fname))
+    rng = np.random.default_rng(0)
+    mesh.add_attribute(rng.normal(size=mesh.num_elms)*1e3, 'random')
+    mesh.add_attribute(np.r_[np.nan, np.arange(mesh.num_elms - 1.)], 'withNaN')
+    mesh.write_vtk(str(tmp_path / 'ascii.vtk'))
+    mesh.write_vtk(str(tmp_path / 'binary.vtk'), binary=True)
+    ascii = mt.vtk_import(str(tmp_path / 'ascii.vtk'))
+    binary = mt.vtk_import(str(tmp_path / 'binary.vtk'))
+    _checkSameMesh(binary, mesh)
+    assert np.array_equal(binary.attr_cache['random'], mesh.attr_cache['random']) # no rounding
+    assert sorted(binary.attr_cache.keys()) == sorted(ascii.attr_cache.keys())
+    for compress in [False, True]:
+        fvtu = str(tmp_path / ('mesh%i.vtu' % compress))
+        mesh.write_vtu(fvtu, compress=compress)
+        m = mt.vtu_import(fvtu)
+        _checkSameMesh(m, mesh)
+        assert np.array_equal(m.attr_cache['random'], mesh.attr_cache['random'])
+    assert os.path.getsize(str(tmp_path / 'mesh1.vtu')) < os.path.getsize(str(tmp_path / 'mesh0.vtu'))
+
+
+def test_vtk_vtu_roundtrip_quad(tmp_path):
+    mesh = mt.quad_mesh(np.linspace(0, 10, 11), np.zeros(11), elec_type=['electrode']*11)[0]
+    mesh.add_attribute(np.arange(mesh.num_elms, dtype=float), 'index')
+    mesh.write_vtk(str(tmp_path / 'binary.vtk'), binary=True)
+    _checkSameMesh(mt.vtk_import(str(tmp_path / 'binary.vtk')), mesh)
+    for compress in [False, True]:
+        mesh.write_vtu(str(tmp_path / 'mesh.vtu'), compress=compress)
+        _checkSameMesh(mt.vtu_import(str(tmp_path / 'mesh.vtu')), mesh)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the sequence generators (run with `python -m pytest tests` from src/).
+"""
+import numpy as np
+import pytest
+import resipy.protocol as protocol
+
+# sequences of the loop based generators (same order), without the
+# quadrupoles of wenner_beta and wenner_gamma with electrodes beyond elec_num
+expected = [
+    ('dpdp1', (8, 1, 3), [
+        [1, 2, 3, 4], [2, 3, 4, 5], [3, 4, 5, 6], [4, 5, 6, 7], [5, 6, 7, 8],
+        [1, 2, 4, 5], [2, 3, 5, 6], [3, 4, 6, 7], [4, 5, 7, 8], [1, 2, 5, 6],
+        [2, 3, 6, 7], [3, 4, 7, 8]]),
+    ('dpdp1', (8, [1, 2], [2, 1]), [
+        [1, 2, 3, 4], [2, 3, 4, 5], [3, 4, 5, 6], [4, 5, 6, 7], [5, 6, 7, 8],
+        [1, 2, 4, 5], [2, 3, 5, 6], [3, 4, 6, 7], [4, 5, 7, 8], [1, 3, 5, 7],
+        [2, 4, 6, 8]]),
+    ('dpdp2', (8, [1, 2], [2, 1]), [
+        [1, 2, 3, 4], [2, 3, 4, 5], [3, 4, 5, 6], [4, 5, 6, 7], [5, 6, 7, 8],
+        [1, 2, 4, 5], [2, 3, 5, 6], [3, 4, 6, 7], [4, 5, 7, 8], [1, 3, 4, 6],
+        [2, 4, 5, 7], [3, 5, 6, 8]]),
+    ('wenner', (8, 2), [
+        [1, 4, 2, 3], [2, 5, 3, 4], [3, 6, 4, 5], [4, 7, 5, 6], [5, 8, 6, 7],
+        [1, 7, 3, 5], [2, 8, 4, 6]]),
+    ('wenner_alpha', (8, [1, 2]), [
+        [1, 4, 2, 3], [2, 5, 3, 4], [3, 6, 4, 5], [4, 7, 5, 6], [5, 8, 6, 7],
+        [1, 7, 3, 5], [2, 8, 4, 6]]),
+    ('wenner_beta', (8, [1, 2]), [
+        [2, 1, 3, 4], [3, 2, 4, 5], [4, 3, 5, 6], [5, 4, 6, 7], [6, 5, 7, 8],
+        [3, 1, 5, 7], [4, 2, 6, 8]]),
+    ('wenner_gamma', (8, [1, 2]), [
+        [1, 3, 2, 4], [2, 4, 3, 5], [3, 5, 4, 6], [4, 6, 5, 7], [5, 7, 6, 8],
+        [1, 5, 3, 7], [2, 6, 4, 8]]),
+    ('schlum1', (8, 1, 2), [
+        [1, 4, 2, 3], [2, 5, 3, 4], [3, 6, 4, 5], [4, 7, 5, 6], [5, 8, 6, 7],
+        [1, 6, 3, 4], [2, 7, 4, 5], [3, 8, 5, 6]]),
+    ('schlum2', (8, [1], [2]), [
+        [1, 4, 2, 3], [2, 5, 3, 4], [3, 6, 4, 5], [4, 7, 5, 6], [5, 8, 6, 7],
+        [1, 6, 3, 4], [2, 7, 4, 5], [3, 8, 5, 6]]),
+    ('multigrad', (8, 1, 2, 2), [
+        [1, 4, 2, 3], [2, 5, 3, 4], [3, 6, 4, 5], [4, 7, 5, 6], [5, 8, 6, 7],
+        [1, 5, 2, 3], [2, 6, 3, 4], [3, 7, 4, 5], [4, 8, 5, 6], [1, 5, 3, 4],
+        [2, 6, 4, 5], [3, 7, 5, 6], [4, 8, 6, 7]]),
+]
+
+
+@pytest.mark.parametrize('name, args, table', expected)
+def test_generators(name, args, table):
+    proto_mtrx = getattr(protocol, name)(*args)
+    assert np.array_equal(proto_mtrx, np.array(table))
+    assert np.all(proto_mtrx <= args[0])
+
+
+def test_generators_int_list():
+    # a single int is the same as a list of one element
+    assert np.array_equal(protocol.dpdp2(8, 1, 2), protocol.dpdp2(8, [1], [2]))
+    assert np.array_equal(protocol.wenner_beta(8, 2), protocol.wenner_beta(8, [2]))
+    with pytest.raises(ValueError):
+        protocol.dpdp1(8, [1, 2], [2])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the Survey class (run with `python -m pytest tests` from src/).
+"""
+import os
+import numpy as np
+import pandas as pd
+from resipy.Survey import Survey, quadKey
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def test_quadKey_inplace_edit():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    key = s.getQuadKey()
+    assert np.array_equal(key, quadKey(s.df[['a','b','m','n']].values))
+    s.df.loc[s.df.index[0], 'a'] = 99 # edits in place are seen
+    s.df['n'] += 1
+    assert np.array_equal(s.getQuadKey(), quadKey(s.df[['a','b','m','n']].values))
+    assert not np.array_equal(s.getQuadKey(), key)
+
+
+def test_filter_undo_reset():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    df0 = s.df.copy()
+    n0 = len(df0)
+    s.filterRecip(percent=1)
+    n1 = len(s.df)
+    assert n1 < n0
+    s.filterData(np.arange(n1) % 2 == 0)
+    assert len(s.df) == (n1 + 1)//2
+    s.undoFilter()
+    assert len(s.df) == n1
+    s.resetFilters()
+    assert len(s.df) == n0
+    cols = ['a','b','m','n','resist','irecip','recipError','recipMean']
+    assert np.allclose(s.df[cols].values, df0[cols].values, equal_nan=True)
+    assert 'resError' in s.dfOrigin.columns
+    assert 'phaseError' in s.dfOrigin.columns
+
+
+def test_filter_unpair_undo():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    irecip0 = s.df['irecip'].values.copy()
+    ie = s.df['irecip'].values < 0 # remove all reciprocals
+    s.filterData(~ie)
+    assert np.all(s.df['irecip'].values == 0)
+    s.undoFilter()
+    assert np.array_equal(s.df['irecip'].values, irecip0)
+    
+    # reciprocal analysis redone on the filtered data is kept when undoing
+    s.filterData(~ie)
+    s.computeReciprocal()
+    s.df['resist'] *= 2 # modified after the filter
+    s.undoFilter()
+    assert np.array_equal(s.df['irecip'].values != 0, irecip0 != 0)
+    resist0 = s.dfReset['resist'].values
+    assert np.allclose(s.df['resist'].values[~ie], 2*resist0[~ie])
+    assert np.allclose(s.df['resist'].values[ie], resist0[ie])
+    for k in np.where(irecip0 > 0)[0][:10]:
+        j = np.where(irecip0 == -irecip0[k])[0][0]
+        assert np.isclose(np.abs(s.df['recipMean'].values[k]),
+                          (2*np.abs(resist0[k]) + np.abs(resist0[j]))/2)
+
+
+def test_assign_df_keep_filters():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    n0 = len(s.df)
+    s.filterRecip(percent=1)
+    n1 = len(s.df)
+    
+    # adding a column with a merge (as R2 does for time-lapse)
+    df0 = s.df[['a','b','m','n','resist']].rename(columns={'resist':'resist0'})
+    s.df = pd.merge(s.df, df0, on=['a','b','m','n'], how='left')
+    assert len(s.df) == n1
+    assert 'resist0' in s.df.columns
+    assert len(s.dfReset) == n0
+    
+    # a subset of the rows (as R2.computeModelError())
+    df = s.df[s.df['resist'] > np.median(s.df['resist'])].copy()
+    df['modErr'] = 0.01
+    s.df = df
+    assert len(s.df) == len(df)
+    s.undoFilter() # the subset is a filter
+    assert len(s.df) == n1
+    assert 'modErr' in s.df.columns
+    assert np.sum(np.isnan(s.df['modErr'])) == n1 - len(df)
+    
+    # a copy with the same rows (as R2.getInvError())
+    df = s.df.copy()
+    df['resInvError'] = 1.
+    s.df = df
+    s.resetFilters()
+    assert len(s.df) == n0
+    
+    # new measurements make a new base
+    s.df = pd.concat([s.df, s.df], ignore_index=True)
+    assert len(s.dfReset) == 2*n0
+
+
+def test_assign_df_sorted_undo():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    s.filterRecip(percent=1)
+    cols = ['resist','irecip','recipError','recipMean']
+    ref = s.df.copy()
+    s.df = s.df.sort_values('resist') # same rows, other order
+    s.undoFilter()
+    df = s.df
+    ie = pd.Index(quadKey(ref[['a','b','m','n']].values)).get_indexer(
+        quadKey(df[['a','b','m','n']].values))
+    assert np.all(ie >= 0)
+    assert np.allclose(df[cols].values, ref[cols].values[ie], equal_nan=True)
+
+
+def test_filter_ip_masks():
+    s = Survey(os.path.join(testdir, 'ip-2d', 'syscal.csv'), ftype='Syscal')
+    n0 = len(s.df)
+    s.filterNested()
+    a, b, m, n = [s.df[c].values for c in ['a','b','m','n']]
+    assert not np.any((m < b) & (m > a) | (n < b) & (n > a))
+    n1 = len(s.df)
+    assert s.filterDataIP.shape[0] == n1
+    s.filterRangeIP(0, 10)
+    ip = s.df['ip'].values*np.abs(s.kFactor)
+    assert len(s.df) < n1
+    assert np.all((ip > 0) & (ip < 10))
+    assert s.filterDataIP.shape[0] == len(s.df)
+    s.undoFilter()
+    assert len(s.df) == n1
+    s.undoFilter()
+    assert len(s.df) == n0
+
+
+def test_pseudo_cache():
+    import matplotlib.pyplot as plt
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    xpos, ypos = s.getPseudoPosition()
+    assert s.getPseudoPosition()[0] is xpos # cached
+    s.filterData(np.arange(len(s.df)) % 2 == 0)
+    xpos2, _ = s.getPseudoPosition()
+    assert len(xpos2) == len(s.df)
+    s.undoFilter()
+    assert np.allclose(s.getPseudoPosition()[0], xpos)
+    
+    # the collection is updated in place when plotting again on the same axis
+    fig, ax = plt.subplots()
+    s.showPseudo(ax=ax)
+    s.showPseudo(ax=ax, log=True, vmin=1, vmax=2)
+    coll = [c for c in ax.collections if c.get_gid() == 'pseudo']
+    assert len(coll) == 1
+    assert coll[0].get_clim() == (1, 2)
+    assert len(fig.axes) == 2 # axis and colorbar
+    assert ax.yaxis_inverted()
+    plt.close(fig)
+
+
+def test_computeK_cache():
+    s = Survey(os.path.join(testdir, 'dc-2d', 'syscal.csv'), ftype='Syscal')
+    s.computeK()
+    K = s.df['K'].values
+    s.df['K'] = 0 # not recomputed if nothing changed
+    s.computeK()
+    assert np.all(s.df['K'].values == 0)
+    s.filterData(np.arange(len(s.df)) % 2 == 0) # filters rebuild the dataframe
+    s.computeK()
+    assert np.allclose(s.df['K'].values, K[::2])
+    s.elec = s.elec*2 # new electrodes positions
+    s.computeK()
+    assert np.allclose(s.df['K'].values, 2*K[::2])
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of the on-disk survey cache (run with `python -m pytest tests` from src/).
+"""
+import os, sys, glob, shutil, time
+import numpy as np
+import pandas as pd
+import resipy.surveyCache as surveyCache
+from resipy.Survey import Survey
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def setup_cache(tmp_path, maxSize=500):
+    surveyCache.setCache(str(tmp_path / 'cache'), maxSize=maxSize)
+    return str(tmp_path / 'cache')
+
+
+def teardown_function(function):
+    surveyCache.disableCache()
+
+
+def test_cache_hit(tmp_path, monkeypatch):
+    cacheDir = setup_cache(tmp_path)
+    fname = str(tmp_path / 'syscal.csv')
+    shutil.copy(os.path.join(testdir, 'ip-2d', 'syscal.csv'), fname)
+    s1 = Survey(fname, ftype='Syscal')
+    assert len(glob.glob(os.path.join(cacheDir, '*.npz'))) == 1
+    # a hit does not call the parser
+    def fail(*args, **kwargs):
+        raise AssertionError('parser called on a cache hit')
+    monkeypatch.setattr(sys.modules['resipy.Survey'], 'syscalParser', fail)
+    s2 = Survey(fname, ftype='Syscal')
+    pd.testing.assert_frame_equal(s1.df, s2.df)
+    pd.testing.assert_frame_equal(s1.dfOrigin, s2.dfOrigin)
+    assert np.allclose(s1.elec, s2.elec)
+    assert s1.kFactor == s2.kFactor
+
+
+def test_cache_no_pickle(tmp_path):
+    cacheDir = setup_cache(tmp_path)
+    df = pd.DataFrame({'a':[1,2], 'b':[3.,4.], 'c':['x','y']})
+    surveyCache.save('k', df, df, np.zeros((2,3)))
+    with np.load(os.path.join(cacheDir, 'k.npz'), allow_pickle=False) as npz:
+        assert all(npz[f].dtype != object for f in npz.files)
+    cached = surveyCache.load('k')
+    pd.testing.assert_frame_equal(cached['df'], df)
+    # object columns with non strings are not cached
+    surveyCache.save('k2', df.assign(c=[1, 'y']), df, np.zeros((2,3)))
+    assert surveyCache.load('k2') is None
+
+
+def test_cache_invalidation(tmp_path):
+    setup_cache(tmp_path)
+    fname = str(tmp_path / 'syscal.csv')
+    shutil.copy(os.path.join(testdir, 'dc-2d', 'syscal.csv'), fname)
+    key = surveyCache.cacheKey(fname, 'Syscal')
+    Survey(fname, ftype='Syscal')
+    assert surveyCache.load(key) is not None
+    assert surveyCache.cacheKey(fname, 'Syscal', spacing=2) != key
+    with open(fname, 'a') as f: # file modified
+        f.write('\n')
+    os.utime(fname, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert surveyCache.cacheKey(fname, 'Syscal') != key
+
+
+def test_cache_lru_eviction(tmp_path):
+    cacheDir = setup_cache(tmp_path)
+    df = pd.DataFrame({'a':np.arange(10000), 'b':np.random.rand(10000)})
+    for i, key in enumerate(['k0', 'k1', 'k2']):
+        surveyCache.save(key, df, df, np.zeros((2,3)))
+        t = time.time() - 100 + i
+        os.utime(os.path.join(cacheDir, key + '.npz'), (t, t))
+    size = os.path.getsize(os.path.join(cacheDir, 'k0.npz'))
+    surveyCache.load('k0') # k0 becomes the most recently used
+    surveyCache.cacheMaxSize = 2.5*size/1e6
+    surveyCache.evict()
+    left = sorted(os.path.basename(f) for f in glob.glob(os.path.join(cacheDir, '*.npz')))
+    assert left == ['k0.npz', 'k2.npz']
+
+
+def test_cache_pool_spawn(tmp_path, monkeypatch):
+    import multiprocessing
+    import resipy.R2
+    R2mod = sys.modules['resipy.R2'] # the module, not the class
+    cacheDir = setup_cache(tmp_path)
+    fnames = []
+    for i in range(2):
+        fnames.append(str(tmp_path / ('syscal%i.csv' % i)))
+        shutil.copy(os.path.join(testdir, 'ip-2d', 'syscal.csv'), fnames[-1])
+    # spawned processes do not inherit the cache set in the main process
+    monkeypatch.setattr(R2mod, 'Pool', multiprocessing.get_context('spawn').Pool)
+    surveys = list(R2mod.parseSurveys(fnames, workers=2))
+    assert len(surveys) == 2
+    assert len(glob.glob(os.path.join(cacheDir, '*.npz'))) == 2
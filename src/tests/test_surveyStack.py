@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Unit tests of SurveyStack (run with `python -m pytest tests` from src/).
+"""
+import os
+import numpy as np
+import pandas as pd
+from resipy.Survey import Survey
+from resipy.SurveyStack import SurveyStack
+
+testdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def getSurveys():
+    dirname = os.path.join(testdir, 'ip-2d-timelapse-syscal')
+    return [Survey(os.path.join(dirname, f), ftype='Syscal')
+            for f in sorted(os.listdir(dirname))]
+
+
+def readBlocks(content):
+    """Split a multi-survey protocol into one dataframe per survey.
+    """
+    lines = content.splitlines()
+    blocks, i = [], 0
+    while i < len(lines):
+        n = int(lines[i])
+        rows = [l.split('\t') for l in lines[i+1:i+1+n]]
+        blocks.append(pd.DataFrame(rows).astype(float))
+        i += n + 1
+    return blocks
+
+
+def test_write2protocol_ip():
+    surveys = getSurveys()
+    for s in surveys:
+        s.fitErrorPwl()
+        s.fitErrorPwlIP()
+    stack = SurveyStack(surveys)
+    for i, s in enumerate(surveys):
+        stack.resError[i, stack.ipos[i]] = s.df['resError'].values
+        stack.phaseError[i, stack.ipos[i]] = s.df['phaseError'].values
+    blocks = readBlocks(stack.write2protocol(err=True, ip=True))
+    assert len(blocks) == len(surveys)
+    for s, block in zip(surveys, blocks):
+        ref = s.write2protocol(err=True, ip=True)
+        assert block.shape == ref.shape
+        # same quadrupoles and values, in the order of the stack index
+        ref = ref.sort_values(['a','b','m','n']).values[:,1:]
+        block = block.sort_values([1,2,3,4]).values[:,1:]
+        assert np.allclose(block, ref, equal_nan=True)
+
+
+def test_write2protocol_common_subset():
+    surveys = getSurveys()
+    stack = SurveyStack(surveys)
+    stack.mask[2,:] = False # last survey fully filtered
+    blocks = readBlocks(stack.write2protocol(isurveys=[0,1], common=True))
+    assert len(blocks[0]) == np.sum(stack.mask[0] & stack.mask[1])
+    assert len(blocks[0]) == len(blocks[1])
+
+
+def test_repeated_quadrupoles_averaged():
+    surveys = getSurveys()[:2]
+    s = surveys[0]
+    s.df = pd.concat([s.df, s.df.iloc[:3]], ignore_index=True)
+    s.df.loc[len(s.df)-3:, 'resist'] += 1
+    stack = SurveyStack(surveys)
+    assert stack.nrepeat[0] == 3
+    ipos = stack.ipos[0]
+    assert np.allclose(stack.resist[0, ipos[:3]], s.df['resist'].values[:3] + 0.5)
+    assert np.allclose(stack.resist[0, ipos[3:-3]], s.df['resist'].values[3:-3])
+    
+    # flags are not averaged
+    s.df.loc[len(s.df)-3:, 'irecip'] = -s.df['irecip'].values[:3] - 7
+    stack = SurveyStack(surveys)
+    ipos = stack.ipos[0]
+    assert np.array_equal(stack.irecip[0, ipos[:3]], s.df['irecip'].values[:3])
+    assert np.array_equal(stack.irecip[0, ipos], np.r_[s.df['irecip'].values[:-3],
+                                                       s.df['irecip'].values[:3]])
@@ -263,18 +263,25 @@ class MatplotlibWidget(QWidget):
         self.figure.axes[0].set_xlim(self.xlim)
         self.figure.axes[0].set_ylim(self.ylim)
 
-    def replot(self, threed=False, aspect=None, **kwargs):
-        self.figure.clear()
-        if threed is False:
-            ax = self.figure.add_subplot(111)
+    def replot(self, threed=False, aspect=None, reuse=False, **kwargs):
+        ''' if `reuse` is True, the callback draws on the current axis
+        instead of a new one (pseudo-sections are then updated in place)
+        '''
+        if reuse and threed is False and self.axis in self.figure.axes:
+            ax = self.axis
+            self.callback(ax=ax, **kwargs)
         else:
-            ax = self.figure.add_subplot(111, projection='3d')
-        self.axis = ax
-        self.callback(ax=ax, **kwargs)
+            self.figure.clear()
+            if threed is False:
+                ax = self.figure.add_subplot(111)
+            else:
+                ax = self.figure.add_subplot(111, projection='3d')
+            self.axis = ax
+            self.callback(ax=ax, **kwargs)
+            ax.callbacks.connect('xlim_changed', self.on_xlims_change)
+            ax.callbacks.connect('ylim_changed', self.on_ylims_change)
         if self.xlim0 is None:
             self.setHome(ax)
-        ax.callbacks.connect('xlim_changed', self.on_xlims_change)
-        ax.callbacks.connect('ylim_changed', self.on_ylims_change)
         if aspect == None:
             aspect = self.aspect
         ax.set_aspect(aspect)
@@ -1333,16 +1340,24 @@ class App(QMainWindow):
         tabImporting.currentChanged.connect(logImportTab)
         tabs.currentChanged.connect(logTab)
 
+        def pseudoReuse(mw, params):
+            # only the colors are updated if the axis already has the points
+            if params.get('contour', False) is True:
+                return False
+            return any([c.get_gid() == 'pseudo' for c in mw.axis.collections])
+
         def plotPseudo():
+            reuse = pseudoReuse(mwPseudo, self.pParams)
             mwPseudo.setCallback(self.r2.showPseudo)
             if (self.r2.typ == 'R3t') | (self.r2.typ == 'cR3t'):
-                mwPseudo.replot(aspect='auto', **self.pParams)
+                mwPseudo.replot(aspect='auto', reuse=reuse, **self.pParams)
             else:
-                mwPseudo.replot(aspect='auto', **self.pParams)
+                mwPseudo.replot(aspect='auto', reuse=reuse, **self.pParams)
 
         def plotPseudoIP():
+            reuse = pseudoReuse(mwPseudoIP, self.pParamsIP)
             mwPseudoIP.setCallback(self.r2.showPseudoIP)
-            mwPseudoIP.replot(aspect='auto', **self.pParamsIP)
+            mwPseudoIP.replot(aspect='auto', reuse=reuse, **self.pParamsIP)
 
         pseudoLayout = QHBoxLayout()
 #        pseudoLayout.setAlignment(Qt.AlignHCenter | Qt.AlignCenter)
@@ -2069,7 +2084,7 @@ class App(QMainWindow):
                         infoDump("%s%i selected measurements removed!" % (rhoRangeText, numSelectRemoved))
                 if ipCheck.checkState() == Qt.Checked:
                     for s in self.r2.surveys:
-                        s.dfPhaseReset = s.df
+                        s.setPhaseReset()
                         s.filterDataIP = s.df
                     heatFilter()
                     iperrFitType.setCurrentIndex(0)
@@ -2090,21 +2105,21 @@ class App(QMainWindow):
             if self.recipErrApplyToAll:
                 for s in self.r2.surveys:
                     numRestored += len(s.dfReset) - len(s.df)
-                    s.df = s.dfReset.copy()
+                    s.resetFilters()
             else:
                 numRestored = len(self.r2.surveys[self.recipErrDataIndex].dfReset) - len(self.r2.surveys[self.recipErrDataIndex].df)
-                self.r2.surveys[self.recipErrDataIndex].df = self.r2.surveys[self.recipErrDataIndex].dfReset.copy()
+                self.r2.surveys[self.recipErrDataIndex].resetFilters()
             if recipErrorInputLine.text() != '':
                 errHist(self.recipErrDataIndex)
                 recipErrorInputLine.setText('')
             if ipCheck.checkState() == Qt.Checked:
                 if self.recipErrApplyToAll:
                     for s in self.r2.surveys:
-                        s.dfPhaseReset = s.dfReset.copy()
-                        s.filterDataIP = s.dfReset.copy()
+                        s.setPhaseReset()
+                        s.filterDataIP = s.df
                 else:
-                    self.r2.surveys[self.recipErrDataIndex].dfPhaseReset = self.r2.surveys[self.recipErrDataIndex].dfReset.copy()
-                    self.r2.surveys[self.recipErrDataIndex].filterDataIP = self.r2.surveys[self.recipErrDataIndex].dfReset.copy()
+                    self.r2.surveys[self.recipErrDataIndex].setPhaseReset()
+                    self.r2.surveys[self.recipErrDataIndex].filterDataIP = self.r2.surveys[self.recipErrDataIndex].df
                 heatFilter()
                 iperrFitType.setCurrentIndex(0)
                 phaseplotError()
@@ -2145,11 +2160,11 @@ class App(QMainWindow):
             if ipCheck.checkState() == Qt.Checked:
                 if self.recipErrApplyToAll:
                     for s in self.r2.surveys:
-                        s.dfPhaseReset = s.dfReset.copy()
-                        s.filterDataIP = s.dfReset.copy()
+                        s.setPhaseReset()
+                        s.filterDataIP = s.df
                 else:
-                    self.r2.surveys[self.recipErrDataIndex].dfPhaseReset = self.r2.surveys[self.recipErrDataIndex].dfReset.copy()
-                    self.r2.surveys[self.recipErrDataIndex].filterDataIP = self.r2.surveys[self.recipErrDataIndex].dfReset.copy()
+                    self.r2.surveys[self.recipErrDataIndex].setPhaseReset()
+                    self.r2.surveys[self.recipErrDataIndex].filterDataIP = self.r2.surveys[self.recipErrDataIndex].df
                 heatFilter()
                 iperrFitType.setCurrentIndex(0)
                 phaseplotError()
@@ -2388,12 +2403,12 @@ class App(QMainWindow):
         def filt_reset():
             if self.phaseFiltDataIndex == -1:
                 for s in self.r2.surveys:
-                    s.filterDataIP = s.dfPhaseReset.copy()
-                    s.df = s.dfPhaseReset.copy()
+                    s.resetPhaseFilters()
+                    s.filterDataIP = s.df
                 infoDump('Phase filters are now reset for all datasets!')
             else:
-                self.r2.surveys[self.phaseFiltDataIndex].filterDataIP = self.r2.surveys[self.phaseFiltDataIndex].dfPhaseReset.copy()
-                self.r2.surveys[self.phaseFiltDataIndex].df = self.r2.surveys[self.phaseFiltDataIndex].dfPhaseReset.copy()
+                self.r2.surveys[self.phaseFiltDataIndex].resetPhaseFilters()
+                self.r2.surveys[self.phaseFiltDataIndex].filterDataIP = self.r2.surveys[self.phaseFiltDataIndex].df
                 infoDump('Phase filters are now reset for selected dataset!')
             heatFilter()
             dcaProgress.setValue(0)
@@ -2652,8 +2667,7 @@ class App(QMainWindow):
         errFitType.addItem('Observed Errors')
         errFitType.addItem('Linear')
         errFitType.addItem('Power-law')
-        if platform.system() == 'Linux':
-            errFitType.addItem('Linear Mixed Effect (requires R and the lme4 package, dc surveys only for now)')
+        errFitType.addItem('Linear Mixed Effect (dc surveys only for now)')
         errFitType.activated.connect(errFitTypeFunc)
         errFitType.setToolTip('Select an error model to use.')
 